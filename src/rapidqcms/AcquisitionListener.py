@@ -7,6 +7,10 @@ from watchdog.events import FileSystemEventHandler
 import hashlib
 import rapidqcms.DatabaseFunctions as db
 import rapidqcms.AutoQCProcessing as qc
+import rapidqcms.QueryProfiler as profiler
+
+# Maximum time (in seconds) to wait for queued uploads to Google Drive before the listener exits
+sync_timeout = 10 * 60
 
 class DataAcquisitionEventHandler(FileSystemEventHandler):
 
@@ -151,7 +155,8 @@ class DataAcquisitionEventHandler(FileSystemEventHandler):
         # Route data file to Rapid-QC-MS pipeline
         if sample_acquired:
             print("Data acquisition completed for", filename)
-            qc.process_data_file(path, filename, extension, self.instrument_id, self.run_id)
+            with profiler.scope("sample: " + filename):
+                qc.process_data_file(path, filename, extension, self.instrument_id, self.run_id)
             print("Data processing for", filename, "complete.")
 
         # Check if data file was the last sample in the sequence
@@ -218,7 +223,8 @@ def start_listener(path, instrument_id, run_id):
                 continue
 
             # Process data file
-            qc.process_data_file(path, filename, extension, instrument_id, run_id)
+            with profiler.scope("sample: " + filename):
+                qc.process_data_file(path, filename, extension, instrument_id, run_id)
             print("Data processing for", filename, "complete.")
 
         print("Last sample acquired. QC job complete.")
@@ -241,7 +247,8 @@ def start_listener(path, instrument_id, run_id):
                     continue
 
                 # Process data file
-                qc.process_data_file(path, filename, extension, instrument_id, run_id)
+                with profiler.scope("sample: " + filename):
+                    qc.process_data_file(path, filename, extension, instrument_id, run_id)
                 print("Data processing for", filename, "complete.")
 
         # Start file monitor and process files as they are created
@@ -267,9 +274,11 @@ def terminate_job(instrument_id, run_id):
 
     Performs the following functions:
         1. Marks instrument run as completed
-        2. Uploads database to Google Drive (if Google Drive sync is enabled)
-        3. Deletes temporary data file directory in /data
-        4. Kills acquisition listener process
+        2. Runs database maintenance, if no other runs are active
+        3. Queues upload of database to Google Drive (if Google Drive sync is enabled)
+        4. Waits for queued uploads to finish
+        5. Deletes temporary data file directory in /data
+        6. Kills acquisition listener process
 
     Args:
         instrument_id (str):
@@ -284,9 +293,19 @@ def terminate_job(instrument_id, run_id):
     # Mark instrument run as completed
     db.mark_run_as_completed(instrument_id, run_id)
 
-    # Sync database on run completion
+    # Run database maintenance while no samples are being written
+    try:
+        if db.database_is_idle(instrument_id):
+            db.run_database_maintenance(instrument_id)
+    except Exception as error:
+        print("Error running database maintenance:", error)
+
+    # Sync database on run completion, after queued uploads of QC results
     if db.sync_is_enabled():
-        db.sync_on_run_completion(instrument_id, run_id)
+        db.queue_run_completion_sync(instrument_id, run_id)
+
+    # Give queued uploads time to finish (any left over are resumed by the dashboard)
+    db.wait_for_sync_queue(timeout=sync_timeout)
 
     # Delete temporary data file directory
     db.delete_temp_directory(instrument_id, run_id)
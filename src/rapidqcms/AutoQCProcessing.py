@@ -160,7 +160,7 @@ def biological_standards_valid(chromatography, biological_standards):
     msp_files = pos_msp_files + neg_msp_files
 
     for file in msp_files:
-        file_path = os.path.join(os.getcwd(), "data", "methods", file)
+        file_path = os.path.join(db.methods_directory, file)
         if not os.path.isfile(file_path):
             return False
 
@@ -310,15 +310,12 @@ def run_msdial_processing(filename, msdial_path, parameter_file, input_folder, o
         File path for MS-DIAL result file (*.msdial)
     """
 
-    # Navigate to directory containing MS-DIAL
-    home = os.getcwd()
-    os.chdir(msdial_path)
-
-    # Run MS-DIAL in a subprocess
-    command = "MsdialConsoleApp.exe lcmsdda -i " + '"' + input_folder + '"' \
+    # Run MS-DIAL in a subprocess, in the directory containing MS-DIAL
+    msdial_exe = '"' + os.path.join(msdial_path, "MsdialConsoleApp.exe") + '"'
+    command = msdial_exe + " lcmsdda -i " + '"' + input_folder + '"' \
             + " -o " + '"' + output_folder + '"' \
             + " -m " + '"' + parameter_file + '"' + " -p"
-    process = psutil.Popen(command)
+    process = psutil.Popen(command, cwd=msdial_path)
     pid = process.pid
 
     # Check every second for 5 minutes if process was completed; if process hangs, return None
@@ -330,7 +327,6 @@ def run_msdial_processing(filename, msdial_path, parameter_file, input_folder, o
                 time.sleep(1)
             else:
                 kill_subprocess(pid)
-                os.chdir(home)
                 return None
 
     # Clear data file directory for next sample
@@ -341,9 +337,6 @@ def run_msdial_processing(filename, msdial_path, parameter_file, input_folder, o
         except OSError:
             os.remove(filepath)
 
-    # Return to original working directory
-    os.chdir(home)
-
     # MS-DIAL output filename
     msdial_result = output_folder + "/" + filename.split(".")[0] + ".msdial"
 
@@ -790,8 +783,8 @@ def process_data_file(path, filename, extension, instrument_id, run_id):
         3. Load peak table into DataFrame and filter out poor annotations
         4. Perform quality control checks based on user-defined criteria
         5. Notify user of QC warnings or fails via Slack or email
-        6. Write QC results to instrument database
-        7. If Google Drive sync is enabled, upload results as CSV files
+        6. Write QC results, sample counters, and stage timestamps to instrument database in one transaction
+        7. If Google Drive sync is enabled, queue upload of results as CSV files
 
     Args:
         path (str):
@@ -812,7 +805,7 @@ def process_data_file(path, filename, extension, instrument_id, run_id):
     id = instrument_id.replace(" ", "_") + "_" + run_id
 
     # Create the necessary directories
-    data_directory = os.path.join(os.getcwd(), r"data")
+    data_directory = db.data_directory
     mzml_file_directory = os.path.join(data_directory, id, "data")
     qc_results_directory = os.path.join(data_directory, id, "results")
 
@@ -878,7 +871,11 @@ def process_data_file(path, filename, extension, instrument_id, run_id):
     # Get MS-DIAL directory
     msdial_directory = db.get_msdial_directory()
 
+    # Record (stage, start time, finish time) of each pipeline stage
+    stages = []
+
     # Run MSConvert
+    stage_started = time.time()
     try:
         mzml_file = run_msconvert(path, filename, extension, mzml_file_directory)
 
@@ -896,8 +893,11 @@ def process_data_file(path, filename, extension, instrument_id, run_id):
         print("Failed to run MSConvert.")
         traceback.print_exc()
 
+    stages.append(("msconvert", stage_started, time.time()))
+
     # Run MS-DIAL
     if mzml_file is not None:
+        stage_started = time.time()
         try:
             peak_list = run_msdial_processing(filename, msdial_directory, msdial_parameters,
                 str(mzml_file_directory), str(qc_results_directory))
@@ -905,9 +905,11 @@ def process_data_file(path, filename, extension, instrument_id, run_id):
             peak_list = None
             print("Failed to run MS-DIAL.")
             traceback.print_exc()
+        stages.append(("msdial", stage_started, time.time()))
 
     # Send peak list to Rapid-QC-MS algorithm if valid
     if mzml_file is not None and peak_list is not None:
+        stage_started = time.time()
 
         # Convert peak list to DataFrame
         try:
@@ -941,6 +943,8 @@ def process_data_file(path, filename, extension, instrument_id, run_id):
             traceback.print_exc()
             return
 
+        stages.append(("qc", stage_started, time.time()))
+
     else:
         print("Failed to process", filename)
         mz_record = None
@@ -951,6 +955,7 @@ def process_data_file(path, filename, extension, instrument_id, run_id):
         peak_list = None
 
     # Send email and Slack notification (if they are enabled)
+    stage_started = time.time()
     try:
         if qc_result != "Pass":
             alert = "QC " + qc_result + ": " + filename
@@ -969,22 +974,26 @@ def process_data_file(path, filename, extension, instrument_id, run_id):
         print("Failed to send Slack notification.")
         traceback.print_exc()
 
-    try:
-        # Write QC results to database and upload to Google Drive
-        db.write_qc_results(filename, instrument_id, run_id, mz_record, rt_record, intensity_record, qc_record, qc_result, is_bio_standard)
-
-        # Update sample counters to trigger dashboard update
-        db.update_sample_counters_for_run(instrument_id=instrument_id, run_id=run_id, latest_sample=filename)
+    stages.append(("notification", stage_started, time.time()))
 
-        # If sync is enabled, upload the QC results to Google Drive
-        if db.sync_is_enabled():
-            db.upload_qc_results(instrument_id, run_id)
+    try:
+        # Write QC results, sample counters, and stage timestamps to database in one transaction
+        db.persist_sample_results(instrument_id, run_id, filename, mz_record, rt_record, intensity_record,
+            qc_record, qc_result, is_bio_standard, stages=stages)
 
     except:
         print("Failed to write QC results to database.")
         traceback.print_exc()
         return
 
+    # If sync is enabled, upload the QC results to Google Drive in the background
+    try:
+        if db.sync_is_enabled():
+            db.queue_qc_results_upload(instrument_id, run_id)
+    except:
+        print("Failed to queue upload of QC results.")
+        traceback.print_exc()
+
 
 def subprocess_is_running(pid):
     """
@@ -1027,4 +1036,24 @@ def kill_subprocess(pid):
         return psutil.Process(pid).kill()
     except Exception as error:
         print("Error killing acquisition listener.")
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+
+
+def start_acquisition_listener(path, instrument_id, run_id):
+
+    """
+    Starts the acquisition listener for an instrument run in a background process.
+
+    The listener script is referenced by its absolute path, so that the server's working directory doesn't matter.
+
+    Args:
+        path (str): Data acquisition path
+        instrument_id (str): Instrument ID
+        run_id (str): Instrument run ID (Job ID)
+
+    Returns:
+        psutil.Popen: Acquisition listener process
+    """
+
+    listener_script = os.path.join(db.src_folder, "AcquisitionListener.py")
+    return psutil.Popen(["py", listener_script, path, instrument_id, run_id], cwd=db.src_folder)
@@ -0,0 +1,235 @@
+import os, uuid, threading, traceback
+from concurrent.futures import ThreadPoolExecutor
+import psutil
+from dash._callback_context import context_value
+from dash.exceptions import PreventUpdate
+from dash.long_callback.managers import BaseLongCallbackManager
+import rapidqcms.DatabaseFunctions as db
+
+"""
+Background callback manager for long-running dashboard operations (ex: loading QC results, Google Drive sync).
+
+Background callbacks return to the browser immediately, which then polls for progress and the result. Jobs run on a
+pool of background threads in the server process, so that they share the run cache and Google Drive authentication
+with regular callbacks. Job state, progress and results are stored on disk with diskcache, so that polling requests
+can be answered by any server worker. The diskcache database is only opened (and created) when the first background
+callback is started or polled, so that importing the dashboard leaves no files behind.
+
+Cancellation is cooperative: a cancelled job stops at its next progress update, and its result is discarded.
+
+Set the environment variable RAPIDQCMS_BACKGROUND_THREADS to change the number of background threads (8 by default).
+"""
+
+# Number of jobs that run at the same time (other jobs wait in the queue)
+threads_environment_variable = "RAPIDQCMS_BACKGROUND_THREADS"
+
+# Results and progress of jobs that are never polled (ex: the browser was closed) expire after an hour
+result_expiration = 60 * 60
+
+
+class JobCancelled(Exception):
+
+    """
+    Raised by set_progress() in a job that was cancelled, to stop it.
+    """
+
+
+class ThreadedDiskcacheManager(BaseLongCallbackManager):
+
+    """
+    Runs background callbacks on a thread pool, and stores job state, progress and results with diskcache.
+
+    Args:
+        cache_directory (str, default None): Folder for the diskcache database, or None for data/background_callbacks
+        threads (int, default None): Number of background threads, or None to read RAPIDQCMS_BACKGROUND_THREADS
+    """
+
+    def __init__(self, cache_directory=None, threads=None):
+
+        if threads is None:
+            threads = int(os.environ.get(threads_environment_variable, 8))
+
+        self.cache_directory = cache_directory
+        self.cache = None
+        self.cache_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="background-callback")
+        super().__init__(None)
+
+
+    @property
+    def handle(self):
+
+        """
+        Returns the diskcache database, which is opened on first use.
+        """
+
+        if self.cache is None:
+            with self.cache_lock:
+                if self.cache is None:
+                    import diskcache
+
+                    cache_directory = self.cache_directory
+                    if cache_directory is None:
+                        cache_directory = os.path.join(db.data_directory, "background_callbacks")
+
+                    self.cache = diskcache.Cache(cache_directory)
+
+        return self.cache
+
+
+    def build_cache_key(self, fn, args, cache_args_to_ignore):
+
+        """
+        Returns a unique key for each call, so that results are never shared between calls or sessions.
+        """
+
+        return uuid.uuid4().hex
+
+
+    def call_job_fn(self, key, job_fn, args, context):
+
+        """
+        Queues a job and returns its ID, which the browser sends back when polling.
+        """
+
+        job = uuid.uuid4().hex
+        self.handle.set(get_job_key(job), os.getpid(), expire=result_expiration)
+        self.executor.submit(job_fn, key, self._make_progress_key(key), args, job, context)
+        return job
+
+
+    def make_job_fn(self, fn, progress):
+        return make_job_fn(self, fn, progress)
+
+
+    def job_running(self, job):
+
+        """
+        Returns whether a job is queued or running (in a server process that is still alive).
+        """
+
+        if job is None:
+            return False
+
+        pid = self.handle.get(get_job_key(job))
+        return pid is not None and psutil.pid_exists(pid)
+
+
+    def job_cancelled(self, job):
+        return self.handle.get(get_cancel_key(job)) is not None
+
+
+    def terminate_job(self, job):
+
+        """
+        Cancels a job if it is still queued or running.
+        """
+
+        if job is None:
+            return
+
+        if self.handle.pop(get_job_key(job), None) is not None:
+            self.handle.set(get_cancel_key(job), True, expire=result_expiration)
+
+
+    def terminate_unhealthy_job(self, job):
+        if job is not None and not self.job_running(job):
+            self.terminate_job(job)
+            return True
+        return False
+
+
+    def get_progress(self, key):
+        return self.handle.get(self._make_progress_key(key))
+
+
+    def result_ready(self, key):
+        return self.handle.get(key) is not None
+
+
+    def get_result(self, key, job):
+
+        """
+        Returns the result of a job and removes it from the cache, or UNDEFINED if the job hasn't finished yet.
+        """
+
+        result = self.handle.get(key, self.UNDEFINED)
+        if result is self.UNDEFINED:
+            return self.UNDEFINED
+
+        self.handle.delete(key)
+        self.handle.delete(self._make_progress_key(key))
+        return result
+
+
+def get_job_key(job):
+    return "job-" + job
+
+
+def get_cancel_key(job):
+    return "cancelled-" + job
+
+
+def make_job_fn(manager, fn, progress):
+
+    """
+    Wraps a callback function into a job that runs on a background thread.
+
+    The job runs with the callback context of the request that started it, so that dash.ctx works as usual. Its result
+    (or an error, or no update if it raised PreventUpdate) is stored before the job is marked as finished.
+
+    Args:
+        manager (ThreadedDiskcacheManager): Background callback manager
+        fn (function): Callback function
+        progress (bool): Whether the callback reports progress (set_progress is passed as its first argument)
+
+    Returns:
+        function: Job function, called with the result key, progress key, callback arguments, job ID and context
+    """
+
+    def job_fn(result_key, progress_key, args, job, context):
+
+        context_value.set(context)
+
+        def set_progress(progress_value):
+            if manager.job_cancelled(job):
+                raise JobCancelled()
+            if not isinstance(progress_value, (list, tuple)):
+                progress_value = [progress_value]
+            manager.handle.set(progress_key, progress_value, expire=result_expiration)
+
+        maybe_progress = [set_progress] if progress else []
+
+        try:
+            if manager.job_cancelled(job):
+                raise JobCancelled()
+            elif isinstance(args, dict):
+                output = fn(*maybe_progress, **args)
+            elif isinstance(args, (list, tuple)):
+                output = fn(*maybe_progress, *args)
+            else:
+                output = fn(*maybe_progress, args)
+
+        except JobCancelled:
+            manager.handle.delete(progress_key)
+            return
+
+        except PreventUpdate:
+            output = {"_dash_no_update": "_dash_no_update"}
+
+        except Exception as error:
+            print("Error in background callback " + fn.__name__ + ":", error)
+            traceback.print_exc()
+            output = {"long_callback_error": {"msg": str(error), "tb": traceback.format_exc()}}
+
+        finally:
+            context_value.set({})
+
+        # Discard the result of a job that was cancelled while it was finishing
+        if manager.job_cancelled(job):
+            return
+
+        manager.handle.set(result_key, output, expire=result_expiration)
+        manager.handle.delete(get_job_key(job))
+
+    return job_fn
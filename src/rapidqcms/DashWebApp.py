@@ -4,11 +4,9 @@ from copy import deepcopy
 
 import pandas as pd
 import sqlalchemy as sa
-from dash import dash, dcc, html, dash_table, Input, Output, State, ctx
+from dash import dash, dcc, html, dash_table, Input, Output, State, ClientsideFunction, ctx
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-from pydrive2.auth import GoogleAuth
-from pydrive2.drive import GoogleDrive
 
 
 
@@ -17,6 +15,12 @@ from rapidqcms.AcquisitionListener import *
 import rapidqcms.DatabaseFunctions as db
 import rapidqcms.AutoQCProcessing as qc
 import rapidqcms.SlackNotifications as bot
+import rapidqcms.QueryProfiler as profiler
+import rapidqcms.RunCache as run_cache
+import rapidqcms.ReportGeneration as report
+import rapidqcms.BackgroundCallbacks as background
+import rapidqcms.LiveUpdates as live
+import flask
 
 
 import logging
@@ -27,15 +31,17 @@ log = logging.getLogger("DashWebApp")
 log.debug("Test log.debug from DashWebApp")
 
 
-# Set ms_autoqc/src as the working directory
+# Paths are absolute (relative to the package folder), so that concurrent requests never depend on the working directory
 src_folder = os.path.dirname(os.path.realpath(__file__))
 print("DashWebApp: src_folder: " + src_folder)
-os.chdir(src_folder)
 
 # Initialize directories
-root_directory = os.getcwd()
+root_directory = src_folder
 data_directory = os.path.join(root_directory, "data")
 methods_directory = os.path.join(data_directory, "methods")
+
+# Read instrument databases from snapshots, so that dashboard queries don't contend with the acquisition listener
+db.enable_read_snapshots()
 auth_directory = os.path.join(root_directory, "auth")
 
 for directory in [data_directory, auth_directory, methods_directory]:
@@ -56,10 +62,18 @@ local_stylesheet = {
 Dash app layout
 """
 
+# Long-running callbacks (background=True) run on background threads, with progress and results stored on disk
+# (in data/background_callbacks, which is created when the first background callback runs)
+background_callback_manager = background.ThreadedDiskcacheManager()
+
 # Initialize Dash app
 app = dash.Dash(__name__, title="Rapid-QC-MS", suppress_callback_exceptions=True,
     external_stylesheets=[local_stylesheet, dbc.themes.BOOTSTRAP, dbc.icons.BOOTSTRAP],
-    meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}])
+    meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}],
+    background_callback_manager=background_callback_manager)
+
+# WSGI application, for serving the dashboard with production WSGI servers (see __main__.py)
+server = app.server
 
 def serve_layout():
 
@@ -83,6 +97,7 @@ def serve_layout():
                     dbc.Nav([
                         dbc.NavItem(dbc.NavLink("About", href="https://github.com/czbiohub-sf/Rapid-QC-MS", className="navbar-button", target="_blank")),
                         dbc.NavItem(dbc.NavLink("Support", href="https://github.com/czbiohub-sf/Rapid-QC-MS/wiki", className="navbar-button", target="_blank")),
+                        dbc.NavItem(dbc.NavLink("Trends", href="#", id="trends-button", className="navbar-button")),
                         dbc.NavItem(dbc.NavLink("Settings", href="#", id="settings-button", className="navbar-button")),
                     ], className="me-auto")
                 ], className="g-0 ms-auto flex-nowrap mt-3 mt-md-0")
@@ -144,8 +159,8 @@ def serve_layout():
                                         dbc.CardHeader(id="active-run-progress-header", style={"padding": "0.75rem"}),
                                         dbc.CardBody([
 
-                                            # Instrument run progress
-                                            dcc.Interval(id="refresh-interval", n_intervals=0, interval=30000, disabled=True),
+                                            # Instrument run progress (the interval only checks for live updates in the browser)
+                                            dcc.Interval(id="refresh-interval", n_intervals=0, interval=500, disabled=True),
                                             dbc.Progress(id="active-run-progress-bar", animated=False),
 
                                             # Buttons for managing Rapid-QC-MS jobs
@@ -179,6 +194,23 @@ def serve_layout():
                                                     ]),
                                                 ]),
                                             ]),
+
+                                            # Button to download a static QC report of the selected run
+                                            html.Div(className="d-flex justify-content-center btn-toolbar", children=[
+                                                dcc.Loading(type="circle", children=[
+                                                    dbc.Button("Download QC Report",
+                                                        id="download-qc-report-button",
+                                                        className="run-button",
+                                                        outline=True,
+                                                        color="primary"),
+                                                    dcc.Download(id="qc-report-download"),
+                                                ]),
+                                            ]),
+                                            html.Div(className="d-flex justify-content-center", children=[
+                                                dbc.FormText(id="qc-report-progress"),
+                                            ]),
+                                            dbc.Alert(id="qc-report-error-alert", color="danger", is_open=False,
+                                                dismissable=True, className="mt-2"),
                                         ])
                                 ]),
 
@@ -468,7 +500,13 @@ def serve_layout():
                         dbc.Modal(id="loading-modal", size="md", centered=True, is_open=False, scrollable=True,
                                   keyboard=False, backdrop="static", children=[
                             dbc.ModalHeader(dbc.ModalTitle(id="loading-modal-title"), close_button=False),
-                            dbc.ModalBody(id="loading-modal-body")
+                            dbc.ModalBody(children=[
+                                html.Div(id="loading-modal-body"),
+                                dbc.Progress(id="loading-modal-progress", value=0, className="margin-top-15")
+                            ]),
+                            dbc.ModalFooter(children=[
+                                dbc.Button("Cancel", color="secondary", id="cancel-load-button")
+                            ]),
                         ]),
 
                         # Modal for job completion / restart / deletion confirmation
@@ -731,7 +769,8 @@ def serve_layout():
 
                                 html.Div([
                                     dbc.Button("Start monitoring instrument run", id="monitor-new-run-button", disabled=True,
-                                    style={"line-height": "1.75"}, color="primary")],
+                                    style={"line-height": "1.75"}, color="primary"),
+                                    dbc.FormText(id="new-job-setup-progress")],
                                 className="d-grid gap-2")
                             ]),
                         ]),
@@ -750,6 +789,45 @@ def serve_layout():
                             dbc.ModalBody(id="new-job-error-modal-body", className="modal-styles"),
                         ]),
 
+                        # Instrument trends across runs, from precomputed run summaries
+                        dbc.Modal(id="trends-modal", fullscreen=True, centered=True, is_open=False, scrollable=True, children=[
+                            dbc.ModalHeader(dbc.ModalTitle(children="Instrument Trends"), close_button=True),
+                            dbc.ModalBody(className="modal-styles-fullscreen", children=[
+
+                                dbc.Row(children=[
+                                    dbc.Col(width=12, lg=2, children=[
+                                        dbc.Label("Instrument"),
+                                        dcc.Dropdown(id="trends-instrument-dropdown", options=[], clearable=False),
+                                    ]),
+                                    dbc.Col(width=12, lg=2, children=[
+                                        dbc.Label("Chromatography"),
+                                        dcc.Dropdown(id="trends-chromatography-dropdown", options=[], clearable=False),
+                                    ]),
+                                    dbc.Col(width=12, lg=2, children=[
+                                        dbc.Label("Polarity"),
+                                        dcc.Dropdown(id="trends-polarity-dropdown", value="Pos", clearable=False, options=[
+                                            {"label": "Positive Mode", "value": "Pos"},
+                                            {"label": "Negative Mode", "value": "Neg"}]),
+                                    ]),
+                                    dbc.Col(width=12, lg=3, children=[
+                                        dbc.Label("Internal standard"),
+                                        dcc.Dropdown(id="trends-istd-dropdown", options=[], clearable=False),
+                                    ]),
+                                    dbc.Col(width=12, lg=3, children=[
+                                        dbc.Label("Metric"),
+                                        dcc.Dropdown(id="trends-metric-dropdown", value="delta_rt", clearable=False,
+                                            options=[{"label": label, "value": metric}
+                                                for metric, (label, column, lower, upper) in trend_metrics.items()]),
+                                    ]),
+                                ]),
+
+                                html.Br(),
+
+                                # Line plot of the selected metric across instrument runs
+                                dcc.Graph(id="trends-plot"),
+                            ])
+                        ]),
+
                         # Rapid-QC-MS settings
                         dbc.Modal(id="settings-modal", fullscreen=True, centered=True, is_open=False, scrollable=True, children=[
                             dbc.ModalHeader(dbc.ModalTitle(children="Settings"), close_button=True),
@@ -1449,6 +1527,7 @@ def serve_layout():
             dcc.Store(id="bio-mz-pos"),
             dcc.Store(id="bio-mz-neg"),
             dcc.Store(id="study-resources"),
+            dcc.Store(id="live-update"),
             dcc.Store(id="specimens"),
             dcc.Store(id="pos-internal-standards"),
             dcc.Store(id="neg-internal-standards"),
@@ -1519,13 +1598,81 @@ def serve_layout():
 # Serve app layout
 app.layout = serve_layout
 
+"""
+Query profiling (only if enabled with the RAPIDQCMS_PROFILE_QUERIES environment variable)
+"""
+
+if profiler.profiling_is_enabled():
+
+    @app.server.before_request
+    def start_query_profiler_scope():
+
+        """
+        Attributes queries issued during a request to the Dash callback (or URL) that was requested
+        """
+
+        scope = "request: " + flask.request.path
+        if flask.request.path.endswith("_dash-update-component"):
+            try:
+                scope = "callback: " + flask.request.get_json()["output"]
+            except Exception:
+                pass
+
+        flask.g.query_profiler_token = profiler.current_scope.set(scope)
+
+
+    @app.server.teardown_request
+    def end_query_profiler_scope(exception=None):
+
+        """
+        Restores the previous query profiler scope after a request
+        """
+
+        token = flask.g.pop("query_profiler_token", None)
+        if token is not None:
+            profiler.current_scope.reset(token)
+
+
+    @app.server.route("/debug/queries")
+    def view_query_profile():
+
+        """
+        Debug page with SQL query statistics of the dashboard and of acquisition listener processes
+        """
+
+        profiler.write_report()
+        reports = [profiler.get_report()] + profiler.read_reports()
+        return "<html><head><title>Rapid-QC-MS – SQL queries</title></head><body style='font-family: sans-serif'>" \
+            + "<h2>SQL query profile</h2>" + "".join(profiler.report_to_html(report) for report in reports) \
+            + "</body></html>"
+
+"""
+Live updates of active instrument runs (server-sent events, see LiveUpdates.py)
+"""
+
+@app.server.route("/live-updates")
+def stream_live_updates():
+
+    """
+    Streams updates of an active instrument run to the browser, which triggers the refresh callbacks
+    """
+
+    instrument_id = flask.request.args.get("instrument")
+    run_id = flask.request.args.get("run")
+
+    if not instrument_id or not run_id:
+        return "Missing instrument or run", 400
+
+    return flask.Response(live.stream_events(instrument_id, run_id), mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 """
 Dash callbacks
 """
 
 
 @app.callback(Output("google-drive-sync-update", "data"),
-              Input("on-page-load", "data"))
+              Input("on-page-load", "data"), background=True)
 def sync_with_google_drive(on_page_load):
 
     """
@@ -1551,7 +1698,7 @@ def sync_with_google_drive(on_page_load):
 
 
 @app.callback(Output("google-drive-download-database", "data"),
-              Input("tabs", "value"), prevent_initial_call=True)
+              Input("tabs", "value"), prevent_initial_call=True, background=True)
 def sync_with_google_drive(instrument_id):
 
     """
@@ -1571,7 +1718,7 @@ def sync_with_google_drive(instrument_id):
 
 
 @app.callback(Output("google-drive-authenticated", "data"),
-              Input("on-page-load", "data"))
+              Input("on-page-load", "data"), background=True)
 def authenticate_with_google_drive(on_page_load):
 
     """
@@ -1596,7 +1743,7 @@ def authenticate_with_google_drive(on_page_load):
               State("gdrive-client-id", "value"),
               State("gdrive-client-secret-1", "value"),
               State("gdrive-client-secret-2", "value"),
-              State("gdrive-client-secret", "value"), prevent_initial_call=True)
+              State("gdrive-client-secret", "value"), prevent_initial_call=True, background=True)
 def launch_google_drive_authentication(setup_auth_button_clicks, sign_in_auth_button_clicks, settings_button_clicks,
     client_id_1, client_id_2, client_id_3, client_secret_1, client_secret_2, client_secret_3):
 
@@ -1640,7 +1787,7 @@ def launch_google_drive_authentication(setup_auth_button_clicks, sign_in_auth_bu
               Output("google-drive-button-1-popover", "is_open"),
               Output("gdrive-folder-id-1", "data"),
               Output("gdrive-methods-zip-id-1", "data"),
-              Input("google-drive-authenticated-1", "data"), prevent_initial_call=True)
+              Input("google-drive-authenticated-1", "data"), prevent_initial_call=True, background=True)
 def check_first_time_google_drive_authentication(google_drive_is_authenticated):
 
     """
@@ -1667,11 +1814,9 @@ def check_first_time_google_drive_authentication(google_drive_is_authenticated):
         if gdrive_folder_id is not None:
             for file in drive.ListFile({"q": "'" + gdrive_folder_id + "' in parents and trashed=false"}).GetList():
                 if file["title"] == "methods.zip":
-                    os.chdir(data_directory)                # Switch to data directory
-                    file.GetContentFile(file["title"])      # Download methods ZIP archive
-                    gdrive_methods_zip_id = file["id"]      # Get methods ZIP file ID
-                    os.chdir(root_directory)                # Switch back to root directory
-                    db.unzip_methods()                      # Unzip methods ZIP archive
+                    file.GetContentFile(os.path.join(data_directory, file["title"]))    # Download methods ZIP archive
+                    gdrive_methods_zip_id = file["id"]                                  # Get methods ZIP file ID
+                    db.unzip_methods()                                                  # Unzip methods ZIP archive
 
             if gdrive_methods_zip_id is not None:
                 popover_message = [dbc.PopoverHeader("Workspace found!"),
@@ -1745,7 +1890,7 @@ def ui_feedback_for_complete_setup_button(button_click):
               State("first-time-instrument-vendor", "label"),
               State("google-drive-authenticated-1", "data"),
               State("gdrive-folder-id-1", "data"),
-              State("gdrive-methods-zip-id-1", "data"), prevent_initial_call=True)
+              State("gdrive-methods-zip-id-1", "data"), prevent_initial_call=True, background=True)
 def complete_first_time_setup(button_click, instrument_id, instrument_vendor, google_drive_authenticated,
     gdrive_folder_id, methods_zip_file_id):
 
@@ -1792,10 +1937,8 @@ def complete_first_time_setup(button_click, instrument_id, instrument_vendor, go
             # Download other instrument databases
             for file in drive.ListFile({"q": "'" + gdrive_folder_id + "' in parents and trashed=false"}).GetList():
                 if file["title"] != "methods.zip":
-                    os.chdir(data_directory)                    # Switch to data directory
-                    file.GetContentFile(file["title"])          # Download database ZIP archive
-                    os.chdir(root_directory)                    # Switch back to root directory
-                    db.unzip_database(filename=file["title"])   # Unzip database ZIP archive
+                    file.GetContentFile(os.path.join(data_directory, file["title"]))    # Download database ZIP archive
+                    db.unzip_database(filename=file["title"])                           # Unzip database ZIP archive
 
             # Sync newly created instrument database to Google Drive folder
             db.zip_database(instrument_id=instrument_id)
@@ -1861,7 +2004,7 @@ def complete_first_time_setup(button_click, instrument_id, instrument_vendor, go
               Output("google-drive-button-2-popover", "is_open"),
               Output("gdrive-folder-id-2", "data"),
               Output("device-identity-selection", "options"),
-              Input("google-drive-authenticated-2", "data"), prevent_initial_call=True)
+              Input("google-drive-authenticated-2", "data"), prevent_initial_call=True, background=True)
 def check_workspace_login_google_drive_authentication(google_drive_is_authenticated):
 
     """
@@ -1900,17 +2043,13 @@ def check_workspace_login_google_drive_authentication(google_drive_is_authentica
 
                 # Download and unzip instrument databases
                 if file["title"] != "methods.zip":
-                    os.chdir(data_directory)                    # Switch to data directory
-                    file.GetContentFile(file["title"])          # Download database ZIP archive
-                    os.chdir(root_directory)                    # Switch back to root directory
-                    db.unzip_database(filename=file["title"])   # Unzip database ZIP archive
+                    file.GetContentFile(os.path.join(data_directory, file["title"]))    # Download database ZIP archive
+                    db.unzip_database(filename=file["title"])                           # Unzip database ZIP archive
 
                 # Download and unzip methods directory
                 else:
-                    os.chdir(data_directory)                # Switch to data directory
-                    file.GetContentFile(file["title"])      # Download methods ZIP archive
-                    os.chdir(root_directory)                # Switch back to root directory
-                    db.unzip_methods()                      # Unzip methods ZIP archive
+                    file.GetContentFile(os.path.join(data_directory, file["title"]))    # Download methods ZIP archive
+                    db.unzip_methods()                                                  # Unzip methods ZIP archive
 
             # Popover alert
             button_text = "Signed in to Google Drive"
@@ -2222,7 +2361,7 @@ def reset_instrument_table(instrument, job_deleted):
               Output("table-container", "style"),
               Output("plot-container", "style"),
               Input("tabs", "value"),
-              Input("refresh-interval", "n_intervals"),
+              Input("live-update", "data"),
               State("study-resources", "data"),
               Input("google-drive-sync-update", "data"),
               Input("start-run-monitor-modal", "is_open"),
@@ -2237,13 +2376,17 @@ def populate_instrument_runs_table(instrument_id, refresh, resources, sync_updat
     trigger = ctx.triggered_id
 
     # Ensure that refresh does not trigger data parsing if no new samples processed
-    if trigger == "refresh-interval":
+    if trigger == "live-update":
         resources = json.loads(resources)
         run_id = resources["run_id"]
         status = resources["status"]
 
+        # On remote devices, poll the run's progress manifest and only download QC results if it changed
         if db.get_device_identity() != instrument_id:
             if db.sync_is_enabled() and status != "Complete":
+                progress = db.get_qc_results_progress(instrument_id, run_id)
+                if progress is not None and progress["completed"] == resources["samples_completed"]:
+                    raise PreventUpdate
                 db.download_qc_results(instrument_id, run_id)
 
         completed_count_in_cache = resources["samples_completed"]
@@ -2281,8 +2424,9 @@ def populate_instrument_runs_table(instrument_id, refresh, resources, sync_updat
               Output("loading-modal-body", "children"),
               Input("instrument-run-table", "active_cell"),
               State("instrument-run-table", "data"),
-              Input("close-load-modal", "data"), prevent_initial_call=True, suppress_callback_exceptions=True)
-def open_loading_modal(active_cell, table_data, load_finished):
+              Input("close-load-modal", "data"),
+              Input("cancel-load-button", "n_clicks"), prevent_initial_call=True, suppress_callback_exceptions=True)
+def open_loading_modal(active_cell, table_data, load_finished, cancel_button):
 
     """
     Shows loading modal on selection of an instrument run
@@ -2290,6 +2434,10 @@ def open_loading_modal(active_cell, table_data, load_finished):
 
     trigger = ctx.triggered_id
 
+    # Close the modal if loading was cancelled
+    if trigger == "cancel-load-button":
+        return False, dash.no_update, dash.no_update
+
     if active_cell:
         run_id = table_data[active_cell["row"]]["Job ID"]
 
@@ -2337,15 +2485,21 @@ def open_loading_modal(active_cell, table_data, load_finished):
               Output("qc-fails-pos", "data"),
               Output("qc-fails-neg", "data"),
               Output("load-finished", "data"),
-              Input("refresh-interval", "n_intervals"),
+              Input("live-update", "data"),
               Input("instrument-run-table", "active_cell"),
               State("instrument-run-table", "data"),
               State("study-resources", "data"),
-              State("tabs", "value"), prevent_initial_call=True, suppress_callback_exceptions=True)
-def load_data(refresh, active_cell, table_data, resources, instrument_id):
+              State("tabs", "value"), prevent_initial_call=True, suppress_callback_exceptions=True,
+              background=True, interval=500,
+              progress=[Output("loading-modal-progress", "value"), Output("loading-modal-progress", "label")],
+              progress_default=[0, ""],
+              cancel=[Input("cancel-load-button", "n_clicks")])
+def load_data(set_progress, refresh, active_cell, table_data, resources, instrument_id):
 
     """
     Updates and stores QC results in dcc.Store objects (user's browser session)
+
+    Runs as a background callback, which reports its progress to the loading modal and can be cancelled from it.
     """
     log.debug("load_data input variables: ")
     log.debug(locals())
@@ -2358,12 +2512,21 @@ def load_data(refresh, active_cell, table_data, resources, instrument_id):
         status = table_data[active_cell["row"]]["Status"]
 
         # Ensure that refresh does not trigger data parsing if no new samples processed
-        if trigger == "refresh-interval":
+        if trigger == "live-update":
             try:
+                # On remote devices, poll the run's progress manifest and only download QC results if it changed
                 if db.get_device_identity() != instrument_id:
                     if db.sync_is_enabled() and status != "Complete":
+                        progress = db.get_qc_results_progress(instrument_id, run_id)
+                        if progress is not None and progress["completed"] == json.loads(resources)["samples_completed"]:
+                            raise PreventUpdate
                         db.download_qc_results(instrument_id, run_id)
 
+                # On the instrument computer, compare the published database version instead of querying the database
+                if db.get_device_identity() == instrument_id:
+                    if json.loads(resources).get("database_version") == db.get_database_version(instrument_id):
+                        raise PreventUpdate
+
                 completed_count_in_cache = json.loads(resources)["samples_completed"]
                 actual_completed_count, total = db.get_completed_samples_count(instrument_id, run_id, status)
 
@@ -2390,13 +2553,27 @@ def load_data(refresh, active_cell, table_data, resources, instrument_id):
                     db.delete_temp_directory(instrument_id, run_id)
 
                     # Restart AcquisitionListener and store process ID
-                    process = psutil.Popen(["py", "AcquisitionListener.py", acquisition_path, instrument_id, run_id])
+                    process = qc.start_acquisition_listener(acquisition_path, instrument_id, run_id)
                     db.store_pid(instrument_id, run_id, process.pid)
 
         # If new sample, route raw data -> parsed data -> user session cache -> plots
+        set_progress((25, "Loading QC results"))
+        results = get_qc_results(instrument_id, run_id, status)
+        set_progress((90, "Sending QC results"))
         log.debug("result of get_qc_results function call")
-        log.debug("{}".format(get_qc_results(instrument_id, run_id, status)))
-        return get_qc_results(instrument_id, run_id, status) + (True,)
+        log.debug("{}".format(results))
+
+        # On refresh, only send tables that changed since the version in the user's session
+        if trigger == "live-update" and resources is not None:
+            previous_fingerprints = json.loads(resources).get("fingerprints")
+            fingerprints = json.loads(results[14])["fingerprints"]
+
+            if previous_fingerprints is not None and len(previous_fingerprints) == len(fingerprints):
+                results = tuple(dash.no_update if fingerprints[index] is not None
+                    and fingerprints[index] == previous_fingerprints[index] else output
+                    for index, output in enumerate(results))
+
+        return results + (True,)
 
     else:
         return (None, None, None, None, None, None, None, None, None, None,
@@ -2421,7 +2598,7 @@ def populate_sample_tables(samples):
     """
 
     if samples is not None:
-        df_samples = pd.DataFrame(json.loads(samples))
+        df_samples = db.decode_table(samples)
         df_samples = df_samples[["Specimen", "Position", "QC"]]
         return df_samples.to_dict("records")
     else:
@@ -2455,13 +2632,13 @@ def update_dropdowns_on_polarity_change(polarity, table_data, samples, bio_inten
     log.debug(locals())
 
     if samples is not None:
-        df_samples = pd.DataFrame(json.loads(samples))
+        df_samples = db.decode_table(samples)
 
         if polarity == "Neg":
             istd_dropdown = json.loads(neg_internal_standards)
 
             if bio_intensity_neg is not None:
-                df = pd.DataFrame(json.loads(bio_intensity_neg[selected_bio_standard]))
+                df = db.decode_table(bio_intensity_neg[selected_bio_standard])
                 df.drop(columns=["Name", "run_id"], inplace=True)
                 bio_dropdown = df.columns.tolist()
             else:
@@ -2474,7 +2651,7 @@ def update_dropdowns_on_polarity_change(polarity, table_data, samples, bio_inten
             istd_dropdown = json.loads(pos_internal_standards)
 
             if bio_intensity_pos is not None:
-                df = pd.DataFrame(json.loads(bio_intensity_pos[selected_bio_standard]))
+                df = db.decode_table(bio_intensity_pos[selected_bio_standard])
                 df.drop(columns=["Name", "run_id"], inplace=True)
                 bio_dropdown = df.columns.tolist()
             else:
@@ -2514,7 +2691,7 @@ def apply_sample_filter_to_plots(filter, polarity, samples, metadata):
 
     # Get complete list of samples (including blanks + pools) in polarity
     if samples is not None:
-        df_samples = pd.DataFrame(json.loads(samples))
+        df_samples = db.decode_table(samples)
         df_samples = df_samples.loc[df_samples["Polarity"].str.contains(polarity)]
         sample_list = df_samples["Specimen"].tolist()
     else:
@@ -2561,9 +2738,10 @@ def apply_sample_filter_to_plots(filter, polarity, samples, metadata):
               State("pos-internal-standards", "data"),
               State("neg-internal-standards", "data"),
               Input("rt-prev-button", "n_clicks"),
-              Input("rt-next-button", "n_clicks"), prevent_initial_call=True)
+              Input("rt-next-button", "n_clicks"),
+              Input("istd-rt-plot", "relayoutData"), prevent_initial_call=True)
 def populate_istd_rt_plot(polarity, internal_standard, selected_samples, rt_pos, rt_neg, samples, resources,
-    pos_internal_standards, neg_internal_standards, previous, next):
+    pos_internal_standards, neg_internal_standards, previous, next, relayout_data):
 
     """
     Populates internal standard retention time vs. sample plot
@@ -2579,18 +2757,18 @@ def populate_istd_rt_plot(polarity, internal_standard, selected_samples, rt_pos,
 
     trigger = ctx.triggered_id
 
-    # Get internal standard RT data
-    df_istd_rt_pos = pd.DataFrame()
-    df_istd_rt_neg = pd.DataFrame()
-
-    if rt_pos is not None:
-        df_istd_rt_pos = pd.DataFrame(json.loads(rt_pos))
+    # Keep the plot if only results of the other polarity changed (ex: a new sample on refresh)
+    triggered = set(ctx.triggered_prop_ids.values())
+    if (triggered == {"istd-rt-pos"} and polarity == "Neg") or (triggered == {"istd-rt-neg"} and polarity == "Pos"):
+        raise PreventUpdate
 
-    if rt_neg is not None:
-        df_istd_rt_neg = pd.DataFrame(json.loads(rt_neg))
+    # Ignore layout changes other than zooming into the x-axis (ex: autosize when the graph is first rendered)
+    x_range = get_zoomed_range(relayout_data) if trigger == "istd-rt-plot" else None
+    if trigger == "istd-rt-plot" and x_range is None:
+        raise PreventUpdate
 
     # Get samples
-    df_samples = pd.DataFrame(json.loads(samples))
+    df_samples = db.decode_table(samples)
     samples = df_samples.loc[df_samples["Polarity"] == polarity]["Specimen"].astype(str).tolist()
 
     # Filter out biological standards
@@ -2602,10 +2780,10 @@ def populate_istd_rt_plot(polarity, internal_standard, selected_samples, rt_pos,
     # Filter samples and internal standards by polarity
     if polarity == "Pos":
         internal_standards = json.loads(pos_internal_standards)
-        df_istd_rt = df_istd_rt_pos
+        istd_rt = rt_pos
     elif polarity == "Neg":
         internal_standards = json.loads(neg_internal_standards)
-        df_istd_rt = df_istd_rt_neg
+        istd_rt = rt_neg
 
 
 
@@ -2623,11 +2801,25 @@ def populate_istd_rt_plot(polarity, internal_standard, selected_samples, rt_pos,
     else:
         index = next
 
-    try:
-        # Generate internal standard RT vs. sample plot
+    # Runs that aren't downsampled are already shown at full resolution when zoomed
+    if trigger == "istd-rt-plot" and len(selected_samples) <= downsample_point_threshold:
+        raise PreventUpdate
+
+    # Internal standard RT data is only loaded if the figure isn't cached
+    def build_figure():
+        df_istd_rt = get_table_from_cache(resources, ("internal_standards", polarity, "retention_time"), istd_rt)
         return load_istd_rt_plot(dataframe=df_istd_rt, samples=selected_samples,
-            internal_standard=internal_standard, retention_times=retention_times), \
-                None, index, internal_standard, {"display": "block"}
+            internal_standard=internal_standard, retention_times=retention_times, x_range=x_range)
+
+    try:
+        # Generate internal standard RT vs. sample plot (zoomed plots aren't cached)
+        if x_range is not None:
+            figure = build_figure()
+        else:
+            figure = get_cached_figure(resources, ("rt", polarity, internal_standard, retention_times[internal_standard]),
+                selected_samples, build_figure)
+
+        return figure, None, index, internal_standard, {"display": "block"}
 
     except Exception as error:
         print("Error in loading RT vs. sample plot:", error)
@@ -2650,9 +2842,10 @@ def populate_istd_rt_plot(polarity, internal_standard, selected_samples, rt_pos,
               State("pos-internal-standards", "data"),
               State("neg-internal-standards", "data"),
               Input("intensity-prev-button", "n_clicks"),
-              Input("intensity-next-button", "n_clicks"), prevent_initial_call=True)
+              Input("intensity-next-button", "n_clicks"),
+              Input("istd-intensity-plot", "relayoutData"), prevent_initial_call=True)
 def populate_istd_intensity_plot(polarity, internal_standard, selected_samples, intensity_pos, intensity_neg, samples, metadata, resources,
-    pos_internal_standards, neg_internal_standards, previous, next):
+    pos_internal_standards, neg_internal_standards, previous, next, relayout_data):
 
     """
     Populates internal standard intensity vs. sample plot
@@ -2669,18 +2862,18 @@ def populate_istd_intensity_plot(polarity, internal_standard, selected_samples,
 
     trigger = ctx.triggered_id
 
-    # Get internal standard intensity data
-    df_istd_intensity_pos = pd.DataFrame()
-    df_istd_intensity_neg = pd.DataFrame()
-
-    if intensity_pos is not None:
-        df_istd_intensity_pos = pd.DataFrame(json.loads(intensity_pos))
+    # Keep the plot if only results of the other polarity changed (ex: a new sample on refresh)
+    triggered = set(ctx.triggered_prop_ids.values())
+    if (triggered == {"istd-intensity-pos"} and polarity == "Neg") or (triggered == {"istd-intensity-neg"} and polarity == "Pos"):
+        raise PreventUpdate
 
-    if intensity_neg is not None:
-        df_istd_intensity_neg = pd.DataFrame(json.loads(intensity_neg))
+    # Ignore layout changes other than zooming into the x-axis (ex: autosize when the graph is first rendered)
+    x_range = get_zoomed_range(relayout_data) if trigger == "istd-intensity-plot" else None
+    if trigger == "istd-intensity-plot" and x_range is None:
+        raise PreventUpdate
 
     # Get samples
-    df_samples = pd.DataFrame(json.loads(samples))
+    df_samples = db.decode_table(samples)
     samples = df_samples.loc[df_samples["Polarity"] == polarity]["Specimen"].astype(str).tolist()
 
     identifiers = db.get_biological_standard_identifiers()
@@ -2695,10 +2888,10 @@ def populate_istd_intensity_plot(polarity, internal_standard, selected_samples,
     # Filter samples and internal standards by polarity
     if polarity == "Pos":
         internal_standards = json.loads(pos_internal_standards)
-        df_istd_intensity = df_istd_intensity_pos
+        istd_intensity = intensity_pos
     elif polarity == "Neg":
         internal_standards = json.loads(neg_internal_standards)
-        df_istd_intensity = df_istd_intensity_neg
+        istd_intensity = intensity_neg
 
     # Set initial internal standard dropdown value when none are selected
     if not internal_standard or trigger == "polarity-options":
@@ -2721,11 +2914,25 @@ def populate_istd_intensity_plot(polarity, internal_standard, selected_samples,
     else:
         index = next
 
-    try:
-        # Generate internal standard intensity vs. sample plot
+    # Runs that aren't downsampled are already shown at full resolution when zoomed
+    if trigger == "istd-intensity-plot" and len(selected_samples) <= downsample_point_threshold:
+        raise PreventUpdate
+
+    # Internal standard intensity data is only loaded if the figure isn't cached
+    def build_figure():
+        df_istd_intensity = get_table_from_cache(resources, ("internal_standards", polarity, "intensity"), istd_intensity)
         return load_istd_intensity_plot(dataframe=df_istd_intensity, samples=selected_samples,
-        internal_standard=internal_standard, treatments=treatments), \
-               None, index, internal_standard, {"display": "block"}
+            internal_standard=internal_standard, treatments=treatments, x_range=x_range)
+
+    try:
+        # Generate internal standard intensity vs. sample plot (zoomed plots aren't cached)
+        if x_range is not None:
+            figure = build_figure()
+        else:
+            figure = get_cached_figure(resources, ("intensity", polarity, internal_standard, get_treatments_key(treatments)),
+                selected_samples, build_figure)
+
+        return figure, None, index, internal_standard, {"display": "block"}
 
     except Exception as error:
         print("Error in loading intensity vs. sample plot:", error)
@@ -2747,9 +2954,10 @@ def populate_istd_intensity_plot(polarity, internal_standard, selected_samples,
               State("neg-internal-standards", "data"),
               State("study-resources", "data"),
               Input("mz-prev-button", "n_clicks"),
-              Input("mz-next-button", "n_clicks"), prevent_initial_call=True)
+              Input("mz-next-button", "n_clicks"),
+              Input("istd-mz-plot", "relayoutData"), prevent_initial_call=True)
 def populate_istd_mz_plot(polarity, internal_standard, selected_samples, delta_mz_pos, delta_mz_neg, samples,
-    pos_internal_standards, neg_internal_standards, resources, previous, next):
+    pos_internal_standards, neg_internal_standards, resources, previous, next, relayout_data):
 
     """
     Populates internal standard delta m/z vs. sample plot
@@ -2763,18 +2971,18 @@ def populate_istd_mz_plot(polarity, internal_standard, selected_samples, delta_m
 
     trigger = ctx.triggered_id
 
-    # Get internal standard RT data
-    df_istd_mz_pos = pd.DataFrame()
-    df_istd_mz_neg = pd.DataFrame()
-
-    if delta_mz_pos is not None:
-        df_istd_mz_pos = pd.DataFrame(json.loads(delta_mz_pos))
+    # Keep the plot if only results of the other polarity changed (ex: a new sample on refresh)
+    triggered = set(ctx.triggered_prop_ids.values())
+    if (triggered == {"istd-delta-mz-pos"} and polarity == "Neg") or (triggered == {"istd-delta-mz-neg"} and polarity == "Pos"):
+        raise PreventUpdate
 
-    if delta_mz_neg is not None:
-        df_istd_mz_neg = pd.DataFrame(json.loads(delta_mz_neg))
+    # Ignore layout changes other than zooming into the x-axis (ex: autosize when the graph is first rendered)
+    x_range = get_zoomed_range(relayout_data) if trigger == "istd-mz-plot" else None
+    if trigger == "istd-mz-plot" and x_range is None:
+        raise PreventUpdate
 
     # Get samples (and filter out biological standards)
-    df_samples = pd.DataFrame(json.loads(samples))
+    df_samples = db.decode_table(samples)
     samples = df_samples.loc[df_samples["Polarity"] == polarity]["Specimen"].astype(str).tolist()
 
     identifiers = db.get_biological_standard_identifiers()
@@ -2785,11 +2993,11 @@ def populate_istd_mz_plot(polarity, internal_standard, selected_samples, delta_m
     # Filter samples and internal standards by polarity
     if polarity == "Pos":
         internal_standards = json.loads(pos_internal_standards)
-        df_istd_mz = df_istd_mz_pos
+        istd_delta_mz = delta_mz_pos
 
     elif polarity == "Neg":
         internal_standards = json.loads(neg_internal_standards)
-        df_istd_mz = df_istd_mz_neg
+        istd_delta_mz = delta_mz_neg
 
     # Set initial dropdown values when none are selected
     if not internal_standard or trigger == "polarity-options":
@@ -2804,10 +3012,24 @@ def populate_istd_mz_plot(polarity, internal_standard, selected_samples, delta_m
     else:
         index = next
 
+    # Runs that aren't downsampled are already shown at full resolution when zoomed
+    if trigger == "istd-mz-plot" and len(selected_samples) <= downsample_point_threshold:
+        raise PreventUpdate
+
+    # Internal standard delta m/z data is only loaded if the figure isn't cached
+    def build_figure():
+        df_istd_mz = get_table_from_cache(resources, ("qc", polarity, "Delta m/z"), istd_delta_mz)
+        return load_istd_delta_mz_plot(dataframe=df_istd_mz, samples=selected_samples, internal_standard=internal_standard,
+            x_range=x_range)
+
     try:
-        # Generate internal standard delta m/z vs. sample plot
-        return load_istd_delta_mz_plot(dataframe=df_istd_mz, samples=selected_samples, internal_standard=internal_standard), \
-               None, index, internal_standard, {"display": "block"}
+        # Generate internal standard delta m/z vs. sample plot (zoomed plots aren't cached)
+        if x_range is not None:
+            figure = build_figure()
+        else:
+            figure = get_cached_figure(resources, ("delta_mz", polarity, internal_standard), selected_samples, build_figure)
+
+        return figure, None, index, internal_standard, {"display": "block"}
 
     except Exception as error:
         print("Error in loading delta m/z vs. sample plot:", error)
@@ -2879,11 +3101,11 @@ def populate_biological_standards_compare_dropdowns(resources, polarity, intensi
         # Get intensity data
         if polarity == "Pos":
             if intensity_pos is not None:
-                df_bio_intensity = pd.DataFrame(json.loads(intensity_pos[selected_bio_standard]))
+                df_bio_intensity = get_table_from_cache(resources, ("biological_standards", selected_bio_standard, "Pos", "intensity"), intensity_pos[selected_bio_standard])
 
         elif polarity == "Neg":
             if intensity_neg is not None:
-                df_bio_intensity = pd.DataFrame(json.loads(intensity_neg[selected_bio_standard]))
+                df_bio_intensity = get_table_from_cache(resources, ("biological_standards", selected_bio_standard, "Neg", "intensity"), intensity_neg[selected_bio_standard])
 
         if df_bio_intensity is not None:
             if runselector != "All":
@@ -2933,43 +3155,42 @@ def populate_bio_standard_mz_rt_plot(polarity, rt_pos, rt_neg, intensity_pos, in
         if mz_pos is None and mz_neg is None:
             return {}, None, None, {"display": "none"}
 
-    # Get run ID and status
+    # Get run ID
     resources = json.loads(resources)
     instrument_id = resources["instrument"]
     run_id = resources["run_id"]
-    status = resources["status"]
 
-    # Get Google Drive instance
-    drive = None
-    if status == "Active" and db.sync_is_enabled():
-        drive = db.get_drive_instance()
-
-    # Toggle a different biological standard
-    if selected_bio_standard is not None:
-        rt_pos, rt_neg, intensity_pos, intensity_neg, mz_pos, mz_neg = get_qc_results(instrument_id=instrument_id,
-            run_id=run_id, status=status, biological_standard=selected_bio_standard, biological_standards_only=True, preserve_names=True)
-
-    # Get biological standard m/z, RT, and intensity data
+    # Get biological standard m/z, RT, and intensity data (the session holds tables for every biological standard of the run)
     if polarity == "Pos":
         if rt_pos is not None and intensity_pos is not None and mz_pos is not None:
-            df_bio_rt = pd.DataFrame(json.loads(rt_pos[selected_bio_standard]))
-            df_bio_intensity = pd.DataFrame(json.loads(intensity_pos[selected_bio_standard]))
-            df_bio_mz = pd.DataFrame(json.loads(mz_pos[selected_bio_standard]))
+            df_bio_rt = get_table_from_cache(resources, ("biological_standards", selected_bio_standard, "Pos", "retention_time"), rt_pos[selected_bio_standard])
+            df_bio_intensity = get_table_from_cache(resources, ("biological_standards", selected_bio_standard, "Pos", "intensity"), intensity_pos[selected_bio_standard])
+            df_bio_mz = get_table_from_cache(resources, ("biological_standards", selected_bio_standard, "Pos", "precursor_mz"), mz_pos[selected_bio_standard])
 
     elif polarity == "Neg":
         if rt_neg is not None and intensity_neg is not None and mz_neg is not None:
-            df_bio_rt = pd.DataFrame(json.loads(rt_neg[selected_bio_standard]))
-            df_bio_intensity = pd.DataFrame(json.loads(intensity_neg[selected_bio_standard]))
-            df_bio_mz = pd.DataFrame(json.loads(mz_neg[selected_bio_standard]))
+            df_bio_rt = get_table_from_cache(resources, ("biological_standards", selected_bio_standard, "Neg", "retention_time"), rt_neg[selected_bio_standard])
+            df_bio_intensity = get_table_from_cache(resources, ("biological_standards", selected_bio_standard, "Neg", "intensity"), intensity_neg[selected_bio_standard])
+            df_bio_mz = get_table_from_cache(resources, ("biological_standards", selected_bio_standard, "Neg", "precursor_mz"), mz_neg[selected_bio_standard])
 
     if click_data is not None:
         selected_feature = click_data["points"][0]["hovertext"]
     else:
         selected_feature = None
 
+    # Compare against precomputed aggregates of the previous runs instead of averaging their injections
+    df_aggregates = None
+    if target_biostnd == "All previous":
+        try:
+            df_aggregates = db.get_bio_standard_aggregates(instrument_id, selected_bio_standard,
+                resources["chromatography"], polarity, before_run=run_id)
+        except Exception as error:
+            print("Error loading biological standard aggregates:", error)
+
     try:
         # Biological standard metabolites – m/z vs. retention time
-        return load_bio_feature_plot(run_id=run_id, df_rt=df_bio_rt, df_mz=df_bio_mz, df_intensity=df_bio_intensity, target_biostnd=target_biostnd, source_biostnd=source_biostnd), \
+        return load_bio_feature_plot(run_id=run_id, df_rt=df_bio_rt, df_mz=df_bio_mz, df_intensity=df_bio_intensity, target_biostnd=target_biostnd, source_biostnd=source_biostnd,
+            df_aggregates=df_aggregates), \
             selected_feature, None, {"display": "block"}
     except Exception as error:
         print("Error in loading biological standard m/z-RT plot:", error)
@@ -3001,24 +3222,28 @@ def populate_bio_standard_benchmark_plot(polarity, selected_feature, intensity_p
     run_id = resources["run_id"]
     status = resources["status"]
 
-    # Get Google Drive instance
-    drive = None
-    if status == "Active" and db.sync_is_enabled():
-        drive = db.get_drive_instance()
-
-    # Toggle a different biological standard
-    if selected_bio_standard is not None:
-        intensity_pos, intensity_neg = get_qc_results(instrument_id=instrument_id, run_id=run_id,
-            status=status, biological_standard=selected_bio_standard, for_benchmark_plot=True)
-
-    # Get intensity data
-    if polarity == "Pos":
-        if intensity_pos is not None:
-            df_bio_intensity = pd.DataFrame(json.loads(intensity_pos[selected_bio_standard]))
+    # Get intensities across runs from precomputed aggregates, instead of parsing the QC results of every previous run
+    df_bio_intensity = None
+    df_aggregates = None
+    if get_load_from(instrument_id, status) == "database":
+        try:
+            df_bio_intensity = db.get_bio_standard_intensities(instrument_id, selected_bio_standard,
+                resources["chromatography"], polarity)
+            df_aggregates = db.get_bio_standard_aggregates(instrument_id, selected_bio_standard,
+                resources["chromatography"], polarity)
+        except Exception as error:
+            print("Error loading biological standard aggregates:", error)
+            df_bio_intensity = None
+
+    # Active runs on remote devices aren't in the local database yet, so their session tables are used instead
+    if df_bio_intensity is None or len(df_bio_intensity) == 0:
+        if polarity == "Pos":
+            if intensity_pos is not None:
+                df_bio_intensity = get_table_from_cache(resources, ("biological_standards", selected_bio_standard, "Pos", "intensity"), intensity_pos[selected_bio_standard])
 
-    elif polarity == "Neg":
-        if intensity_neg is not None:
-            df_bio_intensity = pd.DataFrame(json.loads(intensity_neg[selected_bio_standard]))
+        elif polarity == "Neg":
+            if intensity_neg is not None:
+                df_bio_intensity = get_table_from_cache(resources, ("biological_standards", selected_bio_standard, "Neg", "intensity"), intensity_neg[selected_bio_standard])
 
     # Get clicked or selected feature from biological standard m/z-RT plot
     if not selected_feature:
@@ -3027,7 +3252,7 @@ def populate_bio_standard_benchmark_plot(polarity, selected_feature, intensity_p
     try:
         # Generate biological standard metabolite intensity vs. instrument run plot
         return load_bio_benchmark_plot(dataframe=df_bio_intensity,
-            metabolite_name=selected_feature), {"display": "block"}
+            metabolite_name=selected_feature, df_aggregates=df_aggregates), {"display": "block"}
 
     except Exception as error:
         print("Error loading biological standard intensity plot:", error)
@@ -3050,35 +3275,8 @@ def populate_bio_standard_benchmark_plot(polarity, selected_feature, intensity_p
               Input("istd-rt-plot", "clickData"),
               Input("istd-intensity-plot", "clickData"),
               Input("istd-mz-plot", "clickData"),
-              State("istd-rt-pos", "data"),
-              State("istd-rt-neg", "data"),
-              State("istd-intensity-pos", "data"),
-              State("istd-intensity-neg", "data"),
-              State("istd-mz-pos", "data"),
-              State("istd-mz-neg", "data"),
-              State("istd-delta-rt-pos", "data"),
-              State("istd-delta-rt-neg", "data"),
-              State("istd-in-run-delta-rt-pos", "data"),
-              State("istd-in-run-delta-rt-neg", "data"),
-              State("istd-delta-mz-pos", "data"),
-              State("istd-delta-mz-neg", "data"),
-              State("qc-warnings-pos", "data"),
-              State("qc-warnings-neg", "data"),
-              State("qc-fails-pos", "data"),
-              State("qc-fails-neg", "data"),
-              State("bio-rt-pos", "data"),
-              State("bio-rt-neg", "data"),
-              State("bio-intensity-pos", "data"),
-              State("bio-intensity-neg", "data"),
-              State("bio-mz-pos", "data"),
-              State("bio-mz-neg", "data"),
-              State("sequence", "data"),
-              State("metadata", "data"),
               State("study-resources", "data"), prevent_initial_call=True)
-def toggle_sample_card(is_open, active_cell, table_data, rt_click, intensity_click, mz_click, rt_pos, rt_neg, intensity_pos,
-    intensity_neg, mz_pos, mz_neg, delta_rt_pos, delta_rt_neg, in_run_delta_rt_pos, in_run_delta_rt_neg, delta_mz_pos, delta_mz_neg,
-    qc_warnings_pos, qc_warnings_neg, qc_fails_pos, qc_fails_neg, bio_rt_pos, bio_rt_neg, bio_intensity_pos, bio_intensity_neg,
-    bio_mz_pos, bio_mz_neg, sequence, metadata, resources):
+def toggle_sample_card(is_open, active_cell, table_data, rt_click, intensity_click, mz_click, resources):
 
     """
     Opens information modal when a sample is clicked from the sample table
@@ -3093,15 +3291,15 @@ def toggle_sample_card(is_open, active_cell, table_data, rt_click, intensity_cli
 
     # Get selected sample from plots
     if rt_click:
-        clicked_sample = rt_click["points"][0]["x"]
+        clicked_sample = get_clicked_sample(rt_click)
         clicked_sample = clicked_sample.replace(": RT Info", "")
 
     if intensity_click:
-        clicked_sample = intensity_click["points"][0]["x"]
+        clicked_sample = get_clicked_sample(intensity_click)
         clicked_sample = clicked_sample.replace(": Height", "")
 
     if mz_click:
-        clicked_sample = mz_click["points"][0]["x"]
+        clicked_sample = get_clicked_sample(mz_click)
         clicked_sample = clicked_sample.replace(": Precursor m/z Info", "")
         
     log.debug("clicked_sample = " + str(clicked_sample))
@@ -3110,79 +3308,38 @@ def toggle_sample_card(is_open, active_cell, table_data, rt_click, intensity_cli
     resources = json.loads(resources)
     instrument_id = resources["instrument"]
     run_id = resources["run_id"]
-    status = resources["status"]
-
-    # this is a list with names: eg ["NameUrine", "FakeyMcFakerson"]
-    run_biostnds = resources["biological_standards"]
 
-    # Get sequence and metadata
-    df_sequence = pd.read_json(sequence, orient="split")
-    try:
-        df_metadata = pd.read_json(metadata, orient="split")
-    except:
-        #otherwise populate with an empty dataframe
-        df_metadata = pd.DataFrame()
-
-    # Check whether sample is a biological standard or not
-    is_bio_standard = False
+    # Look up the sample's QC results, sequence and metadata rows (instead of filtering every table of the run)
+    sample_details = get_sample_details(resources, clicked_sample)
+    if sample_details is None:
+        print("Could not find sample in instrument run:", clicked_sample)
+        raise PreventUpdate
 
-    # this is a dict: eg {'Urine': 'NameUrine', 'Fake': 'FakeyMcFakerson'}
-    identifiers = db.get_biological_standard_identifiers()
-    
-    log.debug("identifiers = " + str(identifiers))
-    clicked_sample_identifier = ""
-    for identifier, identusername in identifiers.items():
-        if identifier in clicked_sample and identusername in run_biostnds:
-            clicked_sample_identifier = identifiers[identifier]
-            log.debug("clicked_sample_identifier = " + clicked_sample_identifier)
-            is_bio_standard = True
-            break
-    
+    tables = sample_details["tables"]
+    polarity = sample_details["polarity"]
+    is_bio_standard = sample_details["biological_standard"] is not None
     log.debug("is_bio_standard = " + str(is_bio_standard))
-    # Get polarity
-    polarity = db.get_polarity_for_sample(instrument_id, run_id, clicked_sample, status)
 
     # Generate DataFrames with quantified features and metadata for selected sample
-    # data comes in as a json string from dcc.stores
     if not is_bio_standard:
-
-        if polarity == "Pos":
-            df_rt = pd.DataFrame(json.loads(rt_pos))
-            df_intensity = pd.DataFrame(json.loads(intensity_pos))
-            df_mz = pd.DataFrame(json.loads(mz_pos))
-            df_delta_rt = pd.DataFrame(json.loads(delta_rt_pos))
-            df_in_run_delta_rt = pd.DataFrame(json.loads(in_run_delta_rt_pos))
-            df_delta_mz = pd.DataFrame(json.loads(delta_mz_pos))
-            df_warnings = pd.DataFrame(json.loads(qc_warnings_pos))
-            df_fails = pd.DataFrame(json.loads(qc_fails_pos))
-
-        elif polarity == "Neg":
-            df_rt = pd.DataFrame(json.loads(rt_neg))
-            df_intensity = pd.DataFrame(json.loads(intensity_neg))
-            df_mz = pd.DataFrame(json.loads(mz_neg))
-            df_delta_rt = pd.DataFrame(json.loads(delta_rt_neg))
-            df_in_run_delta_rt = pd.DataFrame(json.loads(in_run_delta_rt_neg))
-            df_delta_mz = pd.DataFrame(json.loads(delta_mz_neg))
-            df_warnings = pd.DataFrame(json.loads(qc_warnings_neg))
-            df_fails = pd.DataFrame(json.loads(qc_fails_neg))
-        df_sample_features, df_sample_info = generate_sample_metadata_dataframe(clicked_sample, df_rt, df_mz, df_intensity,
-            df_delta_rt, df_in_run_delta_rt, df_delta_mz, df_warnings, df_fails, df_sequence, df_metadata)
+        df_sample_features, df_sample_info = generate_sample_metadata_dataframe(clicked_sample,
+            tables[("internal_standards", polarity, "retention_time")],
+            tables[("internal_standards", polarity, "precursor_mz")],
+            tables[("internal_standards", polarity, "intensity")],
+            tables[("qc", polarity, "Delta RT")],
+            tables[("qc", polarity, "In-run delta RT")],
+            tables[("qc", polarity, "Delta m/z")],
+            tables[("qc", polarity, "Warnings")],
+            tables[("qc", polarity, "Fails")],
+            sample_details["sequence"], sample_details["metadata"])
 
     elif is_bio_standard:
+        biological_standard = sample_details["biological_standard"]
+        df_sample_features, df_sample_info = generate_bio_standard_dataframe(clicked_sample, instrument_id, run_id,
+            tables[("biological_standards", biological_standard, polarity, "retention_time")],
+            tables[("biological_standards", biological_standard, polarity, "precursor_mz")],
+            tables[("biological_standards", biological_standard, polarity, "intensity")])
 
-        if polarity == "Pos":
-            df_rt = pd.DataFrame(json.loads(bio_rt_pos[clicked_sample_identifier]))
-            df_intensity = pd.DataFrame(json.loads(bio_intensity_pos[clicked_sample_identifier]))
-            log.debug("bio_mz_pos[clicked_sample_identifier]")
-            log.debug(type(bio_mz_pos[clicked_sample_identifier]))
-            log.debug(bio_mz_pos[clicked_sample_identifier])
-            df_mz = pd.DataFrame(json.loads(bio_mz_pos[clicked_sample_identifier]))
-
-        elif polarity == "Neg":
-            df_rt = pd.DataFrame(json.loads(bio_rt_neg[clicked_sample_identifier]))
-            df_intensity = pd.DataFrame(json.loads(bio_intensity_neg[clicked_sample_identifier]))
-            df_mz = pd.DataFrame(json.loads(bio_mz_neg[clicked_sample_identifier]))
-        df_sample_features, df_sample_info = generate_bio_standard_dataframe(clicked_sample, instrument_id, run_id, df_rt, df_mz, df_intensity)
     # Create tables from DataFrames
     metadata_table = dbc.Table.from_dataframe(df_sample_info, striped=True, bordered=True, hover=True)
     feature_table = dbc.Table.from_dataframe(df_sample_features, striped=True, bordered=True, hover=True)
@@ -3198,6 +3355,96 @@ def toggle_sample_card(is_open, active_cell, table_data, rt_click, intensity_cli
         return True, title, body, [], None, None, None, None, df_sample_features.to_json(), clicked_sample
 
 
+@app.callback(Output("trends-modal", "is_open"),
+              Output("trends-instrument-dropdown", "options"),
+              Output("trends-instrument-dropdown", "value"),
+              Input("trends-button", "n_clicks"),
+              State("tabs", "value"), prevent_initial_call=True)
+def open_trends_modal(button_click, instrument_id):
+
+    """
+    Opens instrument trends modal, with the currently selected instrument
+    """
+
+    instruments = db.get_instruments_list()
+    if instrument_id not in instruments:
+        instrument_id = instruments[0] if len(instruments) > 0 else None
+
+    return True, instruments, instrument_id
+
+
+@app.callback(Output("trends-chromatography-dropdown", "options"),
+              Output("trends-chromatography-dropdown", "value"),
+              Output("trends-istd-dropdown", "options"),
+              Output("trends-istd-dropdown", "value"),
+              Input("trends-instrument-dropdown", "value"),
+              Input("trends-chromatography-dropdown", "value"),
+              Input("trends-polarity-dropdown", "value"),
+              State("trends-istd-dropdown", "value"),
+              Input("trends-metric-dropdown", "value"), prevent_initial_call=True)
+def populate_trends_dropdowns(instrument_id, chromatography, polarity, internal_standard, metric):
+
+    """
+    Populates chromatography and internal standard options for instrument trends, from the instrument's run summaries
+    """
+
+    if instrument_id is None:
+        raise PreventUpdate
+
+    df_runs = db.get_run_summaries(instrument_id, polarity="All", internal_standard="All")
+    chromatography_methods = df_runs["chromatography"].dropna().astype(str).unique().tolist()
+    if chromatography not in chromatography_methods:
+        chromatography = chromatography_methods[-1] if len(chromatography_methods) > 0 else None
+
+    # Run metrics don't depend on internal standards
+    if metric in ["qc_results", "throughput"]:
+        return chromatography_methods, chromatography, [{"label": "All internal standards", "value": "All"}], "All"
+
+    df_summaries = db.get_run_summaries(instrument_id, chromatography=chromatography, polarity=polarity)
+    internal_standards = sorted(df_summaries.loc[df_summaries["internal_standard"] != "All"]["internal_standard"].astype(str).unique())
+    options = [{"label": "All internal standards", "value": "All"}] if metric == "dropout_rate" else []
+    options += [{"label": internal_standard, "value": internal_standard} for internal_standard in internal_standards]
+
+    values = [option["value"] for option in options]
+    if internal_standard not in values:
+        internal_standard = values[0] if len(values) > 0 else None
+
+    return chromatography_methods, chromatography, options, internal_standard
+
+
+@app.callback(Output("trends-plot", "figure"),
+              Input("trends-instrument-dropdown", "value"),
+              Input("trends-chromatography-dropdown", "value"),
+              Input("trends-polarity-dropdown", "value"),
+              Input("trends-istd-dropdown", "value"),
+              Input("trends-metric-dropdown", "value"), prevent_initial_call=True)
+def populate_trends_plot(instrument_id, chromatography, polarity, internal_standard, metric):
+
+    """
+    Populates line plot of a run summary metric across instrument runs
+    """
+
+    if instrument_id is None or chromatography is None or internal_standard is None:
+        return {}
+
+    # Run rows hold metrics of all samples, regardless of polarity
+    if internal_standard == "All":
+        df_summaries = db.get_run_summaries(instrument_id, chromatography=chromatography, polarity="All", internal_standard="All")
+        title = trend_metrics[metric][0] + " – " + instrument_id + ", " + chromatography
+    else:
+        df_summaries = db.get_run_summaries(instrument_id, chromatography=chromatography, polarity=polarity,
+            internal_standard=internal_standard)
+        df_runs = db.get_run_summaries(instrument_id, chromatography=chromatography, polarity="All", internal_standard="All")
+        df_summaries = df_summaries.drop(columns=["started"]).merge(df_runs[["run_id", "started"]], on="run_id", how="left")
+        title = trend_metrics[metric][0] + " – " + internal_standard + " (" + polarity + "), " + chromatography
+
+    try:
+        return load_instrument_trend_plot(df_summaries, metric, title)
+    except Exception as error:
+        print("Error in loading instrument trend plot:", error)
+        return {}
+
+
 @app.callback(Output("settings-modal", "is_open"),
               Input("settings-button", "n_clicks"), prevent_initial_call=True)
 def toggle_settings_modal(button_click):
@@ -3268,7 +3515,7 @@ def sync_settings_to_google_drive(settings_modal_is_open, google_drive_authentic
     if not settings_modal_is_open:
         if google_drive_authenticated or auth_in_app:
             if db.settings_were_modified(md5_checksum):
-                db.upload_methods()
+                db.queue_methods_upload()
                 return True
 
     return False
@@ -3752,7 +3999,8 @@ def bio_standard_msp_text_field_feedback(filename):
               State("add-istd-msp-button", "contents"),
               State("add-istd-msp-button", "filename"),
               State("select-istd-chromatography-dropdown", "value"),
-              State("select-istd-polarity-dropdown", "value"), prevent_initial_call=True)
+              State("select-istd-polarity-dropdown", "value"), prevent_initial_call=True, background=True,
+              running=[(Output("msp-save-changes-button", "disabled"), True, False)])
 def capture_uploaded_istd_msp(button_click, contents, filename, chromatography, polarity):
 
     """
@@ -4385,7 +4633,8 @@ def bio_standard_msp_text_field_ui_callback(filename):
               State("add-bio-msp-button", "filename"),
               State("select-bio-chromatography-dropdown", "value"),
               State("select-bio-polarity-dropdown", "value"),
-              State("select-bio-standard-dropdown", "value"), prevent_initial_call=True)
+              State("select-bio-standard-dropdown", "value"), prevent_initial_call=True, background=True,
+              running=[(Output("bio-standard-save-changes-button", "disabled"), True, False)])
 def capture_uploaded_bio_msp(button_click, contents, filename, chromatography, polarity, bio_standard):
 
     """
@@ -4870,8 +5119,11 @@ def enable_new_autoqc_job_button(run_id_valid, chromatography_valid, qc_config_v
               State("new-metadata", "data"),
               State("data-acquisition-folder-path", "value"),
               State("start-run-qc-configs-dropdown", "value"),
-              State("ms_autoqc-job-type", "value"), prevent_initial_call=True)
-def new_autoqc_job_setup(button_clicks, run_id, instrument_id, chromatography, bio_standards, sequence, metadata,
+              State("ms_autoqc-job-type", "value"), prevent_initial_call=True, background=True,
+              running=[(Output("monitor-new-run-button", "disabled"), True, False)],
+              progress=[Output("new-job-setup-progress", "children")],
+              progress_default=[""])
+def new_autoqc_job_setup(set_progress, button_clicks, run_id, instrument_id, chromatography, bio_standards, sequence, metadata,
     acquisition_path, qc_config_id, job_type):
 
     """
@@ -4885,9 +5137,11 @@ def new_autoqc_job_setup(button_clicks, run_id, instrument_id, chromatography, b
     if run_id not in db.get_instrument_runs(instrument_id, as_list=True):
 
         # Write a new instrument run to the database
+        set_progress("Saving instrument run...")
         db.insert_new_run(run_id, instrument_id, chromatography, bio_standards, acquisition_path, sequence, metadata, qc_config_id, job_type)
 
         # Get MSPs and generate parameters files for MS-DIAL processing
+        set_progress("Generating MS-DIAL parameter files...")
         for polarity in ["Positive", "Negative"]:
 
             # Generate parameters files for processing samples
@@ -4901,12 +5155,13 @@ def new_autoqc_job_setup(button_clicks, run_id, instrument_id, chromatography, b
                     db.generate_msdial_parameters_file(chromatography, polarity, msp_file_path, bio_standard)
 
         # Start AcquisitionListener process in the background
-        process = psutil.Popen(["py", "AcquisitionListener.py", acquisition_path, instrument_id, run_id])
+        set_progress("Starting acquisition listener...")
+        process = qc.start_acquisition_listener(acquisition_path, instrument_id, run_id)
         db.store_pid(instrument_id, run_id, process.pid)
 
         # Upload database to Google Drive
         if db.is_instrument_computer() and db.sync_is_enabled():
-            db.upload_database(instrument_id)
+            db.queue_database_upload(instrument_id)
 
     return True, False
 
@@ -5101,7 +5356,7 @@ def update_folder_path_text_field(select_folder_button, selected_folder, setting
               Output("job-controller-panel", "style"),
               Input("instrument-run-table", "active_cell"),
               State("instrument-run-table", "data"),
-              Input("refresh-interval", "n_intervals"),
+              Input("live-update", "data"),
               Input("tabs", "value"),
               Input("start-run-monitor-modal", "is_open"), prevent_initial_call=True)
 def update_progress_bar_during_active_instrument_run(active_cell, table_data, refresh, instrument_id, new_job_started):
@@ -5138,6 +5393,14 @@ def update_progress_bar_during_active_instrument_run(active_cell, table_data, re
         return {"display": "none"}, None, None, None, True, {"display": "none"}
 
 
+# Checks for live updates of the selected active run in the browser, so that idle runs cause no server requests
+app.clientside_callback(ClientsideFunction(namespace="live_updates", function_name="check_for_updates"),
+    Output("live-update", "data"),
+    Input("refresh-interval", "n_intervals"),
+    Input("refresh-interval", "disabled"),
+    State("study-resources", "data"), prevent_initial_call=True)
+
+
 @app.callback(Output("setup-new-run-button", "style"),
               Input("tabs", "value"), prevent_initial_call=True)
 def hide_elements_for_non_instrument_devices(instrument_id):
@@ -5224,10 +5487,11 @@ def perform_action_on_job(confirm_button, modal_title, resources):
         try:
             # Mark instrument run as completed
             db.mark_run_as_completed(instrument_id, run_id)
+            run_cache.invalidate(instrument_id, run_id)
 
             # Sync database on run completion
             if db.sync_is_enabled():
-                db.sync_on_run_completion(instrument_id, run_id)
+                db.queue_run_completion_sync(instrument_id, run_id)
 
             # Delete temporary data file directory
             db.delete_temp_directory(instrument_id, run_id)
@@ -5249,11 +5513,12 @@ def perform_action_on_job(confirm_button, modal_title, resources):
             pid = db.get_pid(instrument_id, run_id)
             qc.kill_subprocess(pid)
 
-            # Delete temporary data file directory
+            # Delete temporary data file directory and cached figures
             db.delete_temp_directory(instrument_id, run_id)
+            delete_cached_figures(instrument_id, run_id)
 
             # Restart AcquisitionListener and store process ID
-            process = psutil.Popen(["py", "AcquisitionListener.py", acquisition_path, instrument_id, run_id])
+            process = qc.start_acquisition_listener(acquisition_path, instrument_id, run_id)
             db.store_pid(instrument_id, run_id, process.pid)
             return None, True, None, None
 
@@ -5267,11 +5532,13 @@ def perform_action_on_job(confirm_button, modal_title, resources):
         try:
             # Delete instrument run from database
             db.delete_instrument_run(instrument_id, run_id)
+            run_cache.invalidate(instrument_id, run_id)
+            delete_cached_figures(instrument_id, run_id)
 
             # Sync with Google Drive
             if db.sync_is_enabled():
-                db.upload_database(instrument_id)
-                db.delete_active_run_csv_files(instrument_id, run_id)
+                db.queue_database_upload(instrument_id)
+                db.queue_active_run_cleanup(instrument_id, run_id)
 
             # Delete temporary data file directory
             db.delete_temp_directory(instrument_id, run_id)
@@ -5285,6 +5552,44 @@ def perform_action_on_job(confirm_button, modal_title, resources):
     else:
         raise PreventUpdate
 
+@app.callback(Output("qc-report-download", "data"),
+              Output("qc-report-error-alert", "is_open"),
+              Output("qc-report-error-alert", "children"),
+              Input("download-qc-report-button", "n_clicks"),
+              State("study-resources", "data"), prevent_initial_call=True, background=True,
+              running=[(Output("download-qc-report-button", "disabled"), True, False)],
+              progress=[Output("qc-report-progress", "children")],
+              progress_default=[""])
+def download_qc_report(set_progress, button_click, resources):
+
+    """
+    Generates a static QC report with all plots of the selected instrument run, and downloads it as a ZIP archive
+    """
+
+    if resources is None:
+        raise PreventUpdate
+
+    resources = json.loads(resources)
+    instrument_id = resources["instrument"]
+    run_id = resources["run_id"]
+
+    def report_progress(rendered, total):
+        set_progress("Rendering plots (" + str(rendered) + " of " + str(total) + ")...")
+
+    try:
+        set_progress("Loading QC results...")
+        report_directory = report.generate_report(instrument_id, run_id, progress=report_progress)
+
+        set_progress("Compressing QC report...")
+        report_file = report.zip_report(report_directory)
+
+        return dcc.send_file(report_file, filename=run_id + " QC report.zip"), False, None
+
+    except Exception as error:
+        print("Could not generate QC report.")
+        traceback.print_exc()
+        return dash.no_update, True, "Could not generate the QC report for " + run_id + ": " + str(error)
+
 @app.callback(Output("dumped-sample-info-card","data"),
               Input("dump-sample-modal-to-csv","n_clicks"),
               State("feature-table-for-csv","data"),
@@ -3,18 +3,17 @@ import warnings
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
 import os, io, shutil, time
+import threading
+import sqlite3, zipfile, gzip, zlib
 import hashlib, json, ast
 import pandas as pd
 import numpy as np
 import sqlalchemy as sa
-from pydrive2.auth import GoogleAuth
-from pydrive2.drive import GoogleDrive
 from sqlalchemy import INTEGER, REAL, TEXT
 import base64
-from email.message import EmailMessage
-import google.auth as google_auth
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import rapidqcms.QueryProfiler as profiler
+import rapidqcms.SyncWorker as sync
+import rapidqcms.StorageBackends as storage
 
 import logging
 
@@ -22,26 +21,90 @@ import logging
 log = logging.getLogger(__name__)
 log.debug("Test log.debug from DatabaseFunctions")
 
-# Set ms_autoqc/src as the working directory
+# Paths are absolute (relative to the package folder), so that the working directory is never changed
 src_folder = os.path.dirname(os.path.realpath(__file__))
-os.chdir(src_folder)
 
 # Initialize directories
-root_directory = os.getcwd()
+root_directory = src_folder
 data_directory = os.path.join(root_directory, "data")
 print("data_directory: " + data_directory)
 methods_directory = os.path.join(data_directory, "methods")
 auth_directory = os.path.join(root_directory, "auth")
 
+# Profile SQL queries if requested with the RAPIDQCMS_PROFILE_QUERIES environment variable
+if profiler.profiling_requested():
+    profiler.enable_profiling(os.path.join(data_directory, "profiles"))
+
 # Location of settings SQLite database
-settings_database = "sqlite:///data/methods/Settings.db"
 settings_db_file = os.path.join(methods_directory, "Settings.db")
+settings_database = "sqlite:///" + settings_db_file.replace("\\", "/")
 
 # Google Drive authentication files
 credentials_file = os.path.join(auth_directory, "credentials.txt")
 alt_credentials = os.path.join(auth_directory, "email_credentials.txt")
 drive_settings_file = os.path.join(auth_directory, "settings.yaml")
-auth_container = [GoogleAuth(settings_file=drive_settings_file)]
+
+# Google Drive authentication instance, created on first use (see get_google_auth()) and replaced as a whole on sign-in,
+# so that concurrent requests never see a partially initialized instance
+auth_container = [None]
+auth_lock = threading.Lock()
+
+# Significant digits kept for floats in encoded tables, and payload size (in bytes) above which they are compressed
+table_float_precision = 7
+table_compression_threshold = 64 * 1024
+
+# Index of each QC result type in the "qc_dataframe" column of the "sample_qc_results" table
+qc_result_types = {
+    "Delta m/z": 0,
+    "Delta RT": 1,
+    "In-run delta RT": 2,
+    "Intensity dropout": 3,
+    "Warnings": 4,
+    "Fails": 5
+}
+
+# Number of most recent values returned per feature by get_bio_standard_aggregates()
+bio_standard_aggregate_window = 10
+
+# Summary columns of the "run_summaries" table (see create_run_summaries_table())
+run_summary_columns = ["samples", "delta_rt_median", "delta_rt_p05", "delta_rt_p95", "delta_mz_median", "delta_mz_p05",
+    "delta_mz_p95", "in_run_delta_rt_median", "dropout_rate", "pass_rate", "warning_rate", "fail_rate",
+    "started", "finished", "throughput"]
+
+# Persistent queue for Google Drive uploads, processed in the background (see SyncWorker)
+sync_queue_file = os.path.join(data_directory, "sync_queue.db")
+
+# Storage backend for syncing (see StorageBackends). Google Drive is used unless another backend is set
+# with set_storage_backend() or a shared directory is given with the RAPIDQCMS_SYNC_DIRECTORY environment variable.
+sync_directory_environment_variable = "RAPIDQCMS_SYNC_DIRECTORY"
+storage_backend = [None]
+
+# Google Drive storage backend of this process and the folder ID it was created for, so that its cache of Drive ID's is reused
+drive_backend = [None, None]
+
+# Local bookkeeping for syncing (Google Drive ID's and modified dates of files in storage), kept outside of
+# the settings database so that it doesn't change the settings database that is synced with the methods directory
+sync_state_file = os.path.join(data_directory, "sync_state.json")
+
+# Seconds after which a lock on a database version file, left behind by a crashed process, is broken
+version_lock_timeout = 10
+
+# Read-only snapshots of instrument databases for the dashboard (see get_read_database_file())
+read_snapshots_enabled = [False]
+read_snapshots = {}
+read_snapshot_lock = threading.Lock()
+
+# Seconds to reuse the progress of an active run downloaded by get_qc_results_progress(),
+# so that dashboard callbacks refreshing at the same time share one request
+progress_cache_duration = 10
+progress_cache = {}
+progress_cache_lock = threading.Lock()
+
+# Database maintenance schedule (in seconds) and time of last maintenance for each database
+maintenance_interval = 6 * 60 * 60
+maintenance_check_interval = 10 * 60
+last_maintenance = {}
+maintenance_lock = threading.Lock()
 
 """
 The functions defined below operate on two database types:
@@ -77,7 +140,7 @@ def get_database_file(instrument_id, sqlite_conn=False, zip=False):
         filename = instrument_id.replace(" ", "_") + ".db"
 
     if sqlite_conn:
-        return "sqlite:///data/" + filename
+        return "sqlite:///" + os.path.join(data_directory, filename).replace("\\", "/")
     else:
         return os.path.join(data_directory, filename)
 
@@ -192,8 +255,15 @@ def create_databases(instrument_id, new_instrument=False):
         sa.Column("qc_result", TEXT)
     )
 
+    # Enable incremental auto-vacuum before any tables are created
+    enable_incremental_vacuum(instrument_id)
     qc_db_metadata.create_all(qc_db_engine)
 
+    # Create tables for cross-run biological standard aggregates, sample processing stages, and run summaries
+    create_bio_standard_aggregates_table(instrument_id)
+    create_processing_stages_table(instrument_id)
+    create_run_summaries_table(instrument_id)
+
     # If only creating instrument database, save and return here
     if new_instrument:
         set_device_identity(is_instrument_computer=True, instrument_id=instrument_id)
@@ -334,6 +404,7 @@ def create_databases(instrument_id, new_instrument=False):
     )
 
     # Insert tables into database
+    enable_incremental_vacuum("Settings")
     settings_db_metadata.create_all(settings_db_engine)
 
     # Insert default configurations for MS-DIAL and Rapid-QC-MS
@@ -353,6 +424,9 @@ def execute_vacuum(database):
     """
     Executes VACUUM command on the database of choice.
 
+    This rewrites the entire database file and blocks other writers while it runs. For routine maintenance,
+    use run_database_maintenance() instead, which reclaims free pages incrementally.
+
     Args:
         database (str): name of the database, either "Settings" or Instrument ID
 
@@ -365,13 +439,456 @@ def execute_vacuum(database):
     connection.close()
 
 
+def enable_incremental_vacuum(database):
+
+    """
+    Sets auto_vacuum mode of the database of choice to INCREMENTAL, if it isn't already.
+
+    For a new (empty) database, the setting takes effect when the first table is created. An existing database
+    has to be rebuilt with VACUUM once to switch modes, which only happens the first time this function is called on it.
+
+    Args:
+        database (str): name of the database, either "Settings" or Instrument ID
+
+    Returns:
+        None
+    """
+
+    db_metadata, connection = connect_to_database(database)
+
+    # 0 = NONE, 1 = FULL, 2 = INCREMENTAL
+    if connection.execute("PRAGMA auto_vacuum").scalar() != 2:
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        if connection.execute("SELECT COUNT(*) FROM sqlite_master").scalar() > 0:
+            connection.execute("VACUUM")
+
+    connection.close()
+
+
+def run_database_maintenance(database):
+
+    """
+    Runs routine maintenance on the database of choice.
+
+    Performs the following actions:
+        1. Switches the database to incremental auto-vacuum (once, see enable_incremental_vacuum())
+        2. Reclaims free pages with "PRAGMA incremental_vacuum"
+        3. Updates query planner statistics with "ANALYZE" and "PRAGMA optimize"
+
+    Args:
+        database (str): name of the database, either "Settings" or Instrument ID
+
+    Returns:
+        None
+    """
+
+    with maintenance_lock:
+        enable_incremental_vacuum(database)
+
+        db_metadata, connection = connect_to_database(database)
+        connection.execute("PRAGMA incremental_vacuum")
+        connection.execute("ANALYZE")
+        connection.execute("PRAGMA optimize")
+        connection.close()
+
+        last_maintenance[database] = time.time()
+
+
+def database_is_idle(database):
+
+    """
+    Returns True if the database of choice has no active instrument runs writing to it.
+
+    The settings database is always considered idle, since it is only written to from the settings panel.
+
+    Args:
+        database (str): name of the database, either "Settings" or Instrument ID
+
+    Returns:
+        bool: True if the database is idle, False if not
+    """
+
+    if database == "Settings":
+        return True
+
+    db_metadata, connection = connect_to_database(database)
+    active_runs = connection.execute("SELECT COUNT(*) FROM runs WHERE status = 'Active'").scalar()
+    connection.close()
+
+    return active_runs == 0
+
+
+def maintain_idle_databases():
+
+    """
+    Runs maintenance on each local database that is idle and hasn't been maintained within the maintenance interval.
+
+    Returns:
+        None
+    """
+
+    if not os.path.exists(settings_db_file):
+        return None
+
+    for database in ["Settings"] + get_instruments_list():
+
+        # Skip databases that don't exist on this device or were maintained recently
+        if database != "Settings" and not os.path.exists(get_database_file(database)):
+            continue
+        if time.time() - last_maintenance.get(database, 0) < maintenance_interval:
+            continue
+
+        try:
+            if database_is_idle(database):
+                run_database_maintenance(database)
+        except Exception as error:
+            print("maintain_idle_databases() – Error running maintenance on " + database + ":", error)
+
+
+def start_maintenance_scheduler():
+
+    """
+    Starts a background thread that checks for idle databases to maintain every few minutes.
+
+    Returns:
+        threading.Thread: The scheduler thread
+    """
+
+    def run_scheduler():
+        while True:
+            maintain_idle_databases()
+            time.sleep(maintenance_check_interval)
+
+    thread = threading.Thread(target=run_scheduler, daemon=True)
+    thread.start()
+    return thread
+
+
+def snapshot_database(database_file, output_directory=None):
+
+    """
+    Copies a SQLite database file to a consistent snapshot using SQLite's online backup API.
+
+    Unlike copying the file directly, the backup API never captures a half-written transaction, and unlike VACUUM,
+    it does not block writers for the duration of a full file rewrite.
+
+    Args:
+        database_file (str):
+            Path of the database file to snapshot
+        output_directory (str, default None):
+            Directory to write the snapshot to. Defaults to "/data/snapshots".
+
+    Returns:
+        str: Path of the snapshot file, which has the same filename as the database file
+    """
+
+    if output_directory is None:
+        output_directory = os.path.join(data_directory, "snapshots")
+
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    snapshot_file = os.path.join(output_directory, os.path.basename(database_file))
+    temporary_file = snapshot_file + ".tmp"
+
+    source = sqlite3.connect(database_file)
+    destination = sqlite3.connect(temporary_file)
+
+    try:
+        source.backup(destination)
+    finally:
+        destination.close()
+        source.close()
+
+    os.replace(temporary_file, snapshot_file)
+    return snapshot_file
+
+
+def restore_database(snapshot_file, database_file):
+
+    """
+    Replaces the contents of a SQLite database file with a snapshot, using SQLite's online backup API.
+
+    Unlike replacing the file, this works while other connections have the database open (which fails on Windows),
+    and never pairs the new file with a journal left behind by the old one.
+
+    Args:
+        snapshot_file (str):
+            Path of the snapshot to restore
+        database_file (str):
+            Path of the database file to overwrite
+
+    Returns:
+        None
+    """
+
+    source = sqlite3.connect(snapshot_file)
+    destination = sqlite3.connect(database_file, timeout=30)
+
+    try:
+        source.backup(destination)
+    finally:
+        destination.close()
+        source.close()
+
+
+def replace_file(source_file, destination_file, attempts=50):
+
+    """
+    Replaces a file atomically with os.replace(), retrying while the destination is open in another process.
+
+    On Windows, a file can't be replaced while another process (ex: the acquisition listener) has it open.
+
+    Args:
+        source_file (str):
+            Path of the file to move
+        destination_file (str):
+            Path of the file to replace
+        attempts (int, default 50):
+            Number of attempts, 10 milliseconds apart
+
+    Returns:
+        None
+    """
+
+    for attempt in range(attempts):
+        try:
+            os.replace(source_file, destination_file)
+            return None
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.01)
+
+
+def get_database_version(instrument_id):
+
+    """
+    Returns the version number published for an instrument database.
+
+    The version is incremented by publish_database_version() every time QC results or run records are written,
+    so dashboard callbacks can cheaply check whether anything changed since they last loaded data.
+
+    Args:
+        instrument_id (str): Instrument ID
+
+    Returns:
+        int: Version number, or 0 if no version was published yet
+    """
+
+    version_file = get_database_file(instrument_id).replace(".db", ".version")
+
+    try:
+        with open(version_file, "r") as file:
+            return int(file.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+def publish_database_version(instrument_id):
+
+    """
+    Increments the version number of an instrument database after a write.
+
+    The acquisition listener and the dashboard both publish versions, so the version is read and incremented while
+    holding a lock file, and no increment is lost. The version file is replaced atomically, so readers never see
+    a partially written version.
+
+    Args:
+        instrument_id (str): Instrument ID
+
+    Returns:
+        int: New version number
+    """
+
+    version_file = get_database_file(instrument_id).replace(".db", ".version")
+    lock_file = version_file + ".lock"
+
+    acquire_lock_file(lock_file, version_lock_timeout)
+
+    try:
+        version = get_database_version(instrument_id) + 1
+
+        temporary_file = version_file + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(temporary_file, "w") as file:
+            file.write(str(version))
+
+        # On Windows, the version file can't be replaced while a reader has it open
+        replace_file(temporary_file, version_file)
+
+    finally:
+        release_lock_file(lock_file)
+
+    return version
+
+
+def acquire_lock_file(lock_file, timeout):
+
+    """
+    Waits until a lock file can be created, to lock a resource shared between processes.
+
+    A lock file older than the timeout is assumed to be left behind by a crashed process, and is removed.
+
+    Args:
+        lock_file (str): Path of the lock file
+        timeout (float): Seconds after which an existing lock file is broken
+
+    Returns:
+        None
+    """
+
+    while True:
+        try:
+            descriptor = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(descriptor)
+            return None
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_file) > timeout:
+                    os.remove(lock_file)
+                    continue
+            except OSError:
+                pass
+            time.sleep(0.005)
+
+
+def release_lock_file(lock_file):
+
+    """
+    Releases a lock acquired with acquire_lock_file().
+    """
+
+    try:
+        os.remove(lock_file)
+    except FileNotFoundError:
+        pass
+
+
+def enable_read_snapshots():
+
+    """
+    Makes read-only queries on instrument databases use snapshots in this process (see get_read_database_file()).
+
+    Called by the dashboard, so that its queries never contend with the acquisition listener writing results.
+    """
+
+    read_snapshots_enabled[0] = True
+
+
+def get_read_database_file(instrument_id):
+
+    """
+    Returns path for establishing a SQLite connection for read-only queries on an instrument database.
+
+    If read snapshots are enabled (see enable_read_snapshots()), this is a snapshot of the instrument database
+    made with SQLite's backup API. A new snapshot is taken whenever the database file was modified (or a new version
+    was published) since the last one, under a new filename that includes the modification time, size, and version,
+    so that connections to the previous snapshot are never affected. Older snapshots are removed once they are no
+    longer in use.
+
+    Each snapshot is a full copy of the database, so its cost grows with the database size. Snapshots are only
+    taken when a read follows a change, and are shared by all sessions and callbacks in the process, so during
+    an active run this is at most one copy per processed sample (typically every few minutes).
+
+    Otherwise, this is the same as get_database_file(instrument_id, sqlite_conn=True).
+
+    Args:
+        instrument_id (str): Instrument ID
+
+    Returns:
+        str: Path for the database file to read from
+    """
+
+    database_file = get_database_file(instrument_id)
+
+    if not read_snapshots_enabled[0] or not os.path.exists(database_file):
+        return get_database_file(instrument_id, sqlite_conn=True)
+
+    # Compare modification time, size, and published version of the database to those of the current snapshot
+    stat = os.stat(database_file)
+    file_stamp = (stat.st_mtime_ns, stat.st_size, get_database_version(instrument_id))
+
+    with read_snapshot_lock:
+        snapshot = read_snapshots.get(instrument_id)
+
+        if snapshot is None or snapshot[0] != file_stamp or not os.path.exists(snapshot[1]):
+            snapshot_directory = os.path.join(data_directory, "snapshots", "read")
+            snapshot_name = instrument_id.replace(" ", "_") + "." + "-".join(str(value) for value in file_stamp)
+            snapshot_file = snapshot_database(database_file, os.path.join(snapshot_directory, snapshot_name))
+            read_snapshots[instrument_id] = (file_stamp, snapshot_file)
+
+            # Remove previous snapshots (skipped on Windows while they're still open)
+            for directory in os.listdir(snapshot_directory):
+                if directory.startswith(instrument_id.replace(" ", "_") + ".") and directory != snapshot_name:
+                    shutil.rmtree(os.path.join(snapshot_directory, directory), ignore_errors=True)
+
+            snapshot = read_snapshots[instrument_id]
+
+    return "sqlite:///" + snapshot[1].replace("\\", "/")
+
+
+def get_google_auth():
+
+    """
+    Returns the Google Drive authentication instance, creating it on first use.
+
+    The first call in each process (ex: each server worker) loads saved credentials from credentials.txt, if any,
+    without prompting the user to sign in.
+
+    Returns:
+        GoogleAuth: Google Drive authentication instance
+    """
+
+    from pydrive2.auth import GoogleAuth
+
+    with auth_lock:
+        if auth_container[0] is None:
+            gauth = GoogleAuth(settings_file=drive_settings_file)
+
+            if os.path.exists(credentials_file):
+                try:
+                    gauth.LoadCredentialsFile(credentials_file)
+                    if gauth.credentials is not None:
+                        if gauth.access_token_expired:
+                            gauth.Refresh()
+                        else:
+                            gauth.Authorize()
+                except Exception as error:
+                    print("Could not load Google Drive credentials:", error)
+
+            auth_container[0] = gauth
+
+        return auth_container[0]
+
+
+def set_google_auth(gauth):
+
+    """
+    Replaces the Google Drive authentication instance (ex: after the user signed in).
+
+    Args:
+        gauth (GoogleAuth): Authenticated Google Drive authentication instance
+
+    Returns:
+        None
+    """
+
+    with auth_lock:
+        auth_container[0] = gauth
+
+    # The Google Drive backend is recreated with the new authentication instance
+    drive_backend[0] = None
+
+
 def get_drive_instance():
 
     """
     Returns user-authenticated Google Drive instance.
     """
 
-    return GoogleDrive(auth_container[0])
+    from pydrive2.drive import GoogleDrive
+
+    return GoogleDrive(get_google_auth())
 
 
 def launch_google_drive_authentication():
@@ -380,8 +897,11 @@ def launch_google_drive_authentication():
     Launches Google Drive authentication flow and sets authentication instance.
     """
 
-    auth_container[0] = GoogleAuth(settings_file=drive_settings_file)
-    auth_container[0].LocalWebserverAuth()
+    from pydrive2.auth import GoogleAuth
+
+    gauth = GoogleAuth(settings_file=drive_settings_file)
+    gauth.LocalWebserverAuth()
+    set_google_auth(gauth)
 
 
 def save_google_drive_credentials():
@@ -390,7 +910,7 @@ def save_google_drive_credentials():
     Saves Google credentials to a credentials.txt file.
     """
 
-    auth_container[0].SaveCredentialsFile(credentials_file)
+    get_google_auth().SaveCredentialsFile(credentials_file)
 
 
 def initialize_google_drive():
@@ -405,9 +925,10 @@ def initialize_google_drive():
         bool: Whether the Google client credentials file (in the "auth" directory) exists.
     """
 
-    # Create Google Drive instance
-    auth_container[0] = GoogleAuth(settings_file=drive_settings_file)
-    gauth = auth_container[0]
+    from pydrive2.auth import GoogleAuth
+
+    # Create Google Drive instance (shared with other requests once it is initialized)
+    gauth = GoogleAuth(settings_file=drive_settings_file)
 
     # If no credentials file, make user authenticate
     if not os.path.exists(credentials_file) and is_valid():
@@ -431,6 +952,8 @@ def initialize_google_drive():
     elif gauth.credentials is None:
         gauth.LocalWebserverAuth()
 
+    set_google_auth(gauth)
+
     if not os.path.exists(credentials_file) and is_valid():
         save_google_drive_credentials()
 
@@ -499,7 +1022,8 @@ def is_valid(instrument_id=None):
 def sync_is_enabled():
 
     """
-    Checks whether Google Drive sync is enabled simply by querying whether Google Drive ID's exist in the database.
+    Checks whether Google Drive sync is enabled simply by querying whether Google Drive ID's exist in the database,
+    or whether another storage backend is configured (see get_storage_backend()).
 
     Typically used for separating sync-specific functionality.
 
@@ -510,6 +1034,10 @@ def sync_is_enabled():
     if not is_valid():
         return False
 
+    # Syncing through a shared directory or another storage backend
+    if storage_backend[0] is not None or os.environ.get(sync_directory_environment_variable):
+        return True
+
     df_workspace = get_table("Settings", "workspace")
     gdrive_folder_id = df_workspace["gdrive_folder_id"].values[0]
     methods_zip_file_id = df_workspace["methods_zip_file_id"].values[0]
@@ -632,6 +1160,7 @@ def zip_database(instrument_id=None, filename=None):
     Compresses instrument database file into a ZIP archive in /data directory.
 
     Used for fast downloads / uploads over network connections to Google Drive (if Google Drive sync is enabled).
+    The database file is copied with snapshot_database() first, so it doesn't need to be idle or vacuumed.
 
     The zip archive is accessible by filename and path in the /data directory. For example, zipping
     the database for "Thermo QE 1" will generate a zip file with path "../data/Thermo_QE_1.zip".
@@ -657,8 +1186,12 @@ def zip_database(instrument_id=None, filename=None):
         db_zip_file = get_database_file(instrument_id, zip=True)
         filename = instrument_id.replace(" ", "_") + ".db"
 
+    # Zip a consistent snapshot of the database, so that it can be written to in the meantime
+    snapshot_file = snapshot_database(os.path.join(data_directory, filename))
+
     file_without_extension = db_zip_file.replace(".zip", "")
-    shutil.make_archive(file_without_extension, "zip", data_directory, filename)
+    shutil.make_archive(file_without_extension, "zip", os.path.dirname(snapshot_file), filename)
+    os.remove(snapshot_file)
 
 
 def unzip_database(instrument_id=None, filename=None):
@@ -693,13 +1226,30 @@ def zip_methods():
     """
     Compresses methods directory into a ZIP archive in /data directory.
 
+    The settings database is added from a consistent snapshot (see snapshot_database()), and SQLite journal files are skipped.
+
     Returns:
         Path for zip archive of methods directory (ex: "../data/methods.zip")
     """
 
-    output_directory_and_name = os.path.join(data_directory, "methods.zip").replace(".zip", "")
-    shutil.make_archive(output_directory_and_name, "zip", methods_directory)
-    return output_directory_and_name + ".zip"
+    output_zip_file = os.path.join(data_directory, "methods.zip")
+    settings_snapshot = snapshot_database(settings_db_file)
+
+    with zipfile.ZipFile(output_zip_file, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for directory, subdirectories, files in os.walk(methods_directory):
+            for file in files:
+                file_path = os.path.join(directory, file)
+                archive_name = os.path.relpath(file_path, methods_directory)
+
+                if file.endswith("-journal") or file.endswith("-wal") or file.endswith("-shm"):
+                    continue
+                elif file_path == settings_db_file:
+                    file_path = settings_snapshot
+
+                zip_file.write(file_path, archive_name)
+
+    os.remove(settings_snapshot)
+    return output_zip_file
 
 
 def unzip_methods():
@@ -766,7 +1316,7 @@ def get_table(database_name, table_name):
     if database_name == "Settings":
         database = settings_database
     else:
-        database = get_database_file(database_name, sqlite_conn=True)
+        database = get_read_database_file(database_name)
     engine = sa.create_engine(database)
     return pd.read_sql_table(table_name,engine)
 
@@ -789,7 +1339,6 @@ def generate_client_settings_yaml(client_id, client_secret):
         None
     """
 
-    auth_directory = os.path.join(os.getcwd(), "auth")
     if not os.path.exists(auth_directory):
         os.makedirs(auth_directory)
 
@@ -803,7 +1352,7 @@ def generate_client_settings_yaml(client_id, client_secret):
         "\n",
         "save_credentials: True",
         "save_credentials_backend: file",
-        "save_credentials_file: auth/credentials.txt",
+        "save_credentials_file: " + credentials_file.replace("\\", "/"),
         "\n",
         "get_refresh_token: True",
         "\n",
@@ -1121,6 +1670,9 @@ def insert_new_run(run_id, instrument_id, chromatography, bio_standards, path, s
     # Close the connection
     connection.close()
 
+    # Notify readers that the database changed
+    publish_database_version(instrument_id)
+
 
 def get_instrument_run(instrument_id, run_id):
 
@@ -1135,7 +1687,7 @@ def get_instrument_run(instrument_id, run_id):
         DataFrame containing record for instrument run
     """
 
-    database = get_database_file(instrument_id=instrument_id, sqlite_conn=True)
+    database = get_read_database_file(instrument_id)
     engine = sa.create_engine(database)
     query = sa.text("SELECT * FROM runs WHERE run_id = :run_id").bindparams(run_id=run_id)
     df_instrument_run = pd.read_sql(query, engine)
@@ -1178,7 +1730,7 @@ def get_instrument_runs(instrument_id, as_list=False):
         DataFrame containing records for instrument runs (QC jobs) for the given instrument
     """
 
-    database = get_database_file(instrument_id, sqlite_conn=True)
+    database = get_read_database_file(instrument_id)
     engine = sa.create_engine(database)
     df = pd.read_sql("SELECT * FROM runs", engine)
 
@@ -1201,6 +1753,9 @@ def delete_instrument_run(instrument_id, run_id):
         None
     """
 
+    # Make sure the cross-run aggregates table exists before the run is deleted
+    aggregates_created = create_bio_standard_aggregates_table(instrument_id)
+
     # Connect to database
     db_metadata, connection = connect_to_database(instrument_id)
 
@@ -1215,11 +1770,25 @@ def delete_instrument_run(instrument_id, run_id):
             sa.delete(table).where(table.c.run_id == run_id)
         ))
 
+    # Remove the run's biological standards from cross-run aggregates
+    if not aggregates_created:
+        delete_bio_standard_aggregates(db_metadata, connection, run_id)
+
     # Close the connection
     connection.close()
 
+    # A newly created aggregates table is backfilled from the remaining runs instead
+    if aggregates_created:
+        rebuild_bio_standard_aggregates(instrument_id)
 
-def get_acquisition_path(instrument_id, run_id):
+    # Remove the run's summaries
+    rebuild_run_summaries(instrument_id, [run_id])
+
+    # Notify readers that the database changed
+    publish_database_version(instrument_id)
+
+
+def get_acquisition_path(instrument_id, run_id):
 
     """
     Retrieves acquisition path for a given instrument run.
@@ -1379,1593 +1948,4050 @@ def write_qc_results(sample_id, instrument_id, run_id, json_mz, json_rt, json_in
     connection.execute(update_qc_results)
     connection.close()
 
+    # Update cross-run aggregates for biological standard features
+    if is_bio_standard:
+        update_bio_standard_aggregates(instrument_id, run_id, sample_id, json_intensity)
 
-def get_chromatography_methods():
+
+def create_bio_standard_aggregates_table(instrument_id):
 
     """
-    Returns DataFrame of chromatography methods from the Settings database.
+    Creates the "bio_standard_aggregates" table in an instrument database, if it does not exist yet.
+
+    The table holds one row per (biological standard, chromatography, polarity, feature, run) with the count, sum,
+    and sum of squares of the feature's intensities in the run, as well as the values of each injection. Runs are
+    ordered by their position in the "bio_qc_results" table, so that aggregates over the runs before a given run
+    (see get_bio_standard_aggregates()) are computed from a few rows instead of parsing every previous run.
+
+    A table created by an earlier version (with one cumulative row per feature) is replaced.
+
+    Args:
+        instrument_id (str): Instrument ID
+
+    Returns:
+        bool: True if the table was created (and needs to be backfilled), False if it already existed.
     """
 
-    engine = sa.create_engine(settings_database)
-    df_methods = pd.read_sql("SELECT * FROM chromatography_methods", engine)
-    return df_methods
+    database = get_database_file(instrument_id=instrument_id, sqlite_conn=True)
+    engine = sa.create_engine(database)
 
+    if sa.inspect(engine).has_table("bio_standard_aggregates"):
+        columns = [column["name"] for column in sa.inspect(engine).get_columns("bio_standard_aggregates")]
+        if "run_id" in columns:
+            return False
 
-def get_chromatography_methods_list():
+        with engine.begin() as connection:
+            connection.execute(sa.text("DROP TABLE bio_standard_aggregates"))
+
+    db_metadata = sa.MetaData()
+
+    bio_standard_aggregates = sa.Table(
+        "bio_standard_aggregates", db_metadata,
+        sa.Column("id", INTEGER, primary_key=True),
+        sa.Column("biological_standard", TEXT),
+        sa.Column("chromatography", TEXT),
+        sa.Column("polarity", TEXT),
+        sa.Column("feature", TEXT),
+        sa.Column("run_id", TEXT),
+        sa.Column("run_order", INTEGER),
+        sa.Column("n_values", INTEGER),
+        sa.Column("sum_values", REAL),
+        sa.Column("sum_squares", REAL),
+        sa.Column("run_values", TEXT),
+        sa.Index("bio_standard_aggregates_feature", "biological_standard", "chromatography", "polarity", "feature"),
+        sa.Index("bio_standard_aggregates_run", "run_id")
+    )
+
+    db_metadata.create_all(engine)
+    return True
+
+
+def parse_feature_record(record):
 
     """
-    Returns list of chromatography method ID's from the Settings database.
+    Parses a single-record string dict of feature values (as written by write_qc_results) into a dictionary.
+
+    The "Name" key is left out. Values that cannot be cast to float (ex: missing features) are returned as NaN.
+
+    Args:
+        record (str): String dict of feature values in "records" format
+
+    Returns:
+        dict: Dictionary with key-value pairs of { feature: value }
     """
 
-    df_methods = get_chromatography_methods()
-    return df_methods["method_id"].astype(str).tolist()
+    if record is None or record == "None" or record == "nan":
+        return {}
 
+    values = {}
+    for feature, value in ast.literal_eval(record).items():
+        if feature == "Name":
+            continue
+        try:
+            values[feature] = float(value)
+        except (TypeError, ValueError):
+            values[feature] = np.nan
 
-def insert_chromatography_method(method_id):
+    return values
+
+
+def update_bio_standard_aggregates(instrument_id, run_id, sample_id, intensity):
 
     """
-    Inserts new chromatography method in the "chromatography_methods" table of the Settings database.
+    Adds feature intensities of a processed biological standard sample to the cross-run aggregates.
+
+    If the sample was processed before, its previous intensities are replaced, so that reprocessing
+    a sample does not count it twice.
 
     Args:
-        method_id (str): Name of the chromatography method
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        sample_id (str):
+            Sample ID of the biological standard
+        intensity (str):
+            String dict of feature intensities in "records" format
 
     Returns:
         None
     """
 
-    # Connect to database
-    db_metadata, connection = connect_to_database("Settings")
+    # Create and backfill aggregates on first use with an existing database
+    if create_bio_standard_aggregates_table(instrument_id):
+        rebuild_bio_standard_aggregates(instrument_id)
+        return None
 
-    # Get "chromatography_methods" table and "biological_standards" table
-    chromatography_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
-    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+    db_metadata, connection = connect_to_database(instrument_id)
 
-    # Execute insert of chromatography method
-    insert_method = chromatography_table.insert().values(
-        {"method_id": method_id,
-         "num_pos_standards": 0,
-         "num_neg_standards": 0,
-         "pos_istd_msp_file": "",
-         "neg_istd_msp_file": "",
-         "pos_parameter_file": "",
-         "neg_parameter_file": "",
-         "msdial_config_id": "Default"})
+    with connection.begin():
+        write_bio_standard_aggregates(db_metadata, connection, run_id, sample_id, intensity)
 
-    connection.execute(insert_method)
+    connection.close()
 
-    # Execute insert of method for each biological standard
-    df_biological_standards = get_biological_standards()
-    biological_standards = df_biological_standards["name"].astype(str).unique().tolist()
-    identifiers = df_biological_standards["identifier"].astype(str).tolist()
 
-    for index, biological_standard in enumerate(biological_standards):
-        insert_method_for_bio_standard = biological_standards_table.insert().values({
-            "name": biological_standard,
-            "identifier": identifiers[index],
-            "chromatography": method_id,
-            "num_pos_features": 0,
-            "num_neg_features": 0,
-            "msdial_config_id": "Default"})
-        connection.execute(insert_method_for_bio_standard)
+def write_bio_standard_aggregates(db_metadata, connection, run_id, sample_id, intensity):
 
-    # Execute INSERT to database, then close the connection
-    connection.close()
+    """
+    Applies the intensities of a biological standard sample to the "bio_standard_aggregates" table on an open connection.
 
+    Only the rows of the sample's run are read and written: the sample's previous values are replaced by the new ones,
+    and the count, sum, and sum of squares of each feature are recomputed from the values of the run's injections.
 
-def remove_chromatography_method(method_id):
+    This function does not begin, commit, or close anything, so that it can take part in a larger transaction
+    (see persist_sample_results()). The "bio_standard_aggregates" table must already exist.
+
+    Args:
+        db_metadata (sqlalchemy.MetaData):
+            Metadata of the instrument database
+        connection (sqlalchemy.Connection):
+            Open connection to the instrument database
+        run_id (str):
+            Instrument run ID (job ID)
+        sample_id (str):
+            Sample ID of the biological standard
+        intensity (str):
+            String dict of feature intensities in "records" format
+
+    Returns:
+        None
+    """
+
+    bio_qc_results_table = sa.Table("bio_qc_results", db_metadata, autoload=True)
+    runs_table = sa.Table("runs", db_metadata, autoload=True)
+    aggregates_table = sa.Table("bio_standard_aggregates", db_metadata, autoload=True)
+
+    # Get biological standard, polarity, and chromatography of the sample, and the position of its run
+    sample = connection.execute(
+        sa.select(bio_qc_results_table.c.biological_standard, bio_qc_results_table.c.polarity)
+            .where((bio_qc_results_table.c.sample_id == sample_id)
+                   & (bio_qc_results_table.c.run_id == run_id))
+    ).first()
+
+    chromatography = connection.execute(
+        sa.select(runs_table.c.chromatography).where(runs_table.c.run_id == run_id)
+    ).scalar()
+
+    if sample is None or chromatography is None:
+        return None
+
+    biological_standard, polarity = sample
+    run_order = connection.execute(
+        sa.select(sa.func.min(bio_qc_results_table.c.id)).where(bio_qc_results_table.c.run_id == run_id)
+    ).scalar()
+
+    # Values of the run's other injections, by feature
+    rows = connection.execute(
+        sa.select(aggregates_table)
+            .where((aggregates_table.c.biological_standard == biological_standard)
+                   & (aggregates_table.c.chromatography == chromatography)
+                   & (aggregates_table.c.polarity == polarity)
+                   & (aggregates_table.c.run_id == run_id))
+    ).fetchall()
+
+    run_values = {}
+    for row in rows:
+        run_values[row.feature] = [entry for entry in ast.literal_eval(row.run_values) if entry[0] != sample_id]
+
+    for feature, value in parse_feature_record(intensity).items():
+        run_values.setdefault(feature, []).append([sample_id, None if np.isnan(value) else value])
+
+    # Replace the run's rows
+    connection.execute(
+        sa.delete(aggregates_table)
+            .where((aggregates_table.c.biological_standard == biological_standard)
+                   & (aggregates_table.c.chromatography == chromatography)
+                   & (aggregates_table.c.polarity == polarity)
+                   & (aggregates_table.c.run_id == run_id))
+    )
+
+    aggregate_rows = get_bio_standard_aggregate_rows(biological_standard, chromatography, polarity, run_id,
+        run_order, run_values)
+
+    if len(aggregate_rows) > 0:
+        connection.execute(aggregates_table.insert(), aggregate_rows)
+
+
+def write_run_bio_standard_aggregates(db_metadata, connection, run_id):
 
     """
-    Deletes chromatography method and all associated records from the Settings database.
+    Recomputes the "bio_standard_aggregates" rows of an instrument run from its biological standards, on an open connection.
 
-    Details:
-        1. Removes chromatography method in "chromatography_methods" table
-        2. Removes method from "biological_standards" table
-        3. Removes associated internal standards from "internal_standards" table
-        4. Removes associated targeted features from "targeted_features" table
-        5. Deletes corresponding MSPs from folders
-        6. Deletes corresponding MSPs from Google Drive (if sync is enabled)
+    Used after the run's records were replaced (see apply_run_shards()). Like write_bio_standard_aggregates(), this
+    function does not begin, commit, or close anything. The "bio_standard_aggregates" table must already exist.
 
     Args:
-        method_id (str): Name of the chromatography method
+        db_metadata (sqlalchemy.MetaData): Metadata of the instrument database
+        connection (sqlalchemy.Connection): Open connection to the instrument database
+        run_id (str): Instrument run ID (job ID)
 
     Returns:
         None
     """
 
-    # Delete corresponding MSPs from "methods" directory
-    df = get_table("Settings", "chromatography_methods")
-    df = df.loc[df["method_id"] == method_id]
-
-    df2 = get_table("Settings", "biological_standards")
-    df2 = df2.loc[df2["chromatography"] == method_id]
+    bio_qc_results_table = sa.Table("bio_qc_results", db_metadata, autoload=True)
+    runs_table = sa.Table("runs", db_metadata, autoload=True)
+    aggregates_table = sa.Table("bio_standard_aggregates", db_metadata, autoload=True)
 
-    files_to_delete = df["pos_istd_msp_file"].astype(str).tolist() + df["neg_istd_msp_file"].astype(str).tolist() + \
-        df2["pos_bio_msp_file"].astype(str).tolist() + df2["neg_bio_msp_file"].astype(str).tolist()
+    connection.execute(sa.delete(aggregates_table).where(aggregates_table.c.run_id == run_id))
 
-    for file in os.listdir(methods_directory):
-        if file in files_to_delete:
-            os.remove(os.path.join(methods_directory, file))
+    chromatography = connection.execute(
+        sa.select(runs_table.c.chromatography).where(runs_table.c.run_id == run_id)
+    ).scalar()
 
-    # Connect to database and get relevant tables
-    db_metadata, connection = connect_to_database("Settings")
-    chromatography_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
-    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
-    internal_standards_table = sa.Table("internal_standards", db_metadata, autoload=True)
-    targeted_features_table = sa.Table("targeted_features", db_metadata, autoload=True)
+    if chromatography is None:
+        return None
 
-    delete_queries = []
+    samples = connection.execute(
+        sa.select(bio_qc_results_table.c.id, bio_qc_results_table.c.sample_id,
+                  bio_qc_results_table.c.biological_standard, bio_qc_results_table.c.polarity,
+                  bio_qc_results_table.c.intensity)
+            .where(bio_qc_results_table.c.run_id == run_id)
+            .order_by(bio_qc_results_table.c.id)
+    ).fetchall()
 
-    # Remove from "chromatography_methods" table
-    delete_chromatography_method = (
-        sa.delete(chromatography_table)
-            .where((chromatography_table.c.method_id == method_id))
-    )
+    if len(samples) == 0:
+        return None
 
-    delete_queries.append(delete_chromatography_method)
+    run_order = samples[0].id
 
-    # Remove all entries in other tables associated with chromatography
-    for table in [biological_standards_table, internal_standards_table, targeted_features_table]:
-        delete_from_table = (
-            sa.delete(table)
-                .where((table.c.chromatography == method_id))
-        )
-        delete_queries.append(delete_from_table)
+    # Group values of the run's injections by biological standard and polarity
+    run_values = {}
+    for sample in samples:
+        for feature, value in parse_feature_record(sample.intensity).items():
+            run_values.setdefault((sample.biological_standard, sample.polarity), {}).setdefault(feature, []).append(
+                [sample.sample_id, None if np.isnan(value) else value])
 
-    # Execute all deletes, then close the connection
-    for query in delete_queries:
-        connection.execute(query)
+    aggregate_rows = []
+    for (biological_standard, polarity), values in run_values.items():
+        aggregate_rows += get_bio_standard_aggregate_rows(biological_standard, chromatography, polarity, run_id,
+            run_order, values)
 
-    connection.close()
+    if len(aggregate_rows) > 0:
+        connection.execute(aggregates_table.insert(), aggregate_rows)
 
 
-def update_msdial_config_for_internal_standards(chromatography, config_id):
+def get_bio_standard_aggregate_rows(biological_standard, chromatography, polarity, run_id, run_order, run_values):
 
     """
-    Updates MS-DIAL configuration for a given chromatography method.
+    Returns "bio_standard_aggregates" rows for the injections of a biological standard in an instrument run.
 
-    This MS-DIAL configuration will be used to generate a parameters file
-    for processing samples run with this chromatography method.
+    Missing intensities count as 0, the same as in the "All previous" comparison of the dashboard.
 
     Args:
-        chromatography (str):
-            Chromatography method ID (name)
-        config_id (str):
-            MS-DIAL configuration ID (name)
+        biological_standard (str): Name of biological standard
+        chromatography (str): Chromatography method
+        polarity (str): Polarity ("Pos" or "Neg")
+        run_id (str): Instrument run ID (job ID)
+        run_order (int): Position of the run in the "bio_qc_results" table
+        run_values (dict): Dictionary of { feature: [[sample ID, value or None], ...] }
 
     Returns:
-        None
+        list: Rows to insert, one per feature with at least one injection
     """
 
-    # Connect to database and get relevant tables
-    db_metadata, connection = connect_to_database("Settings")
-    methods_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
+    rows = []
 
-    # Update MS-DIAL configuration for chromatography method
-    update_msdial_config = (
-        sa.update(methods_table)
-            .where(methods_table.c.method_id == chromatography)
-            .values(msdial_config_id=config_id)
-    )
+    for feature, values in run_values.items():
+        if len(values) == 0:
+            continue
 
-    connection.execute(update_msdial_config)
-    connection.close()
+        numbers = [value if value is not None else 0.0 for sample_id, value in values]
+        rows.append({
+            "biological_standard": biological_standard,
+            "chromatography": chromatography,
+            "polarity": polarity,
+            "feature": feature,
+            "run_id": run_id,
+            "run_order": run_order,
+            "n_values": len(numbers),
+            "sum_values": sum(numbers),
+            "sum_squares": sum(number ** 2 for number in numbers),
+            "run_values": str(values)})
 
+    return rows
 
-def add_msp_to_database(msp_file, chromatography, polarity, bio_standard=None):
+
+def delete_bio_standard_aggregates(db_metadata, connection, run_id):
 
     """
-    Parses compounds from MSP into the Settings database.
+    Removes an instrument run from the "bio_standard_aggregates" table on an open connection (ex: when the run is deleted).
 
-    This function writes features from an MSP file into the "internal_standards" or "targeted_features" table,
-    and inserts location of pos/neg MSP files into "chromatography_methods" table.
+    Args:
+        db_metadata (sqlalchemy.MetaData): Metadata of the instrument database
+        connection (sqlalchemy.Connection): Open connection to the instrument database
+        run_id (str): Instrument run ID (job ID)
 
-    TODO: The MSP/TXT libraries have standardized names; there is no need to store the filename in the database.
+    Returns:
+        None
+    """
+
+    aggregates_table = sa.Table("bio_standard_aggregates", db_metadata, autoload=True)
+    connection.execute(sa.delete(aggregates_table).where(aggregates_table.c.run_id == run_id))
+
+
+def rebuild_bio_standard_aggregates(instrument_id):
+
+    """
+    Recomputes the "bio_standard_aggregates" table from all biological standard results in an instrument database.
+
+    This function is only called to backfill the table when it is first created for an existing database.
 
     Args:
-        msp_file (io.StringIO):
-            In-memory text-stream file object
-        chromatography (str):
-            Chromatography method ID (name)
-        polarity (str):
-            Polarity for which MSP should be used for ("Positive Mode" or "Negative Mode")
-        bio_standard (str, default None):
-            Parses MSP and applies to biological standard within a chromatography-polarity combination
+        instrument_id (str): Instrument ID
 
     Returns:
         None
     """
-    # Connect to database
-    db_metadata, connection = connect_to_database("Settings")
 
-    # Write MSP file to folder, store file path in database (further down in function)
-    if not os.path.exists(methods_directory):
-        os.makedirs(methods_directory)
+    create_bio_standard_aggregates_table(instrument_id)
 
-    if bio_standard is not None:
-        if polarity == "Positive Mode":
-            filename = bio_standard.replace(" ", "_") + "_" + chromatography + "_Pos.msp"
-        elif polarity == "Negative Mode":
-            filename = bio_standard.replace(" ", "_") + "_" + chromatography + "_Neg.msp"
-    else:
-        if polarity == "Positive Mode":
-            filename = chromatography + "_Pos.msp"
-        elif polarity == "Negative Mode":
-            filename = chromatography + "_Neg.msp"
+    db_metadata, connection = connect_to_database(instrument_id)
+    runs_table = sa.Table("runs", db_metadata, autoload=True)
+    aggregates_table = sa.Table("bio_standard_aggregates", db_metadata, autoload=True)
 
-    msp_file_path = os.path.join(methods_directory, filename)
+    with connection.begin():
+        connection.execute(sa.delete(aggregates_table))
+        for run_id in connection.execute(sa.select(runs_table.c.run_id)).scalars().all():
+            write_run_bio_standard_aggregates(db_metadata, connection, run_id)
 
-    with open(msp_file_path, "w", newline='') as file:
-        msp_file.seek(0)
-        shutil.copyfileobj(msp_file, file)
+    connection.close()
 
-    # Read MSP file
-    with open(msp_file_path, "r") as msp:
-        list_of_features = []
 
-        # Split MSP into list of compounds
-        data = msp.read().split("\n\n")
-        data = [element.split("\n") for element in data]
+def read_bio_standard_aggregates(instrument_id, biological_standard, chromatography, polarity, feature=None):
 
-        # Add each line of each compound into a list
-        for feature in data:
-            if len(feature) != 1:
-                list_of_features.append(feature)
+    """
+    Returns the "bio_standard_aggregates" rows of a biological standard (and optionally a single feature), in run order.
 
-        features_dict = {}
-        added_features = []
+    Args:
+        instrument_id (str): Instrument ID
+        biological_standard (str): Name of biological standard
+        chromatography (str): Chromatography method
+        polarity (str): Polarity ("Pos" or "Neg")
+        feature (str, default None): Targeted feature, or None for all features
 
-        # Iterate through features in MSP
-        for feature_index, feature in enumerate(list_of_features):
+    Returns:
+        DataFrame of "bio_standard_aggregates" rows
+    """
 
-            features_dict[feature_index] = {
-                "Name": None,
-                "Precursor m/z": None,
-                "Retention time": None,
-                "INCHIKEY": None,
-                "MS2 spectrum": None
-            }
+    if create_bio_standard_aggregates_table(instrument_id):
+        rebuild_bio_standard_aggregates(instrument_id)
 
-            # Iterate through each line of each feature in the MSP
-            for data_index, feature_data in enumerate(feature):
-
-                # Capture, name, inchikey, m/z, and RT
-                if "NAME" in feature_data.upper():
-                    feature_name = feature_data.split(": ")[-1]
-                    if feature_name not in added_features:
-                        added_features.append(feature_name)
-                        features_dict[feature_index]["Name"] = feature_name
-                        continue
-                    else:
-                        break
-                elif "PRECURSORMZ" in feature_data.upper():
-                    features_dict[feature_index]["Precursor m/z"] = feature_data.split(": ")[-1]
-                    continue
-                elif "INCHIKEY" in feature_data.upper():
-                    features_dict[feature_index]["INCHIKEY"] = feature_data.split(": ")[-1]
-                    continue
-                elif "RETENTIONTIME" in feature_data.upper():
-                    features_dict[feature_index]["Retention time"] = feature_data.split(": ")[-1]
-                    continue
+    database = get_read_database_file(instrument_id)
+    engine = sa.create_engine(database)
 
-                # Capture MS2 spectrum
-                elif "Num Peaks" in feature_data:
+    query = "SELECT * FROM bio_standard_aggregates WHERE biological_standard = :biological_standard " \
+        + "AND chromatography = :chromatography AND polarity = :polarity"
+    parameters = {"biological_standard": biological_standard, "chromatography": chromatography, "polarity": polarity}
 
-                    # Get number of peaks in MS2 spectrum
-                    num_peaks = int(feature_data.split(": ")[-1])
+    if feature is not None:
+        query += " AND feature = :feature"
+        parameters["feature"] = feature
 
-                    # Each line in the MSP corresponds to a peak
-                    start_index = data_index + 1
-                    end_index = data_index + num_peaks + 1
+    query = sa.text(query + " ORDER BY run_order").bindparams(**parameters)
+    return pd.read_sql(query, engine)
 
-                    # Each peak is represented as a string e.g. "56.04977\t247187"
-                    peaks_in_spectrum = []
-                    for peak in feature[start_index:end_index]:
-                        peaks_in_spectrum.append(peak.replace("\t", ":"))
 
-                    features_dict[feature_index]["MS2 spectrum"] = str(peaks_in_spectrum)
-                    break
+def get_bio_standard_aggregates(instrument_id, biological_standard, chromatography, polarity, before_run=None):
 
-    features_dict = { key:value for key, value in features_dict.items() if value["Name"] is not None }
+    """
+    Returns cross-run aggregates of feature intensities for a biological standard.
 
-    # Adding MSP for biological standards
-    if bio_standard is not None:
+    Args:
+        instrument_id (str):
+            Instrument ID
+        biological_standard (str):
+            Name of biological standard
+        chromatography (str):
+            Chromatography method
+        polarity (str):
+            Polarity ("Pos" or "Neg")
+        before_run (str, default None):
+            If specified, only runs before this run are aggregated (ex: for the "All previous" comparison). If the run
+            has no aggregates yet (ex: an active run on a remote device), all other runs are aggregated.
 
-        # Get "targeted_features" table
-        targeted_features_table = sa.Table("targeted_features", db_metadata, autoload=True)
+    Returns:
+        DataFrame with feature, n_values, sum_values, sum_squares, mean, std, and last_values columns.
+    """
 
-        # Prepare DELETE of old targeted features
-        delete_old_targeted_features = (
-            sa.delete(targeted_features_table)
-                .where((targeted_features_table.c.chromatography == chromatography)
-                       & (targeted_features_table.c.polarity == polarity)
-                       & (targeted_features_table.c.biological_standard == bio_standard))
-        )
+    df_rows = read_bio_standard_aggregates(instrument_id, biological_standard, chromatography, polarity)
 
-        # Execute DELETE
-        connection.execute(delete_old_targeted_features)
+    if before_run is not None:
+        run_order = df_rows.loc[df_rows["run_id"] == before_run, "run_order"]
+        if len(run_order) > 0:
+            df_rows = df_rows.loc[df_rows["run_order"] < run_order.min()]
+        else:
+            df_rows = df_rows.loc[df_rows["run_id"] != before_run]
 
-        # Execute INSERT of each targeted feature into targeted_features table
-        for feature in features_dict:
-            insert_feature = targeted_features_table.insert().values(
-                {"name": features_dict[feature]["Name"],
-                 "chromatography": chromatography,
-                 "polarity": polarity,
-                 "biological_standard": bio_standard,
-                 "precursor_mz": features_dict[feature]["Precursor m/z"],
-                 "retention_time": features_dict[feature]["Retention time"],
-                 "ms2_spectrum": features_dict[feature]["MS2 spectrum"],
-                 "inchikey": features_dict[feature]["INCHIKEY"]})
-            connection.execute(insert_feature)
+    df_aggregates = df_rows.groupby("feature", sort=False)[["n_values", "sum_values", "sum_squares"]].sum()
+    df_aggregates = df_aggregates.reset_index()
 
-        # Get "biological_standards" table
-        biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+    # Derive mean and standard deviation from sums
+    n_values = df_aggregates["n_values"].astype(float).replace(0, np.nan)
+    df_aggregates["mean"] = df_aggregates["sum_values"] / n_values
+    variance = (df_aggregates["sum_squares"] / n_values) - (df_aggregates["mean"] ** 2)
+    df_aggregates["std"] = np.sqrt(variance.clip(lower=0))
 
-        # Write location of msp file to respective cell
-        if polarity == "Positive Mode":
-            update_msp_file = (
-                sa.update(biological_standards_table)
-                    .where((biological_standards_table.c.chromatography == chromatography)
-                           & (biological_standards_table.c.name == bio_standard))
-                    .values(num_pos_features=len(features_dict),
-                            pos_bio_msp_file=filename)
-            )
-        elif polarity == "Negative Mode":
-            update_msp_file = (
-                sa.update(biological_standards_table)
-                    .where((biological_standards_table.c.chromatography == chromatography)
-                           & (biological_standards_table.c.name == bio_standard))
-                    .values(num_neg_features=len(features_dict),
-                            neg_bio_msp_file=filename)
-            )
+    # Most recent values of each feature
+    last_values = {}
+    for row in df_rows.itertuples():
+        last_values.setdefault(row.feature, []).extend(
+            [[row.run_id] + entry for entry in ast.literal_eval(row.run_values)])
+    df_aggregates["last_values"] = [last_values.get(feature, [])[-bio_standard_aggregate_window:]
+        for feature in df_aggregates["feature"]]
 
-        # Execute UPDATE of MSP file location
-        connection.execute(update_msp_file)
+    return df_aggregates
 
-    # Adding MSP for internal standards
-    else:
 
-        # Get internal_standards table
-        internal_standards_table = sa.Table("internal_standards", db_metadata, autoload=True)
+def get_bio_standard_intensities(instrument_id, biological_standard, chromatography, polarity, feature=None):
 
-        # Prepare DELETE of old internal standards
-        delete_old_internal_standards = (
-            sa.delete(internal_standards_table)
-                .where((internal_standards_table.c.chromatography == chromatography)
-                       & (internal_standards_table.c.polarity == polarity))
-        )
+    """
+    Returns intensities of a biological standard's injections across instrument runs from the "bio_standard_aggregates" table.
 
-        # Execute DELETE
-        connection.execute(delete_old_internal_standards)
+    The table has the same layout as the biological standard tables of get_qc_results() (injections as rows, with "Name"
+    and "run_id" columns, and targeted features as columns), but is read without parsing previous runs' QC results.
 
-        # Execute INSERT of each internal standard into internal_standards table
-        for feature in features_dict:
-            insert_feature = internal_standards_table.insert().values(
-                {"name": features_dict[feature]["Name"],
-                 "chromatography": chromatography,
-                 "polarity": polarity,
-                 "precursor_mz": features_dict[feature]["Precursor m/z"],
-                 "retention_time": features_dict[feature]["Retention time"],
-                 "ms2_spectrum": features_dict[feature]["MS2 spectrum"],
-                 "inchikey": features_dict[feature]["INCHIKEY"]})
-            connection.execute(insert_feature)
+    Args:
+        instrument_id (str): Instrument ID
+        biological_standard (str): Name of biological standard
+        chromatography (str): Chromatography method
+        polarity (str): Polarity ("Pos" or "Neg")
+        feature (str, default None): Targeted feature, or None for all features
 
-        # Get "chromatography" table
-        chromatography_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
+    Returns:
+        DataFrame of injections (rows) vs. targeted features (columns)
+    """
 
-        # Write location of msp file to respective cell
-        if polarity == "Positive Mode":
-            update_msp_file = (
-                sa.update(chromatography_table)
-                    .where(chromatography_table.c.method_id == chromatography)
-                    .values(num_pos_standards=len(features_dict),
-                            pos_istd_msp_file=filename)
-            )
-        elif polarity == "Negative Mode":
-            update_msp_file = (
-                sa.update(chromatography_table)
-                    .where(chromatography_table.c.method_id == chromatography)
-                    .values(num_neg_standards=len(features_dict),
-                            neg_istd_msp_file=filename)
-            )
+    df_rows = read_bio_standard_aggregates(instrument_id, biological_standard, chromatography, polarity, feature)
 
-        # Execute UPDATE of MSP file location
-        connection.execute(update_msp_file)
+    injections = {}
+    for row in df_rows.itertuples():
+        for sample_id, value in ast.literal_eval(row.run_values):
+            injections.setdefault((row.run_order, sample_id), {"Name": sample_id, "run_id": row.run_id})[row.feature] = value
 
-    # If the corresponding TXT library existed, delete it
-    txt_library = os.path.join(methods_directory, filename.replace(".msp", ".txt"))
-    os.remove(txt_library) if os.path.exists(txt_library) else None
+    df_intensities = pd.DataFrame([injections[key] for key in sorted(injections, key=lambda key: key[0])],
+        columns=["Name", "run_id"] + list(dict.fromkeys(df_rows["feature"])))
 
-    # Close the connection
-    connection.close()
+    return df_intensities.astype({column: float for column in df_intensities.columns[2:]})
 
 
-def add_csv_to_database(csv_file, chromatography, polarity):
+def create_processing_stages_table(instrument_id):
 
     """
-    Parses compounds from a CSV file into the Settings database.
-
-    Parses compounds from a CSV into the "internal_standards" table, and stores
-    the location of the pos/neg TXT files in "chromatography_methods" table.
+    Creates the "processing_stages" table in an instrument database, if it does not exist yet.
 
-    TODO: The MSP/TXT libraries have standardized names; there is no need to store the filename in the database.
+    The table holds one row per pipeline stage (MSConvert, MS-DIAL, QC, etc.) of each processed sample,
+    with start and finish timestamps and duration in seconds.
 
     Args:
-        csv_file (io.StringIO):
-            In-memory text-stream file object
-        chromatography (str):
-            Chromatography method ID (name)
-        polarity (str):
-            Polarity for which MSP should be used for ("Positive Mode" or "Negative Mode")
+        instrument_id (str): Instrument ID
 
     Returns:
-        None
+        bool: True if the table was created, False if it already existed.
     """
 
-    # Convert CSV file into Python dictionary
-    df_internal_standards = pd.read_csv(csv_file, index_col=False)
-    internal_standards_dict = df_internal_standards.to_dict("index")
-
-    # Create methods directory if it doesn't already exist
-    if not os.path.exists(methods_directory):
-        os.makedirs(methods_directory)
+    database = get_database_file(instrument_id=instrument_id, sqlite_conn=True)
+    engine = sa.create_engine(database)
 
-    # Name file accordingly
-    if polarity == "Positive Mode":
-        filename = chromatography + "_Pos.txt"
-    elif polarity == "Negative Mode":
-        filename = chromatography + "_Neg.txt"
+    if sa.inspect(engine).has_table("processing_stages"):
+        return False
 
-    txt_file_path = os.path.join(methods_directory, filename)
+    db_metadata = sa.MetaData()
 
-    # Write CSV columns to tab-delimited text file
-    df_internal_standards.to_csv(txt_file_path, sep="\t", index=False)
+    processing_stages = sa.Table(
+        "processing_stages", db_metadata,
+        sa.Column("id", INTEGER, primary_key=True),
+        sa.Column("run_id", TEXT),
+        sa.Column("sample_id", TEXT),
+        sa.Column("stage", TEXT),
+        sa.Column("started", TEXT),
+        sa.Column("finished", TEXT),
+        sa.Column("duration", REAL)
+    )
 
-    # Connect to database
-    db_metadata, connection = connect_to_database("Settings")
+    db_metadata.create_all(engine)
+    return True
 
-    # Get internal_standards table
-    internal_standards_table = sa.Table("internal_standards", db_metadata, autoload=True)
 
-    # Prepare DELETE of old internal standards
-    delete_old_internal_standards = (
-        sa.delete(internal_standards_table)
-            .where((internal_standards_table.c.chromatography == chromatography)
-                   & (internal_standards_table.c.polarity == polarity))
-    )
+def get_processing_stages(instrument_id, run_id, sample_id=None):
 
-    # Execute DELETE
-    connection.execute(delete_old_internal_standards)
+    """
+    Returns DataFrame of pipeline stage timestamps for an instrument run, or a single sample in the run.
 
-    # Execute INSERT of each internal standard into internal_standards table
-    for row in internal_standards_dict.keys():
-        insert_standard = internal_standards_table.insert().values(
-            {"name": internal_standards_dict[row]["Common Name"],
-             "chromatography": chromatography,
-             "polarity": polarity,
-             "precursor_mz": internal_standards_dict[row]["MS1 m/z"],
-             "retention_time": internal_standards_dict[row]["RT (min)"]})
-        connection.execute(insert_standard)
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        sample_id (str, default None):
+            Sample ID. If None, stages of all samples in the run are returned.
 
-    # Get "chromatography" table
-    chromatography_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
+    Returns:
+        DataFrame of sample ID, stage, start and finish timestamps, and duration in seconds.
+    """
 
-    # Write location of CSV file to respective cell
-    if polarity == "Positive Mode":
-        update_msp_file = (
-            sa.update(chromatography_table)
-                .where(chromatography_table.c.method_id == chromatography)
-                .values(num_pos_standards=len(internal_standards_dict),
-                        pos_istd_msp_file=filename)
-        )
-    elif polarity == "Negative Mode":
-        update_msp_file = (
-            sa.update(chromatography_table)
-                .where(chromatography_table.c.method_id == chromatography)
-                .values(num_neg_standards=len(internal_standards_dict),
-                        neg_istd_msp_file=filename)
-        )
+    create_processing_stages_table(instrument_id)
 
-    # Execute UPDATE of CSV file location
-    connection.execute(update_msp_file)
+    database = get_database_file(instrument_id=instrument_id, sqlite_conn=True)
+    engine = sa.create_engine(database)
 
-    # If the corresponding MSP library existed, delete it
-    msp_library = os.path.join(methods_directory, filename.replace(".txt", ".msp"))
-    os.remove(msp_library) if os.path.exists(msp_library) else None
+    if sample_id is None:
+        query = sa.text("SELECT * FROM processing_stages WHERE run_id = :run_id").bindparams(run_id=run_id)
+    else:
+        query = sa.text("SELECT * FROM processing_stages WHERE run_id = :run_id AND sample_id = :sample_id")\
+            .bindparams(run_id=run_id, sample_id=sample_id)
 
-    # Close the connection
-    connection.close()
+    return pd.read_sql(query, engine)
 
 
-def get_msdial_configurations():
+def create_run_summaries_table(instrument_id):
 
     """
-    Returns list of user configurations of MS-DIAL parameters from Settings database.
-    """
+    Creates the "run_summaries" table in an instrument database, if it does not exist yet.
 
-    engine = sa.create_engine(settings_database)
-    df_msdial_configurations = pd.read_sql("SELECT * FROM msdial_parameters", engine)
-    return df_msdial_configurations["config_name"].astype(str).tolist()
+    The table holds precomputed summaries of each instrument run, so that instrument trends across months of runs can be
+    plotted without parsing the results of every sample:
 
+        1. One row per (run, polarity, internal standard) with the number of samples, median and 5th / 95th percentile
+           of delta RT and delta m/z, median in-run delta RT, and the fraction of samples with intensity dropouts,
+           warnings, and fails for the internal standard
+        2. One row per run (with polarity and internal standard "All") with the number of samples, fractions of samples
+           that passed, failed, or were marked with a warning, the fraction of dropped out internal standards, the times
+           of the first and last processed sample, and throughput in samples per hour
 
-def generate_msdial_parameters_file(chromatography, polarity, msp_file_path, bio_standard=None):
+    Each row also keeps the values of every sample in the "sample_values" column, so that summaries can be updated when
+    a sample is processed (or reprocessed) without reading the rest of the run.
+
+    Args:
+        instrument_id (str): Instrument ID
 
+    Returns:
+        bool: True if the table was created, False if it already existed.
     """
-    Uses parameters from user-curated MS-DIAL configuration to create a parameters.txt file for MS-DIAL.
 
-    TODO: Currently, this function is only called upon a new job setup. To allow changes during a QC job,
-        this function should be called every time the user makes a configuration save in Settings > MS-DIAL Configurations.
+    database = get_database_file(instrument_id=instrument_id, sqlite_conn=True)
+    engine = sa.create_engine(database)
+
+    if sa.inspect(engine).has_table("run_summaries"):
+        return False
+
+    db_metadata = sa.MetaData()
+
+    run_summaries = sa.Table(
+        "run_summaries", db_metadata,
+        sa.Column("id", INTEGER, primary_key=True),
+        sa.Column("run_id", TEXT),
+        sa.Column("chromatography", TEXT),
+        sa.Column("polarity", TEXT),
+        sa.Column("internal_standard", TEXT),
+        sa.Column("samples", INTEGER),
+        sa.Column("delta_rt_median", REAL),
+        sa.Column("delta_rt_p05", REAL),
+        sa.Column("delta_rt_p95", REAL),
+        sa.Column("delta_mz_median", REAL),
+        sa.Column("delta_mz_p05", REAL),
+        sa.Column("delta_mz_p95", REAL),
+        sa.Column("in_run_delta_rt_median", REAL),
+        sa.Column("dropout_rate", REAL),
+        sa.Column("pass_rate", REAL),
+        sa.Column("warning_rate", REAL),
+        sa.Column("fail_rate", REAL),
+        sa.Column("started", TEXT),
+        sa.Column("finished", TEXT),
+        sa.Column("throughput", REAL),
+        sa.Column("sample_values", TEXT)
+    )
+
+    db_metadata.create_all(engine)
+    return True
+
+
+def get_sample_summary_values(qc_dataframe):
+
+    """
+    Parses the QC results of a sample into the values kept for each internal standard in the "run_summaries" table.
 
     Args:
-        chromatography (str):
-            Chromatography method ID (name)
+        qc_dataframe (str): String list of QC result records, as stored in the "qc_dataframe" column
+
+    Returns:
+        dict: Dictionary of { internal standard : [delta RT, delta m/z, in-run delta RT, dropout, warning, fail] },
+            where missing values are None and dropout, warning, and fail are either 0 or 1
+    """
+
+    if qc_dataframe is None or qc_dataframe == "None" or qc_dataframe == "nan":
+        return {}
+
+    records = ast.literal_eval(qc_dataframe)
+    if len(records) < len(qc_result_types) or len(records[0]) == 0:
+        return {}
+
+    def to_float(value):
+        try:
+            value = float(value)
+            return value if np.isfinite(value) else None
+        except (TypeError, ValueError):
+            return None
+
+    def is_flagged(value):
+        return 0 if value is None or str(value) in ["", "nan", "None", "0"] else 1
+
+    values = {}
+    for internal_standard in records[0]:
+        if internal_standard == "Name":
+            continue
+        values[internal_standard] = [
+            to_float(records[qc_result_types["Delta RT"]].get(internal_standard)),
+            to_float(records[qc_result_types["Delta m/z"]].get(internal_standard)),
+            to_float(records[qc_result_types["In-run delta RT"]].get(internal_standard)),
+            is_flagged(records[qc_result_types["Intensity dropout"]].get(internal_standard)),
+            is_flagged(records[qc_result_types["Warnings"]].get(internal_standard)),
+            is_flagged(records[qc_result_types["Fails"]].get(internal_standard))]
+
+    return values
+
+
+def summarize_run_values(sample_values, internal_standard):
+
+    """
+    Computes the summary columns of a "run_summaries" row from the values of each sample.
+
+    Args:
+        sample_values (dict):
+            For internal standard rows, { sample ID : [delta RT, delta m/z, in-run delta RT, dropout, warning, fail] },
+            and for run rows, { sample ID : [QC result, started, finished, dropouts, internal standards] },
+            with started and finished in seconds since the epoch
+        internal_standard (str):
+            Internal standard of the row, or "All" for run rows
+
+    Returns:
+        dict: Dictionary with the columns in run_summary_columns
+    """
+
+    summary = {column: None for column in run_summary_columns}
+    summary["samples"] = len(sample_values)
+
+    if len(sample_values) == 0:
+        return summary
+
+    def statistic(values, function):
+        values = np.array([value for value in values if value is not None], dtype=float)
+        return float(function(values)) if len(values) > 0 else None
+
+    if internal_standard != "All":
+        values = list(sample_values.values())
+        for index, metric in [(0, "delta_rt"), (1, "delta_mz")]:
+            summary[metric + "_median"] = statistic([value[index] for value in values], np.median)
+            summary[metric + "_p05"] = statistic([value[index] for value in values], lambda x: np.percentile(x, 5))
+            summary[metric + "_p95"] = statistic([value[index] for value in values], lambda x: np.percentile(x, 95))
+        summary["in_run_delta_rt_median"] = statistic([value[2] for value in values], np.median)
+        summary["dropout_rate"] = statistic([value[3] for value in values], np.mean)
+        summary["warning_rate"] = statistic([value[4] for value in values], np.mean)
+        summary["fail_rate"] = statistic([value[5] for value in values], np.mean)
+
+    else:
+        values = list(sample_values.values())
+        results = [value[0] for value in values]
+        summary["pass_rate"] = results.count("Pass") / len(results)
+        summary["warning_rate"] = results.count("Warning") / len(results)
+        summary["fail_rate"] = results.count("Fail") / len(results)
+
+        internal_standards = sum(value[4] for value in values)
+        summary["dropout_rate"] = sum(value[3] for value in values) / internal_standards if internal_standards > 0 else None
+
+        # Throughput in samples per hour, from the start of the first sample to the end of the last one
+        started = statistic([value[1] for value in values], np.min)
+        finished = statistic([value[2] for value in values], np.max)
+        if started is not None and finished is not None:
+            summary["started"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started))
+            summary["finished"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(finished))
+            if finished > started:
+                summary["throughput"] = len(values) / ((finished - started) / 3600)
+
+    return summary
+
+
+def write_run_summaries(db_metadata, connection, run_id, sample_id, polarity, qc_dataframe, qc_result, started, finished):
+
+    """
+    Updates the "run_summaries" rows of an instrument run with a processed sample on an open connection.
+
+    Only the rows of the sample's run and polarity are read and written. The sample's previous values are replaced,
+    so reprocessing a sample does not count it twice. Like write_bio_standard_aggregates(), this function does not begin,
+    commit, or close anything, so that it can take part in persist_sample_results(). The table must already exist.
+
+    Args:
+        db_metadata (sqlalchemy.MetaData):
+            Metadata of the instrument database
+        connection (sqlalchemy.Connection):
+            Open connection to the instrument database
+        run_id (str):
+            Instrument run ID (job ID)
+        sample_id (str):
+            Sample ID
         polarity (str):
-            Polarity ("Positive" or "Negative")
-        msp_file_path (str):
-            MSP library file path
-        bio_standard (str, default None):
-            Specifies that the parameters file is for a biological standard
+            Polarity of the sample
+        qc_dataframe (str):
+            String list of QC result records (None or empty for biological standards)
+        qc_result (str):
+            QC result for sample, either "Pass", "Warning", or "Fail"
+        started (float):
+            Time that processing of the sample started, in seconds since the epoch
+        finished (float):
+            Time that the sample's results were written, in seconds since the epoch
 
     Returns:
         None
     """
 
-    # Get parameters of selected configuration
-    if bio_standard is not None:
-        df_bio_standards = get_biological_standards()
-        df_bio_standards = df_bio_standards.loc[
-            (df_bio_standards["chromatography"] == chromatography) & (df_bio_standards["name"] == bio_standard)]
-        config_name = df_bio_standards["msdial_config_id"].astype(str).values[0]
-    else:
-        df_methods = get_chromatography_methods()
-        df_methods = df_methods.loc[df_methods["method_id"] == chromatography]
-        config_name = df_methods["msdial_config_id"].astype(str).values[0]
+    runs_table = sa.Table("runs", db_metadata, autoload=True)
+    summaries_table = sa.Table("run_summaries", db_metadata, autoload=True)
+
+    chromatography = connection.execute(
+        sa.select(runs_table.c.chromatography).where(runs_table.c.run_id == run_id)
+    ).scalar()
+
+    # Get existing rows of the run for the sample's polarity
+    rows = {}
+    for row in connection.execute(
+        sa.select(summaries_table)
+            .where((summaries_table.c.run_id == run_id)
+                   & (summaries_table.c.polarity.in_([polarity, "All"])))
+    ):
+        rows[(row.polarity, row.internal_standard)] = row
+
+    # Replace the sample's values in each row (including internal standards that are no longer in its results)
+    internal_standard_values = get_sample_summary_values(qc_dataframe)
+    dropouts = sum(values[3] for values in internal_standard_values.values())
+    updates = {("All", "All"): [qc_result, started, finished, dropouts, len(internal_standard_values)]}
+    updates.update({(polarity, internal_standard): values for internal_standard, values in internal_standard_values.items()})
+    updates.update({key: None for key in rows if key not in updates})
+
+    for (row_polarity, internal_standard), values in updates.items():
+        row = rows.get((row_polarity, internal_standard))
+        sample_values = json.loads(row.sample_values) if row is not None else {}
+
+        if values is None:
+            if sample_id not in sample_values:
+                continue
+            del sample_values[sample_id]
+        else:
+            sample_values[sample_id] = values
 
-    parameters = get_msdial_configuration_parameters(config_name)
+        summary = summarize_run_values(sample_values, internal_standard)
+        summary["sample_values"] = json.dumps(sample_values)
 
-    # Create "methods" directory if it does not exist
-    if not os.path.exists(methods_directory):
-        os.makedirs(methods_directory)
+        if row is not None:
+            connection.execute(
+                sa.update(summaries_table)
+                    .where(summaries_table.c.id == row.id)
+                    .values(chromatography=chromatography, **summary)
+            )
+        else:
+            connection.execute(
+                summaries_table.insert().values(
+                    dict(summary, run_id=run_id, chromatography=chromatography, polarity=row_polarity,
+                        internal_standard=internal_standard))
+            )
 
-    # Name parameters file accordingly
-    if bio_standard is not None:
-        if polarity == "Positive":
-            filename = bio_standard.replace(" ", "_") + "_" + config_name.replace(" ", "_") + "_Parameters_Pos.txt"
-        elif polarity == "Negative":
-            filename = bio_standard.replace(" ", "_") + "_" + config_name.replace(" ", "_") + "_Parameters_Neg.txt"
+
+def rebuild_run_summaries(instrument_id, run_ids=None):
+
+    """
+    Recomputes the "run_summaries" rows of instrument runs from the QC results in an instrument database.
+
+    This function is called when the table is first created for an existing database, when a run is marked as completed
+    (so that its summaries are exact even if some samples were written by an older version), and when runs are deleted
+    or replaced by a Google Drive sync.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_ids (list, default None):
+            Instrument run ID's to recompute, or None for all runs
+
+    Returns:
+        None
+    """
+
+    create_run_summaries_table(instrument_id)
+    create_processing_stages_table(instrument_id)
+
+    engine = sa.create_engine(get_database_file(instrument_id, sqlite_conn=True))
+
+    def read_table(table, columns):
+        query = "SELECT " + ", ".join(columns) + " FROM " + table
+        if run_ids is None:
+            return pd.read_sql(query, engine)
+        query = sa.text(query + " WHERE run_id IN :run_ids").bindparams(sa.bindparam("run_ids", expanding=True))
+        return pd.read_sql(query, engine, params={"run_ids": list(run_ids)})
+
+    df_runs = read_table("runs", ["run_id", "chromatography"])
+    df_samples = read_table("sample_qc_results", ["run_id", "sample_id", "polarity", "qc_dataframe", "qc_result"])
+    df_bio_standards = read_table("bio_qc_results", ["run_id", "sample_id", "polarity", "qc_result"])
+    df_stages = read_table("processing_stages", ["run_id", "sample_id", "started", "finished"])
+
+    # Processing times of each sample (first start and last finish of any stage)
+    times = {}
+    for row in df_stages.itertuples():
+        try:
+            started = time.mktime(time.strptime(row.started, "%Y-%m-%d %H:%M:%S"))
+            finished = time.mktime(time.strptime(row.finished, "%Y-%m-%d %H:%M:%S"))
+        except (TypeError, ValueError):
+            continue
+        key = (row.run_id, row.sample_id)
+        previous = times.get(key, (started, finished))
+        times[key] = (min(previous[0], started), max(previous[1], finished))
+
+    # Accumulate values of processed samples for each (run, polarity, internal standard)
+    sample_values = {}
+    for df in [df_bio_standards, df_samples]:
+        for row in df.loc[df["qc_result"].notna()].itertuples():
+            internal_standard_values = get_sample_summary_values(row.qc_dataframe) if hasattr(row, "qc_dataframe") else {}
+            started, finished = times.get((row.run_id, row.sample_id), (None, None))
+            dropouts = sum(values[3] for values in internal_standard_values.values())
+
+            sample_values.setdefault((row.run_id, "All", "All"), {})[row.sample_id] = \
+                [row.qc_result, started, finished, dropouts, len(internal_standard_values)]
+            for internal_standard, values in internal_standard_values.items():
+                sample_values.setdefault((row.run_id, row.polarity, internal_standard), {})[row.sample_id] = values
+
+    chromatography = dict(zip(df_runs["run_id"], df_runs["chromatography"]))
+
+    db_metadata, connection = connect_to_database(instrument_id)
+    summaries_table = sa.Table("run_summaries", db_metadata, autoload=True)
+
+    with connection.begin():
+        if run_ids is None:
+            connection.execute(sa.delete(summaries_table))
+        else:
+            connection.execute(sa.delete(summaries_table).where(summaries_table.c.run_id.in_(list(run_ids))))
+
+        rows = []
+        for (run_id, polarity, internal_standard), values in sample_values.items():
+            if run_id not in chromatography:
+                continue
+            summary = summarize_run_values(values, internal_standard)
+            rows.append(dict(summary, run_id=run_id, chromatography=chromatography[run_id], polarity=polarity,
+                internal_standard=internal_standard, sample_values=json.dumps(values)))
+
+        if len(rows) > 0:
+            connection.execute(summaries_table.insert(), rows)
+
+    connection.close()
+
+
+def get_run_summaries(instrument_id, chromatography=None, polarity=None, internal_standard=None):
+
+    """
+    Returns precomputed summaries of instrument runs from the "run_summaries" table, for instrument trend plots.
+
+    Only the summary columns are read (not the values of each sample), so months of runs are returned in milliseconds.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        chromatography (str, default None):
+            If specified, returns only runs with this chromatography method
+        polarity (str, default None):
+            If specified, returns only rows for this polarity ("All" for run rows)
+        internal_standard (str, default None):
+            If specified, returns only rows for this internal standard ("All" for run rows)
+
+    Returns:
+        DataFrame with run_id, chromatography, polarity, internal_standard, and the columns in run_summary_columns,
+        with runs in the order they were processed.
+    """
+
+    if create_run_summaries_table(instrument_id):
+        rebuild_run_summaries(instrument_id)
+
+    filters = {"chromatography": chromatography, "polarity": polarity, "internal_standard": internal_standard}
+    filters = {column: value for column, value in filters.items() if value is not None}
+
+    query = "SELECT run_id, chromatography, polarity, internal_standard, " \
+        + ", ".join(run_summary_columns) + " FROM run_summaries"
+    if len(filters) > 0:
+        query += " WHERE " + " AND ".join(column + " = :" + column for column in filters)
+
+    engine = sa.create_engine(get_read_database_file(instrument_id))
+    df_summaries = pd.read_sql(sa.text(query).bindparams(**filters), engine)
+
+    # Order runs by the time their first sample was processed (from their run rows)
+    df_run_rows = pd.read_sql("SELECT run_id, started AS run_started FROM run_summaries WHERE internal_standard = 'All'", engine)
+    df_summaries = df_summaries.merge(df_run_rows, on="run_id", how="left")
+    df_summaries = df_summaries.sort_values(["run_started", "run_id"], na_position="first", kind="stable")
+
+    return df_summaries.drop(columns=["run_started"]).reset_index(drop=True)
+
+
+def persist_sample_results(instrument_id, run_id, sample_id, json_mz, json_rt, json_intensity, qc_dataframe, qc_result,
+    is_bio_standard, stages=None):
+
+    """
+    Writes QC results, sample counters, pipeline stage timestamps, and job state for a processed sample in one transaction.
+
+    This replaces calling write_qc_results() and update_sample_counters_for_run() one after the other,
+    which opened a new engine and connection for each step and could leave a sample half-written if the
+    acquisition listener was stopped in between. Either everything below is committed, or nothing is:
+
+        1. QC results in "sample_qc_results" or "bio_qc_results"
+        2. Cross-run aggregates in "bio_standard_aggregates" (biological standards only)
+        3. Pipeline stage timestamps in "processing_stages"
+        4. Summaries of the run in "run_summaries"
+        5. Completed / pass / fail counts and latest sample in "runs"
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        sample_id (str):
+            Sample ID
+        json_mz (str):
+            String dict of internal standard m/z data in "records" format
+        json_rt (str):
+            String dict of internal standard RT data in "records" format
+        json_intensity (str):
+            String dict of internal standard intensity data in "records" format
+        qc_dataframe (str):
+            String dict of various QC data in "records" format
+        qc_result (str):
+            QC result for sample, either "Pass" or "Fail"
+        is_bio_standard (bool):
+            Whether the sample is a biological standard
+        stages (list, default None):
+            List of (stage, start time, finish time) tuples, with times in seconds since the epoch
+
+    Returns:
+        None
+    """
+
+    # Make sure tables added after database creation exist before the transaction starts
+    aggregates_created = create_bio_standard_aggregates_table(instrument_id)
+    summaries_created = create_run_summaries_table(instrument_id)
+    create_processing_stages_table(instrument_id)
+
+    persist_started = time.time()
+
+    # Connect to database once for all writes
+    db_metadata, connection = connect_to_database(instrument_id)
+    sample_qc_results_table = sa.Table("sample_qc_results", db_metadata, autoload=True)
+    bio_qc_results_table = sa.Table("bio_qc_results", db_metadata, autoload=True)
+    runs_table = sa.Table("runs", db_metadata, autoload=True)
+    stages_table = sa.Table("processing_stages", db_metadata, autoload=True)
+
+    if is_bio_standard:
+        qc_results_table = bio_qc_results_table
     else:
-        if polarity == "Positive":
-            filename = chromatography.replace(" ", "_") + "_" + config_name.replace(" ", "_") + "_Parameters_Pos.txt"
-        elif polarity == "Negative":
-            filename = chromatography.replace(" ", "_") + "_" + config_name.replace(" ", "_") + "_Parameters_Neg.txt"
+        qc_results_table = sample_qc_results_table
 
-    parameters_file = os.path.join(methods_directory, filename)
+    try:
+        with connection.begin():
+
+            # Write QC results to sample row
+            connection.execute(
+                sa.update(qc_results_table)
+                    .where((qc_results_table.c.sample_id == sample_id)
+                           & (qc_results_table.c.run_id == run_id))
+                    .values(precursor_mz=json_mz,
+                            retention_time=json_rt,
+                            intensity=json_intensity,
+                            qc_dataframe=qc_dataframe,
+                            qc_result=qc_result)
+            )
 
-    # Some specifications based on polarity / file type for the parameters
-    if polarity == "Positive":
-        adduct_type = "[M+H]+"
-    elif polarity == "Negative":
-        adduct_type = "[M-H]-"
+            # Update cross-run aggregates (a newly created table is backfilled after commit instead)
+            if is_bio_standard and not aggregates_created:
+                write_bio_standard_aggregates(db_metadata, connection, run_id, sample_id, json_intensity)
+
+            # Replace pipeline stage timestamps of the sample
+            stage_rows = []
+            for stage, started, finished in (stages or []) + [("persist", persist_started, time.time())]:
+                stage_rows.append({
+                    "run_id": run_id,
+                    "sample_id": sample_id,
+                    "stage": stage,
+                    "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)),
+                    "finished": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(finished)),
+                    "duration": round(finished - started, 3)})
+
+            connection.execute(
+                sa.delete(stages_table)
+                    .where((stages_table.c.run_id == run_id)
+                           & (stages_table.c.sample_id == sample_id))
+            )
+            connection.execute(stages_table.insert(), stage_rows)
+
+            # Update run summaries (a newly created table is backfilled after commit instead)
+            if not summaries_created:
+                polarity = connection.execute(
+                    sa.select(qc_results_table.c.polarity)
+                        .where((qc_results_table.c.sample_id == sample_id)
+                               & (qc_results_table.c.run_id == run_id))
+                ).scalar()
+                started = min([stage[1] for stage in (stages or [])] + [persist_started])
+                write_run_summaries(db_metadata, connection, run_id, sample_id, polarity,
+                    qc_dataframe if not is_bio_standard else None, qc_result, started, time.time())
+
+            # Count QC results of the run in SQL instead of loading both tables into DataFrames
+            counts = {"Pass": 0, "Fail": 0}
+            for table in [sample_qc_results_table, bio_qc_results_table]:
+                for result, count in connection.execute(
+                    sa.select(table.c.qc_result, sa.func.count())
+                        .where(table.c.run_id == run_id)
+                        .group_by(table.c.qc_result)
+                ):
+                    if result in counts:
+                        counts[result] += count
+
+            # Update sample counters and latest sample to trigger dashboard update
+            connection.execute(
+                sa.update(runs_table)
+                    .where(runs_table.c.run_id == run_id)
+                    .values(completed=counts["Pass"] + counts["Fail"],
+                            passes=counts["Pass"],
+                            fails=counts["Fail"],
+                            latest_sample=sample_id)
+            )
 
-    if msp_file_path.endswith(".msp"):
-        filepath = "MSP file: " + msp_file_path
-    elif msp_file_path.endswith(".txt"):
-        filepath = "Text file: " + msp_file_path
+    finally:
+        connection.close()
 
-    # Text file contents
-    lines = [
-        "#Data type",
-        "MS1 data type: Centroid",
-        "MS2 data type: Centroid",
-        "Ion mode: " + polarity,
-        "DIA file:", "\n"
+    if is_bio_standard and aggregates_created:
+        rebuild_bio_standard_aggregates(instrument_id)
 
-        "#Data collection parameters",
-        "Retention time begin: " + str(parameters[0]),
-        "Retention time end: " + str(parameters[1]),
-        "Mass range begin: " + str(parameters[2]),
-        "Mass range end: " + str(parameters[3]), "\n",
+    if summaries_created:
+        rebuild_run_summaries(instrument_id)
 
-        "#Centroid parameters",
-        "MS1 tolerance for centroid: " + str(parameters[4]),
-        "MS2 tolerance for centroid: " + str(parameters[5]), "\n",
+    # Notify readers that the database changed
+    publish_database_version(instrument_id)
 
-        "#Peak detection parameters",
-        "Smoothing method: " + str(parameters[6]),
-        "Smoothing level: " + str(parameters[7]),
-        "Minimum peak width: " + str(parameters[8]),
-        "Minimum peak height: " + str(parameters[9]),
-        "Mass slice width: " + str(parameters[10]), "\n",
 
-        "#Deconvolution parameters",
-        "Sigma window value: 0.5",
-        "Amplitude cut off: 0", "\n",
+def get_chromatography_methods():
 
-        "#Adduct list",
-        "Adduct list: " + adduct_type, "\n",
+    """
+    Returns DataFrame of chromatography methods from the Settings database.
+    """
 
-        "#Text file and post identification (retention time and accurate mass based) setting",
-        filepath,
-        "Retention time tolerance for post identification: " + str(parameters[11]),
-        "Accurate ms1 tolerance for post identification: " + str(parameters[12]),
-        "Post identification score cut off: " + str(parameters[13]), "\n",
+    engine = sa.create_engine(settings_database)
+    df_methods = pd.read_sql("SELECT * FROM chromatography_methods", engine)
+    return df_methods
 
-        "#Alignment parameters setting",
-        "Retention time tolerance for alignment: " + str(parameters[14]),
-        "MS1 tolerance for alignment: " + str(parameters[15]),
-        "Retention time factor for alignment: " + str(parameters[16]),
-        "MS1 factor for alignment: " + str(parameters[17]),
-        "Peak count filter: " + str(parameters[18]),
-        "QC at least filter: " + str(parameters[19]),
-    ]
 
-    # Write parameters to a text file
-    with open(parameters_file, "w") as file:
-        for line in lines:
-            file.write(line)
-            if line != "\n":
-                file.write("\n")
+def get_chromatography_methods_list():
 
-    # Write path of parameters text file to chromatography method in database
-    db_metadata, connection = connect_to_database("Settings")
-    chromatography_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
-    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+    """
+    Returns list of chromatography method ID's from the Settings database.
+    """
+
+    df_methods = get_chromatography_methods()
+    return df_methods["method_id"].astype(str).tolist()
+
+
+def insert_chromatography_method(method_id):
+
+    """
+    Inserts new chromatography method in the "chromatography_methods" table of the Settings database.
+
+    Args:
+        method_id (str): Name of the chromatography method
+
+    Returns:
+        None
+    """
+
+    # Connect to database
+    db_metadata, connection = connect_to_database("Settings")
+
+    # Get "chromatography_methods" table and "biological_standards" table
+    chromatography_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
+    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+
+    # Execute insert of chromatography method
+    insert_method = chromatography_table.insert().values(
+        {"method_id": method_id,
+         "num_pos_standards": 0,
+         "num_neg_standards": 0,
+         "pos_istd_msp_file": "",
+         "neg_istd_msp_file": "",
+         "pos_parameter_file": "",
+         "neg_parameter_file": "",
+         "msdial_config_id": "Default"})
+
+    connection.execute(insert_method)
+
+    # Execute insert of method for each biological standard
+    df_biological_standards = get_biological_standards()
+    biological_standards = df_biological_standards["name"].astype(str).unique().tolist()
+    identifiers = df_biological_standards["identifier"].astype(str).tolist()
+
+    for index, biological_standard in enumerate(biological_standards):
+        insert_method_for_bio_standard = biological_standards_table.insert().values({
+            "name": biological_standard,
+            "identifier": identifiers[index],
+            "chromatography": method_id,
+            "num_pos_features": 0,
+            "num_neg_features": 0,
+            "msdial_config_id": "Default"})
+        connection.execute(insert_method_for_bio_standard)
+
+    # Execute INSERT to database, then close the connection
+    connection.close()
+
+
+def remove_chromatography_method(method_id):
+
+    """
+    Deletes chromatography method and all associated records from the Settings database.
+
+    Details:
+        1. Removes chromatography method in "chromatography_methods" table
+        2. Removes method from "biological_standards" table
+        3. Removes associated internal standards from "internal_standards" table
+        4. Removes associated targeted features from "targeted_features" table
+        5. Deletes corresponding MSPs from folders
+        6. Deletes corresponding MSPs from Google Drive (if sync is enabled)
+
+    Args:
+        method_id (str): Name of the chromatography method
+
+    Returns:
+        None
+    """
+
+    # Delete corresponding MSPs from "methods" directory
+    df = get_table("Settings", "chromatography_methods")
+    df = df.loc[df["method_id"] == method_id]
+
+    df2 = get_table("Settings", "biological_standards")
+    df2 = df2.loc[df2["chromatography"] == method_id]
+
+    files_to_delete = df["pos_istd_msp_file"].astype(str).tolist() + df["neg_istd_msp_file"].astype(str).tolist() + \
+        df2["pos_bio_msp_file"].astype(str).tolist() + df2["neg_bio_msp_file"].astype(str).tolist()
+
+    for file in os.listdir(methods_directory):
+        if file in files_to_delete:
+            os.remove(os.path.join(methods_directory, file))
+
+    # Connect to database and get relevant tables
+    db_metadata, connection = connect_to_database("Settings")
+    chromatography_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
+    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+    internal_standards_table = sa.Table("internal_standards", db_metadata, autoload=True)
+    targeted_features_table = sa.Table("targeted_features", db_metadata, autoload=True)
+
+    delete_queries = []
+
+    # Remove from "chromatography_methods" table
+    delete_chromatography_method = (
+        sa.delete(chromatography_table)
+            .where((chromatography_table.c.method_id == method_id))
+    )
+
+    delete_queries.append(delete_chromatography_method)
+
+    # Remove all entries in other tables associated with chromatography
+    for table in [biological_standards_table, internal_standards_table, targeted_features_table]:
+        delete_from_table = (
+            sa.delete(table)
+                .where((table.c.chromatography == method_id))
+        )
+        delete_queries.append(delete_from_table)
+
+    # Execute all deletes, then close the connection
+    for query in delete_queries:
+        connection.execute(query)
+
+    connection.close()
+
+
+def update_msdial_config_for_internal_standards(chromatography, config_id):
+
+    """
+    Updates MS-DIAL configuration for a given chromatography method.
+
+    This MS-DIAL configuration will be used to generate a parameters file
+    for processing samples run with this chromatography method.
+
+    Args:
+        chromatography (str):
+            Chromatography method ID (name)
+        config_id (str):
+            MS-DIAL configuration ID (name)
+
+    Returns:
+        None
+    """
+
+    # Connect to database and get relevant tables
+    db_metadata, connection = connect_to_database("Settings")
+    methods_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
+
+    # Update MS-DIAL configuration for chromatography method
+    update_msdial_config = (
+        sa.update(methods_table)
+            .where(methods_table.c.method_id == chromatography)
+            .values(msdial_config_id=config_id)
+    )
+
+    connection.execute(update_msdial_config)
+    connection.close()
+
+
+def add_msp_to_database(msp_file, chromatography, polarity, bio_standard=None):
+
+    """
+    Parses compounds from MSP into the Settings database.
+
+    This function writes features from an MSP file into the "internal_standards" or "targeted_features" table,
+    and inserts location of pos/neg MSP files into "chromatography_methods" table.
+
+    TODO: The MSP/TXT libraries have standardized names; there is no need to store the filename in the database.
+
+    Args:
+        msp_file (io.StringIO):
+            In-memory text-stream file object
+        chromatography (str):
+            Chromatography method ID (name)
+        polarity (str):
+            Polarity for which MSP should be used for ("Positive Mode" or "Negative Mode")
+        bio_standard (str, default None):
+            Parses MSP and applies to biological standard within a chromatography-polarity combination
+
+    Returns:
+        None
+    """
+    # Connect to database
+    db_metadata, connection = connect_to_database("Settings")
+
+    # Write MSP file to folder, store file path in database (further down in function)
+    if not os.path.exists(methods_directory):
+        os.makedirs(methods_directory)
+
+    if bio_standard is not None:
+        if polarity == "Positive Mode":
+            filename = bio_standard.replace(" ", "_") + "_" + chromatography + "_Pos.msp"
+        elif polarity == "Negative Mode":
+            filename = bio_standard.replace(" ", "_") + "_" + chromatography + "_Neg.msp"
+    else:
+        if polarity == "Positive Mode":
+            filename = chromatography + "_Pos.msp"
+        elif polarity == "Negative Mode":
+            filename = chromatography + "_Neg.msp"
+
+    msp_file_path = os.path.join(methods_directory, filename)
+
+    with open(msp_file_path, "w", newline='') as file:
+        msp_file.seek(0)
+        shutil.copyfileobj(msp_file, file)
+
+    # Read MSP file
+    with open(msp_file_path, "r") as msp:
+        list_of_features = []
+
+        # Split MSP into list of compounds
+        data = msp.read().split("\n\n")
+        data = [element.split("\n") for element in data]
+
+        # Add each line of each compound into a list
+        for feature in data:
+            if len(feature) != 1:
+                list_of_features.append(feature)
+
+        features_dict = {}
+        added_features = []
+
+        # Iterate through features in MSP
+        for feature_index, feature in enumerate(list_of_features):
+
+            features_dict[feature_index] = {
+                "Name": None,
+                "Precursor m/z": None,
+                "Retention time": None,
+                "INCHIKEY": None,
+                "MS2 spectrum": None
+            }
+
+            # Iterate through each line of each feature in the MSP
+            for data_index, feature_data in enumerate(feature):
+
+                # Capture, name, inchikey, m/z, and RT
+                if "NAME" in feature_data.upper():
+                    feature_name = feature_data.split(": ")[-1]
+                    if feature_name not in added_features:
+                        added_features.append(feature_name)
+                        features_dict[feature_index]["Name"] = feature_name
+                        continue
+                    else:
+                        break
+                elif "PRECURSORMZ" in feature_data.upper():
+                    features_dict[feature_index]["Precursor m/z"] = feature_data.split(": ")[-1]
+                    continue
+                elif "INCHIKEY" in feature_data.upper():
+                    features_dict[feature_index]["INCHIKEY"] = feature_data.split(": ")[-1]
+                    continue
+                elif "RETENTIONTIME" in feature_data.upper():
+                    features_dict[feature_index]["Retention time"] = feature_data.split(": ")[-1]
+                    continue
+
+                # Capture MS2 spectrum
+                elif "Num Peaks" in feature_data:
+
+                    # Get number of peaks in MS2 spectrum
+                    num_peaks = int(feature_data.split(": ")[-1])
+
+                    # Each line in the MSP corresponds to a peak
+                    start_index = data_index + 1
+                    end_index = data_index + num_peaks + 1
+
+                    # Each peak is represented as a string e.g. "56.04977\t247187"
+                    peaks_in_spectrum = []
+                    for peak in feature[start_index:end_index]:
+                        peaks_in_spectrum.append(peak.replace("\t", ":"))
+
+                    features_dict[feature_index]["MS2 spectrum"] = str(peaks_in_spectrum)
+                    break
+
+    features_dict = { key:value for key, value in features_dict.items() if value["Name"] is not None }
+
+    # Adding MSP for biological standards
+    if bio_standard is not None:
+
+        # Get "targeted_features" table
+        targeted_features_table = sa.Table("targeted_features", db_metadata, autoload=True)
+
+        # Prepare DELETE of old targeted features
+        delete_old_targeted_features = (
+            sa.delete(targeted_features_table)
+                .where((targeted_features_table.c.chromatography == chromatography)
+                       & (targeted_features_table.c.polarity == polarity)
+                       & (targeted_features_table.c.biological_standard == bio_standard))
+        )
+
+        # Execute DELETE
+        connection.execute(delete_old_targeted_features)
+
+        # Execute INSERT of each targeted feature into targeted_features table
+        for feature in features_dict:
+            insert_feature = targeted_features_table.insert().values(
+                {"name": features_dict[feature]["Name"],
+                 "chromatography": chromatography,
+                 "polarity": polarity,
+                 "biological_standard": bio_standard,
+                 "precursor_mz": features_dict[feature]["Precursor m/z"],
+                 "retention_time": features_dict[feature]["Retention time"],
+                 "ms2_spectrum": features_dict[feature]["MS2 spectrum"],
+                 "inchikey": features_dict[feature]["INCHIKEY"]})
+            connection.execute(insert_feature)
+
+        # Get "biological_standards" table
+        biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+
+        # Write location of msp file to respective cell
+        if polarity == "Positive Mode":
+            update_msp_file = (
+                sa.update(biological_standards_table)
+                    .where((biological_standards_table.c.chromatography == chromatography)
+                           & (biological_standards_table.c.name == bio_standard))
+                    .values(num_pos_features=len(features_dict),
+                            pos_bio_msp_file=filename)
+            )
+        elif polarity == "Negative Mode":
+            update_msp_file = (
+                sa.update(biological_standards_table)
+                    .where((biological_standards_table.c.chromatography == chromatography)
+                           & (biological_standards_table.c.name == bio_standard))
+                    .values(num_neg_features=len(features_dict),
+                            neg_bio_msp_file=filename)
+            )
+
+        # Execute UPDATE of MSP file location
+        connection.execute(update_msp_file)
+
+    # Adding MSP for internal standards
+    else:
+
+        # Get internal_standards table
+        internal_standards_table = sa.Table("internal_standards", db_metadata, autoload=True)
+
+        # Prepare DELETE of old internal standards
+        delete_old_internal_standards = (
+            sa.delete(internal_standards_table)
+                .where((internal_standards_table.c.chromatography == chromatography)
+                       & (internal_standards_table.c.polarity == polarity))
+        )
+
+        # Execute DELETE
+        connection.execute(delete_old_internal_standards)
+
+        # Execute INSERT of each internal standard into internal_standards table
+        for feature in features_dict:
+            insert_feature = internal_standards_table.insert().values(
+                {"name": features_dict[feature]["Name"],
+                 "chromatography": chromatography,
+                 "polarity": polarity,
+                 "precursor_mz": features_dict[feature]["Precursor m/z"],
+                 "retention_time": features_dict[feature]["Retention time"],
+                 "ms2_spectrum": features_dict[feature]["MS2 spectrum"],
+                 "inchikey": features_dict[feature]["INCHIKEY"]})
+            connection.execute(insert_feature)
+
+        # Get "chromatography" table
+        chromatography_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
+
+        # Write location of msp file to respective cell
+        if polarity == "Positive Mode":
+            update_msp_file = (
+                sa.update(chromatography_table)
+                    .where(chromatography_table.c.method_id == chromatography)
+                    .values(num_pos_standards=len(features_dict),
+                            pos_istd_msp_file=filename)
+            )
+        elif polarity == "Negative Mode":
+            update_msp_file = (
+                sa.update(chromatography_table)
+                    .where(chromatography_table.c.method_id == chromatography)
+                    .values(num_neg_standards=len(features_dict),
+                            neg_istd_msp_file=filename)
+            )
+
+        # Execute UPDATE of MSP file location
+        connection.execute(update_msp_file)
+
+    # If the corresponding TXT library existed, delete it
+    txt_library = os.path.join(methods_directory, filename.replace(".msp", ".txt"))
+    os.remove(txt_library) if os.path.exists(txt_library) else None
+
+    # Close the connection
+    connection.close()
+
+
+def add_csv_to_database(csv_file, chromatography, polarity):
+
+    """
+    Parses compounds from a CSV file into the Settings database.
+
+    Parses compounds from a CSV into the "internal_standards" table, and stores
+    the location of the pos/neg TXT files in "chromatography_methods" table.
+
+    TODO: The MSP/TXT libraries have standardized names; there is no need to store the filename in the database.
+
+    Args:
+        csv_file (io.StringIO):
+            In-memory text-stream file object
+        chromatography (str):
+            Chromatography method ID (name)
+        polarity (str):
+            Polarity for which MSP should be used for ("Positive Mode" or "Negative Mode")
+
+    Returns:
+        None
+    """
+
+    # Convert CSV file into Python dictionary
+    df_internal_standards = pd.read_csv(csv_file, index_col=False)
+    internal_standards_dict = df_internal_standards.to_dict("index")
+
+    # Create methods directory if it doesn't already exist
+    if not os.path.exists(methods_directory):
+        os.makedirs(methods_directory)
+
+    # Name file accordingly
+    if polarity == "Positive Mode":
+        filename = chromatography + "_Pos.txt"
+    elif polarity == "Negative Mode":
+        filename = chromatography + "_Neg.txt"
+
+    txt_file_path = os.path.join(methods_directory, filename)
+
+    # Write CSV columns to tab-delimited text file
+    df_internal_standards.to_csv(txt_file_path, sep="\t", index=False)
+
+    # Connect to database
+    db_metadata, connection = connect_to_database("Settings")
+
+    # Get internal_standards table
+    internal_standards_table = sa.Table("internal_standards", db_metadata, autoload=True)
+
+    # Prepare DELETE of old internal standards
+    delete_old_internal_standards = (
+        sa.delete(internal_standards_table)
+            .where((internal_standards_table.c.chromatography == chromatography)
+                   & (internal_standards_table.c.polarity == polarity))
+    )
+
+    # Execute DELETE
+    connection.execute(delete_old_internal_standards)
+
+    # Execute INSERT of each internal standard into internal_standards table
+    for row in internal_standards_dict.keys():
+        insert_standard = internal_standards_table.insert().values(
+            {"name": internal_standards_dict[row]["Common Name"],
+             "chromatography": chromatography,
+             "polarity": polarity,
+             "precursor_mz": internal_standards_dict[row]["MS1 m/z"],
+             "retention_time": internal_standards_dict[row]["RT (min)"]})
+        connection.execute(insert_standard)
+
+    # Get "chromatography" table
+    chromatography_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
+
+    # Write location of CSV file to respective cell
+    if polarity == "Positive Mode":
+        update_msp_file = (
+            sa.update(chromatography_table)
+                .where(chromatography_table.c.method_id == chromatography)
+                .values(num_pos_standards=len(internal_standards_dict),
+                        pos_istd_msp_file=filename)
+        )
+    elif polarity == "Negative Mode":
+        update_msp_file = (
+            sa.update(chromatography_table)
+                .where(chromatography_table.c.method_id == chromatography)
+                .values(num_neg_standards=len(internal_standards_dict),
+                        neg_istd_msp_file=filename)
+        )
+
+    # Execute UPDATE of CSV file location
+    connection.execute(update_msp_file)
+
+    # If the corresponding MSP library existed, delete it
+    msp_library = os.path.join(methods_directory, filename.replace(".txt", ".msp"))
+    os.remove(msp_library) if os.path.exists(msp_library) else None
+
+    # Close the connection
+    connection.close()
+
+
+def get_msdial_configurations():
+
+    """
+    Returns list of user configurations of MS-DIAL parameters from Settings database.
+    """
+
+    engine = sa.create_engine(settings_database)
+    df_msdial_configurations = pd.read_sql("SELECT * FROM msdial_parameters", engine)
+    return df_msdial_configurations["config_name"].astype(str).tolist()
+
+
+def generate_msdial_parameters_file(chromatography, polarity, msp_file_path, bio_standard=None):
+
+    """
+    Uses parameters from user-curated MS-DIAL configuration to create a parameters.txt file for MS-DIAL.
+
+    TODO: Currently, this function is only called upon a new job setup. To allow changes during a QC job,
+        this function should be called every time the user makes a configuration save in Settings > MS-DIAL Configurations.
+
+    Args:
+        chromatography (str):
+            Chromatography method ID (name)
+        polarity (str):
+            Polarity ("Positive" or "Negative")
+        msp_file_path (str):
+            MSP library file path
+        bio_standard (str, default None):
+            Specifies that the parameters file is for a biological standard
+
+    Returns:
+        None
+    """
+
+    # Get parameters of selected configuration
+    if bio_standard is not None:
+        df_bio_standards = get_biological_standards()
+        df_bio_standards = df_bio_standards.loc[
+            (df_bio_standards["chromatography"] == chromatography) & (df_bio_standards["name"] == bio_standard)]
+        config_name = df_bio_standards["msdial_config_id"].astype(str).values[0]
+    else:
+        df_methods = get_chromatography_methods()
+        df_methods = df_methods.loc[df_methods["method_id"] == chromatography]
+        config_name = df_methods["msdial_config_id"].astype(str).values[0]
+
+    parameters = get_msdial_configuration_parameters(config_name)
+
+    # Create "methods" directory if it does not exist
+    if not os.path.exists(methods_directory):
+        os.makedirs(methods_directory)
+
+    # Name parameters file accordingly
+    if bio_standard is not None:
+        if polarity == "Positive":
+            filename = bio_standard.replace(" ", "_") + "_" + config_name.replace(" ", "_") + "_Parameters_Pos.txt"
+        elif polarity == "Negative":
+            filename = bio_standard.replace(" ", "_") + "_" + config_name.replace(" ", "_") + "_Parameters_Neg.txt"
+    else:
+        if polarity == "Positive":
+            filename = chromatography.replace(" ", "_") + "_" + config_name.replace(" ", "_") + "_Parameters_Pos.txt"
+        elif polarity == "Negative":
+            filename = chromatography.replace(" ", "_") + "_" + config_name.replace(" ", "_") + "_Parameters_Neg.txt"
+
+    parameters_file = os.path.join(methods_directory, filename)
+
+    # Some specifications based on polarity / file type for the parameters
+    if polarity == "Positive":
+        adduct_type = "[M+H]+"
+    elif polarity == "Negative":
+        adduct_type = "[M-H]-"
+
+    if msp_file_path.endswith(".msp"):
+        filepath = "MSP file: " + msp_file_path
+    elif msp_file_path.endswith(".txt"):
+        filepath = "Text file: " + msp_file_path
+
+    # Text file contents
+    lines = [
+        "#Data type",
+        "MS1 data type: Centroid",
+        "MS2 data type: Centroid",
+        "Ion mode: " + polarity,
+        "DIA file:", "\n"
+
+        "#Data collection parameters",
+        "Retention time begin: " + str(parameters[0]),
+        "Retention time end: " + str(parameters[1]),
+        "Mass range begin: " + str(parameters[2]),
+        "Mass range end: " + str(parameters[3]), "\n",
+
+        "#Centroid parameters",
+        "MS1 tolerance for centroid: " + str(parameters[4]),
+        "MS2 tolerance for centroid: " + str(parameters[5]), "\n",
+
+        "#Peak detection parameters",
+        "Smoothing method: " + str(parameters[6]),
+        "Smoothing level: " + str(parameters[7]),
+        "Minimum peak width: " + str(parameters[8]),
+        "Minimum peak height: " + str(parameters[9]),
+        "Mass slice width: " + str(parameters[10]), "\n",
+
+        "#Deconvolution parameters",
+        "Sigma window value: 0.5",
+        "Amplitude cut off: 0", "\n",
+
+        "#Adduct list",
+        "Adduct list: " + adduct_type, "\n",
+
+        "#Text file and post identification (retention time and accurate mass based) setting",
+        filepath,
+        "Retention time tolerance for post identification: " + str(parameters[11]),
+        "Accurate ms1 tolerance for post identification: " + str(parameters[12]),
+        "Post identification score cut off: " + str(parameters[13]), "\n",
+
+        "#Alignment parameters setting",
+        "Retention time tolerance for alignment: " + str(parameters[14]),
+        "MS1 tolerance for alignment: " + str(parameters[15]),
+        "Retention time factor for alignment: " + str(parameters[16]),
+        "MS1 factor for alignment: " + str(parameters[17]),
+        "Peak count filter: " + str(parameters[18]),
+        "QC at least filter: " + str(parameters[19]),
+    ]
+
+    # Write parameters to a text file
+    with open(parameters_file, "w") as file:
+        for line in lines:
+            file.write(line)
+            if line != "\n":
+                file.write("\n")
+
+    # Write path of parameters text file to chromatography method in database
+    db_metadata, connection = connect_to_database("Settings")
+    chromatography_table = sa.Table("chromatography_methods", db_metadata, autoload=True)
+    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+
+    # For processing biological standard samples
+    if bio_standard is not None:
+        if polarity == "Positive":
+            update_parameter_file = (
+                sa.update(biological_standards_table)
+                    .where((biological_standards_table.c.chromatography == chromatography)
+                           & (biological_standards_table.c.name == bio_standard))
+                    .values(pos_parameter_file=parameters_file)
+            )
+        elif polarity == "Negative":
+            update_parameter_file = (
+                sa.update(biological_standards_table)
+                    .where((biological_standards_table.c.chromatography == chromatography)
+                           & (biological_standards_table.c.name == bio_standard))
+                    .values(neg_parameter_file=parameters_file)
+            )
+    # For processing samples with internal standards
+    else:
+        if polarity == "Positive":
+            update_parameter_file = (
+                sa.update(chromatography_table)
+                    .where(chromatography_table.c.method_id == chromatography)
+                    .values(pos_parameter_file=parameters_file)
+            )
+        elif polarity == "Negative":
+            update_parameter_file = (
+                sa.update(chromatography_table)
+                    .where(chromatography_table.c.method_id == chromatography)
+                    .values(neg_parameter_file=parameters_file)
+            )
+
+    connection.execute(update_parameter_file)
+    connection.close()
+
+
+def add_msdial_configuration(msdial_config_name):
+
+    """
+    Inserts new user configuration of MS-DIAL parameters into the "msdial_parameters" table in Settings database.
+
+    Args:
+        msdial_config_name (str): MS-DIAL configuration ID
+
+    Returns:
+        None
+    """
+
+    # Connect to database
+    db_metadata, connection = connect_to_database("Settings")
+
+    # Get MS-DIAL parameters table
+    msdial_parameters_table = sa.Table("msdial_parameters", db_metadata, autoload=True)
+
+    # Prepare insert of user-inputted run data
+    insert_config = msdial_parameters_table.insert().values(
+        {"config_name": msdial_config_name,
+         "rt_begin": 0,
+         "rt_end": 100,
+         "mz_begin": 0,
+         "mz_end": 2000,
+         "ms1_centroid_tolerance": 0.008,
+         "ms2_centroid_tolerance": 0.01,
+         "smoothing_method": "LinearWeightedMovingAverage",
+         "smoothing_level": 3,
+         "min_peak_width": 3,
+         "min_peak_height": 35000,
+         "mass_slice_width": 0.1,
+         "post_id_rt_tolerance": 0.3,
+         "post_id_mz_tolerance": 0.008,
+         "post_id_score_cutoff": 85,
+         "alignment_rt_tolerance": 0.05,
+         "alignment_mz_tolerance": 0.008,
+         "alignment_rt_factor": 0.5,
+         "alignment_mz_factor": 0.5,
+         "peak_count_filter": 0,
+         "qc_at_least_filter": "True"}
+    )
+
+    # Execute INSERT to database, then close the connection
+    connection.execute(insert_config)
+    connection.close()
+
+
+def remove_msdial_configuration(msdial_config_name):
+
+    """
+    Deletes user configuration of MS-DIAL parameters from the "msdial_parameters" table.
+
+    Args:
+        msdial_config_name (str): MS-DIAL configuration ID
+
+    Returns:
+        None
+    """
+
+    # Connect to database
+    db_metadata, connection = connect_to_database("Settings")
+
+    # Get MS-DIAL parameters table
+    msdial_parameters_table = sa.Table("msdial_parameters", db_metadata, autoload=True)
+
+    # Prepare DELETE of MS-DIAL configuration
+    delete_config = (
+        sa.delete(msdial_parameters_table)
+            .where(msdial_parameters_table.c.config_name == msdial_config_name)
+    )
+
+    # Execute DELETE, then close the connection
+    connection.execute(delete_config)
+    connection.close()
+
+
+def get_msdial_configuration_parameters(msdial_config_name, parameter=None):
+
+    """
+    Returns tuple of parameters defined for a selected MS-DIAL configuration.
+
+    TODO: The MS-DIAL configuration is returned as a tuple for a concise implementation of get_msdial_parameters_for_config()
+        in the DashWebApp module. While convenient there, this function is not optimal for maintainability. Should return
+        the entire DataFrame record instead.
+
+    See update_msdial_configuration() for details on parameters.
+
+    Args:
+        msdial_config_name (str):
+            MS-DIAL configuration ID
+        parameter (str, default None):
+            If specified, returns only the value for the given parameter
+
+    Returns:
+        Tuple of parameters for the given MS-DIAL configuration, or single parameter value.
+    """
+
+    # Get "msdial_parameters" table from database as a DataFrame
+    engine = sa.create_engine(settings_database)
+    df_configurations = pd.read_sql("SELECT * FROM msdial_parameters", engine)
+
+    # Get selected configuration
+    selected_config = df_configurations.loc[
+        df_configurations["config_name"] == msdial_config_name]
+
+    selected_config.drop(["id", "config_name"], inplace=True, axis=1)
+
+    if parameter is not None:
+        return selected_config[parameter].values[0]
+    else:
+        return tuple(selected_config.to_records(index=False)[0])
+
+
+def update_msdial_configuration(config_name, rt_begin, rt_end, mz_begin, mz_end, ms1_centroid_tolerance,
+    ms2_centroid_tolerance, smoothing_method, smoothing_level, mass_slice_width, min_peak_width, min_peak_height,
+    post_id_rt_tolerance, post_id_mz_tolerance, post_id_score_cutoff, alignment_rt_tolerance, alignment_mz_tolerance,
+    alignment_rt_factor, alignment_mz_factor, peak_count_filter, qc_at_least_filter):
+
+    """
+    Updates and saves changes of all parameters for a selected MS-DIAL configuration.
+
+    For details on MS-DIAL parameters, see: https://mtbinfo-team.github.io/mtbinfo.github.io/MS-DIAL/tutorial#section-2-3
+
+    Args:
+        config_name (str):
+            Name / ID of MS-DIAL configuration
+        rt_begin (int):
+            Minimum retention time in RT range for analysis range
+        rt_end (int):
+            Maximum retention time in RT range for analysis
+        mz_begin (float):
+            Minimum precursor mass in m/z range for analysis range
+        mz_end (float):
+            Maximum precursor mass in m/z range for analysis range
+        ms1_centroid_tolerance (float):
+            MS1 centroid tolerance
+        ms2_centroid_tolerance (float):
+            MS2 centroid tolerance
+        smoothing_method (str):
+            Peak smoothing method for peak detection
+        smoothing_level (int):
+            Peak smoothing level
+        mass_slice_width (float):
+            Mass slice width
+        min_peak_width (int):
+            Minimum peak width threshold
+        min_peak_height (int):
+            Minimum peak height threshold
+        post_id_rt_tolerance (float):
+            Post-identification retention time tolerance
+        post_id_mz_tolerance (float):
+            Post-identification precursor m/z tolerance
+        post_id_score_cutoff (int):
+            Similarity score cutoff after peak identification
+        alignment_rt_tolerance (float):
+            Post-alignment retention time tolerance
+        alignment_mz_tolerance (float):
+            Post-alignment precursor m/z tolerance
+        alignment_rt_factor (float):
+            Post-alignment retention time factor
+        alignment_mz_factor (float):
+            Post-alignment precursor m/z tolerance
+        peak_count_filter (int):
+            Peak count filter
+        qc_at_least_filter (str):
+            QC at least filter
+
+    Returns:
+        None
+    """
+
+    # Connect to database
+    db_metadata, connection = connect_to_database("Settings")
+
+    # Get MS-DIAL parameters table
+    msdial_parameters_table = sa.Table("msdial_parameters", db_metadata, autoload=True)
+
+    # Prepare insert of user-inputted MS-DIAL parameters
+    update_parameters = (
+        sa.update(msdial_parameters_table)
+            .where(msdial_parameters_table.c.config_name == config_name)
+            .values(rt_begin=rt_begin,
+                    rt_end=rt_end,
+                    mz_begin=mz_begin,
+                    mz_end=mz_end,
+                    ms1_centroid_tolerance=ms1_centroid_tolerance,
+                    ms2_centroid_tolerance=ms2_centroid_tolerance,
+                    smoothing_method=smoothing_method,
+                    smoothing_level=smoothing_level,
+                    min_peak_width=min_peak_width,
+                    min_peak_height=min_peak_height,
+                    mass_slice_width=mass_slice_width,
+                    post_id_rt_tolerance=post_id_rt_tolerance,
+                    post_id_mz_tolerance=post_id_mz_tolerance,
+                    post_id_score_cutoff=post_id_score_cutoff,
+                    alignment_rt_tolerance=alignment_rt_tolerance,
+                    alignment_mz_tolerance=alignment_mz_tolerance,
+                    alignment_rt_factor=alignment_rt_factor,
+                    alignment_mz_factor=alignment_mz_factor,
+                    peak_count_filter=peak_count_filter,
+                    qc_at_least_filter=qc_at_least_filter)
+    )
+
+    # Execute UPDATE to database, then close the connection
+    connection.execute(update_parameters)
+    connection.close()
+
+
+def get_msp_file_path(chromatography, polarity, bio_standard=None):
+
+    """
+    Returns file paths of MSPs for a selected chromatography / polarity (both stored
+    in the methods folder upon user upload) for MS-DIAL parameter file generation.
+
+    TODO: Once added to workspace, MSP / TXT library file names are standardized. No need to store / retrieve from database.
+        Get the file path using the filename e.g. return directory + chromatography + "_" + polarity + ".msp".
+
+    Args:
+        chromatography (str):
+            Chromatography method ID
+        polarity (str):
+            Polarity, either "Positive" or "Negative"
+        bio_standard (str, default None):
+            Name of biological standard
+
+    Returns:
+        MSP / TXT library file path.
+    """
+
+    # Connect to database
+    engine = sa.create_engine(settings_database)
+
+    if bio_standard is not None:
+        # Get selected biological standard
+        query = sa.text("SELECT * FROM biological_standards WHERE name = :bio_standard AND chromatography = :chromatography").\
+                        bindparams(bio_standard=bio_standard, chromatography=chromatography)
+        df_biological_standards = pd.read_sql(query, engine)
+
+        # Get file path of MSP in requested polarity
+        if polarity == "Positive":
+            msp_file_path = df_biological_standards["pos_bio_msp_file"].astype(str).values[0]
+        elif polarity == "Negative":
+            msp_file_path = df_biological_standards["neg_bio_msp_file"].astype(str).values[0]
+
+    else:
+        # Get selected chromatography method
+        query = sa.text("SELECT * FROM chromatography_methods WHERE method_id = :chromatography").\
+                        bindparams(chromatography=chromatography)
+        df_methods = pd.read_sql(query, engine)
+
+        # Get file path of MSP in requested polarity
+        if polarity == "Positive":
+            msp_file_path = df_methods["pos_istd_msp_file"].astype(str).values[0]
+        elif polarity == "Negative":
+            msp_file_path = df_methods["neg_istd_msp_file"].astype(str).values[0]
+
+    msp_file_path = os.path.join(methods_directory, msp_file_path)
+
+    # Return file path
+    return msp_file_path
+
+
+def get_parameter_file_path(chromatography, polarity, biological_standard=None):
+
+    """
+    Returns file path of parameters file stored in database.
+
+    TODO: Once generated, MS-DIAL parameter filenames are standardized. No need to store / retrieve from database.
+        Get the file path using the filename e.g. return directory + chromatography + "_" + polarity + "_Parameters.txt".
+
+    Args:
+        chromatography (str):
+            Chromatography method ID
+        polarity (str):
+            Polarity, either "Positive" or "Negative"
+        bio_standard (str, default None):
+            Name of biological standard
+
+    Returns:
+        File path for MS-DIAL parameters.txt file.
+    """
+
+    engine = sa.create_engine(settings_database)
+
+    if biological_standard is not None:
+        query = sa.text("SELECT * FROM biological_standards WHERE chromatography = :chromatography AND name = :bio_standard").\
+                        bindparams(bio_standard=biological_standard, chromatography=chromatography)
+    else:
+        query = sa.text("SELECT * FROM chromatography_methods WHERE method_id = :chromatography").\
+                        bindparams(chromatography=chromatography)
+
+    df = pd.read_sql(query, engine)
+
+    if polarity == "Pos":
+        parameter_file = df["pos_parameter_file"].astype(str).values[0]
+    elif polarity == "Neg":
+        parameter_file = df["neg_parameter_file"].astype(str).values[0]
+
+    return parameter_file
+
+
+def get_msdial_directory():
+
+    """
+    Returns location of MS-DIAL directory.
+    """
+
+    return get_table("Settings", "workspace")["msdial_directory"].astype(str).values[0]
+
+
+def get_msconvert_directory():
+
+    """
+    Returns location of MSConvert directory.
+
+    This function uses the MS-DIAL directory path to retrieve user ID, which it then uses to
+    retrieve the path for MSConvert.exe in C:/Users/<username>/AppData/Local/Apps.
+
+    TODO: There is probably a better way to implement this.
+
+    Returns:
+        Location of MSConvert directory in C:/Users/<username>/AppData/Local/Apps/ProteoWizard.
+    """
+
+    user = get_msdial_directory().replace("\\", "/").split("/")[2]
+    msconvert_folder = [f.path for f in os.scandir("C:/Users/" + user + "/AppData/Local/Apps/") if f.is_dir() and "ProteoWizard" in f.name][0]
+    return msconvert_folder
+
+
+def update_msdial_directory(msdial_directory):
+
+    """
+    Updates location of MS-DIAL directory, stored in "workspace" table of the Settings database.
+
+    Args:
+        msdial_directory (str): New MS-DIAL directory location
+
+    Returns:
+        None
+    """
+
+    db_metadata, connection = connect_to_database("Settings")
+    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
+
+    update_msdial_directory = (
+        sa.update(workspace_table)
+            .where(workspace_table.c.id == 1)
+            .values(msdial_directory=msdial_directory)
+    )
+
+    connection.execute(update_msdial_directory)
+    connection.close()
+
+
+def get_internal_standards_dict(chromatography, value_type):
+
+    """
+    Returns dictionary of internal standard keys mapped to either m/z or RT values.
+
+    This function is used to establish a y-axis range for internal standard retention time plots.
+    See load_istd_rt_plot() in the PlotGeneration module.
+
+    TODO: This function needs to filter for polarity!
+
+    Args:
+        chromatography (str):
+            Chromatography method to retrieve internal standards for
+        value_type (str):
+            Data type ("precursor_mz", "retention_time", "ms2_spectrum")
+
+    Returns:
+        Dictionary with key-value pairs of { internal_standard: value_type }
+    """
+
+    engine = sa.create_engine(settings_database)
+    query = sa.text("SELECT * FROM internal_standards WHERE chromatography = :chromatography").\
+                    bindparams(chromatography=chromatography)
+    df_internal_standards = pd.read_sql(query, engine)
+
+    dict = {}
+    keys = df_internal_standards["name"].astype(str).tolist()
+    values = df_internal_standards[value_type].astype(float).tolist()
+
+    for index, key in enumerate(keys):
+        dict[key] = values[index]
+
+    return dict
+
+
+def get_internal_standards(chromatography, polarity):
+
+    """
+    Returns DataFrame of internal standards for a given chromatography method and polarity.
+
+    Args:
+        chromatography (str):
+            Chromatography method ID
+        polarity (str):
+            Polarity (either "Pos" or "Neg")
+
+    Returns:
+        DataFrame of "internal_standards" table from Settings database, filtered by chromatography and polarity.
+    """
+
+    if polarity == "Pos":
+        polarity = "Positive Mode"
+    elif polarity == "Neg":
+        polarity = "Negative Mode"
+
+    engine = sa.create_engine(settings_database)
+    query = sa.text("SELECT * FROM internal_standards WHERE chromatography = :chromatography AND polarity = :polarity").\
+                bindparams(chromatography=chromatography, polarity=polarity)
+    return pd.read_sql(query, engine)
+
+
+def get_targeted_features(biological_standard, chromatography, polarity):
+
+    """
+    Returns DataFrame of metabolite targets for a given biological standard, chromatography, and polarity.
+
+    Args:
+        biological_standard (str):
+            Name of biological standard
+        chromatography (str):
+            Chromatography method ID (name)
+        polarity (str):
+            Polarity (either "Pos" or "Neg")
+
+    Returns:
+        DataFrame of "targeted_features" table from Settings database, filtered by chromatography and polarity.
+    """
+
+    if polarity == "Pos":
+        polarity = "Positive Mode"
+    elif polarity == "Neg":
+        polarity = "Negative Mode"
+
+    engine = sa.create_engine(settings_database)
+
+    query = sa.text("SELECT * FROM targeted_features WHERE chromatography = :chromatography AND polarity = :polarity AND biological_standard = :biostnd").\
+                bindparams(chromatography=chromatography, polarity=polarity, biostnd=biological_standard)
+
+    return pd.read_sql(query, engine)
+
+
+def get_biological_standards():
+
+    """
+    Returns DataFrame of the "biological_standards" table from the Settings database.
+    """
+
+    # Get table from database as a DataFrame
+    engine = sa.create_engine(settings_database)
+    df_biological_standards = pd.read_sql("SELECT * FROM biological_standards", engine)
+    return df_biological_standards
+
+
+def get_biological_standards_list():
+
+    """
+    Returns list of biological standards from the Settings database.
+    """
+
+    df_biological_standards = get_biological_standards()
+    return df_biological_standards["name"].astype(str).unique().tolist()
+
+
+def add_biological_standard(name, identifier):
+
+    """
+    Creates new biological standard with name and identifier.
+
+    The biological standard identifier is a text substring used to distinguish between sample and biological standard.
+    Rapid-QC-MS checks filenames in the sequence for this identifier to process samples accordingly.
+
+    Args:
+        name (str):
+            Name of biological standard
+        identifier (str):
+            String identifier in filename for biological standard
+
+    Returns:
+        None
+    """
+
+    # Get list of chromatography methods
+    chromatography_methods = get_chromatography_methods()["method_id"].tolist()
+
+    # Connect to database and get "biological_standards" table
+    db_metadata, connection = connect_to_database("Settings")
+    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+
+    # Insert a biological standard row for each chromatography
+    for method in chromatography_methods:
+        insert = biological_standards_table.insert().values({
+            "name": name,
+            "identifier": identifier,
+            "chromatography": method,
+            "num_pos_features": 0,
+            "num_neg_features": 0,
+            "msdial_config_id": "Default"
+        })
+        connection.execute(insert)
+
+    # Close the connection
+    connection.close()
+
+
+def remove_biological_standard(name):
+
+    """
+    Deletes biological standard and corresponding MSPs from Settings database.
+
+    Args:
+        name (str): Name of the biological standard
+
+    Returns:
+        None
+    """
+
+    # Delete corresponding MSPs from "methods" directory
+    df = get_table("Settings", "biological_standards")
+    df = df.loc[df["name"] == name]
+    files_to_delete = df["pos_bio_msp_file"].astype(str).tolist() + df["neg_bio_msp_file"].astype(str).tolist()
+
+    for file in os.listdir(methods_directory):
+        if name in files_to_delete:
+            os.remove(os.path.join(methods_directory, file))
+
+    # Connect to database and get relevant tables
+    db_metadata, connection = connect_to_database("Settings")
+    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+    targeted_features_table = sa.Table("targeted_features", db_metadata, autoload=True)
+
+    # Remove biological standard
+    delete_biological_standard = (
+        sa.delete(biological_standards_table)
+            .where((biological_standards_table.c.name == name))
+    )
+    connection.execute(delete_biological_standard)
+
+    # Remove targeted features for that biological standard
+    delete_targeted_features = (
+        sa.delete(targeted_features_table)
+            .where((targeted_features_table.c.biological_standard == name))
+    )
+    connection.execute(delete_targeted_features)
+
+    # Close the connection
+    connection.close()
+
+
+def update_msdial_config_for_bio_standard(biological_standard, chromatography, config_id):
+
+    """
+    Updates MS-DIAL configuration for given biological standard and chromatography method combination.
+
+    Args:
+        biological_standard (str):
+            Name of the biological standard
+        chromatography (str):
+            Chromatography method
+        config_id (str):
+            Name of MS-DIAL configuration to set for this biological standard - chromatography combination
+
+    Returns:
+        None
+    """
+
+    # Connect to database and get relevant tables
+    db_metadata, connection = connect_to_database("Settings")
+    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+
+    # Update MS-DIAL configuration for biological standard
+    update_msdial_config = (
+        sa.update(biological_standards_table)
+            .where((biological_standards_table.c.name == biological_standard)
+                   & (biological_standards_table.c.chromatography == chromatography))
+            .values(msdial_config_id=config_id)
+    )
+
+    connection.execute(update_msdial_config)
+    connection.close()
+
+
+def get_biological_standard_identifiers(bio_standards=None):
+
+    """
+    Returns dictionary of identifiers for a given list of biological standards.
+
+    If no list is provided, returns dict of identifiers for all biological standards.
+
+    Args:
+        bio_standards (list, default None): List of biological standards
+
+    Returns:
+        Dictionary with key-value pairs of { identifier: biological_standard }
+    """
+
+    df_bio_standards = get_biological_standards()
+
+    identifiers = {}
+
+    if bio_standards is not None:
+        if len(bio_standards) > 0:
+            for bio_standard in bio_standards:
+                df = df_bio_standards.loc[df_bio_standards["name"] == bio_standard]
+                identifier = df["identifier"].astype(str).unique().tolist()[0]
+                identifiers[identifier] = bio_standard
+    else:
+        names = df_bio_standards["name"].astype(str).unique().tolist()
+        ids = df_bio_standards["identifier"].astype(str).unique().tolist()
+        for index, name in enumerate(names):
+            identifiers[ids[index]] = names[index]
+
+    return identifiers
+
+
+def get_qc_configurations():
+
+    """
+    Returns DataFrame of "qc_parameters" table from Settings database.
+    """
+
+    engine = sa.create_engine(settings_database)
+    return pd.read_sql("SELECT * FROM qc_parameters", engine)
+
+
+def get_qc_configurations_list():
+
+    """
+    Returns list of names of QC configurations from Settings database.
+    """
+
+    return get_qc_configurations()["config_name"].astype(str).tolist()
+
+
+def add_qc_configuration(qc_config_name):
+
+    """
+    Adds a new QC configuration to the "qc_parameters" table in the Settings database.
+
+    Args:
+        qc_config_name (str): Name of the QC configuration
+
+    Returns:
+        None
+    """
+
+    # Connect to database
+    db_metadata, connection = connect_to_database("Settings")
+
+    # Get QC parameters table
+    qc_parameters_table = sa.Table("qc_parameters", db_metadata, autoload=True)
+
+    # Prepare insert of user-inputted run data
+    insert_config = qc_parameters_table.insert().values(
+        {"config_name": qc_config_name,
+         "intensity_dropouts_cutoff": 4,
+         "library_rt_shift_cutoff": 0.1,
+         "in_run_rt_shift_cutoff": 0.05,
+         "library_mz_shift_cutoff": 0.005,
+         "intensity_enabled": True,
+         "library_rt_enabled": True,
+         "in_run_rt_enabled": True,
+         "library_mz_enabled": True}
+    )
+
+    # Execute INSERT to database, then close the connection
+    connection.execute(insert_config)
+    connection.close()
+
+
+def remove_qc_configuration(qc_config_name):
+
+    """
+    Deletes QC configuration from the "qc_parameters" table in the Settings database.
+
+    Args:
+        qc_config_name (str): Name of the QC configuration
+
+    Returns:
+        None
+    """
+
+    # Connect to database
+    db_metadata, connection = connect_to_database("Settings")
+
+    # Get QC parameters table
+    qc_parameters_table = sa.Table("qc_parameters", db_metadata, autoload=True)
+
+    # Prepare DELETE of MS-DIAL configuration
+    delete_config = (
+        sa.delete(qc_parameters_table)
+            .where(qc_parameters_table.c.config_name == qc_config_name)
+    )
+
+    # Execute DELETE, then close the connection
+    connection.execute(delete_config)
+    connection.close()
+
+
+def get_qc_configuration_parameters(config_name=None, instrument_id=None, run_id=None):
+
+    """
+    Returns DataFrame of parameters for a selected QC configuration.
+
+    The DataFrame has columns for each parameter, as well as for whether the parameter is enabled.
+
+    Args:
+        config_name (str, default None):
+            Name of QC configuration
+        instrument_id (str, default None):
+            Instrument ID (name)
+        run_id (str, default None):
+            Instrument run ID (job ID)
+
+    Returns:
+        DataFrame of parameters for QC configuration.
+    """
+
+    df_configurations = get_table("Settings", "qc_parameters")
+
+    # Get selected configuration
+    if config_name is not None:
+        selected_config = df_configurations.loc[df_configurations["config_name"] == config_name]
+
+    elif instrument_id is not None and run_id is not None:
+        df_runs = get_table(instrument_id, "runs")
+        config_name = df_runs.loc[df_runs["run_id"] == run_id]["qc_config_id"].values[0]
+        selected_config = df_configurations.loc[
+            df_configurations["config_name"] == config_name]
+
+    selected_config.drop(inplace=True, columns=["id", "config_name"])
+
+    # Probably not the most efficient way to do this...
+    for column in ["intensity_enabled", "library_rt_enabled", "in_run_rt_enabled", "library_mz_enabled"]:
+        selected_config.loc[selected_config[column] == 1, column] = True
+        selected_config.loc[selected_config[column] == 0, column] = False
+
+    # Return parameters of selected configuration as a tuple
+    return selected_config
+
+
+def update_qc_configuration(config_name, intensity_dropouts_cutoff, library_rt_shift_cutoff, in_run_rt_shift_cutoff,
+    library_mz_shift_cutoff, intensity_enabled, library_rt_enabled, in_run_rt_enabled, library_mz_enabled):
+
+    """
+    Updates parameters for the given QC configuration.
+
+    Due to the database schema, booleans are stored as integers: 0 for False and 1 for True. They need to be
+    cast back to booleans in get_qc_configuration_parameters(). A schema change would remove the bloat.
+
+    Args:
+        config_name (str):
+            Name of QC configuration
+        intensity_dropouts_cutoff (int):
+            Minimum number of internal standard intensity dropouts to constitute a QC fail
+        library_rt_shift_cutoff (float):
+            Maximum shift from library RT values to constitute a QC fail
+        in_run_rt_shift_cutoff (float):
+            Maximum shift from in-run RT values to constitute a QC fail
+        library_mz_shift_cutoff (float):
+            Maximum shift from library m/z values to constitute a QC fail
+        intensity_enabled (bool):
+            Enables / disables QC check for intensity dropout cutoffs
+        library_rt_enabled (bool):
+            Enables / disables QC check for library RT shifts
+        in_run_rt_enabled (bool):
+            Enables / disables QC check for in-run RT shifts
+        library_mz_enabled (bool):
+            Enables / disables QC check for library m/z shifts
+
+    Returns:
+        None
+    """
+
+    # Connect to database
+    db_metadata, connection = connect_to_database("Settings")
+
+    # Get QC parameters table
+    qc_parameters_table = sa.Table("qc_parameters", db_metadata, autoload=True)
+
+    # Prepare insert of user-inputted QC parameters
+    update_parameters = (
+        sa.update(qc_parameters_table)
+            .where(qc_parameters_table.c.config_name == config_name)
+            .values(intensity_dropouts_cutoff=intensity_dropouts_cutoff,
+                    library_rt_shift_cutoff=library_rt_shift_cutoff,
+                    in_run_rt_shift_cutoff=in_run_rt_shift_cutoff,
+                    library_mz_shift_cutoff=library_mz_shift_cutoff,
+                    intensity_enabled=intensity_enabled,
+                    library_rt_enabled=library_rt_enabled,
+                    in_run_rt_enabled=in_run_rt_enabled,
+                    library_mz_enabled=library_mz_enabled)
+    )
+
+    # Execute UPDATE to database, then close the connection
+    connection.execute(update_parameters)
+    connection.close()
+
+
+def get_samples_in_run(instrument_id, run_id, sample_type="Both"):
+
+    """
+    Returns DataFrame of samples for a given instrument run from instrument database.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        sample_type (str):
+            Sample type, either "Specimen" or "Biological Standard" or "Both"
+
+    Returns:
+        DataFrame of sample tables for a given instrument run.
+    """
+    log.debug("get_samples_in_run local variables")
+    log.debug(locals())
+    if sample_type == "Specimen":
+        df = get_table(instrument_id, "sample_qc_results")
+
+    elif sample_type == "Biological Standard":
+        df = get_table(instrument_id, "bio_qc_results")
+
+    elif sample_type == "Both":
+        df_samples = get_table(instrument_id, "sample_qc_results")
+        df_bio_standards = get_table(instrument_id, "bio_qc_results")
+        df_bio_standards.drop(columns=["biological_standard"], inplace=True)
+        df = pd.concat([df_bio_standards, df_samples], ignore_index=True)
+    #log.debug("get_samples_in_run returns: {}".format(df.loc[df['run_id'] == run_id))
+    return df.loc[df["run_id"] == run_id]
+
+
+def get_samples_from_csv(instrument_id, run_id, sample_type="Both"):
+
+    """
+    Returns DataFrame of samples in a given run using CSV files from Google Drive.
+
+    CSV files of the run metadata, samples, and biological standards tables are stored
+    in the ../data/Instrument_ID_Run_ID/csv directory, and removed on job completion.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        sample_type (str):
+            Sample type, either "Specimen" or "Biological Standard" or "Both"
+
+    Returns:
+        DataFrame of samples for a given instrument run.
+    """
+
+    id = instrument_id.replace(" ", "_") + "_" + run_id
+    csv_directory = os.path.join(data_directory, id, "csv")
+
+    samples_csv = os.path.join(csv_directory, "samples.csv")
+    bio_standards_csv = os.path.join(csv_directory, "bio_standards.csv")
+
+    if sample_type == "Specimen":
+        df = pd.read_csv(samples_csv, index_col=False)
+
+    elif sample_type == "Biological Standard":
+        df = pd.read_csv(bio_standards_csv, index_col=False)
+
+    elif sample_type == "Both":
+        df_samples = pd.read_csv(samples_csv, index_col=False)
+        df_bio_standards = pd.read_csv(bio_standards_csv, index_col=False)
+        df_bio_standards.drop(columns=["biological_standard"], inplace=True)
+        #df = df_bio_standards.append(df_samples, ignore_index=True)
+        df = pd.concat([df_bio_standards, df_samples], ignore_index=True)
+
+    df = df.loc[df["run_id"] == run_id]
+
+    try:
+        df.drop(columns=["id"], inplace=True)
+    finally:
+        return df
+
+
+def get_next_sample(sample_id, instrument_id, run_id):
+
+    """
+    Returns sample following the given sample, or None if last sample.
+
+    Args:
+        sample_id (str):
+            Sample ID
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+
+    Returns:
+        str: The next sample in the instrument run after the given sample ID, or None if last sample.
+    """
+
+    # Get list of samples in run
+    samples = get_samples_in_run(instrument_id, run_id, "Both")["sample_id"].astype(str).tolist()
+
+    # Find sample in list
+    sample_index = samples.index(sample_id)
+    next_sample_index = sample_index + 1
+
+    # Return next sample
+    if next_sample_index != len(samples):
+        return samples[next_sample_index]
+    else:
+        return None
+
+
+def get_remaining_samples(instrument_id, run_id):
+
+    """
+    Returns list of samples remaining in a given instrument run (QC job).
+
+    TODO: This function should just return the samples with null values in the "qc_result" column.
+        The "latest_sample" value in the "runs" table may be unreliable.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+
+    Returns:
+        list: List of samples remaining in a QC job.
+    """
+
+    # Get last processed sample in run
+    df_run = get_instrument_run(instrument_id, run_id)
+    latest_sample = df_run["latest_sample"].astype(str).values[0]
+
+    # Get list of samples in run
+    samples = get_samples_in_run(instrument_id, run_id, "Both")["sample_id"].astype(str).tolist()
+
+    # Return all samples if beginning of run
+    if latest_sample == "None":
+        return samples
+
+    # Get index of latest sample
+    latest_sample_index = samples.index(latest_sample)
+
+    # Return list of samples starting at latest sample
+    return samples[latest_sample_index:len(samples)]
+
+
+def get_unprocessed_samples(instrument_id, run_id):
+
+    """
+    For an active run, returns 1) a list of samples that were not processed due to error / runtime termination,
+    and 2) the current sample being monitored / processed.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+
+    Returns:
+        tuple: List of unprocessed samples for the given instrument run, and current sample being monitored / processed.
+    """
+
+    # Get samples in run
+    df_samples = get_samples_in_run(instrument_id, run_id, "Both")
+
+    # Get list of samples in run
+    samples = df_samples["sample_id"].astype(str).tolist()
+
+    # Construct dictionary of unprocessed samples in instrument run
+    df_unprocessed_samples = df_samples.loc[df_samples["qc_result"].isnull()]
+    unprocessed_samples = df_unprocessed_samples["sample_id"].astype(str).tolist()
+
+    # Get acquisition path, data files, and data file extension
+    acquisition_path = get_acquisition_path(instrument_id, run_id)
+    extension = get_data_file_type(instrument_id)
+    directory_files = os.listdir(acquisition_path)
+    data_files = [file.split(".")[0] for file in directory_files if file.split(".")[0] in unprocessed_samples]
+
+    # Mark acquired data files
+    df_unprocessed_samples.loc[
+        df_unprocessed_samples["sample_id"].isin(data_files), "found"] = "Found"
+    unprocessed_samples = df_unprocessed_samples.dropna(subset=["found"])["sample_id"].astype(str).tolist()
+
+    # Get current sample
+    if len(unprocessed_samples) > 0:
+        current_sample = unprocessed_samples[-1]
+        del unprocessed_samples[-1]
+    else:
+        current_sample = None
+
+    # Return as tuple
+    return unprocessed_samples, current_sample
+
+
+def get_current_sample(instrument_id, run_id):
+
+    """
+    Returns the current sample being monitored / processed.
+
+    TODO: The "latest_sample" is the last sample to be processed. Nomenclature needs to be updated in many places.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+
+    Returns:
+        str: Current sample being monitored / processed.
+    """
+
+    # Get latest sample in run
+    df_run = get_instrument_run(instrument_id, run_id)
+    latest_sample = df_run["latest_sample"].astype(str).values[0]
+
+    # Return second sample if beginning of run
+    if latest_sample == "None":
+        return samples[1]
+
+
+def parse_internal_standard_data(instrument_id, run_id, result_type, polarity, load_from, as_json=True):
+
+    """
+    Parses data from database into JSON-ified DataFrame for samples (as rows) vs. internal standards (as columns).
+
+    Data is stored in a column (for example, "retention_time") as a single-record string dict with the following structure:
+
+    | Sample     | iSTD 1 | iSTD 2 | ... |
+    | ---------- | ------ | ------ | ... |
+    | SAMPLE_001 | 1.207  | 1.934  | ... |
+
+    These records are concatenated together with this function using pd.DataFrame(), which is 100x faster than pd.concat().
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        result_type (str):
+            Column in sample_qc_results table to parse (either "retention_time" or "precursor_mz" or "intensity")
+        polarity (str):
+            Polarity ("Pos" or "Neg")
+        load_from (str):
+            Specifies whether to load data from CSV file (during Google Drive sync of active run) or instrument database
+        as_json (bool, default True):
+            Whether to return table encoded with encode_table() or as DataFrame
+
+    Returns:
+        DataFrame of samples (rows) vs. internal standards (columns) as JSON string.
+    """
+    log.debug("parse_internal_standard_data locals: {}".format(locals()))
+    # Get relevant QC results table from database
+    if load_from == "database" or load_from == "processing":
+        df_samples = get_samples_in_run(instrument_id, run_id, "Specimen")
+    elif load_from == "csv":
+        df_samples = get_samples_from_csv(instrument_id, run_id, "Specimen")
+    # Filter by polarity
+    df_samples = df_samples.loc[df_samples["polarity"] == polarity]
+    sample_ids = df_samples["sample_id"].astype(str).tolist()
+
+    # Return None if results are None
+    if load_from == "processing":
+        if len(df_samples[result_type].dropna()) == 0:
+            return None
+
+    # Initialize DataFrame with individual records of sample data
+    results = parse_result_records(df_samples[result_type].astype(str).tolist())
+    df_results = get_internal_standard_table(results, sample_ids)
+    log.debug("parse_intetrnal_standard_data returns df_results: {}".format(df_results))
+    # Return DataFrame as JSON string
+    if as_json:
+        return encode_table(df_results)
+    else:
+        return df_results
+
+
+def parse_biological_standard_data(instrument_id, run_id, result_type, polarity, biological_standard, load_from, as_json=True, preserve_names=False):
+
+    """
+    Parses biological standard data into JSON-ified DataFrame of targeted features (as columns) vs. instrument runs (as rows).
+
+    The bio_qc_results table in the instrument database is first filtered by biological standard, chromatography, and polarity.
+    Then, the sample name is replaced with the instrument run it was associated with.
+
+    Data is stored in a column (for example, "intensity") as a single-record string dict with the following structure:
+
+    | Name                | Metabolite 1 | Metabolite 2 | ... |
+    | ------------------- | ------------ | ------------ | ... |
+    | INSTRUMENT_RUN_001  | 13597340     | 53024853     | ... |
+
+    These records are concatenated together with this function using pd.DataFrame(), which is 100x faster than pd.concat().
+
+    | Name                | Metabolite 1 | Metabolite 2 | ... |
+    | ------------------- | ------------ | ------------ | ... |
+    | INSTRUMENT_RUN_001  | 13597340     | 53024853     | ... |
+    | INSTRUMENT_RUN_002  | 23543246     | 102030406    | ... |
+    | ...                 | ...          | ...          | ... |
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        result_type (str):
+            Column in bio_qc_results table to parse (either "retention_time" or "precursor_mz" or "intensity")
+        polarity (str):
+            Polarity ("Pos" or "Neg")
+        biological_standard (str):
+            Name of biological standard
+        load_from (str):
+            Specifies whether to load data from CSV file (during Google Drive sync of active run) or instrument database
+        as_json (bool, default True):
+            Whether to return table encoded with encode_table() or as DataFrame
+
+    Returns:
+        JSON-ified DataFrame of targeted features for a biological standard (columns) vs. instrument runs (rows).
+    """
+    log.debug("parse_biological_standard_data input variables")
+    log.debug(locals())
+
+    # Get relevant QC results table from database
+    if load_from == "database":
+        df_samples = get_table(instrument_id, "bio_qc_results")
+    elif load_from == "csv":
+        id = instrument_id.replace(" ", "_") + "_" + run_id
+        bio_standards_csv = os.path.join(data_directory, id, "csv", "bio_standards.csv")
+        df_samples = pd.read_csv(bio_standards_csv, index_col=False)
+
+    # Filter by biological standard type
+    df_samples = df_samples.loc[df_samples["biological_standard"] == biological_standard]
+
+    # Filter by polarity
+    df_samples = df_samples.loc[df_samples["polarity"] == polarity]
+
+    # Filter by instrument
+    df_runs = get_table(instrument_id, "runs")
+    chromatography = df_runs.loc[df_runs["run_id"] == run_id]["chromatography"].values[0]
+
+    # Filter by chromatography
+    run_ids = df_runs.loc[df_runs["chromatography"] == chromatography]["run_id"].astype(str).tolist()
+    df_samples = df_samples.loc[df_samples["run_id"].isin(run_ids)]
+    run_ids = df_samples["run_id"].astype(str).tolist()
+
+    # Initialize DataFrame with individual records of sample data
+    results = parse_result_records(df_samples[result_type].fillna('{}').tolist())
+    df_results = get_biological_standard_table(results, run_ids, preserve_names)
+
+    log.debug("parse_biological_standard_data -> df_results:")
+    log.debug(df_results.head())
+    # Return DataFrame as JSON string
+    if as_json:
+        return encode_table(df_results)
+    else:
+        return df_results
+
+
+def parse_internal_standard_qc_data(instrument_id, run_id, polarity, result_type, load_from, as_json=True):
+
+    """
+    Parses QC data into JSON-ified DataFrame for samples (as rows) vs. internal standards (as columns).
+
+    The QC DataFrame is stored in the "qc_dataframe" column as a single-record string dict with the following structure:
+
+    | Sample     | Delta m/z | Delta RT | In-run delta RT | Warnings | Fails |
+    | ---------- | --------- | -------- | --------------- | -------- | ----- |
+    | SAMPLE_001 | 0.000001  | 0.001    | 0.00001         | None     | None  |
+
+    These records are concatenated together with this function using pd.DataFrame(), which is 100x faster than pd.concat().
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        polarity (str):
+            Polarity ("Pos" or "Neg")
+        result_type (str):
+            Column in sample_qc_results table to parse (either "retention_time" or "precursor_mz" or "intensity")
+        load_from (str):
+            Specifies whether to load data from CSV file (during Google Drive sync of active run) or instrument database
+        as_json (bool, default True):
+            Whether to return table encoded with encode_table() or as DataFrame
+
+    Returns:
+        JSON-ified DataFrame of QC data for samples (as rows) vs. internal standards (as columns).
+    """
+
+    # Get relevant QC results table from database
+    if load_from == "database" or load_from == "processing":
+        df_samples = get_samples_in_run(instrument_id, run_id, "Specimen")
+    elif load_from == "csv":
+        df_samples = get_samples_from_csv(instrument_id, run_id, "Specimen")
+
+    # Filter by polarity
+    df_samples = df_samples.loc[df_samples["polarity"] == polarity]
+
+    # Get list of results using result type (for results DataFrame, each index corresponds to the result type)
+    sample_ids = df_samples["sample_id"].astype(str).tolist()
+    results = parse_qc_dataframe_records(df_samples["qc_dataframe"])
+
+    type_index = qc_result_types[result_type]
+    results = [result[type_index] for result in results]
+    df_results = get_internal_standard_table(results, sample_ids)
 
-    # For processing biological standard samples
-    if bio_standard is not None:
-        if polarity == "Positive":
-            update_parameter_file = (
-                sa.update(biological_standards_table)
-                    .where((biological_standards_table.c.chromatography == chromatography)
-                           & (biological_standards_table.c.name == bio_standard))
-                    .values(pos_parameter_file=parameters_file)
-            )
-        elif polarity == "Negative":
-            update_parameter_file = (
-                sa.update(biological_standards_table)
-                    .where((biological_standards_table.c.chromatography == chromatography)
-                           & (biological_standards_table.c.name == bio_standard))
-                    .values(neg_parameter_file=parameters_file)
-            )
-    # For processing samples with internal standards
+    # Return DataFrame as JSON string
+    if as_json:
+        return encode_table(df_results)
     else:
-        if polarity == "Positive":
-            update_parameter_file = (
-                sa.update(chromatography_table)
-                    .where(chromatography_table.c.method_id == chromatography)
-                    .values(pos_parameter_file=parameters_file)
-            )
-        elif polarity == "Negative":
-            update_parameter_file = (
-                sa.update(chromatography_table)
-                    .where(chromatography_table.c.method_id == chromatography)
-                    .values(neg_parameter_file=parameters_file)
-            )
-
-    connection.execute(update_parameter_file)
-    connection.close()
+        return df_results
 
 
-def add_msdial_configuration(msdial_config_name):
+def parse_result_records(results):
 
     """
-    Inserts new user configuration of MS-DIAL parameters into the "msdial_parameters" table in Settings database.
+    Parses QC results stored as single-record string dicts (ex: "{'Name': 'SAMPLE_001', 'iSTD 1': 1.207}").
 
     Args:
-        msdial_config_name (str): MS-DIAL configuration ID
+        results (list): List of string dicts, where "None" or "nan" denote missing results
 
     Returns:
-        None
+        list: List of dictionaries (empty for missing results)
     """
 
-    # Connect to database
-    db_metadata, connection = connect_to_database("Settings")
+    return [ast.literal_eval(result) if result != "None" and result != "nan" else {} for result in results]
 
-    # Get MS-DIAL parameters table
-    msdial_parameters_table = sa.Table("msdial_parameters", db_metadata, autoload=True)
 
-    # Prepare insert of user-inputted run data
-    insert_config = msdial_parameters_table.insert().values(
-        {"config_name": msdial_config_name,
-         "rt_begin": 0,
-         "rt_end": 100,
-         "mz_begin": 0,
-         "mz_end": 2000,
-         "ms1_centroid_tolerance": 0.008,
-         "ms2_centroid_tolerance": 0.01,
-         "smoothing_method": "LinearWeightedMovingAverage",
-         "smoothing_level": 3,
-         "min_peak_width": 3,
-         "min_peak_height": 35000,
-         "mass_slice_width": 0.1,
-         "post_id_rt_tolerance": 0.3,
-         "post_id_mz_tolerance": 0.008,
-         "post_id_score_cutoff": 85,
-         "alignment_rt_tolerance": 0.05,
-         "alignment_mz_tolerance": 0.008,
-         "alignment_rt_factor": 0.5,
-         "alignment_mz_factor": 0.5,
-         "peak_count_filter": 0,
-         "qc_at_least_filter": "True"}
-    )
+def parse_qc_dataframe_records(qc_dataframes):
 
-    # Execute INSERT to database, then close the connection
-    connection.execute(insert_config)
-    connection.close()
+    """
+    Parses the "qc_dataframe" column of the "sample_qc_results" table.
+
+    Args:
+        qc_dataframes (Series): Values of the "qc_dataframe" column
 
+    Returns:
+        list: For each sample, a list of dictionaries in the order of qc_result_types
+    """
 
-def remove_msdial_configuration(msdial_config_name):
+    results = qc_dataframes.fillna('[{}, {}, {}, {}, {}, {}]').astype(str).tolist()
+    return [ast.literal_eval(result) for result in results]
+
+
+def get_internal_standard_table(results, sample_ids):
 
     """
-    Deletes user configuration of MS-DIAL parameters from the "msdial_parameters" table.
+    Builds a table of samples (as rows) vs. internal standards (as columns) from parsed QC results.
 
     Args:
-        msdial_config_name (str): MS-DIAL configuration ID
+        results (list): List of dictionaries, as returned by parse_result_records()
+        sample_ids (list): Sample ID of each result
 
     Returns:
-        None
+        DataFrame of samples (rows) vs. internal standards (columns), with sample ID's in the "Specimen" column.
     """
 
-    # Connect to database
-    db_metadata, connection = connect_to_database("Settings")
+    df_results = pd.DataFrame(results)
+    df_results.drop(columns=["Name"], inplace=True)
+    df_results["Specimen"] = sample_ids
+    return df_results
 
-    # Get MS-DIAL parameters table
-    msdial_parameters_table = sa.Table("msdial_parameters", db_metadata, autoload=True)
 
-    # Prepare DELETE of MS-DIAL configuration
-    delete_config = (
-        sa.delete(msdial_parameters_table)
-            .where(msdial_parameters_table.c.config_name == msdial_config_name)
-    )
+def get_biological_standard_table(results, run_ids, preserve_names=False):
 
-    # Execute DELETE, then close the connection
-    connection.execute(delete_config)
-    connection.close()
+    """
+    Builds a table of instrument runs (as rows) vs. targeted features (as columns) from parsed biological standard results.
 
+    Args:
+        results (list): List of dictionaries, as returned by parse_result_records()
+        run_ids (list): Instrument run ID of each result
+        preserve_names (bool, default False): If False, replaces sample names with instrument run ID's
 
-def get_msdial_configuration_parameters(msdial_config_name, parameter=None):
+    Returns:
+        DataFrame of instrument runs (rows) vs. targeted features (columns).
+    """
+
+    df_results = pd.DataFrame(results)
+    df_results.insert(1, "run_id", run_ids)
+
+    if preserve_names is False:
+        df_results["Name"] = run_ids
+
+    return df_results
+
+
+def encode_table(df, precision=None, compress=None):
 
     """
-    Returns tuple of parameters defined for a selected MS-DIAL configuration.
+    Encodes a DataFrame in the compact columnar format used for dcc.Store objects on the dashboard.
 
-    TODO: The MS-DIAL configuration is returned as a tuple for a concise implementation of get_msdial_parameters_for_config()
-        in the DashWebApp module. While convenient there, this function is not optimal for maintainability. Should return
-        the entire DataFrame record instead.
+    Unlike JSON in "records" format, which repeats every column name (ex: every internal standard) on every row,
+    the columnar format lists column names once, followed by one array of values per column:
 
-    See update_msdial_configuration() for details on parameters.
+        {"columns": ["iSTD 1", "iSTD 2", "Specimen"], "values": [[1.207, 1.212], [3.481, null], ["S1", "S2"]]}
+
+    Each float is written with a number of significant digits of its own (ex: 1.234568e-05 and 123456.7), which
+    shortens payloads without affecting plots. Large payloads are compressed with zlib and prefixed with "zlib:".
 
     Args:
-        msdial_config_name (str):
-            MS-DIAL configuration ID
-        parameter (str, default None):
-            If specified, returns only the value for the given parameter
+        df (DataFrame):
+            Table to encode
+        precision (int, default None):
+            Significant digits kept for floats (table_float_precision if None)
+        compress (bool, default None):
+            Whether to compress the payload (if None, compresses payloads larger than table_compression_threshold)
 
     Returns:
-        Tuple of parameters for the given MS-DIAL configuration, or single parameter value.
+        str: Encoded table, which can be decoded with decode_table()
     """
 
-    # Get "msdial_parameters" table from database as a DataFrame
-    engine = sa.create_engine(settings_database)
-    df_configurations = pd.read_sql("SELECT * FROM msdial_parameters", engine)
+    if precision is None:
+        precision = table_float_precision
 
-    # Get selected configuration
-    selected_config = df_configurations.loc[
-        df_configurations["config_name"] == msdial_config_name]
+    values = []
+    for column in df.columns:
+        series = df[column]
 
-    selected_config.drop(["id", "config_name"], inplace=True, axis=1)
+        # Write floats with significant digits, keeping a decimal point so that they are decoded as floats
+        if pd.api.types.is_float_dtype(series):
+            finite = np.isfinite(series.to_numpy()).tolist()
+            numbers = ["%.*g" % (precision, value) for value in series.tolist()]
+            numbers = [("null" if not is_finite else number if "." in number or "e" in number else number + ".0")
+                for number, is_finite in zip(numbers, finite)]
+            values.append("[" + ",".join(numbers) + "]")
+        else:
+            values.append(series.to_json(orient="values", double_precision=15))
 
-    if parameter is not None:
-        return selected_config[parameter].values[0]
-    else:
-        return tuple(selected_config.to_records(index=False)[0])
+    payload = '{"columns":' + json.dumps([str(column) for column in df.columns], separators=(",", ":")) \
+        + ',"values":[' + ",".join(values) + "]}"
 
+    if compress or (compress is None and len(payload) > table_compression_threshold):
+        payload = "zlib:" + base64.b64encode(zlib.compress(payload.encode(), 1)).decode()
+
+    return payload
 
-def update_msdial_configuration(config_name, rt_begin, rt_end, mz_begin, mz_end, ms1_centroid_tolerance,
-    ms2_centroid_tolerance, smoothing_method, smoothing_level, mass_slice_width, min_peak_width, min_peak_height,
-    post_id_rt_tolerance, post_id_mz_tolerance, post_id_score_cutoff, alignment_rt_tolerance, alignment_mz_tolerance,
-    alignment_rt_factor, alignment_mz_factor, peak_count_filter, qc_at_least_filter):
+
+def decode_table(data):
 
     """
-    Updates and saves changes of all parameters for a selected MS-DIAL configuration.
+    Decodes a table encoded with encode_table() into a DataFrame.
 
-    For details on MS-DIAL parameters, see: https://mtbinfo-team.github.io/mtbinfo.github.io/MS-DIAL/tutorial#section-2-3
+    Tables in JSON "records" format (from sessions started before the columnar format) are decoded as well.
 
     Args:
-        config_name (str):
-            Name / ID of MS-DIAL configuration
-        rt_begin (int):
-            Minimum retention time in RT range for analysis range
-        rt_end (int):
-            Maximum retention time in RT range for analysis
-        mz_begin (float):
-            Minimum precursor mass in m/z range for analysis range
-        mz_end (float):
-            Maximum precursor mass in m/z range for analysis range
-        ms1_centroid_tolerance (float):
-            MS1 centroid tolerance
-        ms2_centroid_tolerance (float):
-            MS2 centroid tolerance
-        smoothing_method (str):
-            Peak smoothing method for peak detection
-        smoothing_level (int):
-            Peak smoothing level
-        mass_slice_width (float):
-            Mass slice width
-        min_peak_width (int):
-            Minimum peak width threshold
-        min_peak_height (int):
-            Minimum peak height threshold
-        post_id_rt_tolerance (float):
-            Post-identification retention time tolerance
-        post_id_mz_tolerance (float):
-            Post-identification precursor m/z tolerance
-        post_id_score_cutoff (int):
-            Similarity score cutoff after peak identification
-        alignment_rt_tolerance (float):
-            Post-alignment retention time tolerance
-        alignment_mz_tolerance (float):
-            Post-alignment precursor m/z tolerance
-        alignment_rt_factor (float):
-            Post-alignment retention time factor
-        alignment_mz_factor (float):
-            Post-alignment precursor m/z tolerance
-        peak_count_filter (int):
-            Peak count filter
-        qc_at_least_filter (str):
-            QC at least filter
+        data (str): Encoded table
 
     Returns:
-        None
+        DataFrame: Decoded table
     """
 
-    # Connect to database
-    db_metadata, connection = connect_to_database("Settings")
+    if data.startswith("zlib:"):
+        data = zlib.decompress(base64.b64decode(data[5:])).decode()
 
-    # Get MS-DIAL parameters table
-    msdial_parameters_table = sa.Table("msdial_parameters", db_metadata, autoload=True)
+    table = json.loads(data)
 
-    # Prepare insert of user-inputted MS-DIAL parameters
-    update_parameters = (
-        sa.update(msdial_parameters_table)
-            .where(msdial_parameters_table.c.config_name == config_name)
-            .values(rt_begin=rt_begin,
-                    rt_end=rt_end,
-                    mz_begin=mz_begin,
-                    mz_end=mz_end,
-                    ms1_centroid_tolerance=ms1_centroid_tolerance,
-                    ms2_centroid_tolerance=ms2_centroid_tolerance,
-                    smoothing_method=smoothing_method,
-                    smoothing_level=smoothing_level,
-                    min_peak_width=min_peak_width,
-                    min_peak_height=min_peak_height,
-                    mass_slice_width=mass_slice_width,
-                    post_id_rt_tolerance=post_id_rt_tolerance,
-                    post_id_mz_tolerance=post_id_mz_tolerance,
-                    post_id_score_cutoff=post_id_score_cutoff,
-                    alignment_rt_tolerance=alignment_rt_tolerance,
-                    alignment_mz_tolerance=alignment_mz_tolerance,
-                    alignment_rt_factor=alignment_rt_factor,
-                    alignment_mz_factor=alignment_mz_factor,
-                    peak_count_filter=peak_count_filter,
-                    qc_at_least_filter=qc_at_least_filter)
-    )
+    if isinstance(table, list):
+        return pd.DataFrame(table)
 
-    # Execute UPDATE to database, then close the connection
-    connection.execute(update_parameters)
-    connection.close()
+    return pd.DataFrame(dict(zip(table["columns"], table["values"])), columns=table["columns"])
 
 
-def get_msp_file_path(chromatography, polarity, bio_standard=None):
+def load_run_results(instrument_id, run_id, load_from, chromatography, biological_standards=None,
+    internal_standards=True, preserve_names=False, previous=None):
 
     """
-    Returns file paths of MSPs for a selected chromatography / polarity (both stored
-    in the methods folder upon user upload) for MS-DIAL parameter file generation.
+    Reads and parses all QC results of an instrument run in a single pass.
 
-    TODO: Once added to workspace, MSP / TXT library file names are standardized. No need to store / retrieve from database.
-        Get the file path using the filename e.g. return directory + chromatography + "_" + polarity + ".msp".
+    Calling parse_internal_standard_data(), parse_internal_standard_qc_data(), and parse_biological_standard_data()
+    for every table that the dashboard shows would read and parse the same rows dozens of times. Instead, this function
+    reads the run's samples and the biological standards of runs with the same chromatography once, parses each result
+    once, and builds all tables from memory. Tables that can't be built are set to None, so that an error in one table
+    doesn't prevent loading the others.
+
+    If the results of a previous load are passed, only samples processed since then are read and parsed
+    (see update_run_results()), and the run is read in full only if that isn't possible.
 
     Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        load_from (str):
+            Specifies whether to load data from CSV file (during Google Drive sync of active run) or instrument database
         chromatography (str):
-            Chromatography method ID
-        polarity (str):
-            Polarity, either "Positive" or "Negative"
-        bio_standard (str, default None):
-            Name of biological standard
+            Chromatography method of the instrument run
+        biological_standards (list, default None):
+            Biological standards to build tables for
+        internal_standards (bool, default True):
+            Whether to build internal standard and QC tables (False if only biological standards are needed)
+        preserve_names (bool, default False):
+            If False, replaces biological standard sample names with instrument run ID's
+        previous (dict, default None):
+            Results of a previous call for the same run and arguments, to update with newly processed samples
 
     Returns:
-        MSP / TXT library file path.
+        dict: Dictionary with the following keys:
+            - "samples": DataFrame of samples and biological standards in the instrument run
+            - "internal_standards": { polarity : { result type (ex: "retention_time") : DataFrame } }
+            - "qc": { polarity : { QC result type (ex: "Delta RT") : DataFrame } }
+            - "biological_standards": { biological standard : { polarity : { result type : DataFrame } } }
+            - "processed", "rows", "records", "options": Bookkeeping for update_run_results()
     """
 
-    # Connect to database
-    engine = sa.create_engine(settings_database)
+    # Apply only the samples processed since the previous load, if possible
+    if previous is not None:
+        try:
+            results = update_run_results(instrument_id, run_id, load_from, previous)
+            if results is not None:
+                return results
+        except Exception as error:
+            print("Error updating QC results of " + run_id + ", reloading run:", error)
 
-    if bio_standard is not None:
-        # Get selected biological standard
-        query = sa.text("SELECT * FROM biological_standards WHERE name = :bio_standard AND chromatography = :chromatography").\
-                        bindparams(bio_standard=bio_standard, chromatography=chromatography)
-        df_biological_standards = pd.read_sql(query, engine)
+    results = {"samples": None, "internal_standards": {}, "qc": {}, "biological_standards": {}}
+    polarities = ["Pos", "Neg"]
+    result_types = ["precursor_mz", "retention_time", "intensity"]
 
-        # Get file path of MSP in requested polarity
-        if polarity == "Positive":
-            msp_file_path = df_biological_standards["pos_bio_msp_file"].astype(str).values[0]
-        elif polarity == "Negative":
-            msp_file_path = df_biological_standards["neg_bio_msp_file"].astype(str).values[0]
+    rows = {"samples": {}, "internal_standards": {}, "biological_standards": {}}
+    records_by_table = {}
+    processed = None
 
-    else:
-        # Get selected chromatography method
-        query = sa.text("SELECT * FROM chromatography_methods WHERE method_id = :chromatography").\
-                        bindparams(chromatography=chromatography)
-        df_methods = pd.read_sql(query, engine)
+    # Read samples of the run, and biological standards of runs with the same chromatography
+    if load_from == "csv":
+        id = instrument_id.replace(" ", "_") + "_" + run_id
+        df_samples = get_samples_from_csv(instrument_id, run_id, "Specimen")
+        df_bio_standards = pd.read_csv(os.path.join(data_directory, id, "csv", "bio_standards.csv"), index_col=False) \
+            if os.path.exists(os.path.join(data_directory, id, "csv", "bio_standards.csv")) else None
+
+        # Runs with the same chromatography in the local database (the active run may not be in it yet)
+        if df_bio_standards is not None:
+            run_ids = [run_id]
+            if os.path.exists(get_database_file(instrument_id)):
+                df_runs = get_instrument_runs(instrument_id)
+                run_ids += df_runs.loc[df_runs["chromatography"] == chromatography]["run_id"].astype(str).tolist()
+            df_bio_standards = df_bio_standards.loc[df_bio_standards["run_id"].isin(run_ids)]
 
-        # Get file path of MSP in requested polarity
-        if polarity == "Positive":
-            msp_file_path = df_methods["pos_istd_msp_file"].astype(str).values[0]
-        elif polarity == "Negative":
-            msp_file_path = df_methods["neg_istd_msp_file"].astype(str).values[0]
+    else:
+        # Check when samples were processed before reading them, so that samples processed meanwhile are read again
+        processed = get_processed_samples(instrument_id, run_id)
+        engine = sa.create_engine(get_read_database_file(instrument_id))
 
-    msp_file_path = os.path.join(methods_directory, msp_file_path)
+        query = sa.text("SELECT * FROM sample_qc_results WHERE run_id = :run_id ORDER BY id")
+        df_samples = pd.read_sql(query.bindparams(run_id=run_id), engine)
 
-    # Return file path
-    return msp_file_path
+        query = sa.text("SELECT bio_qc_results.* FROM bio_qc_results "
+            + "JOIN runs ON bio_qc_results.run_id = runs.run_id "
+            + "WHERE runs.chromatography = :chromatography ORDER BY bio_qc_results.id")
+        df_bio_standards = pd.read_sql(query.bindparams(chromatography=chromatography), engine)
+
+    # Samples table for the run
+    try:
+        df_run_samples = df_samples
+        if df_bio_standards is not None:
+            df_run_bio_standards = df_bio_standards.loc[df_bio_standards["run_id"] == run_id]
+            df_run_bio_standards = df_run_bio_standards.drop(columns=["biological_standard"])
+            df_run_samples = pd.concat([df_run_bio_standards, df_samples], ignore_index=True)
+        results["samples"] = df_run_samples
+        rows["samples"] = {sample_id: position for position, sample_id in enumerate(df_run_samples["sample_id"].astype(str))}
+
+        if load_from == "csv":
+            processed = get_result_signatures(df_run_samples)
+    except Exception as error:
+        print("Error loading samples:", error)
+
+    # Internal standard and QC tables, with each result parsed once
+    if internal_standards:
+        for polarity in polarities:
+            df = df_samples.loc[df_samples["polarity"] == polarity]
+            sample_ids = df["sample_id"].astype(str).tolist()
+            rows["internal_standards"].update({sample_id: (polarity, position) for position, sample_id in enumerate(sample_ids)})
+
+            results["internal_standards"][polarity] = {}
+            for result_type in result_types:
+                try:
+                    records = parse_result_records(df[result_type].astype(str).tolist())
+                    results["internal_standards"][polarity][result_type] = get_internal_standard_table(records, sample_ids)
+                    records_by_table[("internal_standards", polarity, result_type)] = records
+                except Exception as error:
+                    print("Error loading " + polarity + " mode " + result_type + " data:", error)
+                    results["internal_standards"][polarity][result_type] = None
+
+            try:
+                qc_records = parse_qc_dataframe_records(df["qc_dataframe"])
+            except Exception as error:
+                print("Error loading " + polarity + " mode QC data:", error)
+                qc_records = None
+
+            results["qc"][polarity] = {}
+            for qc_result_type, type_index in qc_result_types.items():
+                try:
+                    records = [record[type_index] for record in qc_records]
+                    results["qc"][polarity][qc_result_type] = get_internal_standard_table(records, sample_ids)
+                    records_by_table[("qc", polarity, qc_result_type)] = records
+                except Exception as error:
+                    print("Error loading " + polarity + " mode " + qc_result_type + " data:", error)
+                    results["qc"][polarity][qc_result_type] = None
+
+    # Biological standard tables
+    for biological_standard in (biological_standards or []):
+        results["biological_standards"][biological_standard] = {}
+
+        for polarity in polarities:
+            results["biological_standards"][biological_standard][polarity] = {}
+
+            for result_type in result_types:
+                try:
+                    df = df_bio_standards.loc[(df_bio_standards["biological_standard"] == biological_standard)
+                        & (df_bio_standards["polarity"] == polarity)]
+                    records = parse_result_records(df[result_type].fillna('{}').tolist())
+                    df_results = get_biological_standard_table(records, df["run_id"].astype(str).tolist(), preserve_names)
+                    records_by_table[("biological_standards", biological_standard, polarity, result_type)] = records
+
+                    for position, (sample_id, sample_run_id) in enumerate(zip(df["sample_id"].astype(str), df["run_id"])):
+                        if sample_run_id == run_id:
+                            rows["biological_standards"][sample_id] = (biological_standard, polarity, position)
+                except Exception as error:
+                    print("Error loading " + polarity + " mode biological standard " + result_type + " data:", error)
+                    df_results = None
+
+                results["biological_standards"][biological_standard][polarity][result_type] = df_results
+
+    # Keep track of processed samples, their rows in each table, and parsed results, to apply newly processed samples later
+    results["processed"] = processed
+    results["rows"] = rows
+    results["records"] = records_by_table
+    results["options"] = {
+        "biological_standards": biological_standards or [],
+        "internal_standards": internal_standards,
+        "preserve_names": preserve_names
+    }
 
+    return results
 
-def get_parameter_file_path(chromatography, polarity, biological_standard=None):
+
+def update_run_results(instrument_id, run_id, load_from, previous):
 
     """
-    Returns file path of parameters file stored in database.
+    Updates previously loaded QC results of an instrument run with the samples processed since they were loaded.
 
-    TODO: Once generated, MS-DIAL parameter filenames are standardized. No need to store / retrieve from database.
-        Get the file path using the filename e.g. return directory + chromatography + "_" + polarity + "_Parameters.txt".
+    Only the rows of samples that were processed (or reprocessed) since the previous load are read and parsed,
+    so refreshing an active run takes time in proportion to the number of new samples rather than the length of the run.
+    The previous results are not modified, since other dashboard sessions may still be using them.
 
     Args:
-        chromatography (str):
-            Chromatography method ID
-        polarity (str):
-            Polarity, either "Positive" or "Negative"
-        bio_standard (str, default None):
-            Name of biological standard
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        load_from (str):
+            Specifies whether to load data from CSV file (during Google Drive sync of active run) or instrument database
+        previous (dict):
+            Results returned by an earlier call to load_run_results() for the same run
 
     Returns:
-        File path for MS-DIAL parameters.txt file.
+        dict: Updated results in the format of load_run_results(), or None if the run needs to be read in full
     """
 
-    engine = sa.create_engine(settings_database)
+    options = previous["options"]
+    rows = previous["rows"]
 
-    if biological_standard is not None:
-        query = sa.text("SELECT * FROM biological_standards WHERE chromatography = :chromatography AND name = :bio_standard").\
-                        bindparams(bio_standard=biological_standard, chromatography=chromatography)
+    if previous["processed"] is None or previous["samples"] is None or not options["internal_standards"]:
+        return None
+
+    # Find samples that were processed since the previous load
+    if load_from == "csv":
+        df_samples = get_samples_from_csv(instrument_id, run_id, "Specimen")
+        df_bio_standards = get_samples_from_csv(instrument_id, run_id, "Biological Standard")
+        df_bio_standards = df_bio_standards.loc[df_bio_standards["run_id"] == run_id]
+        processed = dict(get_result_signatures(df_bio_standards), **get_result_signatures(df_samples))
     else:
-        query = sa.text("SELECT * FROM chromatography_methods WHERE method_id = :chromatography").\
-                        bindparams(chromatography=chromatography)
+        processed = get_processed_samples(instrument_id, run_id)
 
-    df = pd.read_sql(query, engine)
+    if processed is None or not set(previous["processed"]).issubset(processed):
+        return None
 
-    if polarity == "Pos":
-        parameter_file = df["pos_parameter_file"].astype(str).values[0]
-    elif polarity == "Neg":
-        parameter_file = df["neg_parameter_file"].astype(str).values[0]
+    changed = [sample_id for sample_id, value in processed.items() if previous["processed"].get(sample_id) != value]
 
-    return parameter_file
+    # Samples that aren't in the previous results (ex: added to the sequence) require reading the run in full
+    if not set(changed).issubset(rows["samples"]):
+        return None
 
+    results = dict(previous, processed=processed)
+    if len(changed) == 0:
+        return results
 
-def get_msdial_directory():
+    # Read the rows of the changed samples
+    if load_from == "csv":
+        df_samples = df_samples.loc[df_samples["sample_id"].astype(str).isin(changed)]
+        df_bio_standards = df_bio_standards.loc[df_bio_standards["sample_id"].astype(str).isin(changed)]
+    else:
+        engine = sa.create_engine(get_read_database_file(instrument_id))
+        sample_ids = sa.bindparam("sample_ids", expanding=True)
+
+        query = sa.text("SELECT * FROM sample_qc_results WHERE run_id = :run_id AND sample_id IN :sample_ids ORDER BY id")
+        df_samples = pd.read_sql(query.bindparams(sample_ids), engine, params={"run_id": run_id, "sample_ids": changed})
+
+        query = sa.text("SELECT * FROM bio_qc_results WHERE run_id = :run_id AND sample_id IN :sample_ids ORDER BY id")
+        df_bio_standards = pd.read_sql(query.bindparams(sample_ids), engine, params={"run_id": run_id, "sample_ids": changed})
+
+    # Copy the nested dictionaries, so that the previous results keep their tables
+    results["internal_standards"] = {polarity: dict(tables) for polarity, tables in previous["internal_standards"].items()}
+    results["qc"] = {polarity: dict(tables) for polarity, tables in previous["qc"].items()}
+    results["biological_standards"] = {biological_standard: {polarity: dict(tables) for polarity, tables in polarities.items()}
+        for biological_standard, polarities in previous["biological_standards"].items()}
+    results["records"] = dict(previous["records"])
+
+    # Samples table
+    df_run_samples = previous["samples"].copy()
+    for df in [df_bio_standards, df_samples]:
+        for row in df.to_dict("records"):
+            position = rows["samples"][str(row["sample_id"])]
+            for column, value in row.items():
+                if column in df_run_samples.columns:
+                    df_run_samples.at[position, column] = value
+    results["samples"] = df_run_samples
+
+    # Replace the parsed results of changed samples, then rebuild each affected table from its parsed results
+    changed_records = {}
+
+    for polarity in ["Pos", "Neg"]:
+        df = df_samples.loc[df_samples["polarity"] == polarity]
+        positions = [rows["internal_standards"][sample_id][1] for sample_id in df["sample_id"].astype(str)]
+
+        for result_type in ["precursor_mz", "retention_time", "intensity"]:
+            records = parse_result_records(df[result_type].astype(str).tolist())
+            changed_records[("internal_standards", polarity, result_type)] = list(zip(positions, records))
+
+        qc_records = parse_qc_dataframe_records(df["qc_dataframe"])
+        for qc_result_type, type_index in qc_result_types.items():
+            records = [record[type_index] for record in qc_records]
+            changed_records[("qc", polarity, qc_result_type)] = list(zip(positions, records))
+
+    for row in df_bio_standards.to_dict("records"):
+        if str(row["sample_id"]) not in rows["biological_standards"]:
+            if row["biological_standard"] in options["biological_standards"]:
+                return None
+            continue
+
+        biological_standard, polarity, position = rows["biological_standards"][str(row["sample_id"])]
+        for result_type in ["precursor_mz", "retention_time", "intensity"]:
+            value = row[result_type] if row[result_type] is not None else "{}"
+            changed_records.setdefault(("biological_standards", biological_standard, polarity, result_type), []).append(
+                (position, parse_result_records([str(value)])[0]))
+
+    for table, changes in changed_records.items():
+        if len(changes) == 0:
+            continue
+
+        # Tables that couldn't be built before (ex: no sample of a polarity was processed yet) require a full read
+        if table not in previous["records"]:
+            return None
 
-    """
-    Returns location of MS-DIAL directory.
-    """
+        records = list(previous["records"][table])
+        for position, record in changes:
+            records[position] = record
+        results["records"][table] = records
 
-    return get_table("Settings", "workspace")["msdial_directory"].astype(str).values[0]
+        if table[0] == "biological_standards":
+            df_previous = results["biological_standards"][table[1]][table[2]][table[3]]
+            results["biological_standards"][table[1]][table[2]][table[3]] = get_biological_standard_table(
+                records, df_previous["run_id"].tolist(), options["preserve_names"])
+        else:
+            df_previous = results[table[0]][table[1]][table[2]]
+            results[table[0]][table[1]][table[2]] = get_internal_standard_table(records, df_previous["Specimen"].tolist())
 
+    return results
 
-def get_msconvert_directory():
+
+def get_processed_samples(instrument_id, run_id):
 
     """
-    Returns location of MSConvert directory.
+    Returns when each sample of an instrument run was last processed, from the "processing_stages" table.
 
-    This function uses the MS-DIAL directory path to retrieve user ID, which it then uses to
-    retrieve the path for MSConvert.exe in C:/Users/<username>/AppData/Local/Apps.
+    Timestamps only have a resolution of seconds, so the row ID and duration of the "persist" stage are included,
+    which change whenever the sample is processed again (even within the same second).
 
-    TODO: There is probably a better way to implement this.
+    Args:
+        instrument_id (str): Instrument ID
+        run_id (str): Instrument run ID (job ID)
 
     Returns:
-        Location of MSConvert directory in C:/Users/<username>/AppData/Local/Apps/ProteoWizard.
+        dict: Dictionary of { sample ID : time, row ID and duration of the write of its QC results },
+        or None if unavailable
     """
 
-    user = get_msdial_directory().replace("\\", "/").split("/")[2]
-    msconvert_folder = [f.path for f in os.scandir("C:/Users/" + user + "/AppData/Local/Apps/") if f.is_dir() and "ProteoWizard" in f.name][0]
-    return msconvert_folder
+    engine = sa.create_engine(get_read_database_file(instrument_id))
+    query = sa.text("SELECT sample_id, finished || '|' || id || '|' || duration AS processed FROM processing_stages "
+        "WHERE run_id = :run_id AND stage = 'persist'")
 
+    try:
+        df = pd.read_sql(query.bindparams(run_id=run_id), engine)
+    except Exception:
+        return None
 
-def update_msdial_directory(msdial_directory):
+    return dict(zip(df["sample_id"].astype(str), df["processed"].astype(str)))
+
+
+def get_result_signatures(df_samples):
 
     """
-    Updates location of MS-DIAL directory, stored in "workspace" table of the Settings database.
+    Returns the raw QC results of each sample as a string, to detect which samples changed between two CSV downloads.
 
     Args:
-        msdial_directory (str): New MS-DIAL directory location
+        df_samples (DataFrame): Rows of the "sample_qc_results" or "bio_qc_results" table
 
     Returns:
-        None
+        dict: Dictionary of { sample ID : raw QC results }
     """
 
-    db_metadata, connection = connect_to_database("Settings")
-    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
+    columns = ["precursor_mz", "retention_time", "intensity", "qc_dataframe", "qc_result"]
+    signatures = df_samples[columns].astype(str).agg("|".join, axis=1)
+    return dict(zip(df_samples["sample_id"].astype(str), signatures))
 
-    update_msdial_directory = (
-        sa.update(workspace_table)
-            .where(workspace_table.c.id == 1)
-            .values(msdial_directory=msdial_directory)
-    )
 
-    connection.execute(update_msdial_directory)
-    connection.close()
+def get_workspace_users_list():
 
+    """
+    Returns a list of users that have access to the Rapid-QC-MS workspace.
+    """
 
-def get_internal_standards_dict(chromatography, value_type):
+    return get_table("Settings", "gdrive_users")["email_address"].astype(str).tolist()
 
-    """
-    Returns dictionary of internal standard keys mapped to either m/z or RT values.
 
-    This function is used to establish a y-axis range for internal standard retention time plots.
-    See load_istd_rt_plot() in the PlotGeneration module.
+def add_user_to_workspace(email_address):
 
-    TODO: This function needs to filter for polarity!
+    """
+    Gives user access to workspace in Google Drive and stores email address in database.
+
+    Access is granted by sharing the Rapid-QC-MS folder in Google Drive with the user's Google account.
 
     Args:
-        chromatography (str):
-            Chromatography method to retrieve internal standards for
-        value_type (str):
-            Data type ("precursor_mz", "retention_time", "ms2_spectrum")
+        email_address (str): Email address for Google account to grant access to workspace.
 
     Returns:
-        Dictionary with key-value pairs of { internal_standard: value_type }
+        None
     """
 
-    engine = sa.create_engine(settings_database)
-    query = sa.text("SELECT * FROM internal_standards WHERE chromatography = :chromatography").\
-                    bindparams(chromatography=chromatography)
-    df_internal_standards = pd.read_sql(query, engine)
+    if email_address in get_workspace_users_list():
+        return "User already exists"
 
-    dict = {}
-    keys = df_internal_standards["name"].astype(str).tolist()
-    values = df_internal_standards[value_type].astype(float).tolist()
+    # Get Google Drive instance
+    drive = get_drive_instance()
 
-    for index, key in enumerate(keys):
-        dict[key] = values[index]
+    # Get ID of Rapid-QC-MS folder in Google Drive
+    gdrive_folder_id = get_drive_folder_id()
 
-    return dict
+    if gdrive_folder_id is not None:
+        # Add user access by updating permissions
+        folder = drive.CreateFile({"id": gdrive_folder_id})
+        permission = folder.InsertPermission({
+            "type": "user",
+            "role": "writer",
+            "value": email_address})
 
+        # Insert user email address in "gdrive_users" table
+        db_metadata, connection = connect_to_database("Settings")
+        gdrive_users_table = sa.Table("gdrive_users", db_metadata, autoload=True)
 
-def get_internal_standards(chromatography, polarity):
+        insert_user_email = gdrive_users_table.insert().values(
+            {"name": permission["name"],
+             "email_address": email_address,
+             "permission_id": permission["id"]})
+
+        connection.execute(insert_user_email)
+        connection.close()
+
+    else:
+        return "Error"
+
+
+def delete_user_from_workspace(email_address):
 
     """
-    Returns DataFrame of internal standards for a given chromatography method and polarity.
+    Removes user access to workspace in Google Drive and deletes email from database.
 
     Args:
-        chromatography (str):
-            Chromatography method ID
-        polarity (str):
-            Polarity (either "Pos" or "Neg")
+        email_address (str): Email address for Google account whose access will to be revoked.
 
     Returns:
-        DataFrame of "internal_standards" table from Settings database, filtered by chromatography and polarity.
+        None
     """
 
-    if polarity == "Pos":
-        polarity = "Positive Mode"
-    elif polarity == "Neg":
-        polarity = "Negative Mode"
+    if email_address not in get_workspace_users_list():
+        return "User does not exist"
 
-    engine = sa.create_engine(settings_database)
-    query = sa.text("SELECT * FROM internal_standards WHERE chromatography = :chromatography AND polarity = :polarity").\
-                bindparams(chromatography=chromatography, polarity=polarity)
-    return pd.read_sql(query, engine)
+    # Get Google Drive instance
+    drive = get_drive_instance()
 
+    # Get ID of Rapid-QC-MS folder in Google Drive
+    gdrive_folder_id = get_drive_folder_id()
 
-def get_targeted_features(biological_standard, chromatography, polarity):
+    if gdrive_folder_id is not None:
+        # Get permission ID of user from database
+        folder = drive.CreateFile({"id": gdrive_folder_id})
+        df_gdrive_users = get_table("Settings", "gdrive_users")
+        df_gdrive_users = df_gdrive_users.loc[df_gdrive_users["email_address"] == email_address]
+        permission_id = df_gdrive_users["permission_id"].astype(str).values[0]
+
+        # Delete user access by updating permissions
+        folder.DeletePermission(permission_id)
+
+        # Delete user email address in "gdrive_users" table
+        db_metadata, connection = connect_to_database("Settings")
+        gdrive_users_table = sa.Table("gdrive_users", db_metadata, autoload=True)
+
+        delete_user_email = (
+            sa.delete(gdrive_users_table)
+                .where((gdrive_users_table.c.email_address == email_address))
+        )
+
+        connection.execute(delete_user_email)
+        connection.close()
+
+    else:
+        return "Error"
+
+def get_qc_results(instrument_id, sample_list, is_bio_standard=False):
 
     """
-    Returns DataFrame of metabolite targets for a given biological standard, chromatography, and polarity.
+    Returns DataFrame of QC results for a given sample list.
+
+    TODO: This function will break if samples in different runs have the same sample ID. Add run ID filter.
 
     Args:
-        biological_standard (str):
-            Name of biological standard
-        chromatography (str):
-            Chromatography method ID (name)
-        polarity (str):
-            Polarity (either "Pos" or "Neg")
+        instrument_id (str):
+            Instrument ID
+        sample_list (list):
+            List of samples to query (20231201 Ira: only ever one element?)
+        is_bio_standard (bool, default False):
+            Whether the list is biological standards (True) or samples (False)
 
     Returns:
-        DataFrame of "targeted_features" table from Settings database, filtered by chromatography and polarity.
+        DataFrame of QC results for a given sample list.
     """
+    log.debug("get_qc_results input variables")
+    log.debug(locals())
 
-    if polarity == "Pos":
-        polarity = "Positive Mode"
-    elif polarity == "Neg":
-        polarity = "Negative Mode"
+    if len(sample_list) == 0:
+        return pd.DataFrame()
 
-    engine = sa.create_engine(settings_database)
+    database = get_read_database_file(instrument_id)
+    engine = sa.create_engine(database)
 
-    query = sa.text("SELECT * FROM targeted_features WHERE chromatography = :chromatography AND polarity = :polarity AND biological_standard = :biostnd").\
-                bindparams(chromatography=chromatography, polarity=polarity, biostnd=biological_standard)
+    sample_list = str(sample_list[0])
 
+    log.debug("sample_list: " + sample_list)
+    if is_bio_standard:
+        query = sa.text("SELECT sample_id, qc_result FROM bio_qc_results WHERE sample_id = :sample_list").\
+            bindparams(sample_list=sample_list)
+    else:
+        query = sa.text("SELECT sample_id, qc_result FROM sample_qc_results WHERE sample_id = :sample_list").\
+            bindparams(sample_list=sample_list)
+        
+    log.debug("get_qc_results returns pd.read_sql(query, engine), which looks like:")
+    log.debug(pd.read_sql(query, engine))
     return pd.read_sql(query, engine)
 
 
-def get_biological_standards():
+def create_workspace_metadata():
 
     """
-    Returns DataFrame of the "biological_standards" table from the Settings database.
+    Creates record in "workspace" table to store various metadata.
     """
 
-    # Get table from database as a DataFrame
-    engine = sa.create_engine(settings_database)
-    df_biological_standards = pd.read_sql("SELECT * FROM biological_standards", engine)
-    return df_biological_standards
+    db_metadata, connection = connect_to_database("Settings")
+    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
+    connection.execute(workspace_table.insert().values({"id": 1}))
+    connection.close()
 
 
-def get_biological_standards_list():
+def get_device_identity():
 
     """
-    Returns list of biological standards from the Settings database.
+    Returns device identity (either an Instrument ID or "Shared user").
     """
 
-    df_biological_standards = get_biological_standards()
-    return df_biological_standards["name"].astype(str).unique().tolist()
+    return get_table("Settings", "workspace")["instrument_identity"].astype(str).tolist()[0]
 
 
-def add_biological_standard(name, identifier):
+def set_device_identity(is_instrument_computer, instrument_id):
 
     """
-    Creates new biological standard with name and identifier.
-
-    The biological standard identifier is a text substring used to distinguish between sample and biological standard.
-    Rapid-QC-MS checks filenames in the sequence for this identifier to process samples accordingly.
+    Indicates whether the user's device is the instrument PC or not.
 
     Args:
-        name (str):
-            Name of biological standard
-        identifier (str):
-            String identifier in filename for biological standard
+        is_instrument_computer (bool):
+            Whether the device is an instrument computer or not
+        instrument_id (str):
+            Instrument ID (if None, set to "Shared user")
 
     Returns:
         None
     """
 
-    # Get list of chromatography methods
-    chromatography_methods = get_chromatography_methods()["method_id"].tolist()
+    if not is_instrument_computer:
+        instrument_id = "Shared user"
 
-    # Connect to database and get "biological_standards" table
     db_metadata, connection = connect_to_database("Settings")
-    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
 
-    # Insert a biological standard row for each chromatography
-    for method in chromatography_methods:
-        insert = biological_standards_table.insert().values({
-            "name": name,
-            "identifier": identifier,
-            "chromatography": method,
-            "num_pos_features": 0,
-            "num_neg_features": 0,
-            "msdial_config_id": "Default"
-        })
-        connection.execute(insert)
+    update_identity = (
+        sa.update(workspace_table)
+            .where(workspace_table.c.id == 1)
+            .values(
+                is_instrument_computer=is_instrument_computer,
+                instrument_identity=instrument_id
+        )
+    )
 
-    # Close the connection
+    connection.execute(update_identity)
     connection.close()
 
 
-def remove_biological_standard(name):
+def run_is_on_instrument_pc(instrument_id, run_id):
 
     """
-    Deletes biological standard and corresponding MSPs from Settings database.
+    Validates that the current device is the instrument PC on which the run was started.
+
+    TODO: Use this function in PlotGeneration and DashWebApp module.
 
     Args:
-        name (str): Name of the biological standard
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID
 
     Returns:
-        None
+        True if instrument run was started on the current device, and False if not.
     """
 
-    # Delete corresponding MSPs from "methods" directory
-    df = get_table("Settings", "biological_standards")
-    df = df.loc[df["name"] == name]
-    files_to_delete = df["pos_bio_msp_file"].astype(str).tolist() + df["neg_bio_msp_file"].astype(str).tolist()
-
-    for file in os.listdir(methods_directory):
-        if name in files_to_delete:
-            os.remove(os.path.join(methods_directory, file))
-
-    # Connect to database and get relevant tables
-    db_metadata, connection = connect_to_database("Settings")
-    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
-    targeted_features_table = sa.Table("targeted_features", db_metadata, autoload=True)
-
-    # Remove biological standard
-    delete_biological_standard = (
-        sa.delete(biological_standards_table)
-            .where((biological_standards_table.c.name == name))
-    )
-    connection.execute(delete_biological_standard)
-
-    # Remove targeted features for that biological standard
-    delete_targeted_features = (
-        sa.delete(targeted_features_table)
-            .where((targeted_features_table.c.biological_standard == name))
-    )
-    connection.execute(delete_targeted_features)
+    instrument_id = get_instrument_run(instrument_id, run_id)["instrument_id"].astype(str).tolist()[0]
+    device_identity = get_table("Settings", "workspace")["instrument_identity"].astype(str).tolist()[0]
 
-    # Close the connection
-    connection.close()
+    if instrument_id == device_identity:
+        return True
+    else:
+        return False
 
 
-def update_msdial_config_for_bio_standard(biological_standard, chromatography, config_id):
+def update_slack_bot_token(slack_bot_token):
 
     """
-    Updates MS-DIAL configuration for given biological standard and chromatography method combination.
+    Updates Slack bot user OAuth 2.0 token in "workspace" table of Settings database.
+
+    For details on the Slack API, see: https://slack.dev/python-slack-sdk/
 
     Args:
-        biological_standard (str):
-            Name of the biological standard
-        chromatography (str):
-            Chromatography method
-        config_id (str):
-            Name of MS-DIAL configuration to set for this biological standard - chromatography combination
+        slack_bot_token (str): Slack bot user OAuth token
 
     Returns:
         None
     """
 
-    # Connect to database and get relevant tables
     db_metadata, connection = connect_to_database("Settings")
-    biological_standards_table = sa.Table("biological_standards", db_metadata, autoload=True)
+    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
 
-    # Update MS-DIAL configuration for biological standard
-    update_msdial_config = (
-        sa.update(biological_standards_table)
-            .where((biological_standards_table.c.name == biological_standard)
-                   & (biological_standards_table.c.chromatography == chromatography))
-            .values(msdial_config_id=config_id)
+    update_slack_bot_token = (
+        sa.update(workspace_table)
+            .where(workspace_table.c.id == 1)
+            .values(slack_bot_token=slack_bot_token)
     )
 
-    connection.execute(update_msdial_config)
+    connection.execute(update_slack_bot_token)
     connection.close()
 
 
-def get_biological_standard_identifiers(bio_standards=None):
+def get_slack_bot_token():
 
     """
-    Returns dictionary of identifiers for a given list of biological standards.
+    Returns Slack bot token stored in "workspace" table of Settings database.
+    """
 
-    If no list is provided, returns dict of identifiers for all biological standards.
+    return get_table("Settings", "workspace")["slack_bot_token"].astype(str).values[0]
+
+
+def update_slack_channel(slack_channel, notifications_enabled):
+
+    """
+    Updates Slack channel registered for notifications in "workspace" table of Settings database.
 
     Args:
-        bio_standards (list, default None): List of biological standards
+        slack_channel (str):
+            Slack channel to post messages to
+        notifications_enabled (bool):
+            Whether to send Slack notifications for QC warnings and fails
 
     Returns:
-        Dictionary with key-value pairs of { identifier: biological_standard }
+        None
     """
 
-    df_bio_standards = get_biological_standards()
+    db_metadata, connection = connect_to_database("Settings")
+    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
 
-    identifiers = {}
+    update_slack_channel = (
+        sa.update(workspace_table)
+            .where(workspace_table.c.id == 1)
+            .values(
+                slack_channel=slack_channel.replace("#", ""),
+                slack_enabled=notifications_enabled)
+    )
 
-    if bio_standards is not None:
-        if len(bio_standards) > 0:
-            for bio_standard in bio_standards:
-                df = df_bio_standards.loc[df_bio_standards["name"] == bio_standard]
-                identifier = df["identifier"].astype(str).unique().tolist()[0]
-                identifiers[identifier] = bio_standard
-    else:
-        names = df_bio_standards["name"].astype(str).unique().tolist()
-        ids = df_bio_standards["identifier"].astype(str).unique().tolist()
-        for index, name in enumerate(names):
-            identifiers[ids[index]] = names[index]
+    connection.execute(update_slack_channel)
+    connection.close()
 
-    return identifiers
+
+def get_slack_channel():
+
+    """
+    Returns Slack channel registered for notifications.
+    """
+
+    return get_table("Settings", "workspace")["slack_channel"].astype(str).values[0]
 
 
-def get_qc_configurations():
+def get_slack_notifications_toggled():
 
     """
-    Returns DataFrame of "qc_parameters" table from Settings database.
+    Returns Slack notification toggle setting.
     """
 
-    engine = sa.create_engine(settings_database)
-    return pd.read_sql("SELECT * FROM qc_parameters", engine)
+    try:
+        return get_table("Settings", "workspace")["slack_enabled"].astype(int).tolist()[0]
+    except:
+        return None
 
 
-def get_qc_configurations_list():
+def get_email_notifications_list(as_string=False):
 
     """
-    Returns list of names of QC configurations from Settings database.
+    Returns list of emails registered for email notifications for QC warnings and fails.
+
+    Args:
+        as_string (bool, default False):
+            Whether to return the list as a string (for Gmail API) or as list object (for display in Settings page)
+
+    Returns:
+        List of emails registered for QC warning/fail notifications.
     """
 
-    return get_qc_configurations()["config_name"].astype(str).tolist()
+    email_list = get_table("Settings", "email_notifications")["email_address"].astype(str).tolist()
+
+    if as_string:
+        email_list_string = ""
+
+        for email in email_list:
+            email_list_string += email
+            if email != email_list[-1]:
+                email_list_string += ","
 
+        return email_list_string
 
-def add_qc_configuration(qc_config_name):
+    else:
+        return email_list
+
+
+def register_email_for_notifications(email_address):
 
     """
-    Adds a new QC configuration to the "qc_parameters" table in the Settings database.
+    Inserts email address into "email_notifications" table in Settings database.
 
     Args:
-        qc_config_name (str): Name of the QC configuration
+        email_address (str): Email address to register for notifications.
 
     Returns:
         None
     """
 
-    # Connect to database
     db_metadata, connection = connect_to_database("Settings")
+    email_notifications_table = sa.Table("email_notifications", db_metadata, autoload=True)
 
-    # Get QC parameters table
-    qc_parameters_table = sa.Table("qc_parameters", db_metadata, autoload=True)
-
-    # Prepare insert of user-inputted run data
-    insert_config = qc_parameters_table.insert().values(
-        {"config_name": qc_config_name,
-         "intensity_dropouts_cutoff": 4,
-         "library_rt_shift_cutoff": 0.1,
-         "in_run_rt_shift_cutoff": 0.05,
-         "library_mz_shift_cutoff": 0.005,
-         "intensity_enabled": True,
-         "library_rt_enabled": True,
-         "in_run_rt_enabled": True,
-         "library_mz_enabled": True}
-    )
+    insert_email_address = email_notifications_table.insert().values({
+        "email_address": email_address
+    })
 
-    # Execute INSERT to database, then close the connection
-    connection.execute(insert_config)
+    connection.execute(insert_email_address)
     connection.close()
 
 
-def remove_qc_configuration(qc_config_name):
+def delete_email_from_notifications(email_address):
 
     """
-    Deletes QC configuration from the "qc_parameters" table in the Settings database.
+    Deletes email address from "email_notifications" table in Settings database.
 
     Args:
-        qc_config_name (str): Name of the QC configuration
+        email_address (str): Email address to unsubscribe from notifications.
 
     Returns:
         None
     """
 
-    # Connect to database
     db_metadata, connection = connect_to_database("Settings")
-
-    # Get QC parameters table
-    qc_parameters_table = sa.Table("qc_parameters", db_metadata, autoload=True)
-
-    # Prepare DELETE of MS-DIAL configuration
-    delete_config = (
-        sa.delete(qc_parameters_table)
-            .where(qc_parameters_table.c.config_name == qc_config_name)
+    email_notifications_table = sa.Table("email_notifications", db_metadata, autoload=True)
+
+    delete_email_address = (
+        sa.delete(email_notifications_table)
+            .where((email_notifications_table.c.email_address == email_address))
     )
 
-    # Execute DELETE, then close the connection
-    connection.execute(delete_config)
+    connection.execute(delete_email_address)
     connection.close()
 
 
-def get_qc_configuration_parameters(config_name=None, instrument_id=None, run_id=None):
+def get_completed_samples_count(instrument_id, run_id, status):
 
     """
-    Returns DataFrame of parameters for a selected QC configuration.
-
-    The DataFrame has columns for each parameter, as well as for whether the parameter is enabled.
+    Returns tuple containing count for completed samples and total samples in a given instrument run.
 
     Args:
-        config_name (str, default None):
-            Name of QC configuration
-        instrument_id (str, default None):
-            Instrument ID (name)
-        run_id (str, default None):
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
             Instrument run ID (job ID)
+        status (str):
+            Instrument run (QC job) status, either "Active" or "Complete"
 
     Returns:
-        DataFrame of parameters for QC configuration.
+        Tuple with number of completed samples and total samples for a given instrument run.
     """
 
-    df_configurations = get_table("Settings", "qc_parameters")
+    if status == "Active" and sync_is_enabled():
+        if get_device_identity() == instrument_id:
+            df_instrument_run = get_instrument_run(instrument_id, run_id)
+        else:
+            df_instrument_run = get_instrument_run_from_csv(instrument_id, run_id)
+    else:
+        df_instrument_run = get_instrument_run(instrument_id, run_id)
 
-    # Get selected configuration
-    if config_name is not None:
-        selected_config = df_configurations.loc[df_configurations["config_name"] == config_name]
+    completed = df_instrument_run["completed"].astype(int).tolist()[0]
+    total_samples = df_instrument_run["samples"].astype(int).tolist()[0]
+    return (completed, total_samples)
 
-    elif instrument_id is not None and run_id is not None:
-        df_runs = get_table(instrument_id, "runs")
-        config_name = df_runs.loc[df_runs["run_id"] == run_id]["qc_config_id"].values[0]
-        selected_config = df_configurations.loc[
-            df_configurations["config_name"] == config_name]
 
-    selected_config.drop(inplace=True, columns=["id", "config_name"])
+def get_run_progress(instrument_id, run_id, status):
 
-    # Probably not the most efficient way to do this...
-    for column in ["intensity_enabled", "library_rt_enabled", "in_run_rt_enabled", "library_mz_enabled"]:
-        selected_config.loc[selected_config[column] == 1, column] = True
-        selected_config.loc[selected_config[column] == 0, column] = False
+    """
+    Returns progress of instrument run as a percentage of samples completed.
 
-    # Return parameters of selected configuration as a tuple
-    return selected_config
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        status (str):
+            Instrument run (QC job) status, either "Active" or "Complete"
+
+    Returns:
+        float: Percent of samples processed for the given instrument run.
+    """
+
+    completed, total_samples = get_completed_samples_count(instrument_id, run_id, status)
+    percent_complete = (completed / total_samples) * 100
+    return round(percent_complete, 1)
 
 
-def update_qc_configuration(config_name, intensity_dropouts_cutoff, library_rt_shift_cutoff, in_run_rt_shift_cutoff,
-    library_mz_shift_cutoff, intensity_enabled, library_rt_enabled, in_run_rt_enabled, library_mz_enabled):
+def update_sample_counters_for_run(instrument_id, run_id, latest_sample):
 
     """
-    Updates parameters for the given QC configuration.
+    Increments "completed" count, as well as "pass" and "fail" counts accordingly.
 
-    Due to the database schema, booleans are stored as integers: 0 for False and 1 for True. They need to be
-    cast back to booleans in get_qc_configuration_parameters(). A schema change would remove the bloat.
+    TODO: The "latest_sample" is the last sample to be processed / completed.
+        Nomenclature should be updated for clarity.
 
     Args:
-        config_name (str):
-            Name of QC configuration
-        intensity_dropouts_cutoff (int):
-            Minimum number of internal standard intensity dropouts to constitute a QC fail
-        library_rt_shift_cutoff (float):
-            Maximum shift from library RT values to constitute a QC fail
-        in_run_rt_shift_cutoff (float):
-            Maximum shift from in-run RT values to constitute a QC fail
-        library_mz_shift_cutoff (float):
-            Maximum shift from library m/z values to constitute a QC fail
-        intensity_enabled (bool):
-            Enables / disables QC check for intensity dropout cutoffs
-        library_rt_enabled (bool):
-            Enables / disables QC check for library RT shifts
-        in_run_rt_enabled (bool):
-            Enables / disables QC check for in-run RT shifts
-        library_mz_enabled (bool):
-            Enables / disables QC check for library m/z shifts
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        latest_sample (str):
+            Last sample to be processed
 
     Returns:
         None
     """
 
-    # Connect to database
-    db_metadata, connection = connect_to_database("Settings")
+    df = get_samples_in_run(instrument_id, run_id, "Both")
 
-    # Get QC parameters table
-    qc_parameters_table = sa.Table("qc_parameters", db_metadata, autoload=True)
+    try:
+        passes = int(df["qc_result"].value_counts()["Pass"])
+    except:
+        passes = 0
 
-    # Prepare insert of user-inputted QC parameters
-    update_parameters = (
-        sa.update(qc_parameters_table)
-            .where(qc_parameters_table.c.config_name == config_name)
-            .values(intensity_dropouts_cutoff=intensity_dropouts_cutoff,
-                    library_rt_shift_cutoff=library_rt_shift_cutoff,
-                    in_run_rt_shift_cutoff=in_run_rt_shift_cutoff,
-                    library_mz_shift_cutoff=library_mz_shift_cutoff,
-                    intensity_enabled=intensity_enabled,
-                    library_rt_enabled=library_rt_enabled,
-                    in_run_rt_enabled=in_run_rt_enabled,
-                    library_mz_enabled=library_mz_enabled)
+    try:
+        warnings = int(df["qc_result"].value_counts()["Warning"])
+    except:
+        warnings = 0
+
+    try:
+        fails = int(df["qc_result"].value_counts()["Fail"])
+    except:
+        fails = 0
+
+    completed = passes + fails
+
+    db_metadata, connection = connect_to_database(instrument_id)
+    instrument_runs_table = sa.Table("runs", db_metadata, autoload=True)
+
+    update_status = (
+        sa.update(instrument_runs_table)
+            .where(instrument_runs_table.c.run_id == run_id)
+            .values(
+                completed=completed,
+                passes=passes,
+                fails=fails,
+                latest_sample=latest_sample
+        )
     )
 
-    # Execute UPDATE to database, then close the connection
-    connection.execute(update_parameters)
+    connection.execute(update_status)
     connection.close()
 
+    # Notify readers that the database changed
+    publish_database_version(instrument_id)
 
-def get_samples_in_run(instrument_id, run_id, sample_type="Both"):
+
+def mark_run_as_completed(instrument_id, run_id):
 
     """
-    Returns DataFrame of samples for a given instrument run from instrument database.
+    Marks instrument run status as completed.
 
     Args:
         instrument_id (str):
             Instrument ID
         run_id (str):
             Instrument run ID (job ID)
-        sample_type (str):
-            Sample type, either "Specimen" or "Biological Standard" or "Both"
 
     Returns:
-        DataFrame of sample tables for a given instrument run.
+        None
     """
-    log.debug("get_samples_in_run local variables")
-    log.debug(locals())
-    if sample_type == "Specimen":
-        df = get_table(instrument_id, "sample_qc_results")
 
-    elif sample_type == "Biological Standard":
-        df = get_table(instrument_id, "bio_qc_results")
+    db_metadata, connection = connect_to_database(instrument_id)
+    instrument_runs_table = sa.Table("runs", db_metadata, autoload=True)
 
-    elif sample_type == "Both":
-        df_samples = get_table(instrument_id, "sample_qc_results")
-        df_bio_standards = get_table(instrument_id, "bio_qc_results")
-        df_bio_standards.drop(columns=["biological_standard"], inplace=True)
-        df = pd.concat([df_bio_standards, df_samples], ignore_index=True)
-    #log.debug("get_samples_in_run returns: {}".format(df.loc[df['run_id'] == run_id))
-    return df.loc[df["run_id"] == run_id]
+    update_status = (
+        sa.update(instrument_runs_table)
+            .where(instrument_runs_table.c.run_id == run_id)
+            .values(status="Complete")
+    )
+
+    connection.execute(update_status)
+    connection.close()
 
+    # Recompute the run's summaries from all of its samples
+    rebuild_run_summaries(instrument_id, [run_id])
+
+    # Notify readers that the database changed
+    publish_database_version(instrument_id)
 
-def get_samples_from_csv(instrument_id, run_id, sample_type="Both"):
+
+def skip_sample(instrument_id, run_id):
 
     """
-    Returns DataFrame of samples in a given run using CSV files from Google Drive.
+    Skips sample by setting "latest_sample" value for instrument run to the next sample.
 
-    CSV files of the run metadata, samples, and biological standards tables are stored
-    in the ../data/Instrument_ID_Run_ID/csv directory, and removed on job completion.
+    This function was used after restarting the acquisition listener when MS-DIAL got stuck processing a corrupted file.
+    Now that MS-DIAL runs in the background, it is deprecated and should be removed.
 
     Args:
         instrument_id (str):
             Instrument ID
         run_id (str):
             Instrument run ID (job ID)
-        sample_type (str):
-            Sample type, either "Specimen" or "Biological Standard" or "Both"
 
     Returns:
-        DataFrame of samples for a given instrument run.
+        None
     """
 
-    id = instrument_id.replace(" ", "_") + "_" + run_id
-    csv_directory = os.path.join(data_directory, id, "csv")
-
-    samples_csv = os.path.join(csv_directory, "samples.csv")
-    bio_standards_csv = os.path.join(csv_directory, "bio_standards.csv")
-
-    if sample_type == "Specimen":
-        df = pd.read_csv(samples_csv, index_col=False)
-
-    elif sample_type == "Biological Standard":
-        df = pd.read_csv(bio_standards_csv, index_col=False)
+    # Get next sample
+    samples = get_remaining_samples(instrument_id, run_id)
+    next_sample = samples[1]
 
-    elif sample_type == "Both":
-        df_samples = pd.read_csv(samples_csv, index_col=False)
-        df_bio_standards = pd.read_csv(bio_standards_csv, index_col=False)
-        df_bio_standards.drop(columns=["biological_standard"], inplace=True)
-        #df = df_bio_standards.append(df_samples, ignore_index=True)
-        df = pd.concat([df_bio_standards, df_samples], ignore_index=True)
+    # Set latest sample to next sample
+    db_metadata, connection = connect_to_database(instrument_id)
+    instrument_runs_table = sa.Table("runs", db_metadata, autoload=True)
 
-    df = df.loc[df["run_id"] == run_id]
+    connection.execute((
+        sa.update(instrument_runs_table)
+            .where(instrument_runs_table.c.run_id == run_id)
+            .values(latest_sample=next_sample)
+    ))
 
-    try:
-        df.drop(columns=["id"], inplace=True)
-    finally:
-        return df
+    connection.close()
 
 
-def get_next_sample(sample_id, instrument_id, run_id):
+def store_pid(instrument_id, run_id, pid):
 
     """
-    Returns sample following the given sample, or None if last sample.
+    Stores acquisition listener subprocess ID to allow for checkup and termination.
 
     Args:
-        sample_id (str):
-            Sample ID
         instrument_id (str):
             Instrument ID
         run_id (str):
             Instrument run ID (job ID)
+        pid (str):
+            Process ID for acquisition listener subprocess
 
     Returns:
-        str: The next sample in the instrument run after the given sample ID, or None if last sample.
+        None
     """
 
-    # Get list of samples in run
-    samples = get_samples_in_run(instrument_id, run_id, "Both")["sample_id"].astype(str).tolist()
-
-    # Find sample in list
-    sample_index = samples.index(sample_id)
-    next_sample_index = sample_index + 1
+    db_metadata, connection = connect_to_database(instrument_id)
+    instrument_runs_table = sa.Table("runs", db_metadata, autoload=True)
 
-    # Return next sample
-    if next_sample_index != len(samples):
-        return samples[next_sample_index]
-    else:
-        return None
+    update_pid = (
+        sa.update(instrument_runs_table)
+            .where(instrument_runs_table.c.run_id == run_id)
+            .values(pid=pid)
+    )
 
+    connection.execute(update_pid)
+    connection.close()
 
-def get_remaining_samples(instrument_id, run_id):
 
-    """
-    Returns list of samples remaining in a given instrument run (QC job).
+def get_pid(instrument_id, run_id):
 
-    TODO: This function should just return the samples with null values in the "qc_result" column.
-        The "latest_sample" value in the "runs" table may be unreliable.
+    """
+    Retrieves acquisition listener process ID from "runs" table in Settings database.
 
     Args:
         instrument_id (str):
@@ -2974,1190 +6000,1152 @@ def get_remaining_samples(instrument_id, run_id):
             Instrument run ID (job ID)
 
     Returns:
-        list: List of samples remaining in a QC job.
+        None
     """
 
-    # Get last processed sample in run
-    df_run = get_instrument_run(instrument_id, run_id)
-    latest_sample = df_run["latest_sample"].astype(str).values[0]
-
-    # Get list of samples in run
-    samples = get_samples_in_run(instrument_id, run_id, "Both")["sample_id"].astype(str).tolist()
-
-    # Return all samples if beginning of run
-    if latest_sample == "None":
-        return samples
-
-    # Get index of latest sample
-    latest_sample_index = samples.index(latest_sample)
-
-    # Return list of samples starting at latest sample
-    return samples[latest_sample_index:len(samples)]
+    try:
+        return get_instrument_run(instrument_id, run_id)["pid"].astype(int).tolist()[0]
+    except:
+        return None
 
 
-def get_unprocessed_samples(instrument_id, run_id):
+def upload_to_google_drive(file_dict):
 
     """
-    For an active run, returns 1) a list of samples that were not processed due to error / runtime termination,
-    and 2) the current sample being monitored / processed.
+    Uploads files to Rapid-QC-MS folder in Google Drive.
 
     Args:
-        instrument_id (str):
-            Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
+        file_dict (dict):
+            Dictionary with key-value structure { filename : file path }
 
     Returns:
-        tuple: List of unprocessed samples for the given instrument run, and current sample being monitored / processed.
+        dict: Dictionary with key-value structure { filename : Google Drive ID }
     """
 
-    # Get samples in run
-    df_samples = get_samples_in_run(instrument_id, run_id, "Both")
+    # Get Google Drive instance
+    drive = get_drive_instance()
 
-    # Get list of samples in run
-    samples = df_samples["sample_id"].astype(str).tolist()
+    # Get Google Drive ID for the Rapid-QC-MS folder
+    folder_id = get_drive_folder_id()
 
-    # Construct dictionary of unprocessed samples in instrument run
-    df_unprocessed_samples = df_samples.loc[df_samples["qc_result"].isnull()]
-    unprocessed_samples = df_unprocessed_samples["sample_id"].astype(str).tolist()
+    # Store Drive ID's of uploaded file(s)
+    drive_ids = {}
 
-    # Get acquisition path, data files, and data file extension
-    acquisition_path = get_acquisition_path(instrument_id, run_id)
-    extension = get_data_file_type(instrument_id)
-    directory_files = os.listdir(acquisition_path)
-    data_files = [file.split(".")[0] for file in directory_files if file.split(".")[0] in unprocessed_samples]
+    # Validate Google Drive folder ID
+    if folder_id is not None:
+        if folder_id != "None" and folder_id != "":
 
-    # Mark acquired data files
-    df_unprocessed_samples.loc[
-        df_unprocessed_samples["sample_id"].isin(data_files), "found"] = "Found"
-    unprocessed_samples = df_unprocessed_samples.dropna(subset=["found"])["sample_id"].astype(str).tolist()
+            # Upload each file to Google Drive
+            for filename in file_dict.keys():
+                if os.path.exists(file_dict[filename]):
+                    metadata = {
+                        "title": filename,
+                        "parents": [{"id": folder_id}],
+                    }
+                    file = drive.CreateFile(metadata=metadata)
+                    file.SetContentFile(file_dict[filename])
+                    sync.throttle(os.path.getsize(file_dict[filename]))
+                    file.Upload()
 
-    # Get current sample
-    if len(unprocessed_samples) > 0:
-        current_sample = unprocessed_samples[-1]
-        del unprocessed_samples[-1]
-    else:
-        current_sample = None
+                    drive_ids[file["title"]] = file["id"]
 
-    # Return as tuple
-    return unprocessed_samples, current_sample
+    return drive_ids
 
 
-def get_current_sample(instrument_id, run_id):
+def start_sync_worker():
 
     """
-    Returns the current sample being monitored / processed.
-
-    TODO: The "latest_sample" is the last sample to be processed. Nomenclature needs to be updated in many places.
+    Creates the persistent upload queue if needed, and starts the background worker that processes it.
 
-    Args:
-        instrument_id (str):
-            Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
+    Uploads left in the queue by a previous process (ex: an acquisition listener that was stopped) are resumed.
 
     Returns:
-        str: Current sample being monitored / processed.
+        None
     """
 
-    # Get latest sample in run
-    df_run = get_instrument_run(instrument_id, run_id)
-    latest_sample = df_run["latest_sample"].astype(str).values[0]
+    if sync.queue_database[0] is None:
+        if not os.path.exists(data_directory):
+            os.makedirs(data_directory)
+        sync.initialize(sync_queue_file)
 
-    # Return second sample if beginning of run
-    if latest_sample == "None":
-        return samples[1]
+    sync.start_worker()
 
 
-def parse_internal_standard_data(instrument_id, run_id, result_type, polarity, load_from, as_json=True):
+def queue_qc_results_upload(instrument_id, run_id):
 
     """
-    Parses data from database into JSON-ified DataFrame for samples (as rows) vs. internal standards (as columns).
-
-    Data is stored in a column (for example, "retention_time") as a single-record string dict with the following structure:
-
-    | Sample     | iSTD 1 | iSTD 2 | ... |
-    | ---------- | ------ | ------ | ... |
-    | SAMPLE_001 | 1.207  | 1.934  | ... |
+    Queues an upload of QC results for an instrument run to Google Drive, to be run on a background thread.
 
-    These records are concatenated together with this function using pd.DataFrame(), which is 100x faster than pd.concat().
+    Uploads that are already waiting in the queue for the same instrument run are coalesced into one,
+    since each upload sends the latest results of the entire run. Call wait_for_sync_queue() before
+    the process exits to make sure all queued uploads have finished.
 
     Args:
         instrument_id (str):
             Instrument ID
         run_id (str):
             Instrument run ID (job ID)
-        result_type (str):
-            Column in sample_qc_results table to parse (either "retention_time" or "precursor_mz" or "intensity")
-        polarity (str):
-            Polarity ("Pos" or "Neg")
-        load_from (str):
-            Specifies whether to load data from CSV file (during Google Drive sync of active run) or instrument database
-        as_json (bool, default True):
-            Whether to return table as JSON string or as DataFrame
 
     Returns:
-        DataFrame of samples (rows) vs. internal standards (columns) as JSON string.
+        None
     """
-    log.debug("parse_internal_standard_data locals: {}".format(locals()))
-    # Get relevant QC results table from database
-    if load_from == "database" or load_from == "processing":
-        df_samples = get_samples_in_run(instrument_id, run_id, "Specimen")
-    elif load_from == "csv":
-        df_samples = get_samples_from_csv(instrument_id, run_id, "Specimen")
-    # Filter by polarity
-    df_samples = df_samples.loc[df_samples["polarity"] == polarity]
-    sample_ids = df_samples["sample_id"].astype(str).tolist()
 
-    # Return None if results are None
-    if load_from == "processing":
-        if len(df_samples[result_type].dropna()) == 0:
-            return None
-
-    # Initialize DataFrame with individual records of sample data
-    results = df_samples[result_type].astype(str).tolist()
-    results = [ast.literal_eval(result) if result != "None" and result != "nan" else {} for result in results]
-    df_results = pd.DataFrame(results)
-    df_results.drop(columns=["Name"], inplace=True)
-    df_results["Specimen"] = sample_ids
-    log.debug("parse_intetrnal_standard_data returns df_results: {}".format(df_results))
-    # Return DataFrame as JSON string
-    if as_json:
-        return df_results.to_json(orient="records")
-    else:
-        return df_results
+    start_sync_worker()
+    sync.enqueue("qc_results", "qc_results:" + instrument_id + ":" + run_id, instrument_id=instrument_id, run_id=run_id)
 
 
-def parse_biological_standard_data(instrument_id, run_id, result_type, polarity, biological_standard, load_from, as_json=True, preserve_names=False):
+def queue_database_upload(instrument_id):
 
     """
-    Parses biological standard data into JSON-ified DataFrame of targeted features (as columns) vs. instrument runs (as rows).
-
-    The bio_qc_results table in the instrument database is first filtered by biological standard, chromatography, and polarity.
-    Then, the sample name is replaced with the instrument run it was associated with.
-
-    Data is stored in a column (for example, "intensity") as a single-record string dict with the following structure:
-
-    | Name                | Metabolite 1 | Metabolite 2 | ... |
-    | ------------------- | ------------ | ------------ | ... |
-    | INSTRUMENT_RUN_001  | 13597340     | 53024853     | ... |
-
-    These records are concatenated together with this function using pd.DataFrame(), which is 100x faster than pd.concat().
-
-    | Name                | Metabolite 1 | Metabolite 2 | ... |
-    | ------------------- | ------------ | ------------ | ... |
-    | INSTRUMENT_RUN_001  | 13597340     | 53024853     | ... |
-    | INSTRUMENT_RUN_002  | 23543246     | 102030406    | ... |
-    | ...                 | ...          | ...          | ... |
+    Queues an upload of an instrument database to Google Drive, to be run on a background thread.
 
     Args:
         instrument_id (str):
             Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
-        result_type (str):
-            Column in bio_qc_results table to parse (either "retention_time" or "precursor_mz" or "intensity")
-        polarity (str):
-            Polarity ("Pos" or "Neg")
-        biological_standard (str):
-            Name of biological standard
-        load_from (str):
-            Specifies whether to load data from CSV file (during Google Drive sync of active run) or instrument database
-        as_json (bool, default True):
-            Whether to return table as JSON string or as DataFrame
 
     Returns:
-        JSON-ified DataFrame of targeted features for a biological standard (columns) vs. instrument runs (rows).
+        None
     """
-    log.debug("parse_biological_standard_data input variables")
-    log.debug(locals())
-
-    # Get relevant QC results table from database
-    if load_from == "database":
-        df_samples = get_table(instrument_id, "bio_qc_results")
-    elif load_from == "csv":
-        id = instrument_id.replace(" ", "_") + "_" + run_id
-        bio_standards_csv = os.path.join(data_directory, id, "csv", "bio_standards.csv")
-        df_samples = pd.read_csv(bio_standards_csv, index_col=False)
 
-    # Filter by biological standard type
-    df_samples = df_samples.loc[df_samples["biological_standard"] == biological_standard]
+    start_sync_worker()
+    sync.enqueue("database", "database:" + instrument_id, instrument_id=instrument_id)
 
-    # Filter by polarity
-    df_samples = df_samples.loc[df_samples["polarity"] == polarity]
 
-    # Filter by instrument
-    df_runs = get_table(instrument_id, "runs")
-    chromatography = df_runs.loc[df_runs["run_id"] == run_id]["chromatography"].values[0]
+def queue_methods_upload():
 
-    # Filter by chromatography
-    run_ids = df_runs.loc[df_runs["chromatography"] == chromatography]["run_id"].astype(str).tolist()
-    df_samples = df_samples.loc[df_samples["run_id"].isin(run_ids)]
-    run_ids = df_samples["run_id"].astype(str).tolist()
+    """
+    Queues an upload of the methods directory (settings database and MS-DIAL configurations) to Google Drive.
 
-    # Initialize DataFrame with individual records of sample data
-    results = df_samples[result_type].fillna('{}').tolist()
-    results = [ast.literal_eval(result) if result != "None" and result != "nan" else {} for result in results]
-    df_results = pd.DataFrame(results)
-    df_results.insert(1, "run_id", run_ids)
-    
-    if preserve_names is False:
-        df_results["Name"] = run_ids
+    Returns:
+        None
+    """
 
-    log.debug("parse_biological_standard_data -> df_results:")
-    log.debug(df_results.head())
-    # Return DataFrame as JSON string
-    if as_json:
-        return df_results.to_json(orient="records")
-    else:
-        return df_results
+    start_sync_worker()
+    sync.enqueue("methods", "methods")
 
 
-def parse_internal_standard_qc_data(instrument_id, run_id, polarity, result_type, load_from, as_json=True):
+def queue_run_completion_sync(instrument_id, run_id):
 
     """
-    Parses QC data into JSON-ified DataFrame for samples (as rows) vs. internal standards (as columns).
-
-    The QC DataFrame is stored in the "qc_dataframe" column as a single-record string dict with the following structure:
-
-    | Sample     | Delta m/z | Delta RT | In-run delta RT | Warnings | Fails |
-    | ---------- | --------- | -------- | --------------- | -------- | ----- |
-    | SAMPLE_001 | 0.000001  | 0.001    | 0.00001         | None     | None  |
-
-    These records are concatenated together with this function using pd.DataFrame(), which is 100x faster than pd.concat().
+    Queues the syncing that follows a completed (or stopped) instrument run, see sync_on_run_completion().
 
     Args:
         instrument_id (str):
             Instrument ID
         run_id (str):
             Instrument run ID (job ID)
-        polarity (str):
-            Polarity ("Pos" or "Neg")
-        result_type (str):
-            Column in sample_qc_results table to parse (either "retention_time" or "precursor_mz" or "intensity")
-        load_from (str):
-            Specifies whether to load data from CSV file (during Google Drive sync of active run) or instrument database
-        as_json (bool, default True):
-            Whether to return table as JSON string or as DataFrame
 
     Returns:
-        JSON-ified DataFrame of QC data for samples (as rows) vs. internal standards (as columns).
+        None
     """
 
-    # Get relevant QC results table from database
-    if load_from == "database" or load_from == "processing":
-        df_samples = get_samples_in_run(instrument_id, run_id, "Specimen")
-    elif load_from == "csv":
-        df_samples = get_samples_from_csv(instrument_id, run_id, "Specimen")
-
-    # Filter by polarity
-    df_samples = df_samples.loc[df_samples["polarity"] == polarity]
-
-    # For results DataFrame, each index corresponds to the result type
-    get_result_index = {
-        "Delta m/z": 0,
-        "Delta RT": 1,
-        "In-run delta RT": 2,
-        "Intensity dropout": 3,
-        "Warnings": 4,
-        "Fails": 5
-    }
+    # QC result files are only deleted after the database (which now holds the run) was uploaded
+    queue_database_upload(instrument_id)
+    queue_active_run_cleanup(instrument_id, run_id)
 
-    # Get list of results using result type
-    sample_ids = df_samples["sample_id"].astype(str).tolist()
-    results = df_samples["qc_dataframe"].fillna('[{}, {}, {}, {}, {}, {}]').astype(str).tolist()
 
-    type_index = get_result_index[result_type]
-    results = [ast.literal_eval(result)[type_index] for result in results]
-    df_results = pd.DataFrame(results)
-    df_results.drop(columns=["Name"], inplace=True)
-    df_results["Specimen"] = sample_ids
+def queue_active_run_cleanup(instrument_id, run_id):
 
-    # Return DataFrame as JSON string
-    if as_json:
-        return df_results.to_json(orient="records")
-    else:
-        return df_results
+    """
+    Queues deletion of the QC result files of an instrument run from Google Drive, see delete_active_run_csv_files().
 
+    The deletion waits for a queued upload of the instrument database to succeed, so that remote devices
+    don't lose the run's results if the upload fails (ex: while offline).
 
-def get_workspace_users_list():
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
 
-    """
-    Returns a list of users that have access to the Rapid-QC-MS workspace.
+    Returns:
+        None
     """
 
-    return get_table("Settings", "gdrive_users")["email_address"].astype(str).tolist()
+    start_sync_worker()
+    sync.enqueue("active_run_cleanup", "active_run_cleanup:" + instrument_id + ":" + run_id,
+        depends_on="database:" + instrument_id, instrument_id=instrument_id, run_id=run_id)
 
 
-def add_user_to_workspace(email_address):
+def wait_for_sync_queue(timeout=None):
 
     """
-    Gives user access to workspace in Google Drive and stores email address in database.
+    Blocks until all queued uploads to Google Drive have finished, or until the timeout expires.
 
-    Access is granted by sharing the Rapid-QC-MS folder in Google Drive with the user's Google account.
+    Uploads that are still queued after the timeout stay in the queue, and are resumed by the next
+    process that starts the sync worker (see start_sync_worker()).
 
     Args:
-        email_address (str): Email address for Google account to grant access to workspace.
+        timeout (float, default None):
+            Maximum number of seconds to wait, or None to wait indefinitely
 
     Returns:
-        None
+        bool: True if all queued uploads have finished
     """
 
-    if email_address in get_workspace_users_list():
-        return "User already exists"
+    return sync.wait_until_idle(timeout)
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
 
-    # Get ID of Rapid-QC-MS folder in Google Drive
-    gdrive_folder_id = get_drive_folder_id()
+def get_active_run_sync_state_path(instrument_id, run_id):
 
-    if gdrive_folder_id is not None:
-        # Add user access by updating permissions
-        folder = drive.CreateFile({"id": gdrive_folder_id})
-        permission = folder.InsertPermission({
-            "type": "user",
-            "role": "writer",
-            "value": email_address})
+    """
+    Returns path of the local state file for syncing an active instrument run through Google Drive.
 
-        # Insert user email address in "gdrive_users" table
-        db_metadata, connection = connect_to_database("Settings")
-        gdrive_users_table = sa.Table("gdrive_users", db_metadata, autoload=True)
+    The file is kept outside of the run's temporary directory, so that it survives restarts of the acquisition listener.
 
-        insert_user_email = gdrive_users_table.insert().values(
-            {"name": permission["name"],
-             "email_address": email_address,
-             "permission_id": permission["id"]})
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
 
-        connection.execute(insert_user_email)
-        connection.close()
+    Returns:
+        str: Path of the state file
+    """
 
-    else:
-        return "Error"
+    shard_directory = os.path.join(data_directory, "shards")
+    if not os.path.exists(shard_directory):
+        os.makedirs(shard_directory)
 
+    id = instrument_id.replace(" ", "_") + "_" + run_id
+    return os.path.join(shard_directory, id + "_active.json")
 
-def delete_user_from_workspace(email_address):
 
+def upload_qc_results(instrument_id, run_id):
+    
     """
-    Removes user access to workspace in Google Drive and deletes email from database.
+    Uploads QC results of newly processed samples in an active instrument run to the storage backend (Google Drive).
+
+    Each new or reprocessed sample is uploaded as a small, append-only shard named "Instrument_ID_Run_ID_qc_00001.json.gz",
+    which holds its row from "sample_qc_results" or "bio_qc_results". The run record (minus its counters) is uploaded
+    as a shard only when it changes. A manifest "Instrument_ID_Run_ID.json" holds the run's counters and the number of
+    shards, so its size doesn't grow with the run, and remote devices only download shards they haven't seen yet
+    (see download_qc_results()).
+
+    Shards are numbered in the order of the run's rows, and the highest number that may have been uploaded is saved
+    before each upload. If the acquisition listener stops between uploading a shard and saving its state, the next upload
+    replaces the same shard instead of adding a duplicate, and the manifest only counts shards whose state was saved.
+
+    Whenever anything changed, a tiny progress manifest "Instrument_ID_Run_ID_progress.json" is uploaded last,
+    with the number of completed samples, the latest sample, and a version that remote devices poll cheaply
+    (see get_qc_results_progress()).
 
     Args:
-        email_address (str): Email address for Google account whose access will to be revoked.
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
 
     Returns:
         None
     """
 
-    if email_address not in get_workspace_users_list():
-        return "User does not exist"
+    id = instrument_id.replace(" ", "_") + "_" + run_id
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
+    # Get storage backend
+    backend = get_storage_backend()
+    if backend is None:
+        return None
 
-    # Get ID of Rapid-QC-MS folder in Google Drive
-    gdrive_folder_id = get_drive_folder_id()
+    # Read hashes of rows that were already uploaded for this run
+    state_path = get_active_run_sync_state_path(instrument_id, run_id)
+    try:
+        with open(state_path, "r") as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        state = {"run_id": run_id, "manifest_id": None, "version": 0, "counts": None, "hashes": {}}
 
-    if gdrive_folder_id is not None:
-        # Get permission ID of user from database
-        folder = drive.CreateFile({"id": gdrive_folder_id})
-        df_gdrive_users = get_table("Settings", "gdrive_users")
-        df_gdrive_users = df_gdrive_users.loc[df_gdrive_users["email_address"] == email_address]
-        permission_id = df_gdrive_users["permission_id"].astype(str).values[0]
+    # State files that list every shard are converted to shard counters
+    if "shards" in state:
+        state["sequence"] = state["reserved"] = state["published"] = len(state.pop("shards"))
 
-        # Delete user access by updating permissions
-        folder.DeletePermission(permission_id)
+    for counter in ["sequence", "reserved", "published"]:
+        state.setdefault(counter, 0)
 
-        # Delete user email address in "gdrive_users" table
-        db_metadata, connection = connect_to_database("Settings")
-        gdrive_users_table = sa.Table("gdrive_users", db_metadata, autoload=True)
+    def save_state():
+        temporary_file = state_path + ".tmp"
+        with open(temporary_file, "w") as file:
+            json.dump(state, file)
+        os.replace(temporary_file, state_path)
 
-        delete_user_email = (
-            sa.delete(gdrive_users_table)
-                .where((gdrive_users_table.c.email_address == email_address))
-        )
+    # Get the run record and this run's rows only (not the entire "bio_qc_results" table)
+    database = get_database_file(instrument_id, sqlite_conn=True)
+    engine = sa.create_engine(database)
 
-        connection.execute(delete_user_email)
-        connection.close()
+    df_run = pd.read_sql(sa.text("SELECT * FROM runs WHERE run_id = :run_id").bindparams(run_id=run_id), engine)
+    counter_columns = ["status", "completed", "passes", "fails", "latest_sample"]
+    counts = json.loads(df_run[counter_columns].to_json(orient="records"))[0]
 
-    else:
-        return "Error"
+    # Leave out counters (sent in the manifest) and device-specific columns, so the run shard rarely changes
+    tables = {"runs": df_run.drop(columns=counter_columns + ["id", "pid", "drive_id"])}
+    for table in ["sample_qc_results", "bio_qc_results"]:
+        query = sa.text("SELECT * FROM " + table + " WHERE run_id = :run_id AND qc_result IS NOT NULL ORDER BY id").bindparams(run_id=run_id)
+        tables[table] = pd.read_sql(query, engine).drop(columns=["id"])
 
-def get_qc_results(instrument_id, sample_list, is_bio_standard=False):
+    # Shards up to this number may exist already (from an upload that was interrupted), and are replaced by name
+    reserved = state["reserved"]
 
-    """
-    Returns DataFrame of QC results for a given sample list.
+    # Upload a shard for each new or changed row
+    for table, df in tables.items():
+        for row in json.loads(df.to_json(orient="split", index=False))["data"]:
+            content = json.dumps({"table": table, "columns": df.columns.tolist(), "row": row}, sort_keys=True).encode("utf-8")
+            key = table + ":" + (row[df.columns.tolist().index("sample_id")] if table != "runs" else run_id)
+            row_hash = hashlib.md5(content).hexdigest()
 
-    TODO: This function will break if samples in different runs have the same sample ID. Add run ID filter.
+            if state["hashes"].get(key) == row_hash:
+                continue
 
-    Args:
-        instrument_id (str):
-            Instrument ID
-        sample_list (list):
-            List of samples to query (20231201 Ira: only ever one element?)
-        is_bio_standard (bool, default False):
-            Whether the list is biological standards (True) or samples (False)
+            sequence = state["sequence"] + 1
+            if sequence > state["reserved"]:
+                state["reserved"] = sequence
+                save_state()
 
-    Returns:
-        DataFrame of QC results for a given sample list.
-    """
-    log.debug("get_qc_results input variables")
-    log.debug(locals())
+            backend.put(get_qc_results_shard_name(instrument_id, run_id, sequence), gzip.compress(content, mtime=0),
+                new=sequence > reserved)
 
-    if len(sample_list) == 0:
-        return pd.DataFrame()
+            state["hashes"][key] = row_hash
+            state["sequence"] = sequence
 
-    database = get_database_file(instrument_id=instrument_id, sqlite_conn=True)
-    engine = sa.create_engine(database)
+    # Skip manifests if nothing changed since the last upload
+    if state["sequence"] == state["published"] and counts == state.get("counts") and state["manifest_id"] is not None:
+        return None
 
-    sample_list = str(sample_list[0])
+    save_state()
 
-    log.debug("sample_list: " + sample_list)
-    if is_bio_standard:
-        query = sa.text("SELECT sample_id, qc_result FROM bio_qc_results WHERE sample_id = :sample_list").\
-            bindparams(sample_list=sample_list)
-    else:
-        query = sa.text("SELECT sample_id, qc_result FROM sample_qc_results WHERE sample_id = :sample_list").\
-            bindparams(sample_list=sample_list)
-        
-    log.debug("get_qc_results returns pd.read_sql(query, engine), which looks like:")
-    log.debug(pd.read_sql(query, engine))
-    return pd.read_sql(query, engine)
+    state["version"] = state.get("version", 0) + 1
+    state["counts"] = counts
 
+    # Upload manifest with counters and number of shards
+    manifest = json.dumps({"run_id": run_id, "version": state["version"], "counts": counts,
+        "shard_count": state["sequence"]}).encode("utf-8")
+    manifest_file = backend.put(id + ".json", manifest, id=state["manifest_id"])
+    state["published"] = state["sequence"]
 
-def create_workspace_metadata():
+    # Upload progress manifest last, so that remote devices find everything it refers to
+    progress = {"run_id": run_id, "version": state["version"], "status": counts["status"],
+        "completed": counts["completed"], "latest_sample": counts["latest_sample"], "manifest_id": manifest_file["id"]}
+    progress_file = backend.put(id + "_progress.json", json.dumps(progress).encode("utf-8"), id=state.get("progress_id"))
+    state["progress_id"] = progress_file["id"]
 
-    """
-    Creates record in "workspace" table to store various metadata.
-    """
+    with progress_cache_lock:
+        progress_cache[(instrument_id, run_id)] = (time.time(), progress)
 
-    db_metadata, connection = connect_to_database("Settings")
-    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
-    connection.execute(workspace_table.insert().values({"id": 1}))
-    connection.close()
+    # Save state, then store ID of the manifest in local database
+    if state["manifest_id"] != manifest_file["id"]:
+        state["manifest_id"] = manifest_file["id"]
 
+        db_metadata, connection = connect_to_database(instrument_id)
+        runs_table = sa.Table("runs", db_metadata, autoload=True)
+
+        connection.execute((
+            sa.update(runs_table)
+                .where(runs_table.c.run_id == run_id)
+                .values(drive_id=manifest_file["id"])
+        ))
+
+        connection.close()
+
+    save_state()
 
-def get_device_identity():
+
+def get_qc_results_shard_name(instrument_id, run_id, sequence):
 
     """
-    Returns device identity (either an Instrument ID or "Shared user").
+    Returns the file name of a shard of QC results of an active instrument run (see upload_qc_results()).
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        sequence (int):
+            Number of the shard, starting at 1
+
+    Returns:
+        str: File name of the shard
     """
 
-    return get_table("Settings", "workspace")["instrument_identity"].astype(str).tolist()[0]
+    return instrument_id.replace(" ", "_") + "_" + run_id + "_qc_" + str(sequence).zfill(5) + ".json.gz"
 
 
-def set_device_identity(is_instrument_computer, instrument_id):
+def get_qc_results_progress(instrument_id, run_id, max_age=None):
 
     """
-    Indicates whether the user's device is the instrument PC or not.
+    Returns the progress manifest of an active instrument run, as uploaded by upload_qc_results().
+
+    The progress manifest is a few bytes, so remote devices can poll it on every refresh to find out whether
+    there are new results. Downloaded progress is reused for a few seconds (see progress_cache_duration).
 
     Args:
-        is_instrument_computer (bool):
-            Whether the device is an instrument computer or not
         instrument_id (str):
-            Instrument ID (if None, set to "Shared user")
+            Instrument ID
+        run_id (str):
+            Instrument run ID (job ID)
+        max_age (float, default None):
+            Maximum age (in seconds) of cached progress to return. Defaults to progress_cache_duration.
 
     Returns:
-        None
+        dict: Run ID, version, status, number of completed samples, latest sample, and manifest ID,
+        or None if the run has no progress manifest
     """
 
-    if not is_instrument_computer:
-        instrument_id = "Shared user"
+    if max_age is None:
+        max_age = progress_cache_duration
 
-    db_metadata, connection = connect_to_database("Settings")
-    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
+    key = (instrument_id, run_id)
 
-    update_identity = (
-        sa.update(workspace_table)
-            .where(workspace_table.c.id == 1)
-            .values(
-                is_instrument_computer=is_instrument_computer,
-                instrument_identity=instrument_id
-        )
-    )
+    with progress_cache_lock:
+        if key in progress_cache and time.time() - progress_cache[key][0] < max_age:
+            return progress_cache[key][1]
 
-    connection.execute(update_identity)
-    connection.close()
+    backend = get_storage_backend()
+    if backend is None:
+        return None
 
+    try:
+        filename = instrument_id.replace(" ", "_") + "_" + run_id + "_progress.json"
+        progress = json.loads(backend.get(filename))
+    except FileNotFoundError:
+        progress = None
+
+    with progress_cache_lock:
+        progress_cache[key] = (time.time(), progress)
+
+    return progress
 
-def run_is_on_instrument_pc(instrument_id, run_id):
+
+def download_qc_results(instrument_id, run_id):
 
     """
-    Validates that the current device is the instrument PC on which the run was started.
+    Downloads QC results of an active instrument run from the storage backend (Google Drive) and stores them
+    as CSV files in /data directory.
 
-    TODO: Use this function in PlotGeneration and DashWebApp module.
+    The progress manifest of the run is checked first (see get_qc_results_progress()), and nothing else is downloaded
+    unless its version changed. Then, only shards that were uploaded since the last download are fetched by name,
+    up to the number of shards in the manifest (see upload_qc_results()). New samples are appended to the local CSV
+    files, which are only read and rewritten (once per download) if a sample was reprocessed. The sample ID's that
+    were applied are kept in applied.json, next to the CSV files. The run record is rewritten with the latest counters
+    from the manifest.
+
+    The biological standards CSV file also includes biological standards of previous runs from the local database,
+    so that benchmark plots work the same as for completed runs.
 
     Args:
         instrument_id (str):
             Instrument ID
         run_id (str):
-            Instrument run ID
+            Instrument run ID (job ID)
 
     Returns:
-        True if instrument run was started on the current device, and False if not.
+        tuple: Paths of run.csv, samples.csv, and bio_standards.csv, respectively.
     """
 
-    instrument_id = get_instrument_run(instrument_id, run_id)["instrument_id"].astype(str).tolist()[0]
-    device_identity = get_table("Settings", "workspace")["instrument_identity"].astype(str).tolist()[0]
+    id = instrument_id.replace(" ", "_") + "_" + run_id
 
-    if instrument_id == device_identity:
-        return True
+    # Get storage backend
+    backend = get_storage_backend()
+
+    # Initialize directories
+    csv_directory = os.path.join(data_directory, id, "csv")
+    if not os.path.exists(csv_directory):
+        os.makedirs(csv_directory)
+
+    # Define file paths
+    run_csv = os.path.join(csv_directory, "run.csv")
+    samples_csv = os.path.join(csv_directory, "samples.csv")
+    bio_standards_csv_file = os.path.join(csv_directory, "bio_standards.csv")
+    state_path = os.path.join(csv_directory, "applied.json")
+    csv_files = {"sample_qc_results": samples_csv, "bio_qc_results": bio_standards_csv_file}
+
+    try:
+        with open(state_path, "r") as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        state = {"sequence": 0, "run": None, "applied": {}}
+
+        # Start biological standards from previous runs in local database
+        if os.path.exists(get_database_file(instrument_id)):
+            df_bio_standards = get_table(instrument_id, "bio_qc_results")
+            df_bio_standards = df_bio_standards.loc[df_bio_standards["run_id"] != run_id]
+            if len(df_bio_standards) > 0:
+                df_bio_standards.to_csv(bio_standards_csv_file, index=False)
+
+    # Only download the manifest if the run's progress version changed since the last download
+    progress = get_qc_results_progress(instrument_id, run_id)
+
+    if progress is not None:
+        if progress["version"] == state.get("version"):
+            return (run_csv, samples_csv, bio_standards_csv_file)
+        manifest_file = {"name": id + ".json", "id": progress["manifest_id"], "modified": None}
+
+    # Without a progress manifest, compare the modified date of the manifest
     else:
-        return False
+        manifest_file = backend.stat(id + ".json") if backend is not None else None
 
+    if manifest_file is not None and (progress is not None or manifest_file["modified"] != state.get("modified_date")):
+        manifest = json.loads(backend.get(manifest_file["name"], id=manifest_file["id"]))
 
-def update_slack_bot_token(slack_bot_token):
+        # Manifests of older versions list every shard instead of counting them
+        shard_count = manifest["shard_count"] if "shard_count" in manifest else len(manifest["shards"])
 
-    """
-    Updates Slack bot user OAuth 2.0 token in "workspace" table of Settings database.
+        # Sample ID's of this run that are already in each CSV file (state files of older versions don't list them)
+        if "applied" not in state:
+            state["applied"] = {}
+            for table, csv_file in csv_files.items():
+                if os.path.exists(csv_file):
+                    df = pd.read_csv(csv_file, index_col=False, usecols=["sample_id", "run_id"])
+                    state["applied"][table] = df.loc[df["run_id"] == run_id]["sample_id"].astype(str).tolist()
 
-    For details on the Slack API, see: https://slack.dev/python-slack-sdk/
+        applied = {table: set(state["applied"].get(table, [])) for table in csv_files}
 
-    Args:
-        slack_bot_token (str): Slack bot user OAuth token
+        # Download new shards in order, keeping the latest row of each sample
+        new_rows = {table: {} for table in csv_files}
 
-    Returns:
-        None
-    """
+        for sequence in range(state["sequence"] + 1, shard_count + 1):
+            shard_filename = get_qc_results_shard_name(instrument_id, run_id, sequence)
+            shard = json.loads(gzip.decompress(backend.get(shard_filename)).decode("utf-8"))
+            row = dict(zip(shard["columns"], shard["row"]))
 
-    db_metadata, connection = connect_to_database("Settings")
-    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
+            if shard["table"] == "runs":
+                state["run"] = row
+            else:
+                new_rows[shard["table"]][str(row["sample_id"])] = row
 
-    update_slack_bot_token = (
-        sa.update(workspace_table)
-            .where(workspace_table.c.id == 1)
-            .values(slack_bot_token=slack_bot_token)
-    )
+            state["sequence"] = sequence
 
-    connection.execute(update_slack_bot_token)
-    connection.close()
+        # Append new samples to the CSV files, which are only read and rewritten if a sample was reprocessed
+        for table, rows in new_rows.items():
+            if len(rows) == 0:
+                continue
 
+            csv_file = csv_files[table]
+            df_rows = pd.DataFrame(list(rows.values()))
 
-def get_slack_bot_token():
+            if not os.path.exists(csv_file):
+                df_rows.to_csv(csv_file, index=False)
 
-    """
-    Returns Slack bot token stored in "workspace" table of Settings database.
-    """
+            elif len(applied[table].intersection(rows)) > 0:
+                df = pd.read_csv(csv_file, index_col=False)
+                reprocessed = (df["sample_id"].astype(str).isin(rows)) & (df["run_id"] == run_id)
+                df = pd.concat([df.loc[~reprocessed], df_rows], ignore_index=True)[df.columns]
+                df.to_csv(csv_file, index=False)
 
-    return get_table("Settings", "workspace")["slack_bot_token"].astype(str).values[0]
+            else:
+                columns = pd.read_csv(csv_file, index_col=False, nrows=0).columns
+                df_rows.reindex(columns=columns).to_csv(csv_file, mode="a", header=False, index=False)
 
+            applied[table].update(rows)
+            state["applied"][table] = sorted(applied[table])
 
-def update_slack_channel(slack_channel, notifications_enabled):
+        # Rewrite run record with latest counters
+        if state["run"] is not None:
+            pd.DataFrame([dict(state["run"], **manifest["counts"])]).to_csv(run_csv, index=False)
 
-    """
-    Updates Slack channel registered for notifications in "workspace" table of Settings database.
+        state["version"] = manifest.get("version")
+        state["modified_date"] = manifest_file["modified"]
+        with open(state_path, "w") as file:
+            json.dump(state, file)
 
-    Args:
-        slack_channel (str):
-            Slack channel to post messages to
-        notifications_enabled (bool):
-            Whether to send Slack notifications for QC warnings and fails
+    # Define and return file paths
+    return (run_csv, samples_csv, bio_standards_csv_file)
 
-    Returns:
-        None
-    """
 
-    db_metadata, connection = connect_to_database("Settings")
-    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
+def get_drive_folder_id():
 
-    update_slack_channel = (
-        sa.update(workspace_table)
-            .where(workspace_table.c.id == 1)
-            .values(
-                slack_channel=slack_channel.replace("#", ""),
-                slack_enabled=notifications_enabled)
-    )
+    """
+    Returns Google Drive ID for the Rapid-QC-MS folder (found in user's root Drive directory).
+    """
 
-    connection.execute(update_slack_channel)
-    connection.close()
+    return get_table("Settings", "workspace")["gdrive_folder_id"].values[0]
 
 
-def get_slack_channel():
+def get_database_drive_id(instrument_id):
 
     """
-    Returns Slack channel registered for notifications.
+    Returns Google Drive ID for a given instrument's database.
+
+    Args:
+        instrument_id (str): Instrument ID
+
+    Returns:
+        str: Google Drive ID for the instrument database ZIP archive.
     """
 
-    return get_table("Settings", "workspace")["slack_channel"].astype(str).values[0]
+    df = get_table("Settings", "instruments")
+    return df.loc[df["name"] == instrument_id]["drive_id"].values[0]
 
 
-def get_slack_notifications_toggled():
+def read_sync_state():
 
     """
-    Returns Slack notification toggle setting.
+    Reads the local sync state file, which caches Google Drive ID's and modified dates of files in storage.
+
+    Returns:
+        dict: Sync state with "drive_ids" and "last_modified" dictionaries, keyed by file or database name
     """
 
     try:
-        return get_table("Settings", "workspace")["slack_enabled"].astype(int).tolist()[0]
-    except:
-        return None
+        with open(sync_state_file, "r") as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        state = {}
 
+    state.setdefault("drive_ids", {})
+    state.setdefault("last_modified", {})
+    return state
 
-def get_email_notifications_list(as_string=False):
+
+def update_sync_state(section, name, value):
 
     """
-    Returns list of emails registered for email notifications for QC warnings and fails.
+    Sets (or removes) a value in the local sync state file.
+
+    The file is locked while it is rewritten, since the acquisition listener and the dashboard both update it.
 
     Args:
-        as_string (bool, default False):
-            Whether to return the list as a string (for Gmail API) or as list object (for display in Settings page)
+        section (str):
+            Section of the sync state ("drive_ids" or "last_modified")
+        name (str):
+            File or database name
+        value (str):
+            Value to store, or None to remove it
 
     Returns:
-        List of emails registered for QC warning/fail notifications.
+        None
     """
 
-    email_list = get_table("Settings", "email_notifications")["email_address"].astype(str).tolist()
+    lock_file = sync_state_file + ".lock"
+    acquire_lock_file(lock_file, version_lock_timeout)
 
-    if as_string:
-        email_list_string = ""
+    try:
+        state = read_sync_state()
 
-        for email in email_list:
-            email_list_string += email
-            if email != email_list[-1]:
-                email_list_string += ","
+        if value is None:
+            state[section].pop(name, None)
+        else:
+            state[section][name] = value
 
-        return email_list_string
+        write_sync_state(state)
 
-    else:
-        return email_list
+    finally:
+        release_lock_file(lock_file)
 
 
-def register_email_for_notifications(email_address):
+def write_sync_state(state):
 
     """
-    Inserts email address into "email_notifications" table in Settings database.
+    Writes the local sync state file, replacing the previous one atomically.
 
     Args:
-        email_address (str): Email address to register for notifications.
+        state (dict): Sync state, as returned by read_sync_state()
 
     Returns:
         None
     """
 
-    db_metadata, connection = connect_to_database("Settings")
-    email_notifications_table = sa.Table("email_notifications", db_metadata, autoload=True)
-
-    insert_email_address = email_notifications_table.insert().values({
-        "email_address": email_address
-    })
-
-    connection.execute(insert_email_address)
-    connection.close()
+    temporary_file = sync_state_file + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+    with open(temporary_file, "w") as file:
+        json.dump(state, file)
+    os.replace(temporary_file, sync_state_file)
 
 
-def delete_email_from_notifications(email_address):
+def get_cached_drive_id(name):
 
     """
-    Deletes email address from "email_notifications" table in Settings database.
+    Returns the cached Google Drive ID for a file in the Rapid-QC-MS Google Drive folder.
+
+    Falls back to Drive ID's stored in the "workspace" table (methods ZIP archive) and
+    "instruments" table (instrument database ZIP archives).
 
     Args:
-        email_address (str): Email address to unsubscribe from notifications.
+        name (str): Title of the file in Google Drive
 
     Returns:
-        None
+        str: Google Drive ID, or None if not cached
     """
 
-    db_metadata, connection = connect_to_database("Settings")
-    email_notifications_table = sa.Table("email_notifications", db_metadata, autoload=True)
+    drive_id = read_sync_state()["drive_ids"].get(name)
+    if drive_id is not None:
+        return drive_id
 
-    delete_email_address = (
-        sa.delete(email_notifications_table)
-            .where((email_notifications_table.c.email_address == email_address))
-    )
+    # Check Drive ID's stored during workspace setup
+    if name == "methods.zip":
+        drive_id = get_table("Settings", "workspace")["methods_zip_file_id"].values[0]
+    else:
+        df_instruments = get_table("Settings", "instruments")
+        df_instruments = df_instruments.loc[df_instruments["name"].str.replace(" ", "_") + ".zip" == name]
+        drive_id = df_instruments["drive_id"].values[0] if len(df_instruments) > 0 else None
 
-    connection.execute(delete_email_address)
-    connection.close()
+    if drive_id is None or drive_id == "None" or drive_id == "":
+        return None
 
+    return drive_id
 
-def get_completed_samples_count(instrument_id, run_id, status):
+
+def remember_drive_id(name, drive_id):
 
     """
-    Returns tuple containing count for completed samples and total samples in a given instrument run.
+    Caches the Google Drive ID of a file in the Rapid-QC-MS Google Drive folder (see read_sync_state()).
 
     Args:
-        instrument_id (str):
-            Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
-        status (str):
-            Instrument run (QC job) status, either "Active" or "Complete"
+        name (str):
+            Title of the file in Google Drive
+        drive_id (str):
+            Google Drive ID of the file, or None to remove it from the cache
 
     Returns:
-        Tuple with number of completed samples and total samples for a given instrument run.
+        None
     """
 
-    if status == "Active" and sync_is_enabled():
-        if get_device_identity() == instrument_id:
-            df_instrument_run = get_instrument_run(instrument_id, run_id)
-        else:
-            df_instrument_run = get_instrument_run_from_csv(instrument_id, run_id)
-    else:
-        df_instrument_run = get_instrument_run(instrument_id, run_id)
-
-    completed = df_instrument_run["completed"].astype(int).tolist()[0]
-    total_samples = df_instrument_run["samples"].astype(int).tolist()[0]
-    return (completed, total_samples)
+    update_sync_state("drive_ids", name, drive_id)
 
 
-def get_run_progress(instrument_id, run_id, status):
+def set_storage_backend(backend):
 
     """
-    Returns progress of instrument run as a percentage of samples completed.
+    Sets the storage backend used for syncing, instead of Google Drive (ex: an InMemoryBackend for benchmarks).
 
     Args:
-        instrument_id (str):
-            Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
-        status (str):
-            Instrument run (QC job) status, either "Active" or "Complete"
+        backend (StorageBackend): Storage backend, or None to use the default backend
 
     Returns:
-        float: Percent of samples processed for the given instrument run.
+        None
     """
 
-    completed, total_samples = get_completed_samples_count(instrument_id, run_id, status)
-    percent_complete = (completed / total_samples) * 100
-    return round(percent_complete, 1)
+    storage_backend[0] = backend
 
 
-def update_sample_counters_for_run(instrument_id, run_id, latest_sample):
+def get_storage_backend():
 
     """
-    Increments "completed" count, as well as "pass" and "fail" counts accordingly.
-
-    TODO: The "latest_sample" is the last sample to be processed / completed.
-        Nomenclature should be updated for clarity.
+    Returns the storage backend used for syncing the workspace between devices.
 
-    Args:
-        instrument_id (str):
-            Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
-        latest_sample (str):
-            Last sample to be processed
+    In order of precedence, this is the backend set with set_storage_backend(), a LocalDirectoryBackend for the
+    directory in the RAPIDQCMS_SYNC_DIRECTORY environment variable, or a GoogleDriveBackend for the Rapid-QC-MS folder
+    in Google Drive. The Google Drive backend is created once per process, and Google Drive ID's are also cached
+    on disk (see get_cached_drive_id()).
 
     Returns:
-        None
+        StorageBackend: Storage backend, or None if sync is not set up
     """
 
-    df = get_samples_in_run(instrument_id, run_id, "Both")
-
-    try:
-        passes = int(df["qc_result"].value_counts()["Pass"])
-    except:
-        passes = 0
+    if storage_backend[0] is not None:
+        return storage_backend[0]
 
-    try:
-        warnings = int(df["qc_result"].value_counts()["Warning"])
-    except:
-        warnings = 0
+    sync_directory = os.environ.get(sync_directory_environment_variable)
+    if sync_directory:
+        storage_backend[0] = storage.LocalDirectoryBackend(sync_directory)
+        return storage_backend[0]
 
-    try:
-        fails = int(df["qc_result"].value_counts()["Fail"])
-    except:
-        fails = 0
+    gdrive_folder_id = get_drive_folder_id()
+    if gdrive_folder_id is None or gdrive_folder_id == "None" or gdrive_folder_id == "":
+        return None
 
-    completed = passes + fails
+    if drive_backend[0] is None or drive_backend[1] != gdrive_folder_id:
 
-    db_metadata, connection = connect_to_database(instrument_id)
-    instrument_runs_table = sa.Table("runs", db_metadata, autoload=True)
+        # Clear sync state of a previous workspace, so that its Google Drive ID's aren't used in the new folder
+        if read_sync_state().get("folder_id") != gdrive_folder_id:
+            write_sync_state({"folder_id": gdrive_folder_id})
 
-    update_status = (
-        sa.update(instrument_runs_table)
-            .where(instrument_runs_table.c.run_id == run_id)
-            .values(
-                completed=completed,
-                passes=passes,
-                fails=fails,
-                latest_sample=latest_sample
-        )
-    )
+        drive_backend[0] = storage.GoogleDriveBackend(get_drive_instance(), gdrive_folder_id,
+            lookup_id=get_cached_drive_id, remember_id=remember_drive_id)
+        drive_backend[1] = gdrive_folder_id
 
-    connection.execute(update_status)
-    connection.close()
+    return drive_backend[0]
 
 
-def mark_run_as_completed(instrument_id, run_id):
+def upload_database(instrument_id, sync_settings=False):
 
     """
-    Marks instrument run status as completed.
+    Uploads changes to the instrument database (and optionally, the methods directory) to the storage backend (Google Drive).
+
+    Instead of re-uploading the entire database, only instrument runs that changed since the last upload are uploaded
+    as small, immutable shards, along with a manifest listing the current shard of each run. See upload_database_changes().
+
+    The full database ZIP archive is only uploaded when it does not exist in storage yet (in Google Drive, it is uploaded
+    when the workspace is set up), and serves as a base for devices that don't have a local copy of the database yet.
 
     Args:
         instrument_id (str):
-            Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
+            Instrument ID for the instrument database to upload
+        sync_settings (bool, default False):
+            Whether to upload methods directory as well
 
     Returns:
-        None
+        str: Timestamp upon upload completion.
     """
 
-    db_metadata, connection = connect_to_database(instrument_id)
-    instrument_runs_table = sa.Table("runs", db_metadata, autoload=True)
+    # Get storage backend
+    backend = get_storage_backend()
+    if backend is None:
+        return None
 
-    update_status = (
-        sa.update(instrument_runs_table)
-            .where(instrument_runs_table.c.run_id == run_id)
-            .values(status="Complete")
-    )
+    # Upload methods directory
+    if sync_settings == True:
+        upload_methods()
 
-    connection.execute(update_status)
-    connection.close()
+    # Upload full database ZIP archive if there is none yet
+    db_zip_file = instrument_id.replace(" ", "_") + ".zip"
+    if backend.stat(db_zip_file) is None:
+        zip_database(instrument_id=instrument_id)
+        file = backend.put_file(db_zip_file, get_database_file(instrument_id, zip=True))
+        os.remove(get_database_file(instrument_id, zip=True))
+        remember_last_modified(database=instrument_id, modified_date=file["modified"])
 
+    # Upload changed instrument runs
+    upload_database_changes(instrument_id)
 
-def skip_sample(instrument_id, run_id):
+    return time.strftime("%H:%M:%S")
+
+
+def get_sync_manifest_path(instrument_id):
 
     """
-    Skips sample by setting "latest_sample" value for instrument run to the next sample.
+    Returns path of the local copy of the sync manifest for an instrument database.
 
-    This function was used after restarting the acquisition listener when MS-DIAL got stuck processing a corrupted file.
-    Now that MS-DIAL runs in the background, it is deprecated and should be removed.
+    On the instrument computer, this is the manifest that was last uploaded. On other devices,
+    this is the manifest whose changes were last applied to the local database.
 
     Args:
-        instrument_id (str):
-            Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
+        instrument_id (str): Instrument ID
 
     Returns:
-        None
+        str: Path of the local sync manifest
     """
 
-    # Get next sample
-    samples = get_remaining_samples(instrument_id, run_id)
-    next_sample = samples[1]
-
-    # Set latest sample to next sample
-    db_metadata, connection = connect_to_database(instrument_id)
-    instrument_runs_table = sa.Table("runs", db_metadata, autoload=True)
-
-    connection.execute((
-        sa.update(instrument_runs_table)
-            .where(instrument_runs_table.c.run_id == run_id)
-            .values(latest_sample=next_sample)
-    ))
-
-    connection.close()
+    return os.path.join(data_directory, instrument_id.replace(" ", "_") + "_manifest.json")
 
 
-def store_pid(instrument_id, run_id, pid):
+def read_sync_manifest(instrument_id):
 
     """
-    Stores acquisition listener subprocess ID to allow for checkup and termination.
+    Reads the local sync manifest for an instrument database.
 
     Args:
-        instrument_id (str):
-            Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
-        pid (str):
-            Process ID for acquisition listener subprocess
+        instrument_id (str): Instrument ID
 
     Returns:
-        None
+        dict: Sync manifest, or an empty manifest if there is none
     """
 
-    db_metadata, connection = connect_to_database(instrument_id)
-    instrument_runs_table = sa.Table("runs", db_metadata, autoload=True)
-
-    update_pid = (
-        sa.update(instrument_runs_table)
-            .where(instrument_runs_table.c.run_id == run_id)
-            .values(pid=pid)
-    )
-
-    connection.execute(update_pid)
-    connection.close()
+    try:
+        with open(get_sync_manifest_path(instrument_id), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {"instrument": instrument_id, "version": 0, "runs": {}, "deleted": {}}
 
 
-def get_pid(instrument_id, run_id):
+def write_sync_manifest(instrument_id, manifest):
 
     """
-    Retrieves acquisition listener process ID from "runs" table in Settings database.
+    Writes the local sync manifest for an instrument database, replacing the previous one atomically.
 
     Args:
-        instrument_id (str):
-            Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
+        instrument_id (str): Instrument ID
+        manifest (dict): Sync manifest
 
     Returns:
-        None
+        str: Path of the local sync manifest
     """
 
-    try:
-        return get_instrument_run(instrument_id, run_id)["pid"].astype(int).tolist()[0]
-    except:
-        return None
+    manifest_path = get_sync_manifest_path(instrument_id)
+    temporary_file = manifest_path + ".tmp"
 
+    with open(temporary_file, "w") as file:
+        json.dump(manifest, file)
+    os.replace(temporary_file, manifest_path)
 
-def upload_to_google_drive(file_dict):
+    return manifest_path
 
-    """
-    Uploads files to Rapid-QC-MS folder in Google Drive.
 
-    Args:
-        file_dict (dict):
-            Dictionary with key-value structure { filename : file path }
+def export_run_shard(instrument_id, run_id):
 
-    Returns:
-        dict: Dictionary with key-value structure { filename : Google Drive ID }
     """
+    Exports all records of an instrument run (QC job) into a compressed JSON shard.
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
+    The shard contains the run's rows in the "runs", "sample_qc_results", "bio_qc_results", and "processing_stages"
+    tables, without their local primary keys. Its content is deterministic, so unchanged runs produce the same hash.
 
-    # Get Google Drive ID for the Rapid-QC-MS folder
-    folder_id = get_drive_folder_id()
+    Args:
+        instrument_id (str): Instrument ID
+        run_id (str): Instrument run ID (job ID)
 
-    # Store Drive ID's of uploaded file(s)
-    drive_ids = {}
+    Returns:
+        tuple: Gzip-compressed shard (bytes) and MD5 hash of the uncompressed shard (str)
+    """
 
-    # Validate Google Drive folder ID
-    if folder_id is not None:
-        if folder_id != "None" and folder_id != "":
+    database = get_database_file(instrument_id, sqlite_conn=True)
+    engine = sa.create_engine(database)
 
-            # Upload each file to Google Drive
-            for filename in file_dict.keys():
-                if os.path.exists(file_dict[filename]):
-                    metadata = {
-                        "title": filename,
-                        "parents": [{"id": folder_id}],
-                    }
-                    file = drive.CreateFile(metadata=metadata)
-                    file.SetContentFile(file_dict[filename])
-                    file.Upload()
+    shard = {"run_id": run_id}
+    for table in ["runs", "sample_qc_results", "bio_qc_results", "processing_stages"]:
+        if not sa.inspect(engine).has_table(table):
+            continue
+        query = sa.text("SELECT * FROM " + table + " WHERE run_id = :run_id ORDER BY id").bindparams(run_id=run_id)
+        df = pd.read_sql(query, engine).drop(columns=["id"])
+        shard[table] = json.loads(df.to_json(orient="split", index=False))
 
-                    drive_ids[file["title"]] = file["id"]
+    content = json.dumps(shard, sort_keys=True).encode("utf-8")
+    return gzip.compress(content, mtime=0), hashlib.md5(content).hexdigest()
 
-    return drive_ids
 
+def apply_run_shards(instrument_id, shards, deleted_runs):
 
-def upload_qc_results(instrument_id, run_id):
-    
     """
-    Uploads QC results for a given instrument run to Google Drive as CSV files.
+    Replaces records of instrument runs in the local database with the contents of downloaded shards, in one transaction.
 
     Args:
         instrument_id (str):
             Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
+        shards (list):
+            List of gzip-compressed shards, as created by export_run_shard()
+        deleted_runs (list):
+            List of run ID's to delete from the local database
 
     Returns:
         None
     """
 
-    id = instrument_id.replace(" ", "_") + "_" + run_id
+    create_processing_stages_table(instrument_id)
+    aggregates_created = create_bio_standard_aggregates_table(instrument_id)
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
+    db_metadata, connection = connect_to_database(instrument_id)
+    tables = {table: sa.Table(table, db_metadata, autoload=True)
+        for table in ["runs", "sample_qc_results", "bio_qc_results", "processing_stages"]}
 
-    # Define file names and file paths
-    run_filename = "run.csv"
-    samples_csv_filename = "samples.csv"
-    bio_standards_csv_filename = "bio_standards.csv"
+    with connection.begin():
 
-    run_directory = os.path.join(data_directory, id)
-    if not os.path.exists(run_directory):
-        os.makedirs(run_directory)
+        for run_id in deleted_runs:
+            for table in tables.values():
+                connection.execute(sa.delete(table).where(table.c.run_id == run_id))
+            delete_bio_standard_aggregates(db_metadata, connection, run_id)
 
-    csv_directory = os.path.join(run_directory, "csv")
-    if not os.path.exists(csv_directory):
-        os.makedirs(csv_directory)
+        applied_runs = []
+        for content in shards:
+            shard = json.loads(gzip.decompress(content).decode("utf-8"))
+            applied_runs.append(shard["run_id"])
 
-    run_csv_path = os.path.join(csv_directory, run_filename)
-    samples_csv_path = os.path.join(csv_directory, samples_csv_filename)
-    bio_standards_csv_path = os.path.join(csv_directory, bio_standards_csv_filename)
+            for table_name, table in tables.items():
+                connection.execute(sa.delete(table).where(table.c.run_id == shard["run_id"]))
 
-    # Convert sample and biological standard QC results from database into CSV files
-    df_run = get_instrument_run(instrument_id, run_id)
-    df_run.to_csv(run_csv_path, index=False)
+                if table_name not in shard:
+                    continue
 
-    df_samples = get_samples_in_run(instrument_id=instrument_id, run_id=run_id, sample_type="Specimen")
-    if len(df_samples) > 0:
-        df_samples.to_csv(samples_csv_path, index=False)
+                # Only insert columns that exist in the local table
+                columns = [column for column in shard[table_name]["columns"] if column in table.c]
+                rows = [{column: value for column, value in zip(shard[table_name]["columns"], row) if column in columns}
+                    for row in shard[table_name]["data"]]
 
-    df_bio_standards = get_table(instrument_id, "bio_qc_results")
-    if len(df_bio_standards) > 0:
-        df_bio_standards.to_csv(bio_standards_csv_path, index=False)
+                if len(rows) > 0:
+                    connection.execute(table.insert(), rows)
 
-    # Compress CSV files into a ZIP archive for faster upload
-    zip_filename = id + ".zip"
-    zip_file_path = zip_csv_files(
-        input_directory=csv_directory, output_directory_and_name=os.path.join(run_directory, id))
+            # Recompute cross-run aggregates of the run's biological standards
+            if not aggregates_created:
+                write_run_bio_standard_aggregates(db_metadata, connection, shard["run_id"])
 
-    zip_file = {zip_filename: zip_file_path}
+    connection.close()
 
-    # Get Google Drive ID for the CSV files ZIP archive
-    zip_file_drive_id = get_instrument_run(instrument_id, run_id)["drive_id"].tolist()[0]
+    # A newly created aggregates table is backfilled from all runs instead
+    if aggregates_created:
+        rebuild_bio_standard_aggregates(instrument_id)
 
-    # Update existing ZIP archive in Google Drive
-    if zip_file_drive_id is not None:
+    rebuild_run_summaries(instrument_id, list(deleted_runs) + applied_runs)
+    publish_database_version(instrument_id)
 
-        file = drive.CreateFile({
-            "id": zip_file_drive_id,
-            "title": zip_filename,
-        })
 
-        # Execute upload
-        file.SetContentFile(zip_file_path)
-        file.Upload()
+def get_changed_runs(instrument_id, manifest):
 
-    # If zip file Drive ID does not exist,
-    else:
+    """
+    Returns the instrument runs that may have changed since the last upload recorded in a sync manifest.
 
-        # Upload CSV files ZIP archive to Google Drive for first time
-        drive_id = upload_to_google_drive(zip_file)[zip_filename]
+    A run may have changed if its record in the "runs" table changed (counters, status, sequence, etc.), or if samples
+    of the run were processed (or reprocessed) since the last upload, which is found from the "processing_stages" rows
+    that finished since the last upload. Only light columns of the "runs" table and recent "processing_stages" rows
+    (through an index on their finish time) are read, so this doesn't depend on the size of the QC results in the
+    database.
 
-        # Store Drive ID of ZIP file in local database
-        db_metadata, connection = connect_to_database(instrument_id)
-        runs_table = sa.Table("runs", db_metadata, autoload=True)
+    Args:
+        instrument_id (str): Instrument ID
+        manifest (dict): Local sync manifest, as returned by read_sync_manifest()
 
-        connection.execute((
-            sa.update(runs_table)
-                .where(runs_table.c.run_id == run_id)
-                .values(drive_id=drive_id)
-        ))
+    Returns:
+        tuple: Stamp of each run's record (dict), list of run ID's that may have changed, and finish time of the last
+            processed sample
+    """
 
-        connection.close()
+    create_processing_stages_table(instrument_id)
+
+    database = get_database_file(instrument_id, sqlite_conn=True)
+    engine = sa.create_engine(database)
 
+    # Stamp of each run's record, without reading the sequence and metadata themselves
+    query = sa.text("SELECT run_id, status, samples, completed, passes, fails, latest_sample, qc_config_id, "
+        + "biological_standards, pid, drive_id, sample_status, job_type, chromatography, acquisition_path, "
+        + "length(sequence) AS sequence_length, length(metadata) AS metadata_length FROM runs ORDER BY id")
+    run_stamps = {}
+    with engine.connect() as connection:
+        for row in connection.execute(query):
+            run_stamps[row.run_id] = hashlib.md5(json.dumps(list(row), default=str).encode("utf-8")).hexdigest()
 
-def download_qc_results(instrument_id, run_id):
+        # Runs with samples processed since the last upload (samples finished in the same second are checked again)
+        connection.execute(sa.text("CREATE INDEX IF NOT EXISTS processing_stages_finished ON processing_stages (finished)"))
+        last_finished = connection.execute(sa.text("SELECT MAX(finished) FROM processing_stages")).scalar() or ""
+        processed_runs = set(connection.execute(
+            sa.text("SELECT DISTINCT run_id FROM processing_stages WHERE finished >= :previous_finished")
+                .bindparams(previous_finished=manifest.get("last_finished", ""))
+        ).scalars().all())
+
+    changed_runs = [run_id for run_id, stamp in run_stamps.items()
+        if run_id in processed_runs or manifest["runs"].get(run_id, {}).get("stamp") != stamp]
+
+    return run_stamps, changed_runs, last_finished
+
+
+def upload_database_changes(instrument_id):
 
     """
-    Downloads CSV files of QC results from Google Drive and stores in /data directory.
+    Uploads instrument runs that changed since the last upload to the storage backend, along with an updated manifest.
+
+    Only runs that may have changed since the last upload are exported (see get_changed_runs()), so the cost of a sync
+    doesn't grow with the number of runs in the database. Each of them is exported with export_run_shard() and compared
+    by hash to the last uploaded manifest. Changed runs are uploaded as new files named "Instrument_ID_Run_ID_hash.json.gz",
+    then the manifest "Instrument_ID_manifest.json" is updated to point to them, and finally the superseded shards are
+    deleted. Devices that read the manifest in the meantime still find the shards it refers to.
 
     Args:
-        instrument_id (str):
-            Instrument ID
-        run_id (str):
-            Instrument run ID (job ID)
+        instrument_id (str): Instrument ID
 
     Returns:
-        tuple: Paths of run.csv, samples.csv, and bio_standards.csv, respectively.
+        int: Number of runs uploaded or deleted
     """
 
-    id = instrument_id.replace(" ", "_") + "_" + run_id
+    backend = get_storage_backend()
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
+    manifest = read_sync_manifest(instrument_id)
+    version = manifest["version"] + 1
+    superseded_files = []
 
-    # Initialize directories
-    run_directory = os.path.join(data_directory, id)
-    if not os.path.exists(run_directory):
-        os.makedirs(run_directory)
+    # Upload shards of new and modified runs
+    run_stamps, changed_runs, last_finished = get_changed_runs(instrument_id, manifest)
+    run_ids = list(run_stamps.keys())
 
-    csv_directory = os.path.join(run_directory, "csv")
-    if not os.path.exists(csv_directory):
-        os.makedirs(csv_directory)
+    for run_id in changed_runs:
+        content, shard_hash = export_run_shard(instrument_id, run_id)
 
-    # Zip file
-    zip_filename = id + ".zip"
-    zip_file_path = os.path.join(run_directory, zip_filename)
+        if run_id in manifest["runs"] and manifest["runs"][run_id]["hash"] == shard_hash:
+            manifest["runs"][run_id]["stamp"] = run_stamps[run_id]
+            continue
 
-    # Get Google Drive folder ID
-    gdrive_folder_id = get_drive_folder_id()
+        shard_filename = instrument_id.replace(" ", "_") + "_" + run_id + "_" + shard_hash[:12] + ".json.gz"
+        shard = backend.put(shard_filename, content, new=True)
 
-    # Find and download ZIP archive of CSV files from Google Drive
-    for file in drive.ListFile({"q": "'" + gdrive_folder_id + "' in parents and trashed=false"}).GetList():
-        if file["title"] == zip_filename:
-            os.chdir(run_directory)
-            file.GetContentFile(file["title"])
-            os.chdir(root_directory)
-            break
+        if run_id in manifest["runs"]:
+            superseded_files.append(manifest["runs"][run_id])
 
-    # Unzip archive
-    unzip_csv_files(zip_file_path, csv_directory)
+        manifest["runs"][run_id] = {"hash": shard_hash, "name": shard_filename, "id": shard["id"], "version": version,
+            "stamp": run_stamps[run_id]}
+        manifest["deleted"].pop(run_id, None)
 
-    # Define and return file paths
-    run_csv = os.path.join(csv_directory, "run.csv")
-    samples_csv = os.path.join(csv_directory, "samples.csv")
-    bio_standards_csv_file = os.path.join(csv_directory, "bio_standards.csv")
+    # Record runs that were deleted locally
+    for run_id in list(manifest["runs"].keys()):
+        if run_id not in run_ids:
+            superseded_files.append(manifest["runs"][run_id])
+            del manifest["runs"][run_id]
+            manifest["deleted"][run_id] = version
 
-    return (run_csv, samples_csv, bio_standards_csv_file)
+    changes = len([run for run in manifest["runs"].values() if run["version"] == version]) \
+        + len([run for run in manifest["deleted"].values() if run == version])
 
+    manifest["last_finished"] = last_finished
 
-def get_drive_folder_id():
+    # Remember which runs were checked, even if none of them changed
+    if changes == 0 and manifest.get("id") is not None:
+        write_sync_manifest(instrument_id, manifest)
+        return 0
 
-    """
-    Returns Google Drive ID for the Rapid-QC-MS folder (found in user's root Drive directory).
-    """
+    # Upload manifest, replacing the previous one
+    manifest["version"] = version
+    manifest_filename = instrument_id.replace(" ", "_") + "_manifest.json"
+    manifest_path = write_sync_manifest(instrument_id, manifest)
+    manifest_file = backend.put_file(manifest_filename, manifest_path, id=manifest.get("id"))
 
-    return get_table("Settings", "workspace")["gdrive_folder_id"].values[0]
+    if manifest.get("id") != manifest_file["id"]:
+        manifest["id"] = manifest_file["id"]
+        write_sync_manifest(instrument_id, manifest)
 
+    # Delete superseded shards
+    for shard in superseded_files:
+        try:
+            backend.delete(shard["name"], id=shard["id"])
+        except Exception as error:
+            print("upload_database_changes() – Could not delete superseded shard:", error)
 
-def get_database_drive_id(instrument_id):
+    return changes
 
-    """
-    Returns Google Drive ID for a given instrument's database.
 
-    Args:
-        instrument_id (str): Instrument ID
+def download_database_changes(instrument_id):
 
-    Returns:
-        str: Google Drive ID for the instrument database ZIP archive.
     """
+    Applies instrument runs that changed in the storage backend since the last sync to the local database.
 
-    df = get_table("Settings", "instruments")
-    return df.loc[df["name"] == instrument_id]["drive_id"].values[0]
-
-
-def upload_database(instrument_id, sync_settings=False):
-
-    """
-    Uploads database file and methods directory to Google Drive as ZIP archives.
+    Downloads the manifest uploaded by upload_database_changes(), then downloads only the shards of runs whose hash
+    differs from the local manifest, and applies them with apply_run_shards().
 
     Args:
-        instrument_id (str):
-            Instrument ID for the instrument database to upload
-        sync_settings (bool, default False):
-            Whether to upload methods directory as well
+        instrument_id (str): Instrument ID
 
     Returns:
-        str: Timestamp upon upload completion.
+        int: Number of runs applied or deleted, or None if no manifest exists in storage
     """
 
-    # Get Google Drive ID's for the Rapid-QC-MS folder and database file
-    gdrive_folder_id = get_drive_folder_id()
-    instrument_db_file_id = get_database_drive_id(instrument_id)
+    backend = get_storage_backend()
+    manifest_filename = instrument_id.replace(" ", "_") + "_manifest.json"
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
+    # Get manifest metadata, and skip downloading the manifest if it wasn't modified since the last sync
+    manifest_file = backend.stat(manifest_filename) if backend is not None else None
 
-    # Vacuum database to optimize size
-    execute_vacuum(instrument_id)
+    if manifest_file is None:
+        return None
 
-    # Upload methods directory to Google Drive
-    if sync_settings == True:
-        upload_methods()
+    local_manifest = read_sync_manifest(instrument_id)
 
-    # Upload database to Google Drive
-    if gdrive_folder_id is not None and instrument_db_file_id is not None:
+    if local_manifest.get("id") == manifest_file["id"] \
+            and local_manifest.get("modified_date") == manifest_file["modified"]:
+        return 0
 
-        # Upload zipped database
-        zip_database(instrument_id=instrument_id)
-        file = drive.CreateFile(
-            {"id": instrument_db_file_id, "title": instrument_id.replace(" ", "_") + ".zip"})
-        file.SetContentFile(get_database_file(instrument_id, zip=True))
-        file.Upload()
+    remote_manifest = json.loads(backend.get(manifest_filename, id=manifest_file["id"]))
 
-        # Save modifiedDate of database file
-        remember_last_modified(database=instrument_id, modified_date=file["modifiedDate"])
+    # Download shards of runs that changed since the last sync
+    shards = []
+    for run_id, run in remote_manifest["runs"].items():
+        if run_id in local_manifest["runs"] and local_manifest["runs"][run_id]["hash"] == run["hash"]:
+            continue
+        shards.append(backend.get(run["name"], id=run["id"]))
 
-    else:
-        return None
+    # Only delete runs that are still in the local database
+    local_run_ids = set(get_instrument_runs(instrument_id, as_list=True))
+    deleted_runs = [run_id for run_id in remote_manifest["deleted"].keys() if run_id in local_run_ids]
 
-    return time.strftime("%H:%M:%S")
+    if len(shards) > 0 or len(deleted_runs) > 0:
+        apply_run_shards(instrument_id, shards, deleted_runs)
+
+    remote_manifest["id"] = manifest_file["id"]
+    remote_manifest["modified_date"] = manifest_file["modified"]
+    write_sync_manifest(instrument_id, remote_manifest)
+
+    return len(shards) + len(deleted_runs)
 
 
 def download_database(instrument_id, sync_settings=False):
 
     """
-    Downloads instrument database ZIP file from Google Drive.
+    Downloads instrument database from the storage backend (Google Drive).
 
     This function is called when accessing an instrument database from a device other than the given instrument.
 
+    If a local copy of the database exists, only instrument runs that changed since the last sync are downloaded
+    (see download_database_changes()). Otherwise, the full database ZIP archive is downloaded first.
+
     Args:
         instrument_id (str):
             Instrument ID for the instrument database to download
@@ -4170,39 +7158,53 @@ def download_database(instrument_id, sync_settings=False):
 
     db_zip_file = instrument_id.replace(" ", "_") + ".zip"
 
+    # If a local copy of the database exists, only apply runs that changed since the last sync
+    if os.path.exists(get_database_file(instrument_id)):
+        try:
+            if sync_settings == True:
+                download_methods()
+
+            changes = download_database_changes(instrument_id)
+            if changes is not None:
+                return time.strftime("%H:%M:%S") if changes > 0 else None
+
+        except Exception as error:
+            print("Error downloading database changes:", error)
+            return None
+
     # If the database was not modified by another instrument, skip download (for instruments only)
     if not database_was_modified(instrument_id):
         return None
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
-
-    # Get Google Drive ID's for the Rapid-QC-MS folder and database file
-    gdrive_folder_id = get_drive_folder_id()
-    instrument_db_file_id = get_instrument(instrument_id)["drive_id"].values[0]
+    # Get storage backend
+    backend = get_storage_backend()
 
-    # If Google Drive folder is found, look for database next
-    if gdrive_folder_id is not None and instrument_db_file_id is not None:
+    # If sync is set up, look for database next
+    if backend is not None:
 
         # Download newly added / modified MSP files in Rapid-QC-MS > methods
         if sync_settings == True:
             download_methods(skip_check=True)
 
         try:
-            for file in drive.ListFile({"q": "'" + gdrive_folder_id + "' in parents and trashed=false"}).GetList():
-                if file["title"] == db_zip_file:
+            file = backend.stat(db_zip_file)
+            if file is not None:
 
-                    # Download and unzip database
-                    os.chdir(data_directory)                        # Change to data directory
-                    file.GetContentFile(file["title"])              # Download database and get file ID
-                    os.chdir(root_directory)                        # Return to root directory
-                    unzip_database(instrument_id=instrument_id)     # Unzip database
+                # Download and unzip database
+                backend.get_file(db_zip_file, get_database_file(instrument_id, zip=True), id=file["id"])
+                unzip_database(instrument_id=instrument_id)     # Unzip database
+                publish_database_version(instrument_id)         # Notify readers that the database changed
 
-                    # Save modifiedDate of database file
-                    remember_last_modified(database=instrument_id, modified_date=file["modifiedDate"])
+                # Apply all run shards on top of the downloaded database
+                if os.path.exists(get_sync_manifest_path(instrument_id)):
+                    os.remove(get_sync_manifest_path(instrument_id))
+                download_database_changes(instrument_id)
+
+                # Save modifiedDate of database file
+                remember_last_modified(database=instrument_id, modified_date=file["modified"])
 
         except Exception as error:
-            print("Error downloading database from Google Drive:", error)
+            print("Error downloading database:", error)
             return None
     else:
         return None
@@ -4210,53 +7212,222 @@ def download_database(instrument_id, sync_settings=False):
     return time.strftime("%H:%M:%S")
 
 
-def upload_methods():
+def get_methods_manifest_path():
 
     """
-    Uploads methods directory ZIP archive to Google Drive.
+    Returns path of the local copy of the methods manifest (see upload_methods()).
+
+    On the device that uploads settings, this is the manifest that was last uploaded. On other devices,
+    this is the manifest that was last applied to the local methods directory.
     """
 
-    df_workspace = get_table("Settings", "workspace")
-    methods_zip_file_id = df_workspace["methods_zip_file_id"].values[0]
+    return os.path.join(data_directory, "methods_manifest.json")
 
-    # Vacuum database to optimize size
-    execute_vacuum("Settings")
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
+def read_methods_manifest():
+
+    """
+    Reads the local methods manifest.
+
+    Returns:
+        dict: Methods manifest, or an empty manifest if there is none
+    """
 
-    # Upload methods ZIP archive to Google Drive
-    if methods_zip_file_id is not None:
+    try:
+        with open(get_methods_manifest_path(), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {"version": 0, "files": {}}
 
-        # Upload zipped database
-        methods_zip_file = zip_methods()
-        file = drive.CreateFile({"id": methods_zip_file_id, "title": "methods.zip"})
-        file.SetContentFile(methods_zip_file)
-        file.Upload()
 
-        # Save modifiedDate of methods ZIP file
-        remember_last_modified(database="Settings", modified_date=file["modifiedDate"])
+def write_methods_manifest(manifest):
 
-    else:
+    """
+    Writes the local methods manifest, replacing the previous one atomically.
+
+    Args:
+        manifest (dict): Methods manifest
+
+    Returns:
+        str: Path of the local methods manifest
+    """
+
+    manifest_path = get_methods_manifest_path()
+    temporary_file = manifest_path + ".tmp"
+
+    with open(temporary_file, "w") as file:
+        json.dump(manifest, file)
+    os.replace(temporary_file, manifest_path)
+
+    return manifest_path
+
+
+def hash_methods_directory(manifest):
+
+    """
+    Computes MD5 hashes of all files in the methods directory.
+
+    Hashes of files whose modification time and size match the local manifest are reused, so large MSP libraries
+    are only read when they change. The settings database is hashed from a consistent snapshot (see snapshot_database()),
+    which is only taken when the database file or its write-ahead log changed since the last upload. SQLite journal
+    files are skipped.
+
+    Args:
+        manifest (dict): Local methods manifest, as returned by read_methods_manifest()
+
+    Returns:
+        dict: Dictionary with key-value structure { path relative to methods directory : file info }, where file info
+        holds the file's "path" (the snapshot, for the settings database), "hash", "mtime", and "size"
+    """
+
+    files = {}
+
+    for directory, subdirectories, filenames in os.walk(methods_directory):
+        for filename in filenames:
+            file_path = os.path.join(directory, filename)
+            relative_path = os.path.relpath(file_path, methods_directory).replace("\\", "/")
+
+            if filename.endswith("-journal") or filename.endswith("-wal") or filename.endswith("-shm") \
+                    or filename.endswith(".tmp"):
+                continue
+
+            previous = manifest["files"].get(relative_path)
+            source = None
+
+            # Snapshot the settings database only if it was written to since the last upload
+            if file_path == settings_db_file:
+                source = [[file_stat.st_mtime_ns, file_stat.st_size] for file_stat in
+                    [os.stat(path) for path in [file_path, file_path + "-wal"] if os.path.exists(path)]]
+
+                if previous is not None and previous.get("source") == source:
+                    files[relative_path] = dict(previous, path=file_path)
+                    continue
+
+                file_path = snapshot_database(settings_db_file)
+
+            file_stat = os.stat(file_path)
+
+            if previous is not None and previous.get("mtime") == file_stat.st_mtime_ns \
+                    and previous.get("size") == file_stat.st_size:
+                file_hash = previous["hash"]
+            else:
+                with open(file_path, "rb") as file:
+                    file_hash = hashlib.md5(file.read()).hexdigest()
+
+            files[relative_path] = {"path": file_path, "hash": file_hash,
+                "mtime": file_stat.st_mtime_ns, "size": file_stat.st_size}
+
+            if source is not None:
+                files[relative_path]["source"] = source
+
+    return files
+
+
+def upload_methods():
+
+    """
+    Uploads changed files in the methods directory to the storage backend (Google Drive).
+
+    Each file is stored once under its content hash, as a compressed blob named "methods_hash.gz", and the manifest
+    "methods_manifest.json" maps paths in the methods directory to blobs. Only files whose hash changed since
+    the last upload are sent, so changing settings doesn't re-upload MSP libraries and MS-DIAL parameter files.
+
+    Returns:
+        str: Timestamp upon upload completion, or None if sync is not set up
+    """
+
+    # Get storage backend
+    backend = get_storage_backend()
+    if backend is None:
         return None
 
+    manifest = read_methods_manifest()
+    files = hash_methods_directory(manifest)
+    previous_blobs = {file["name"]: file["id"] for file in manifest["files"].values()}
+    changes = len(set(manifest["files"].keys()) - set(files.keys()))
+
+    try:
+        # Upload blobs of new and modified files (files with identical content share a blob)
+        blobs = {file["hash"]: file for file in manifest["files"].values()}
+        methods_files = {}
+
+        for relative_path, file in files.items():
+            if file["hash"] not in blobs:
+                blob_name = "methods_" + file["hash"] + ".gz"
+                with open(file["path"], "rb") as local_file:
+                    blob = backend.put(blob_name, gzip.compress(local_file.read(), mtime=0), new=True)
+                blobs[file["hash"]] = {"name": blob_name, "id": blob["id"]}
+
+            previous = manifest["files"].get(relative_path)
+            if previous is None or previous["hash"] != file["hash"]:
+                changes += 1
+
+            methods_files[relative_path] = {"hash": file["hash"], "name": blobs[file["hash"]]["name"],
+                "id": blobs[file["hash"]]["id"], "mtime": file["mtime"], "size": file["size"]}
+
+            if "source" in file:
+                methods_files[relative_path]["source"] = file["source"]
+
+    finally:
+        snapshot_file = files.get("Settings.db", {}).get("path")
+        if snapshot_file is not None and snapshot_file != settings_db_file and os.path.exists(snapshot_file):
+            os.remove(snapshot_file)
+
+    manifest["files"] = methods_files
+
+    # Upload manifest, replacing the previous one
+    if changes > 0 or manifest.get("id") is None:
+        manifest["version"] += 1
+        manifest_path = write_methods_manifest(manifest)
+        manifest_file = backend.put_file("methods_manifest.json", manifest_path, id=manifest.get("id"))
+        manifest["id"] = manifest_file["id"]
+        manifest["modified_date"] = manifest_file["modified"]
+
+    write_methods_manifest(manifest)
+
+    # Delete blobs that are no longer referenced
+    current_blobs = set(file["name"] for file in manifest["files"].values())
+    for blob_name, blob_id in previous_blobs.items():
+        if blob_name not in current_blobs:
+            try:
+                backend.delete(blob_name, id=blob_id)
+            except Exception as error:
+                print("upload_methods() – Could not delete unused methods file:", error)
+
+    return time.strftime("%H:%M:%S")
+
 
 def download_methods(skip_check=False):
 
     """
-    Downloads methods directory ZIP archive from Google Drive.
+    Downloads changed files in the methods directory from the storage backend (Google Drive).
+
+    Files in the manifest uploaded by upload_methods() are only downloaded and replaced if their hash differs from
+    the last applied manifest and from the local file. If there is no manifest in storage, the methods directory ZIP archive
+    uploaded during workspace setup is downloaded instead.
 
     Args:
-        skip_check (bool, default False): If True, skips checking whether database was modified
+        skip_check (bool, default False): If True, skips checking whether the methods manifest was modified
 
     Returns:
-        None
+        str: Timestamp upon download completion, or None if nothing was downloaded
     """
 
-    # If the database was not modified by another instrument, skip download (for instruments only)
-    if not skip_check:
-        if not database_was_modified("Settings"):
+    # Get storage backend
+    backend = get_storage_backend()
+    if backend is None:
+        return None
+
+    # Skip download if the methods manifest wasn't modified since the last sync
+    local_manifest = read_methods_manifest()
+    manifest_file = backend.stat("methods_manifest.json")
+
+    if manifest_file is None:
+        if not skip_check and not database_was_modified("Settings"):
             return None
+    elif not skip_check and local_manifest.get("id") == manifest_file["id"] \
+            and local_manifest.get("modified_date") == manifest_file["modified"]:
+        return None
 
     # Get device identity
     instrument_bool = is_instrument_computer()
@@ -4268,26 +7439,53 @@ def download_methods(skip_check=False):
     except:
         msdial_directory = None
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
-
-    # Get Google Drive folder ID
-    gdrive_folder_id = get_drive_folder_id()
-
     try:
-        # Download and unzip methods directory
-        for file in drive.ListFile({"q": "'" + gdrive_folder_id + "' in parents and trashed=false"}).GetList():
-            if file["title"] == "methods.zip":
-                os.chdir(data_directory)                # Change to data directory
-                file.GetContentFile(file["title"])      # Download methods ZIP archive
-                os.chdir(root_directory)                # Return to root directory
-                unzip_methods()                         # Unzip methods directory
+        # Download and unzip methods directory (for workspaces without a methods manifest)
+        if manifest_file is None:
+            file = backend.stat("methods.zip")
+            if file is not None:
+                backend.get_file("methods.zip", os.path.join(data_directory, "methods.zip"), id=file["id"])
+                unzip_methods()
 
                 # Save modifiedDate of methods directory
-                remember_last_modified(database="Settings", modified_date=file["modifiedDate"])
+                remember_last_modified(database="Settings", modified_date=file["modified"])
+
+        # Download files whose content differs from the local methods directory
+        else:
+            remote_manifest = json.loads(backend.get("methods_manifest.json", id=manifest_file["id"]))
+
+            for relative_path, file in remote_manifest["files"].items():
+                file_path = os.path.join(methods_directory, *relative_path.split("/"))
+                applied_file = local_manifest["files"].get(relative_path)
+
+                # Skip files that were already applied, or that are identical locally (ex: after downloading methods.zip)
+                if os.path.exists(file_path):
+                    if applied_file is not None and applied_file["hash"] == file["hash"]:
+                        continue
+                    with open(file_path, "rb") as local_file:
+                        if hashlib.md5(local_file.read()).hexdigest() == file["hash"]:
+                            continue
+
+                if not os.path.exists(os.path.dirname(file_path)):
+                    os.makedirs(os.path.dirname(file_path))
+
+                temporary_file = file_path + ".tmp"
+                with open(temporary_file, "wb") as local_file:
+                    local_file.write(gzip.decompress(backend.get(file["name"], id=file["id"])))
+
+                # The settings database is restored in place, since the dashboard and acquisition listener may have it open
+                if file_path == settings_db_file and os.path.exists(file_path):
+                    restore_database(temporary_file, file_path)
+                    os.remove(temporary_file)
+                else:
+                    replace_file(temporary_file, file_path)
+
+            remote_manifest["id"] = manifest_file["id"]
+            remote_manifest["modified_date"] = manifest_file["modified"]
+            write_methods_manifest(remote_manifest)
 
     except Exception as error:
-        print("Error downloading methods from Google Drive:", error)
+        print("Error downloading methods:", error)
         return None
 
     # Update MS-DIAL directory
@@ -4303,7 +7501,8 @@ def remember_last_modified(database, modified_date):
     """
     Stores last modified time of database file in Google Drive.
 
-    This function is called after file upload, and used for comparison before download.
+    This function is called after file upload, and used for comparison before download. The modified time is stored
+    in the local sync state file (see read_sync_state()), so that the settings database isn't changed by syncing.
 
     Args:
         database (str):
@@ -4315,24 +7514,7 @@ def remember_last_modified(database, modified_date):
         None
     """
 
-    db_metadata, connection = connect_to_database("Settings")
-    instruments_table = sa.Table("instruments", db_metadata, autoload=True)
-    workspace_table = sa.Table("workspace", db_metadata, autoload=True)
-
-    if database == "Settings":
-        connection.execute((
-            sa.update(workspace_table)
-                .where((workspace_table.c.id == 1))
-                .values(methods_last_modified=modified_date)
-        ))
-    else:
-        connection.execute((
-            sa.update(instruments_table)
-            .where((instruments_table.c.name == database))
-            .values(last_modified=modified_date)
-        ))
-
-    connection.close()
+    update_sync_state("last_modified", database, modified_date)
 
 
 def database_was_modified(database_name):
@@ -4347,25 +7529,28 @@ def database_was_modified(database_name):
         Returns True if workspace file was modified by another instrument PC in Google Drive, and False if not.
     """
 
-    # Get Google Drive folder ID from database
-    gdrive_folder_id = get_drive_folder_id()
+    # Get storage backend
+    backend = get_storage_backend()
+    if backend is None:
+        return False
+
+    # Compare "last modified" values (workspaces synced by older versions stored them in the settings database)
+    local_last_modified = read_sync_state()["last_modified"].get(database_name)
 
-    # Compare "last modified" values
     if database_name == "Settings":
-        local_last_modified = get_table("Settings", "workspace")["methods_last_modified"].values[0]
+        if local_last_modified is None:
+            local_last_modified = get_table("Settings", "workspace")["methods_last_modified"].values[0]
         filename = "methods.zip"
     else:
-        local_last_modified = get_instrument(database_name)["last_modified"].values[0]
+        if local_last_modified is None:
+            local_last_modified = get_instrument(database_name)["last_modified"].values[0]
         filename = database_name.replace(" ", "_") + ".zip"
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
-
+    # Get modified date with a metadata request (by Drive ID, for Google Drive)
     drive_last_modified = None
-    for file in drive.ListFile({"q": "'" + gdrive_folder_id + "' in parents and trashed=false"}).GetList():
-        if file["title"] == filename:
-            drive_last_modified = file["modifiedDate"]
-            break
+    file = backend.stat(filename)
+    if file is not None:
+        drive_last_modified = file["modified"]
 
     if local_last_modified == drive_last_modified:
         return False
@@ -4381,17 +7566,17 @@ def send_sync_signal(folder_id):
     TODO: This method is deprecated. Please remove if no plans for usage.
 
     Args:
-        folder_id (str): Google Drive folder ID
+        folder_id (str): Google Drive folder ID (unused, the file is stored with the storage backend)
 
     Returns:
         bool: True if sync signal was sent, False if not.
     """
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
+    # Get storage backend
+    backend = get_storage_backend()
 
     try:
-        drive.CreateFile(metadata={"title": "Syncing", "parents": [{"id": folder_id}]}).Upload()
+        backend.put("Syncing", b"", new=True)
         return True
     except:
         return False
@@ -4405,18 +7590,17 @@ def safe_to_upload(folder_id):
     TODO: This method is deprecated. Please remove if no plans for usage.
 
     Args:
-        folder_id (str): Google Drive folder ID
+        folder_id (str): Google Drive folder ID (unused, the file is looked up with the storage backend)
 
     Returns:
         bool: False if another device is currently uploading to Google Drive, True if not.
     """
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
+    # Get storage backend
+    backend = get_storage_backend()
 
-    for file in drive.ListFile({"q": "'" + folder_id + "' in parents and trashed=false"}).GetList():
-        if file["title"] == "Syncing":
-            return False
+    if backend.stat("Syncing") is not None:
+        return False
 
     return True
 
@@ -4429,19 +7613,19 @@ def remove_sync_signal(folder_id):
     TODO: This method is deprecated. Please remove if no plans for usage.
 
     Args:
-        folder_id (str): Google Drive folder ID
+        folder_id (str): Google Drive folder ID (unused, the file is deleted with the storage backend)
 
     Returns:
         bool: True if sync signal was removed, False if not.
     """
 
-    # Get Google Drive instance
-    drive = get_drive_instance()
+    # Get storage backend
+    backend = get_storage_backend()
 
     try:
-        for file in drive.ListFile({"q": "'" + folder_id + "' in parents and trashed=false"}).GetList():
-            if file["title"] == "Syncing":
-                file.Delete()
+        for file in backend.list("Syncing"):
+            if file["name"] == "Syncing":
+                backend.delete(file["name"], id=file["id"])
         return True
     except:
         return False
@@ -4450,7 +7634,7 @@ def remove_sync_signal(folder_id):
 def delete_active_run_csv_files(instrument_id, run_id):
 
     """
-    Checks for and deletes CSV files from Google Drive at the end of an active instrument run.
+    Checks for and deletes QC result shards and manifest from the storage backend at the end of an active instrument run.
 
     Args:
         instrument_id (str):
@@ -4464,16 +7648,18 @@ def delete_active_run_csv_files(instrument_id, run_id):
 
     id = instrument_id.replace(" ", "_") + "_" + run_id
 
-    # Find zip archive of CSV files in Google Drive and delete it
-    drive = get_drive_instance()
-    gdrive_folder_id = get_drive_folder_id()
+    # Find manifest and shards of QC results in storage and delete them
+    backend = get_storage_backend()
+    state_path = get_active_run_sync_state_path(instrument_id, run_id)
 
-    if gdrive_folder_id is not None:
-        drive_file_list = drive.ListFile({"q": "'" + gdrive_folder_id + "' in parents and trashed=false"}).GetList()
-        for file in drive_file_list:
-            if file["title"] == id + ".zip":
-                file.Delete()
-                break
+    if backend is not None:
+        for file in backend.list(id):
+            if file["name"] == id + ".json" or file["name"] == id + ".zip" \
+                    or file["name"] == id + "_progress.json" or file["name"].startswith(id + "_qc_"):
+                backend.delete(file["name"], id=file["id"])
+
+    if os.path.exists(state_path):
+        os.remove(state_path)
 
     # Delete Drive ID from database
     db_metadata, connection = connect_to_database(instrument_id)
@@ -4507,10 +7693,6 @@ def sync_on_run_completion(instrument_id, run_id):
         None
     """
 
-    # Get Google Drive instance and folder ID
-    drive = get_drive_instance()
-    gdrive_folder_id = get_drive_folder_id()
-
     # Upload database to Google Drive
     try:
         upload_database(instrument_id)
@@ -4662,6 +7844,11 @@ def send_email(subject, message_body):
         On success, an email.message.EmailMessage object.
     """
 
+    # The Gmail API client is only imported when an email is sent
+    from email.message import EmailMessage
+    import google.auth as google_auth
+    from googleapiclient.discovery import build
+
     try:
         credentials = google_auth.load_credentials_from_file(alt_credentials)[0]
 
@@ -4682,4 +7869,11 @@ def send_email(subject, message_body):
         traceback.print_exc()
         send_message = None
 
-    return send_message
\ No newline at end of file
+    return send_message
+
+
+# Functions that run each type of job in the upload queue
+sync.register_job_type("qc_results", upload_qc_results)
+sync.register_job_type("database", upload_database)
+sync.register_job_type("methods", upload_methods)
+sync.register_job_type("active_run_cleanup", delete_active_run_csv_files)
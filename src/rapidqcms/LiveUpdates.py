@@ -0,0 +1,211 @@
+import os, time, json, queue, threading, traceback
+import rapidqcms.DatabaseFunctions as db
+
+"""
+Pushes progress of active instrument runs to dashboard sessions with server-sent events (see /live-updates route).
+
+A single watcher thread per server process checks the runs that are being watched, and notifies their subscribers
+when the number of completed samples or the status of a run changes:
+
+- On the instrument computer, the watcher reads the version file of the instrument database, which is published after
+  every write (see publish_database_version()). The run record is only queried when the version changed, so idle runs
+  cause no database queries at all.
+- On remote devices, the watcher polls the run's progress manifest on Google Drive (see get_qc_results_progress()),
+  once for all sessions that watch the run.
+
+The watcher thread stops when nobody is watching anymore, and starts again with the next subscriber.
+
+Set the environment variable RAPIDQCMS_LIVE_UPDATE_INTERVAL to change how often runs are checked (0.5 seconds by
+default). Progress manifests on Google Drive are polled every 5 seconds.
+"""
+
+# Seconds between checks of watched runs
+poll_interval_environment_variable = "RAPIDQCMS_LIVE_UPDATE_INTERVAL"
+poll_interval = float(os.environ.get(poll_interval_environment_variable, 0.5))
+remote_poll_interval = 5
+
+# Idle streams get a comment every few seconds, so that proxies keep them open and closed browser tabs are detected
+keepalive_interval = 15
+
+# Streams are closed after 10 minutes (browsers reconnect automatically), so that server threads are recycled
+stream_duration = 10 * 60
+
+# Subscriber queues and latest state of each watched run, keyed by (instrument ID, run ID)
+subscribers = {}
+run_states = {}
+subscribers_lock = threading.Lock()
+watcher_thread = [None]
+
+
+def subscribe(instrument_id, run_id):
+
+    """
+    Starts watching an instrument run, and returns a queue that receives its updates.
+
+    The current state of the run (if it is already known) is put in the queue right away.
+
+    Args:
+        instrument_id (str): Instrument ID
+        run_id (str): Instrument run ID (job ID)
+
+    Returns:
+        queue.Queue: Queue of updates, each as a dict with instrument, run ID, completed samples, status and sequence
+    """
+
+    key = (instrument_id, run_id)
+    events = queue.Queue()
+
+    with subscribers_lock:
+        subscribers.setdefault(key, []).append(events)
+
+        if key in run_states and run_states[key]["event"] is not None:
+            events.put(run_states[key]["event"])
+
+        # Start the watcher thread if it isn't running
+        if watcher_thread[0] is None:
+            watcher_thread[0] = threading.Thread(target=watch_runs, name="live-updates", daemon=True)
+            watcher_thread[0].start()
+
+    return events
+
+
+def unsubscribe(instrument_id, run_id, events):
+
+    """
+    Removes a subscriber queue, and stops watching the instrument run if it has no subscribers left.
+
+    Args:
+        instrument_id (str): Instrument ID
+        run_id (str): Instrument run ID (job ID)
+        events (queue.Queue): Queue returned by subscribe()
+
+    Returns:
+        None
+    """
+
+    key = (instrument_id, run_id)
+
+    with subscribers_lock:
+        if events in subscribers.get(key, []):
+            subscribers[key].remove(events)
+
+        if key in subscribers and len(subscribers[key]) == 0:
+            del subscribers[key]
+            run_states.pop(key, None)
+
+
+def watch_runs():
+
+    """
+    Checks watched instrument runs until there are no subscribers left (runs on the watcher thread).
+    """
+
+    while True:
+
+        with subscribers_lock:
+            watched_runs = list(subscribers.keys())
+
+            if len(watched_runs) == 0:
+                watcher_thread[0] = None
+                return
+
+        for instrument_id, run_id in watched_runs:
+            try:
+                check_run(instrument_id, run_id)
+            except Exception as error:
+                print("LiveUpdates – Error checking " + instrument_id + " run " + run_id + ":", error)
+                traceback.print_exc()
+
+        time.sleep(poll_interval)
+
+
+def check_run(instrument_id, run_id):
+
+    """
+    Checks whether an instrument run changed since the last check, and notifies its subscribers if it did.
+
+    Args:
+        instrument_id (str): Instrument ID
+        run_id (str): Instrument run ID (job ID)
+
+    Returns:
+        None
+    """
+
+    key = (instrument_id, run_id)
+
+    with subscribers_lock:
+        state = run_states.get(key)
+
+    # Whether the run is watched from the instrument computer or from a remote device is only checked once
+    if state is None:
+        remote = db.sync_is_enabled() and db.get_device_identity() != instrument_id
+        state = {"remote": remote, "database_version": None, "event": None, "sequence": 0}
+
+    if state["remote"]:
+        progress = db.get_qc_results_progress(instrument_id, run_id, max_age=remote_poll_interval)
+        if progress is None:
+            return
+        completed, status = int(progress["completed"]), progress["status"]
+
+    else:
+        # Only query the run record if the database changed
+        database_version = db.get_database_version(instrument_id)
+        if database_version == state["database_version"]:
+            return
+
+        df_instrument_run = db.get_instrument_run(instrument_id, run_id)
+        if len(df_instrument_run) == 0:
+            return
+
+        state["database_version"] = database_version
+        completed = int(df_instrument_run["completed"].astype(int).tolist()[0])
+        status = df_instrument_run["status"].tolist()[0]
+
+    with subscribers_lock:
+        if key not in subscribers:
+            return
+
+        previous_event = state["event"]
+        if previous_event is None or (previous_event["completed"], previous_event["status"]) != (completed, status):
+            state["sequence"] += 1
+            state["event"] = {"instrument": instrument_id, "run_id": run_id, "completed": completed,
+                "status": status, "sequence": state["sequence"]}
+
+            for events in subscribers[key]:
+                events.put(state["event"])
+
+        run_states[key] = state
+
+
+def stream_events(instrument_id, run_id):
+
+    """
+    Generates a server-sent event stream with updates of an instrument run.
+
+    The stream ends after stream_duration seconds, or when the browser disconnects (detected at the next keepalive).
+
+    Args:
+        instrument_id (str): Instrument ID
+        run_id (str): Instrument run ID (job ID)
+
+    Returns:
+        Generator of server-sent event messages (str)
+    """
+
+    events = subscribe(instrument_id, run_id)
+
+    try:
+        # Browsers reconnect a second after the stream ends
+        yield "retry: 1000\n\n"
+
+        started = time.time()
+        while time.time() - started < stream_duration:
+            try:
+                event = events.get(timeout=keepalive_interval)
+                yield "data: " + json.dumps(event) + "\n\n"
+            except queue.Empty:
+                yield ": keepalive\n\n"
+
+    finally:
+        unsubscribe(instrument_id, run_id, events)
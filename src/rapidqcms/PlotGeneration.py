@@ -1,8 +1,10 @@
-import os, json, ast, traceback, time
+import os, json, ast, traceback, time, hashlib, shutil, threading, weakref
 import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 import rapidqcms.DatabaseFunctions as db
+import rapidqcms.RunCache as run_cache
 
 import logging
 
@@ -23,6 +25,24 @@ bootstrap_colors = {
     "yellow-low-opacity": "rgba(255, 193, 7, 0.4)"
 }
 
+# Internal standard plots use WebGL above this many samples, and are downsampled to this many points
+webgl_sample_threshold = 1000
+downsample_point_threshold = 2000
+
+# Metrics for instrument trend plots, as { metric : (label, summary column, lower percentile column, upper percentile column) }
+trend_metrics = {
+    "delta_rt": ("Delta RT (min)", "delta_rt_median", "delta_rt_p05", "delta_rt_p95"),
+    "delta_mz": ("Delta m/z", "delta_mz_median", "delta_mz_p05", "delta_mz_p95"),
+    "in_run_delta_rt": ("In-run delta RT (min)", "in_run_delta_rt_median", None, None),
+    "dropout_rate": ("Intensity dropout rate", "dropout_rate", None, None),
+    "qc_results": ("QC results", None, None, None),
+    "throughput": ("Throughput (samples / hour)", "throughput", None, None)
+}
+
+# Figures of completed runs are saved to disk (increment the version when figures change, to ignore older files)
+figures_directory = os.path.join(db.data_directory, "figures")
+figure_cache_version = 1
+
 def get_qc_results(instrument_id, run_id, status="Complete", biological_standard=None, biological_standards_only=False, for_benchmark_plot=False, preserve_names=True):
 
     """
@@ -31,6 +51,10 @@ def get_qc_results(instrument_id, run_id, status="Complete", biological_standard
     This function will return whatever tables it can in a tuple, and fill None for the tables that throw errors in parsing.
     This is so that an error in retrieving one table will not prevent retrieving other tables.
 
+    Results are cached in the server-side run cache (see RunCache.py) by instrument, run, and results version,
+    so that all dashboard sessions viewing the same run share one parsed copy, and going back to a recently viewed
+    run doesn't read the database again. Completed runs don't change anymore, and are pinned in the cache.
+
     Depending on whether Google Drive sync is enabled, this function will load data from either CSV files
     (for active instrument runs) or the local instrument database (for completed runs).
 
@@ -52,7 +76,7 @@ def get_qc_results(instrument_id, run_id, status="Complete", biological_standard
             If specified, returns QC results specifically for biological standard benchmark plot
 
     Returns:
-        tuple: Tuple containing tables of various sample data in JSON "records" format. Order is as follows:
+        tuple: Tuple containing tables of various sample data, encoded with db.encode_table(). Order is as follows:
             1. df_rt_pos: Retention times for internal standards in positive mode
             2. df_rt_neg: Retention times for internal standards in negative mode
             3. df_intensity_pos: Intensities for internal standards in positive mode
@@ -84,19 +108,453 @@ def get_qc_results(instrument_id, run_id, status="Complete", biological_standard
     """
     log.debug("get_qc_results local variables: {}".format(locals()))
     # Get run information / metadata
+    load_from = get_load_from(instrument_id, status)
+
+    # Get database version before loading, so that writes made while loading trigger another refresh
+    database_version = db.get_database_version(instrument_id)
+
+    if load_from == "csv":
+        db.download_qc_results(instrument_id, run_id)
+
+    # Serve results from the run cache if this version of the run was loaded before
+    version, pinned = get_results_version(instrument_id, run_id, status, load_from, database_version)
+    arguments = (biological_standard, biological_standards_only, for_benchmark_plot, preserve_names)
+
+    def build():
+        return build_qc_results(instrument_id, run_id, status, load_from, database_version, version, pinned, *arguments)
+
+    if version is None:
+        return build()
+
+    return run_cache.get_or_load((instrument_id, run_id, version) + arguments, build, pinned)
+
+
+def get_load_from(instrument_id, status):
+
+    """
+    Returns whether QC results of an instrument run are loaded from CSV files or the instrument database.
+
+    Active runs on other devices are loaded from CSV files synced with Google Drive. Completed runs, and all runs on the
+    instrument computer (on which the run was started), are loaded from the instrument database.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        status (str):
+            QC job status, either "Active" or "Complete"
+
+    Returns:
+        str: Either "csv" or "database"
+    """
+
     if db.get_device_identity() != instrument_id and db.sync_is_enabled():
-        if status == "Complete":
-            load_from = "database"
-        elif status == "Active":
-            load_from = "csv"
-    else:
-        load_from = "database"
+        if status == "Active":
+            return "csv"
+
+    return "database"
+
+
+def get_results_version(instrument_id, run_id, status, load_from, database_version):
+
+    """
+    Returns the version of an instrument run's QC results, which is used as its key in the run cache.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (Job ID)
+        status (str):
+            QC job status, either "Active" or "Complete"
+        load_from (str):
+            Whether results are loaded from CSV files (active runs on remote devices) or the instrument database
+        database_version (int):
+            Version of the instrument database, as returned by get_database_version()
+
+    Returns:
+        tuple: Results version (None if it is unknown), and whether the results are immutable
+    """
+
+    if status == "Complete":
+        return "complete", True
 
-    if load_from == "database":
-        df_run = db.get_instrument_run(instrument_id, run_id)
     elif load_from == "csv":
-        db.download_qc_results(instrument_id, run_id)
-        df_run = db.get_instrument_run_from_csv(instrument_id, run_id)
+        progress = db.get_qc_results_progress(instrument_id, run_id)
+        return (progress["version"] if progress is not None else None), False
+
+    else:
+        return database_version, False
+
+
+def load_parsed_run(instrument_id, run_id, load_from, version, pinned):
+
+    """
+    Loads the run record and all parsed QC results of an instrument run, using the run cache if possible.
+
+    The parsed tables are shared by all dashboard sessions, so callers must not modify them (see get_table_from_cache()).
+    When a new version of an active run is loaded, the cached previous version is updated with the newly processed
+    samples instead of reading the run in full.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (Job ID)
+        load_from (str):
+            Whether results are loaded from CSV files (active runs on remote devices) or the instrument database
+        version (int or str):
+            Results version, as returned by get_results_version(), or None to skip the cache
+        pinned (bool):
+            Whether the results are immutable (for completed runs)
+
+    Returns:
+        dict: Run record ("run"), parsed QC results ("results") as returned by db.load_run_results(), and tables
+            serialized to JSON so far ("json", keyed by the ID of each table, with a weak reference to the table
+            and its JSON), which is only accessed while holding "json_lock"
+    """
+
+    def load():
+        if load_from == "database":
+            df_run = db.get_instrument_run(instrument_id, run_id)
+        elif load_from == "csv":
+            df_run = db.get_instrument_run_from_csv(instrument_id, run_id)
+
+        biological_standards = df_run["biological_standards"].values[0]
+        if biological_standards is not None:
+            biological_standards = ast.literal_eval(biological_standards)
+
+        # Update the previous version of an active run with newly processed samples, if it is still cached
+        previous = run_cache.get_latest(instrument_id, run_id) if version is not None and not pinned else None
+        if previous is not None and previous["load_from"] != load_from:
+            previous = None
+
+        results = db.load_run_results(instrument_id, run_id, load_from, df_run["chromatography"].values[0],
+            biological_standards=biological_standards, preserve_names=True,
+            previous=previous["results"] if previous is not None else None)
+
+        # Keep JSON of tables that didn't change, so that they aren't serialized again
+        json_cache = {}
+        if previous is not None:
+            tables = get_tables(results)
+            with previous["json_lock"]:
+                json_cache = {key: value for key, value in previous["json"].items()
+                    if any(value[0]() is df for df in tables)}
+
+        return {"run": df_run, "results": results, "load_from": load_from, "json": json_cache,
+            "json_lock": threading.Lock()}
+
+    if version is None:
+        return load()
+
+    return run_cache.get_or_load((instrument_id, run_id, version), load, pinned)
+
+
+def get_tables(results):
+
+    """
+    Returns all tables in the output of db.load_run_results() as a flat list.
+    """
+
+    tables = [results["samples"]]
+    for polarity_tables in list(results["internal_standards"].values()) + list(results["qc"].values()):
+        tables += list(polarity_tables.values())
+    for biological_standard_tables in results["biological_standards"].values():
+        for polarity_tables in biological_standard_tables.values():
+            tables += list(polarity_tables.values())
+
+    return [df for df in tables if df is not None]
+
+
+def get_fingerprint(value):
+
+    """
+    Returns a short hash of a JSON table (or dictionary of JSON tables), to check whether a table changed between refreshes.
+    """
+
+    if value is None:
+        return None
+    elif not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True)
+
+    return hashlib.md5(value.encode()).hexdigest()[:16]
+
+
+def get_table_from_cache(resources, table, data):
+
+    """
+    Returns a table of parsed QC results from the run cache, instead of parsing the JSON stored in the user's session.
+
+    Falls back to parsing the JSON if the run is not cached (anymore), or was cached for a different results version.
+
+    Args:
+        resources (dict):
+            Run metadata from the "study-resources" store (parsed), or None
+        table (tuple):
+            Path of the table in the output of db.load_run_results(), ex: ("internal_standards", "Pos", "retention_time")
+        data (str):
+            Same table encoded with db.encode_table(), from a dcc.Store object
+
+    Returns:
+        DataFrame of QC results (a copy, so that it can be modified by the caller)
+    """
+
+    parsed = None
+    if resources is not None and resources.get("results_version") is not None:
+        parsed = run_cache.get((resources["instrument"], resources["run_id"], resources["results_version"]))
+
+    if parsed is not None:
+        df = parsed["results"]
+        for key in table:
+            df = df.get(key) if df is not None else None
+        if df is not None:
+            return df.copy()
+
+    return db.decode_table(data)
+
+
+def get_sample_details(resources, sample_id):
+
+    """
+    Returns the QC results, sequence rows, and metadata rows of a single sample, for the sample information card.
+
+    Instead of decoding every table of the run from the user's session and filtering each one by sample, the sample's rows
+    are looked up by sample ID in the parsed run (see load_parsed_run()), which keeps the position of every sample in its
+    tables. Sequence and metadata rows are indexed by sample ID once per results version (see get_sample_info_index()).
+    This way, the time to open a sample card doesn't depend on the length of the run.
+
+    Args:
+        resources (dict):
+            Run metadata from the "study-resources" store (parsed)
+        sample_id (str):
+            Sample ID
+
+    Returns:
+        dict: Dictionary with the following keys, or None if the sample is not in the run:
+            - "polarity": Polarity of the sample, either "Pos" or "Neg"
+            - "biological_standard": Biological standard of the sample, or None if it is not a biological standard
+            - "tables": { table path (see get_table_from_cache()) : single-row DataFrame }
+            - "sequence": Rows of the acquisition sequence for the sample
+            - "metadata": Rows of the sample metadata for the sample
+    """
+
+    instrument_id = resources["instrument"]
+    run_id = resources["run_id"]
+    version = resources.get("results_version")
+    pinned = version == "complete"
+    load_from = resources.get("load_from") or get_load_from(instrument_id, resources["status"])
+
+    # Use the run as parsed for this session, or a newer version of it, before reading it again
+    parsed = run_cache.get((instrument_id, run_id, version)) if version is not None else None
+    if parsed is None:
+        parsed = run_cache.get_latest(instrument_id, run_id)
+    if parsed is None or parsed["load_from"] != load_from:
+        parsed = load_parsed_run(instrument_id, run_id, load_from, version, pinned)
+
+    results = parsed["results"]
+    rows = results["rows"]
+
+    # Find the tables and row of the sample
+    if sample_id in rows["biological_standards"]:
+        biological_standard, polarity, position = rows["biological_standards"][sample_id]
+        tables = {("biological_standards", biological_standard, polarity, result_type): df
+            for result_type, df in results["biological_standards"][biological_standard][polarity].items()}
+
+    elif sample_id in rows["internal_standards"]:
+        biological_standard = None
+        polarity, position = rows["internal_standards"][sample_id]
+        tables = {("internal_standards", polarity, result_type): df
+            for result_type, df in results["internal_standards"][polarity].items()}
+        tables.update({("qc", polarity, qc_result_type): df for qc_result_type, df in results["qc"][polarity].items()})
+
+    else:
+        return None
+
+    # Get sequence and metadata rows of the sample
+    sample_info = get_sample_info_index(instrument_id, run_id, version, pinned, parsed["run"])
+    sequence_rows = sample_info["sequence_rows"].get(sample_id, [])
+    metadata_rows = sample_info["metadata_rows"].get(sample_id, [])
+
+    return {
+        "polarity": polarity,
+        "biological_standard": biological_standard,
+        "tables": {table: df.iloc[[position]].reset_index(drop=True) for table, df in tables.items() if df is not None},
+        "sequence": sample_info["sequence"].iloc[sequence_rows].reset_index(drop=True),
+        "metadata": sample_info["metadata"].iloc[metadata_rows].reset_index(drop=True)
+    }
+
+
+def get_sample_info_index(instrument_id, run_id, version, pinned, df_run):
+
+    """
+    Returns the acquisition sequence and sample metadata of an instrument run, indexed by sample ID.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (Job ID)
+        version (int or str):
+            Results version, as returned by get_results_version(), or None to skip the cache
+        pinned (bool):
+            Whether the results are immutable (for completed runs)
+        df_run (DataFrame):
+            Instrument run record, as returned by db.get_instrument_run()
+
+    Returns:
+        dict: Sequence ("sequence") and metadata ("metadata") tables, and the positions of each sample's rows in them
+            ("sequence_rows" and "metadata_rows", as { sample ID : list of positions })
+    """
+
+    def load():
+        df_sequence = pd.read_json(df_run["sequence"].values[0], orient="split")
+        try:
+            df_metadata = pd.read_json(df_run["metadata"].values[0], orient="split")
+        except:
+            df_metadata = pd.DataFrame()
+
+        sample_info = {"sequence": df_sequence, "metadata": df_metadata}
+        for table, column in [("sequence", "File Name"), ("metadata", "Filename")]:
+            df = sample_info[table]
+            positions = df.groupby(df[column].astype(str)).indices if len(df) > 0 and column in df.columns else {}
+            sample_info[table + "_rows"] = {sample_id: rows.tolist() for sample_id, rows in positions.items()}
+
+        return sample_info
+
+    if version is None:
+        return load()
+
+    return run_cache.get_or_load((instrument_id, run_id, version, "sample_info"), load, pinned)
+
+
+def get_cached_figure(resources, figure, samples, build):
+
+    """
+    Returns a Plotly figure from the figure cache, or builds and caches it.
+
+    Figures are cached in the run cache by instrument, run, results version, figure (plot type, polarity, internal standard,
+    and anything else that changes the figure), and selected samples, so that flipping through internal standards or
+    switching polarity only transfers a cached figure. Figures of completed runs never change, so they are also saved to
+    disk as JSON, and are loaded from there after the server restarts or the figure is evicted from memory.
+
+    Args:
+        resources (dict):
+            Run metadata from the "study-resources" store (parsed), or None
+        figure (tuple):
+            Plot type, polarity, internal standard, and other arguments that change the figure
+        samples (list):
+            Selected samples
+        build (function):
+            Function without arguments that returns the figure (a plotly.graph_objects.Figure object)
+
+    Returns:
+        dict: Plotly figure
+    """
+
+    if resources is None or resources.get("results_version") is None:
+        return build()
+
+    sample_filter = hashlib.md5("\n".join(samples).encode()).hexdigest()[:16]
+    key = (resources["instrument"], resources["run_id"], resources["results_version"], "figure", figure_cache_version) \
+        + tuple(figure) + (sample_filter,)
+    pinned = resources["results_version"] == "complete"
+
+    def load():
+        figure_file = get_figure_file(key) if pinned else None
+
+        # Load figures of completed runs from disk
+        if figure_file is not None and os.path.exists(figure_file):
+            try:
+                with open(figure_file, "r") as file:
+                    return file.read()
+            except:
+                print("Could not read cached figure:", figure_file)
+                traceback.print_exc()
+
+        figure_json = build().to_json()
+
+        # Save figures of completed runs to disk (writing to a temporary file first, so that no partial file is read)
+        if figure_file is not None:
+            try:
+                os.makedirs(os.path.dirname(figure_file), exist_ok=True)
+                temporary_file = figure_file + ".tmp" + str(os.getpid())
+                with open(temporary_file, "w") as file:
+                    file.write(figure_json)
+                os.replace(temporary_file, figure_file)
+            except:
+                print("Could not save cached figure:", figure_file)
+                traceback.print_exc()
+
+        return figure_json
+
+    return json.loads(run_cache.get_or_load(key, load, pinned))
+
+
+def get_treatments_key(treatments):
+
+    """
+    Returns a short hash of the treatments of selected samples, to include in the figure cache key of plots that show them.
+
+    Args:
+        treatments (DataFrame): Table of samples ("Filename") and their "Treatment", or an empty DataFrame
+
+    Returns:
+        str: Hash of the treatments, or None if there are no treatments
+    """
+
+    if len(treatments) == 0:
+        return None
+
+    return hashlib.md5(treatments.to_json(orient="values").encode()).hexdigest()[:16]
+
+
+def get_figure_file(key):
+
+    """
+    Returns the path of the file that a figure of a completed run is saved to, given its figure cache key.
+    """
+
+    filename = hashlib.md5(repr(key).encode()).hexdigest() + ".json"
+    return os.path.join(figures_directory, str(key[0]), str(key[1]), filename)
+
+
+def delete_cached_figures(instrument_id, run_id=None):
+
+    """
+    Deletes the figures of an instrument run (or of all runs on an instrument) that were saved to disk.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str, default None):
+            Instrument run ID, or None for all runs on the instrument
+
+    Returns:
+        None
+    """
+
+    directory = os.path.join(figures_directory, str(instrument_id))
+    if run_id is not None:
+        directory = os.path.join(directory, str(run_id))
+
+    if os.path.exists(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def build_qc_results(instrument_id, run_id, status, load_from, database_version, version, pinned,
+    biological_standard, biological_standards_only, for_benchmark_plot, preserve_names):
+
+    """
+    Builds the tuple of QC result tables returned by get_qc_results() from the parsed results of an instrument run.
+
+    See get_qc_results() for the arguments and returned tables. The results version and whether the results are
+    pinned are passed on to load_parsed_run().
+
+    The returned resources include a fingerprint of each table, so that dashboard refreshes can skip tables that
+    the user's session already holds.
+    """
+
+    parsed = load_parsed_run(instrument_id, run_id, load_from, version, pinned)
+    df_run = parsed["run"]
 
     chromatography = df_run["chromatography"].values[0]
     df_sequence = df_run["sequence"].values[0]
@@ -123,76 +581,64 @@ def get_qc_results(instrument_id, run_id, status="Complete", biological_standard
         "precursor_mass_dict": precursor_mz_dict,
         "retention_times_dict": retention_times_dict,
         "samples_completed": completed,
-        "biological_standards": biological_standards
+        "biological_standards": biological_standards,
+        "database_version": database_version,
+        "results_version": version,
+        "load_from": load_from
     }
 
     log.debug("get_qc_results resources: {}".format(resources))
 
-    # Parse m/z, RT, and intensity data for biological standards into DataFrames
+    # Tables were parsed from the run's results in a single pass
+    results = parsed["results"]
+
     if biological_standards is not None:
+        biological_standard_list = biological_standards if biological_standard is None else [biological_standard]
 
-        df_bio_mz_pos = {}
-        df_bio_mz_neg = {}
-        df_bio_intensity_neg = {}
-        df_bio_intensity_pos = {}
-        df_bio_rt_neg = {}
-        df_bio_rt_pos = {}
-
-        if biological_standard is None:
-            biological_standard_list = biological_standards
-            log.debug("Biological_standards is... ")
-            log.debug(biological_standard)
-        else:
-            biological_standard_list = [biological_standard]
-            log.debug("[Biological_standard] is... ")
-            log.debug(biological_standard)
+    json_cache = parsed["json"]
 
-        for bio_stnd in biological_standard_list:
-            log.debug("in for bio_stnd in biological_standard ")
-            try:
-                df_bio_mz_pos[bio_stnd] = db.parse_biological_standard_data(instrument_id=instrument_id, run_id=run_id,
-                    result_type="precursor_mz", polarity="Pos", biological_standard=bio_stnd, load_from=load_from, preserve_names=preserve_names)
-                log.debug("df_bio_mz_pos type is: ")
-                log.debug(type(df_bio_mz_pos))
-                log.debug(df_bio_mz_pos)
-            except Exception as error:
-                print("Error loading positive (+) mode biological standard precursor m/z data:", error)
-                df_bio_mz_pos[bio_stnd] = None
+    # Tables are serialized once per results version, and the cached entry grows by the size of their JSON
+    def to_json(df):
+        if df is None:
+            return None
 
-            try:
-                df_bio_rt_pos[bio_stnd] = db.parse_biological_standard_data(instrument_id=instrument_id, run_id=run_id,
-                    result_type="retention_time", polarity="Pos", biological_standard=bio_stnd, load_from=load_from, preserve_names=preserve_names)
-            except Exception as error:
-                print("Error loading positive (+) mode biological standard precursor m/z data:", error)
-                df_bio_rt_pos[bio_stnd] = None
+        with parsed["json_lock"]:
+            cached = json_cache.get(id(df))
+            if cached is not None and cached[0]() is df:
+                return cached[1]
 
-            try:
-                df_bio_intensity_pos[bio_stnd] = db.parse_biological_standard_data(instrument_id=instrument_id, run_id=run_id,
-                    result_type="intensity", polarity="Pos", biological_standard=bio_stnd, load_from=load_from, preserve_names=preserve_names)
-            except Exception as error:
-                print("Error loading positive (+) mode biological standard retention time data:", error)
-                df_bio_intensity_pos[bio_stnd] = None
+            encoded = db.encode_table(df)
+            json_cache[id(df)] = (weakref.ref(df), encoded)
 
-            try:
-                df_bio_mz_neg[bio_stnd] = db.parse_biological_standard_data(instrument_id=instrument_id, run_id=run_id,
-                    result_type="precursor_mz", polarity="Neg", biological_standard=bio_stnd, load_from=load_from, preserve_names=preserve_names)
-            except Exception as error:
-                print("Error loading negative (-) mode biological standard precursor m/z data:", error)
-                df_bio_mz_neg[bio_stnd] = None
+            if version is not None:
+                size_change = run_cache.estimate_size(encoded) - (run_cache.estimate_size(cached[1]) if cached else 0)
+                run_cache.resize((instrument_id, run_id, version), size_change)
 
-            try:
-                df_bio_rt_neg[bio_stnd] = db.parse_biological_standard_data(instrument_id=instrument_id, run_id=run_id,
-                    result_type="retention_time", polarity="Neg", biological_standard=bio_stnd, load_from=load_from, preserve_names=preserve_names)
-            except Exception as error:
-                print("Error loading positive (+) mode biological standard retention time data:", error)
-                df_bio_rt_neg[bio_stnd] = None
+        return encoded
 
-            try:
-                df_bio_intensity_neg[bio_stnd] = db.parse_biological_standard_data(instrument_id=instrument_id, run_id=run_id,
-                    result_type="intensity", polarity="Neg", biological_standard=bio_stnd, load_from=load_from, preserve_names=preserve_names)
-            except Exception as error:
-                print("Error loading negative (-) mode biological standard intensity data:", error)
-                df_bio_intensity_neg[bio_stnd] = None
+    def get_bio_table(bio_stnd, polarity, result_type):
+        df = results["biological_standards"].get(bio_stnd, {}).get(polarity, {}).get(result_type)
+
+        # Renamed copies are temporary, so their JSON isn't cached
+        if df is not None and preserve_names is False:
+            return db.encode_table(df.assign(Name=df["run_id"]))
+        return to_json(df)
+
+    # Parse m/z, RT, and intensity data for biological standards into DataFrames
+    if biological_standards is not None:
+        bio_tables = {}
+        for polarity in ["Pos", "Neg"]:
+            for result_type in ["precursor_mz", "retention_time", "intensity"]:
+                bio_tables[(polarity, result_type)] = {
+                    bio_stnd: get_bio_table(bio_stnd, polarity, result_type)
+                    for bio_stnd in biological_standard_list}
+
+        df_bio_mz_pos = bio_tables[("Pos", "precursor_mz")]
+        df_bio_rt_pos = bio_tables[("Pos", "retention_time")]
+        df_bio_intensity_pos = bio_tables[("Pos", "intensity")]
+        df_bio_mz_neg = bio_tables[("Neg", "precursor_mz")]
+        df_bio_rt_neg = bio_tables[("Neg", "retention_time")]
+        df_bio_intensity_neg = bio_tables[("Neg", "intensity")]
 
     else:
         df_bio_mz_pos = None
@@ -209,133 +655,37 @@ def get_qc_results(instrument_id, run_id, status="Complete", biological_standard
         return df_bio_intensity_pos, df_bio_intensity_neg
 
     # Parse m/z, RT, and intensity data for internal standards into DataFrames
-    try:
-        df_mz_pos = db.parse_internal_standard_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="precursor_mz", polarity="Pos", load_from=load_from)
-    except Exception as error:
-        print("Error loading positive (+) mode precursor m/z data:", error)
-        df_mz_pos = None
-
-    try:
-        df_rt_pos = db.parse_internal_standard_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="retention_time", polarity="Pos", load_from=load_from)
-    except Exception as error:
-        print("Error loading positive (+) mode retention time data:", error)
-        df_rt_pos = None
-
-    try:
-        df_intensity_pos = db.parse_internal_standard_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="intensity", polarity="Pos", load_from=load_from)
-    except Exception as error:
-        print("Error loading positive (+) mode intensity data:", error)
-        df_intensity_pos = None
-
-    try:
-        df_mz_neg = db.parse_internal_standard_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="precursor_mz", polarity="Neg", load_from=load_from)
-    except Exception as error:
-        print("Error loading negative (-) mode precursor m/z data:", error)
-        df_mz_neg = None
-
-    try:
-        df_rt_neg = db.parse_internal_standard_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="retention_time", polarity="Neg", load_from=load_from)
-    except Exception as error:
-        print("Error loading negative (-) mode retention time data:", error)
-        df_rt_neg = None
-
-    try:
-        df_intensity_neg = db.parse_internal_standard_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="intensity", polarity="Neg", load_from=load_from)
-    except Exception as error:
-        print("Error loading negative (-) mode intensity data:", error)
-        df_intensity_neg = None
-
-    try:
-        df_delta_rt_pos = db.parse_internal_standard_qc_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="Delta RT", polarity="Pos", load_from=load_from)
-    except Exception as error:
-        print("Error loading positive (+) mode delta RT data:", error)
-        df_delta_rt_pos = None
-
-    try:
-        df_delta_rt_neg = db.parse_internal_standard_qc_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="Delta RT", polarity="Neg", load_from=load_from)
-    except Exception as error:
-        print("Error loading negative (-) mode delta RT data:", error)
-        df_delta_rt_neg = None
-
-    try:
-        df_in_run_delta_rt_pos = db.parse_internal_standard_qc_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="In-run delta RT", polarity="Pos", load_from=load_from)
-    except Exception as error:
-        print("Error loading positive (+) mode in-run delta RT data:", error)
-        df_in_run_delta_rt_pos = None
-
-    try:
-        df_in_run_delta_rt_neg = db.parse_internal_standard_qc_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="In-run delta RT", polarity="Neg", load_from=load_from)
-    except Exception as error:
-        print("Error loading negative (-) mode in-run delta RT data:", error)
-        df_in_run_delta_rt_neg = None
-
-    try:
-        df_delta_mz_pos = db.parse_internal_standard_qc_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="Delta m/z", polarity="Pos", load_from=load_from)
-    except Exception as error:
-        print("Error loading positive (+) mode delta m/z data:", error)
-        df_delta_mz_pos = None
-
-    try:
-        df_delta_mz_neg = db.parse_internal_standard_qc_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="Delta m/z", polarity="Neg", load_from=load_from)
-    except Exception as error:
-        print("Error loading negative (-) mode delta m/z data:", error)
-        df_delta_mz_neg = None
-
-    try:
-        df_warnings_pos = db.parse_internal_standard_qc_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="Warnings", polarity="Pos", load_from=load_from)
-    except Exception as error:
-        print("Error loading positive (+) mode QC warnings data:", error)
-        df_warnings_pos = None
-
-    try:
-        df_warnings_neg = db.parse_internal_standard_qc_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="Warnings", polarity="Neg", load_from=load_from)
-    except Exception as error:
-        print("Error loading negative (-) mode QC warnings data:", error)
-        df_warnings_neg = None
-
-    try:
-        df_fails_pos = db.parse_internal_standard_qc_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="Fails", polarity="Pos", load_from=load_from)
-    except Exception as error:
-        print("Error loading positive (+) mode QC fails data:", error)
-        df_fails_pos = None
-
-    try:
-        df_fails_neg = db.parse_internal_standard_qc_data(instrument_id=instrument_id,
-            run_id=run_id, result_type="Fails", polarity="Neg", load_from=load_from)
-    except Exception as error:
-        print("Error loading negative (-) mode QC fails data:", error)
-        df_fails_neg = None
+    internal_standards = results["internal_standards"]
+    df_mz_pos = to_json(internal_standards["Pos"]["precursor_mz"])
+    df_rt_pos = to_json(internal_standards["Pos"]["retention_time"])
+    df_intensity_pos = to_json(internal_standards["Pos"]["intensity"])
+    df_mz_neg = to_json(internal_standards["Neg"]["precursor_mz"])
+    df_rt_neg = to_json(internal_standards["Neg"]["retention_time"])
+    df_intensity_neg = to_json(internal_standards["Neg"]["intensity"])
+
+    # Parse QC results for internal standards into DataFrames
+    qc = results["qc"]
+    df_delta_rt_pos = to_json(qc["Pos"]["Delta RT"])
+    df_delta_rt_neg = to_json(qc["Neg"]["Delta RT"])
+    df_in_run_delta_rt_pos = to_json(qc["Pos"]["In-run delta RT"])
+    df_in_run_delta_rt_neg = to_json(qc["Neg"]["In-run delta RT"])
+    df_delta_mz_pos = to_json(qc["Pos"]["Delta m/z"])
+    df_delta_mz_neg = to_json(qc["Neg"]["Delta m/z"])
+    df_warnings_pos = to_json(qc["Pos"]["Warnings"])
+    df_warnings_neg = to_json(qc["Neg"]["Warnings"])
+    df_fails_pos = to_json(qc["Pos"]["Fails"])
+    df_fails_neg = to_json(qc["Neg"]["Fails"])
 
     # Generate DataFrame for sample table
     try:
-        if load_from == "database":
-            df_samples = db.get_samples_in_run(instrument_id, run_id, "Both")
-        elif load_from == "csv":
-            df_samples = db.get_samples_from_csv(instrument_id, run_id, "Both")
-
-        df_samples = df_samples[["sample_id", "position", "qc_result", "polarity"]]
+        df_samples = results["samples"][["sample_id", "position", "qc_result", "polarity"]]
         df_samples = df_samples.rename(
             columns={
                 "sample_id": "Specimen",
                 "position": "Position",
                 "qc_result": "QC",
                 "polarity": "Polarity"})
-        df_samples = df_samples.to_json(orient="records")
+        df_samples = db.encode_table(df_samples)
 
     except Exception as error:
         print("Error loading samples from database:", error)
@@ -343,23 +693,29 @@ def get_qc_results(instrument_id, run_id, status="Complete", biological_standard
         df_samples = ""
 
     # Get internal standards from data
-    if df_rt_pos is not None:
-        pos_internal_standards = pd.read_json(df_rt_pos, orient="records").columns.tolist()
+    if internal_standards["Pos"]["retention_time"] is not None:
+        pos_internal_standards = internal_standards["Pos"]["retention_time"].columns.tolist()
         pos_internal_standards.remove("Specimen")
     else:
         pos_internal_standards = []
 
-    if df_rt_neg is not None:
-        neg_internal_standards = pd.read_json(df_rt_neg, orient="records").columns.tolist()
+    if internal_standards["Neg"]["retention_time"] is not None:
+        neg_internal_standards = internal_standards["Neg"]["retention_time"].columns.tolist()
         neg_internal_standards.remove("Specimen")
     else:
         neg_internal_standards = []
 
-    return (df_rt_pos, df_rt_neg, df_intensity_pos, df_intensity_neg, df_mz_pos, df_mz_neg, df_sequence, df_metadata,
+    outputs = [df_rt_pos, df_rt_neg, df_intensity_pos, df_intensity_neg, df_mz_pos, df_mz_neg, df_sequence, df_metadata,
         df_bio_rt_pos, df_bio_rt_neg, df_bio_intensity_pos, df_bio_intensity_neg, df_bio_mz_pos, df_bio_mz_neg,
-        json.dumps(resources), df_samples, json.dumps(pos_internal_standards), json.dumps(neg_internal_standards),
+        resources, df_samples, json.dumps(pos_internal_standards), json.dumps(neg_internal_standards),
         df_delta_rt_pos, df_delta_rt_neg, df_in_run_delta_rt_pos, df_in_run_delta_rt_neg, df_delta_mz_pos, df_delta_mz_neg,
-        df_warnings_pos, df_warnings_neg, df_fails_pos, df_fails_neg)
+        df_warnings_pos, df_warnings_neg, df_fails_pos, df_fails_neg]
+
+    # Fingerprint each table (except resources), so that refreshes only send tables that changed
+    resources["fingerprints"] = [get_fingerprint(output) if output is not resources else None for output in outputs]
+    outputs[14] = json.dumps(resources)
+
+    return tuple(outputs)
 
 def generate_sample_metadata_dataframe(sample, df_rt, df_mz, df_intensity, df_delta_rt, df_in_run_delta_rt,
     df_delta_mz, df_warnings, df_fails, df_sequence, df_metadata):
@@ -525,12 +881,217 @@ def generate_bio_standard_dataframe(clicked_sample, instrument_id, run_id, df_rt
     return df_sample_features, df_sample_info
 
 
-def load_istd_rt_plot(dataframe, samples, internal_standard, retention_times):
+def load_instrument_trend_plot(df_summaries, metric, title):
+
+    """
+    Returns line plot figure of a run summary metric across instrument runs, from the "run_summaries" table.
+
+    Medians are plotted as lines, with a band between the 5th and 95th percentiles if the metric has them.
+    For "qc_results", the fractions of samples that passed, were marked with a warning, and failed are plotted instead.
+
+    Args:
+        df_summaries (DataFrame):
+            Run summaries for one internal standard (or run rows), as returned by db.get_run_summaries()
+        metric (str):
+            Key of trend_metrics
+        title (str):
+            Title of the plot
+
+    Returns:
+        plotly.graph_objects.Figure object: Plotly line plot of the metric across instrument runs
+    """
+
+    label, column, lower_column, upper_column = trend_metrics[metric]
+
+    # Plot runs in the order they were processed, labeled with their start times
+    runs = df_summaries["run_id"].astype(str).tolist()
+    started = df_summaries["started"].fillna("").astype(str).tolist() if "started" in df_summaries.columns else [""] * len(runs)
+    customdata = np.column_stack([runs, started]) if len(runs) > 0 else None
+    hovertemplate = "Run: %{customdata[0]}<br>%{fullData.name}: %{y:.4g}<extra></extra>"
+
+    fig = go.Figure()
+
+    if metric == "qc_results":
+        for result, color in [("pass_rate", "green"), ("warning_rate", "yellow"), ("fail_rate", "red")]:
+            fig.add_trace(go.Scatter(x=runs, y=df_summaries[result], customdata=customdata, mode="lines+markers",
+                name=result.replace("_rate", "").capitalize(), line=dict(color=bootstrap_colors[color]),
+                hovertemplate=hovertemplate))
+        label = "Fraction of samples"
+
+    else:
+        if lower_column is not None:
+            fig.add_trace(go.Scatter(x=runs, y=df_summaries[upper_column], mode="lines", line=dict(width=0),
+                name="95th percentile", hoverinfo="skip", showlegend=False))
+            fig.add_trace(go.Scatter(x=runs, y=df_summaries[lower_column], mode="lines", line=dict(width=0),
+                fill="tonexty", fillcolor=bootstrap_colors["blue-low-opacity"], name="5th - 95th percentile",
+                hoverinfo="skip"))
+
+        fig.add_trace(go.Scatter(x=runs, y=df_summaries[column], customdata=customdata, mode="lines+markers",
+            name="Median" if lower_column is not None else label, line=dict(color=bootstrap_colors["blue"]),
+            hovertemplate=hovertemplate))
+
+    fig.update_layout(
+        title=title,
+        height=600,
+        showlegend=True,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        margin=dict(t=75, b=75, l=0, r=0))
+    fig.update_xaxes(title="Instrument run", type="category")
+    fig.update_yaxes(title=label)
+
+    return fig
+
+
+def downsample_lttb(x, y, threshold):
+
+    """
+    Returns the indices of points to keep when downsampling a series with Largest-Triangle-Three-Buckets (LTTB).
+
+    The first and last points are always kept. The points in between are split into buckets, and from each bucket,
+    the point that forms the largest triangle with the previously kept point and the average of the next bucket is kept.
+    Unlike keeping every nth point, this preserves peaks and outliers, which are what matter in QC plots.
+
+    Args:
+        x (array): x values, in ascending order
+        y (array): y values (without NaN's)
+        threshold (int): Number of points to keep
+
+    Returns:
+        numpy array: Indices of the kept points, in ascending order
+    """
+
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Bucket edges for all points except the first and last
+    edges = np.linspace(1, length - 1, threshold - 1).astype(int)
+
+    kept = np.zeros(threshold, dtype=int)
+    kept[-1] = length - 1
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else length
+
+        # Average of the next bucket
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        # Keep the point that forms the largest triangle with the previous point and the next bucket's average
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+
+    return kept
+
+
+def get_zoomed_range(relayout_data):
+
+    """
+    Returns the x-axis range that a Plotly graph was zoomed into, from the graph's relayoutData property.
+
+    Args:
+        relayout_data (dict): relayoutData of a dcc.Graph component
+
+    Returns:
+        list: [start, end] of the zoomed x-axis range, or None if the graph wasn't zoomed
+    """
+
+    if not relayout_data:
+        return None
+
+    if "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        return [relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]]
+
+    # Range slider updates set the range as a list
+    elif "xaxis.range" in relayout_data:
+        return list(relayout_data["xaxis.range"])
+
+    return None
+
+
+def get_clicked_sample(click_data):
+
+    """
+    Returns the name of the sample that was clicked in an internal standard plot, from the graph's clickData property.
+
+    Args:
+        click_data (dict): clickData of a dcc.Graph component
+
+    Returns:
+        str: Name of the clicked sample
+    """
+
+    point = click_data["points"][0]
+    sample = point.get("customdata", point["x"])
+
+    # Intensity plots pass the sample name and treatment
+    if isinstance(sample, list):
+        sample = sample[0]
+
+    return str(sample)
+
+
+def get_istd_plot_points(dataframe, samples, internal_standard, x_range=None):
+
+    """
+    Returns the points to plot for an internal standard across samples, downsampled for large runs.
+
+    Samples are plotted at their position in the list of samples, so that a zoomed range can be mapped back to samples.
+    Runs with more than downsample_point_threshold samples are downsampled with LTTB, and if a zoomed range is given,
+    all samples in that range are added back so that the zoomed view is shown at full resolution.
+
+    Args:
+        dataframe (DataFrame):
+            Table of results for internal standards (columns) across samples (rows)
+        samples (list):
+            Samples to plot, in order
+        internal_standard (str):
+            The selected internal standard
+        x_range (list, default None):
+            Zoomed x-axis range [start, end] in sample positions, or None to plot the whole run
+
+    Returns:
+        Tuple of numpy arrays: sample positions, sample names, and values of the plotted points
+    """
+
+    # Align results with samples (samples without results are NaN)
+    values = dataframe.drop_duplicates("Specimen", keep="last").set_index("Specimen")[internal_standard]
+    values = pd.to_numeric(values.reindex(samples), errors="coerce").to_numpy(dtype=float)
+    positions = np.arange(len(samples))
+
+    if len(samples) > downsample_point_threshold:
+
+        # Downsample the whole run to get an overview
+        positions = positions[~np.isnan(values)]
+        kept = positions[downsample_lttb(positions, values[positions], downsample_point_threshold)]
+
+        # Add the samples in the zoomed range (downsampled again only if the range itself is too large)
+        if x_range is not None:
+            zoomed = positions[(positions >= np.floor(x_range[0])) & (positions <= np.ceil(x_range[1]))]
+            zoomed = zoomed[downsample_lttb(zoomed, values[zoomed], downsample_point_threshold)]
+            kept = np.union1d(kept, zoomed)
+
+        positions = kept
+
+    return positions, np.asarray(samples, dtype=object)[positions], values[positions]
+
+
+def load_istd_rt_plot(dataframe, samples, internal_standard, retention_times, x_range=None):
 
     """
     Returns line plot figure of retention times (for a selected internal standard) across samples.
 
-    Documentation on Plotly line plots: https://plotly.com/python-api-reference/generated/plotly.express.line.html
+    Runs with more than webgl_sample_threshold samples are rendered with WebGL, and large runs are downsampled
+    (see get_istd_plot_points). Sample names are passed as customdata, so that clicked points can be mapped to samples.
+
+    Documentation on Plotly WebGL traces: https://plotly.com/python/webgl-vs-svg/
 
     Args:
         dataframe (DataFrame):
@@ -541,48 +1102,51 @@ def load_istd_rt_plot(dataframe, samples, internal_standard, retention_times):
             The selected internal standard
         retention_times (dict):
             Dictionary with key-value pairs of type { internal_standard: retention_time }
+        x_range (list, default None):
+            Zoomed x-axis range to show at full resolution, from get_zoomed_range()
 
     Returns:
-        plotly.express.line object: Plotly line plot of retention times (for the selected internal standard) across samples.
+        plotly.graph_objects.Figure object: Plotly line plot of retention times (for the selected internal standard) across samples.
     """
 
-    df_filtered_by_samples = dataframe.loc[dataframe["Specimen"].isin(samples)]
-    df_filtered_by_samples[internal_standard] = df_filtered_by_samples[internal_standard].astype(float).round(3)
+    positions, names, values = get_istd_plot_points(dataframe, samples, internal_standard, x_range)
 
     y_min = retention_times[internal_standard] - 0.1
     y_max = retention_times[internal_standard] + 0.1
 
-    fig = px.line(df_filtered_by_samples,
+    # Use WebGL for large runs
+    scatter = go.Scattergl if len(samples) > webgl_sample_threshold else go.Scatter
+
+    fig = go.Figure(scatter(
+        x=positions,
+        y=np.round(values, 3),
+        customdata=names,
+        mode="lines+markers",
+        hovertemplate="Sample: %{customdata} <br>Retention Time: %{y} min<br><extra></extra>"))
+    fig.update_layout(
         title="Retention Time vs. Specimens – " + internal_standard,
-        x=samples,
-        y=internal_standard,
         height=600,
-        markers=True,
-        hover_name=samples,
-        labels={"variable": "Internal Standard",
-              "index": "Specimen",
-              "value": "Retention Time"},
-        log_x=False)
-    fig.update_layout(
         transition_duration=500,
         clickmode="event",
         showlegend=False,
-        legend_title_text="Internal Standards",
+        uirevision=internal_standard + str(len(samples)),
         margin=dict(t=75, b=75, l=0, r=0))
     fig.update_xaxes(showticklabels=False, title="Specimen")
     fig.update_yaxes(title="Retention Time (min)", range=[y_min, y_max])
     fig.add_hline(y=retention_times[internal_standard], line_width=2, line_dash="dash")
-    fig.update_traces(hovertemplate="Sample: %{x} <br>Retention Time: %{y} min<br>")
 
     return fig
 
 
-def load_istd_intensity_plot(dataframe, samples, internal_standard, treatments):
+def load_istd_intensity_plot(dataframe, samples, internal_standard, treatments, x_range=None):
 
     """
     Returns bar plot figure of peak intensities (for a selected internal standard) across samples.
 
-    Documentation on Plotly bar plots: https://plotly.com/python-api-reference/generated/plotly.express.bar.html
+    Runs with more than webgl_sample_threshold samples are rendered as a WebGL scatter plot instead of bars,
+    and large runs are downsampled (see get_istd_plot_points). Bars are colored by sample treatment.
+
+    Documentation on Plotly bar plots: https://plotly.com/python/bar-charts/
 
     Args:
         dataframe (DataFrame):
@@ -593,50 +1157,62 @@ def load_istd_intensity_plot(dataframe, samples, internal_standard, treatments):
             The selected internal standard
         treatments (DataFrame):
             DataFrame with sample treatments (from the metadata file) mapped to sample ID's
+        x_range (list, default None):
+            Zoomed x-axis range to show at full resolution, from get_zoomed_range()
 
     Returns:
-        plotly.express.bar object: Plotly bar plot of intensities (for the selected internal standard) across samples.
+        plotly.graph_objects.Figure object: Plotly bar plot of intensities (for the selected internal standard) across samples.
     """
 
-    df_filtered_by_samples = dataframe.loc[dataframe["Specimen"].isin(samples)]
+    positions, names, values = get_istd_plot_points(dataframe, samples, internal_standard, x_range)
 
+    # Map treatments to samples (samples without a treatment keep their own name), and treatments to colors
+    sample_series = pd.Series(samples, dtype=object)
     if len(treatments) > 0:
-        # Map treatments to sample names
-        df_mapped = pd.DataFrame()
-        df_mapped["Specimen"] = df_filtered_by_samples["Specimen"]
-        df_mapped["Treatment"] = df_mapped.replace(
-            treatments.set_index("Filename")["Treatment"])
-        df_filtered_by_samples["Treatment"] = df_mapped["Treatment"].astype(str)
+        treatment_map = treatments.drop_duplicates("Filename", keep="last").set_index("Filename")["Treatment"].astype(str)
+        sample_treatments = sample_series.map(treatment_map).fillna(sample_series)
     else:
-        df_filtered_by_samples["Treatment"] = " "
+        sample_treatments = pd.Series(" ", index=sample_series.index)
 
-    fig = px.bar(df_filtered_by_samples,
-        title="Intensity vs. Specimens – " + internal_standard,
-        x="Specimen",
-        y=internal_standard,
-        text="Specimen",
-        color="Treatment",
-        height=600)
+    palette = np.asarray(px.colors.qualitative.Plotly, dtype=object)
+    codes = pd.factorize(sample_treatments)[0]
+    colors = palette[codes[positions] % len(palette)]
+    customdata = np.column_stack([names, sample_treatments.to_numpy(dtype=object)[positions]])
+
+    # Use WebGL markers instead of SVG bars for large runs
+    if len(samples) > webgl_sample_threshold:
+        trace = go.Scattergl(x=positions, y=values, mode="markers", marker=dict(color=colors, size=5))
+    else:
+        trace = go.Bar(x=positions, y=values, marker=dict(color=colors))
+
+    trace.update(customdata=customdata,
+        hovertemplate="Sample: %{customdata[0]}<br>Treatment: %{customdata[1]}<br>Intensity: %{y:.2e}<br><extra></extra>")
+
+    fig = go.Figure(trace)
     fig.update_layout(
+        title="Intensity vs. Specimens – " + internal_standard,
+        height=600,
         showlegend=False,
         transition_duration=500,
         clickmode="event",
+        uirevision=internal_standard + str(len(samples)),
         xaxis=dict(rangeslider=dict(visible=True), autorange=True),
-        legend=dict(font=dict(size=10)),
         margin=dict(t=75, b=75, l=0, r=0))
     fig.update_xaxes(showticklabels=False, title="Specimen")
     fig.update_yaxes(title="Intensity")
-    fig.update_traces(textposition="outside", hovertemplate="Sample: %{x}<br>Intensity: %{y:.2e}<br>")
 
     return fig
 
 
-def load_istd_delta_mz_plot(dataframe, samples, internal_standard):
+def load_istd_delta_mz_plot(dataframe, samples, internal_standard, x_range=None):
 
     """
     Returns line plot figure of delta m/z (for a selected internal standard) across samples.
 
-    Documentation on Plotly line plots: https://plotly.com/python-api-reference/generated/plotly.express.line.html
+    Runs with more than webgl_sample_threshold samples are rendered with WebGL, and large runs are downsampled
+    (see get_istd_plot_points).
+
+    Documentation on Plotly WebGL traces: https://plotly.com/python/webgl-vs-svg/
 
     Args:
         dataframe (DataFrame):
@@ -645,38 +1221,38 @@ def load_istd_delta_mz_plot(dataframe, samples, internal_standard):
             Samples to query from the DataFrame
         internal_standard (str):
             The selected internal standard
+        x_range (list, default None):
+            Zoomed x-axis range to show at full resolution, from get_zoomed_range()
 
     Returns:
-        plotly.express.line object: Plotly line plot of delta m/z (for the selected internal standard) across samples.
+        plotly.graph_objects.Figure object: Plotly line plot of delta m/z (for the selected internal standard) across samples.
     """
 
-    # Get delta m/z results for selected samples
-    df_filtered_by_samples = dataframe.loc[dataframe["Specimen"].isin(samples)]
+    positions, names, values = get_istd_plot_points(dataframe, samples, internal_standard, x_range)
+
+    # Use WebGL for large runs
+    scatter = go.Scattergl if len(samples) > webgl_sample_threshold else go.Scatter
 
-    fig = px.line(df_filtered_by_samples,
+    fig = go.Figure(scatter(
+        x=positions,
+        y=values,
+        customdata=names,
+        mode="lines+markers",
+        hovertemplate="Sample: %{customdata} <br>Delta m/z: %{y}<br><extra></extra>"))
+    fig.update_layout(
         title="Delta m/z vs. Specimens – " + internal_standard,
-        x=samples,
-        y=internal_standard,
         height=600,
-        markers=True,
-        hover_name=samples,
-        labels={"variable": "Internal Standard",
-              "index": "Specimen",
-              "value": "Delta m/z"},
-        log_x=False)
-    fig.update_layout(
         transition_duration=500,
         clickmode="event",
         showlegend=False,
-        legend_title_text="Internal Standards",
+        uirevision=internal_standard + str(len(samples)),
         margin=dict(t=75, b=75, l=0, r=0))
     fig.update_xaxes(showticklabels=False, title="Specimen")
     fig.update_yaxes(title="delta m/z", range=[-0.01, 0.01])
-    fig.update_traces(hovertemplate="Sample: %{x} <br>Delta m/z: %{y}<br>")
 
     return fig
 
-def load_bio_feature_plot(run_id, df_rt, df_mz, df_intensity, target_biostnd, source_biostnd, return_runids=False):
+def load_bio_feature_plot(run_id, df_rt, df_mz, df_intensity, target_biostnd, source_biostnd, return_runids=False, df_aggregates=None):
 
     """
     Returns scatter plot figure of precursor m/z vs. retention time for targeted features in the biological standard.
@@ -697,6 +1273,9 @@ def load_bio_feature_plot(run_id, df_rt, df_mz, df_intensity, target_biostnd, so
             Table of precursor masses for targeted features (columns) across instrument runs (rows)
         df_intensity (DataFrame):
             Table of intensities for targeted features (columns) across instrument runs (rows)
+        df_aggregates (DataFrame, default None):
+            Feature intensity aggregates of the runs before this one, from get_bio_standard_aggregates(), used for
+            "All previous"
 
     Returns:
         plotly.express.scatter object: m/z - RT scatter plot for targeted metabolites in the biological standard
@@ -713,7 +1292,17 @@ def load_bio_feature_plot(run_id, df_rt, df_mz, df_intensity, target_biostnd, so
     bio_df["Precursor m/z"] = df_mz.loc[df_mz["run_id"] == run_id][metabolites].iloc[0].astype(float).values
     bio_df["Retention time (min)"] =  df_rt.loc[df_rt["run_id"] == run_id][metabolites].iloc[0].astype(float).values
     bio_df["Intensity"] =  df_intensity.loc[df_intensity["run_id"] == run_id][metabolites].iloc[0].astype(float).values
-    if target_biostnd == "All previous":
+    if target_biostnd == "All previous" and df_aggregates is not None and len(df_aggregates) > 0:
+
+        # Get percent change of feature intensities compared to the precomputed mean of injections in previous runs
+        feature_intensity_from_study = bio_df["Intensity"].fillna(0).values
+        average_intensity_in_studies = df_aggregates.set_index("feature").reindex(metabolites)["mean"].values
+
+        bio_df["% Change"] = ((feature_intensity_from_study - average_intensity_in_studies) / average_intensity_in_studies) * 100
+        bio_df.replace(np.inf, 100, inplace=True)
+        bio_df.replace(-np.inf, -100, inplace=True)
+
+    elif target_biostnd == "All previous":
     # Construct new DataFrame
 
         # Get percent change of feature intensities (only for runs previous to this one)
@@ -788,7 +1377,7 @@ def load_bio_feature_plot(run_id, df_rt, df_mz, df_intensity, target_biostnd, so
         return sample_names
 
 
-def load_bio_benchmark_plot(dataframe, metabolite_name, return_runids=False):
+def load_bio_benchmark_plot(dataframe, metabolite_name, return_runids=False, df_aggregates=None):
 
     """
     Returns bar plot figure of intensities for a targeted metabolite in a biological standard across instrument runs.
@@ -800,6 +1389,8 @@ def load_bio_benchmark_plot(dataframe, metabolite_name, return_runids=False):
             Table of intensities for targeted metabolites (columns) across instrument runs (rows)
         metabolite_name (str):
             The targeted metabolite to query from the DataFrame
+        df_aggregates (DataFrame, default None):
+            Cross-run feature intensity aggregates from get_bio_standard_aggregates(), used to draw the cross-run mean
 
     Returns:
         plotly.express.bar object: Plotly bar plot of intensities (for the selected targeted metabolite) across instrument runs.
@@ -838,6 +1429,13 @@ def load_bio_benchmark_plot(dataframe, metabolite_name, return_runids=False):
     fig.update_traces(textposition="outside",
                       hovertemplate=f"{metabolite_name}" + "<br>Study: %{x} <br>Intensity: %{text}<br>")
 
+    # Draw cross-run mean intensity for the metabolite
+    if df_aggregates is not None:
+        df_feature = df_aggregates.loc[df_aggregates["feature"] == metabolite_name]
+        if len(df_feature) > 0 and not pd.isna(df_feature["mean"].values[0]):
+            fig.add_hline(y=df_feature["mean"].values[0], line_width=2, line_dash="dash",
+                annotation_text="Mean of " + str(int(df_feature["n_values"].values[0])) + " injections")
+
     if return_runids is False:
         return fig
     else:
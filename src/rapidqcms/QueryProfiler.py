@@ -0,0 +1,356 @@
+import os, sys, time, json, html, atexit, threading
+import contextvars
+from contextlib import contextmanager
+import sqlalchemy as sa
+
+"""
+Opt-in profiler for SQL queries issued through SQLAlchemy.
+
+Set the environment variable RAPIDQCMS_PROFILE_QUERIES=1 before starting Rapid-QC-MS to enable it.
+Every statement is recorded with its text, the DatabaseFunctions function that issued it, its duration,
+and the number of rows and (approximate) bytes fetched from it. Statistics are aggregated per function,
+per statement, and per scope (a dashboard callback or a processed sample, see scope()).
+
+Reports are written as JSON to /data/profiles and can be viewed on the dashboard at /debug/queries.
+"""
+
+# Environment variable to opt in to query profiling
+profiling_environment_variable = "RAPIDQCMS_PROFILE_QUERIES"
+
+# Directory for JSON reports, set by enable_profiling()
+report_directory = [None]
+
+# Number of slowest individual queries to keep
+slowest_queries_limit = 50
+
+# Aggregated statistics, guarded by a lock since Dash and the sync queue use multiple threads
+statistics_lock = threading.Lock()
+statistics = {"by_function": {}, "by_statement": {}, "by_scope": {}, "slowest": []}
+
+# Current request or sample being profiled
+current_scope = contextvars.ContextVar("current_scope", default="(none)")
+
+is_enabled = [False]
+
+
+def profiling_requested():
+
+    """
+    Returns True if query profiling was requested with the RAPIDQCMS_PROFILE_QUERIES environment variable.
+    """
+
+    return os.environ.get(profiling_environment_variable, "0").lower() in ["1", "true", "yes"]
+
+
+def profiling_is_enabled():
+
+    """
+    Returns True if query profiling is running in this process.
+    """
+
+    return is_enabled[0]
+
+
+def enable_profiling(output_directory):
+
+    """
+    Registers SQLAlchemy engine event listeners for all engines, so that every query is profiled.
+
+    Args:
+        output_directory (str): Directory to write JSON reports to
+
+    Returns:
+        None
+    """
+
+    if is_enabled[0]:
+        return None
+
+    report_directory[0] = output_directory
+
+    sa.event.listen(sa.engine.Engine, "before_cursor_execute", before_cursor_execute)
+    sa.event.listen(sa.engine.Engine, "after_cursor_execute", after_cursor_execute)
+    atexit.register(write_report)
+
+    is_enabled[0] = True
+
+
+def get_calling_function():
+
+    """
+    Returns the name of the innermost DatabaseFunctions function on the call stack.
+
+    Falls back to the innermost function in any other Rapid-QC-MS module, for queries issued outside DatabaseFunctions.
+    """
+
+    frame = sys._getframe(1)
+    fallback = "(unknown)"
+
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module == "rapidqcms.DatabaseFunctions":
+            return frame.f_code.co_name
+        elif module.startswith("rapidqcms.") and module != __name__ and fallback == "(unknown)":
+            fallback = module.split(".")[-1] + "." + frame.f_code.co_name
+        frame = frame.f_back
+
+    return fallback
+
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+
+    """
+    Records the start time of a query. See SQLAlchemy's ConnectionEvents.before_cursor_execute.
+    """
+
+    if context is not None:
+        context._query_profiler_start = time.perf_counter()
+
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+
+    """
+    Records a finished query, and wraps its cursor to count fetched rows and bytes.
+    See SQLAlchemy's ConnectionEvents.after_cursor_execute.
+    """
+
+    if context is None or not hasattr(context, "_query_profiler_start"):
+        return None
+
+    record = {
+        "statement": " ".join(statement.split())[:300],
+        "function": get_calling_function(),
+        "scope": current_scope.get(),
+        "duration": time.perf_counter() - context._query_profiler_start,
+        "rows": 0,
+        "bytes": 0
+    }
+
+    add_to_statistics(record, queries=1, duration=record["duration"])
+
+    # Count rows and bytes as the result is fetched, which happens after this event
+    if context.cursor is not None and context.cursor.description is not None:
+        context.cursor = ProfiledCursor(context.cursor, record)
+
+
+class ProfiledCursor:
+
+    """
+    Wraps a DB-API cursor and adds the number of rows and approximate bytes fetched from it to the query statistics.
+    """
+
+    def __init__(self, cursor, record):
+
+        self.cursor = cursor
+        self.record = record
+
+
+    def __getattr__(self, name):
+
+        return getattr(self.cursor, name)
+
+
+    def count(self, rows):
+
+        """
+        Adds fetched rows to the record of the query and the aggregated statistics, then returns the rows.
+        """
+
+        size = 0
+        for row in rows:
+            for value in row:
+                if isinstance(value, (str, bytes)):
+                    size += len(value)
+                elif value is not None:
+                    size += 8
+
+        self.record["rows"] += len(rows)
+        self.record["bytes"] += size
+        add_to_statistics(self.record, rows=len(rows), size=size)
+        return rows
+
+
+    def fetchone(self):
+
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.count([row])
+        return row
+
+
+    def fetchmany(self, *args, **kwargs):
+
+        return self.count(self.cursor.fetchmany(*args, **kwargs))
+
+
+    def fetchall(self):
+
+        return self.count(self.cursor.fetchall())
+
+
+def add_to_statistics(record, queries=0, duration=0.0, rows=0, size=0):
+
+    """
+    Adds a query (or rows fetched from it) to the statistics aggregated by function, statement, and scope.
+
+    Args:
+        record (dict): Record of the query, as created in after_cursor_execute()
+        queries (int, default 0): Number of queries to add
+        duration (float, default 0.0): Query duration in seconds to add
+        rows (int, default 0): Number of fetched rows to add
+        size (int, default 0): Number of fetched bytes to add
+
+    Returns:
+        None
+    """
+
+    with statistics_lock:
+        for group, key in [("by_function", record["function"]),
+                           ("by_statement", record["statement"]),
+                           ("by_scope", record["scope"])]:
+
+            if key not in statistics[group]:
+                statistics[group][key] = {"queries": 0, "total_time": 0.0, "max_time": 0.0, "rows": 0, "bytes": 0}
+
+            entry = statistics[group][key]
+            entry["queries"] += queries
+            entry["total_time"] += duration
+            entry["max_time"] = max(entry["max_time"], duration)
+            entry["rows"] += rows
+            entry["bytes"] += size
+
+        # Keep the slowest individual queries (the record is shared, so fetched rows show up later)
+        if queries > 0:
+            slowest = statistics["slowest"]
+            if len(slowest) < slowest_queries_limit or duration > slowest[-1]["duration"]:
+                slowest.append(record)
+                slowest.sort(key=lambda item: item["duration"], reverse=True)
+                del slowest[slowest_queries_limit:]
+
+
+@contextmanager
+def scope(name):
+
+    """
+    Context manager that attributes queries issued within it to a named scope, such as a dashboard callback or a sample.
+
+    If profiling is enabled, the report is written when the scope exits.
+
+    Args:
+        name (str): Name of the scope (ex: "sample: Sample_001")
+    """
+
+    token = current_scope.set(name)
+    try:
+        yield
+    finally:
+        current_scope.reset(token)
+        if is_enabled[0]:
+            write_report()
+
+
+def get_report():
+
+    """
+    Returns a copy of the aggregated query statistics, sorted by total time.
+
+    Returns:
+        dict: Statistics by function, statement, and scope, and the slowest individual queries
+    """
+
+    with statistics_lock:
+        report = {"pid": os.getpid(), "generated": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+        for group in ["by_function", "by_statement", "by_scope"]:
+            report[group] = [dict(name=key, **value) for key, value in statistics[group].items()]
+            report[group].sort(key=lambda item: item["total_time"], reverse=True)
+
+        report["slowest"] = [dict(record) for record in statistics["slowest"]]
+
+    return report
+
+
+def write_report():
+
+    """
+    Writes the query statistics of this process to a JSON file in the report directory.
+
+    Returns:
+        str: Path of the report file, or None if profiling is not enabled
+    """
+
+    if report_directory[0] is None:
+        return None
+
+    if not os.path.exists(report_directory[0]):
+        os.makedirs(report_directory[0])
+
+    report_file = os.path.join(report_directory[0], "query_profile_" + str(os.getpid()) + ".json")
+    temporary_file = report_file + ".tmp"
+
+    with open(temporary_file, "w") as file:
+        json.dump(get_report(), file, indent=2)
+
+    os.replace(temporary_file, report_file)
+    return report_file
+
+
+def read_reports():
+
+    """
+    Reads query reports written by other Rapid-QC-MS processes (such as acquisition listeners).
+
+    Returns:
+        list: Reports from the report directory, excluding this process
+    """
+
+    reports = []
+
+    if report_directory[0] is None or not os.path.exists(report_directory[0]):
+        return reports
+
+    for filename in sorted(os.listdir(report_directory[0])):
+        if not filename.endswith(".json") or filename == "query_profile_" + str(os.getpid()) + ".json":
+            continue
+        try:
+            with open(os.path.join(report_directory[0], filename)) as file:
+                reports.append(json.load(file))
+        except Exception as error:
+            print("Could not read query report " + filename + ":", error)
+
+    return reports
+
+
+def report_to_html(report):
+
+    """
+    Renders a query report as HTML tables for the /debug/queries page.
+
+    Args:
+        report (dict): Report as returned by get_report()
+
+    Returns:
+        str: HTML string
+    """
+
+    def table(rows, columns):
+        header = "".join("<th>" + column + "</th>" for column in columns)
+        body = ""
+        for row in rows:
+            cells = ""
+            for column in columns:
+                value = row.get(column, "")
+                if isinstance(value, float):
+                    value = str(round(value * 1000, 2)) + " ms" if "time" in column or column == "duration" else round(value, 2)
+                cells += "<td>" + html.escape(str(value)) + "</td>"
+            body += "<tr>" + cells + "</tr>"
+        return "<table border='1' cellpadding='4' style='border-collapse: collapse; font-size: 12px'>" \
+            + "<tr>" + header + "</tr>" + body + "</table>"
+
+    aggregate_columns = ["name", "queries", "total_time", "max_time", "rows", "bytes"]
+
+    return "<h3>Process " + str(report["pid"]) + " (" + report["generated"] + ")</h3>" \
+        + "<h4>By function</h4>" + table(report["by_function"], aggregate_columns) \
+        + "<h4>By request / sample</h4>" + table(report["by_scope"], aggregate_columns) \
+        + "<h4>Slowest queries</h4>" + table(report["slowest"], ["duration", "function", "scope", "rows", "bytes", "statement"]) \
+        + "<h4>By statement</h4>" + table(report["by_statement"][:100], aggregate_columns)
@@ -0,0 +1,407 @@
+import os, sys, ast, time, html, shutil, argparse, traceback
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import plotly.offline
+import rapidqcms.DatabaseFunctions as db
+import rapidqcms.PlotGeneration as plots
+
+"""
+Static QC reports for instrument runs.
+
+A report renders every internal standard plot (retention time, intensity, and delta m/z, in both polarities) and every
+biological standard plot (m/z vs. retention time, and the benchmark plot of each targeted feature) of an instrument run
+into a self-contained bundle: a single HTML file with Plotly embedded once, and optionally a PNG image for each plot.
+
+Plots are rendered in a pool of worker processes, which only receive the columns of the tables that they plot.
+PNG images require the optional kaleido package (pip install kaleido).
+
+Usage: python -m rapidqcms.ReportGeneration <instrument ID> <run ID> [--output DIRECTORY] [--png] [--processes N]
+"""
+
+# Reports are saved to this directory by default
+reports_directory = os.path.join(db.data_directory, "reports")
+
+# Internal standard plots rendered for each polarity
+internal_standard_plots = {
+    "rt": ("retention_time", "Retention time"),
+    "intensity": ("intensity", "Intensity"),
+    "delta_mz": ("Delta m/z", "Delta m/z"),
+}
+
+
+def generate_report(instrument_id, run_id, output_directory=None, formats=("html",), processes=None, progress=None):
+
+    """
+    Renders all internal standard and biological standard plots of an instrument run into a report bundle.
+
+    The bundle contains report.html, which embeds Plotly and all plots, and (if "png" is in formats and kaleido is
+    installed) a "png" folder with an image of each plot.
+
+    Args:
+        instrument_id (str):
+            Instrument ID
+        run_id (str):
+            Instrument run ID (Job ID)
+        output_directory (str, default None):
+            Folder to save the report to, or None for data/reports/<instrument ID>/<run ID>
+        formats (tuple, default ("html",)):
+            Output formats, "html" and / or "png"
+        processes (int, default None):
+            Number of worker processes, or None for the number of CPUs (1 renders plots in this process)
+        progress (function, default None):
+            Called with the number of rendered plots and the total number of plots, after each plot
+
+    Returns:
+        str: Path of the report folder
+    """
+
+    start = time.time()
+
+    if output_directory is None:
+        output_directory = os.path.join(reports_directory, str(instrument_id), str(run_id))
+
+    # Start from an empty folder, so that plots of a previous report aren't mixed in
+    if os.path.exists(output_directory):
+        shutil.rmtree(output_directory)
+    os.makedirs(output_directory)
+
+    # PNG images are only rendered if kaleido is installed
+    formats = list(formats)
+    if "png" in formats and importlib.util.find_spec("kaleido") is None:
+        print("PNG images are skipped, because kaleido is not installed (pip install kaleido).")
+        formats.remove("png")
+    if "png" in formats:
+        os.makedirs(os.path.join(output_directory, "png"))
+
+    tasks, df_run = get_report_tasks(instrument_id, run_id)
+    for task in tasks:
+        task["formats"] = formats
+        task["output_directory"] = output_directory
+
+    # Render plots in worker processes, in chunks to limit the overhead of sending tasks
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(processes, len(tasks)))
+
+    rendered = []
+
+    if processes == 1:
+        for task in tasks:
+            rendered.append(render_plot(task))
+            if progress is not None:
+                progress(len(rendered), len(tasks))
+    else:
+        chunksize = max(1, len(tasks) // (processes * 4))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for result in executor.map(render_plot, tasks, chunksize=chunksize):
+                rendered.append(result)
+                if progress is not None:
+                    progress(len(rendered), len(tasks))
+
+    write_report_html(os.path.join(output_directory, "report.html"), instrument_id, run_id, df_run, tasks, rendered)
+
+    print("Rendered " + str(len(tasks)) + " plots for " + run_id + " in " + str(round(time.time() - start, 1))
+        + " seconds with " + str(processes) + " processes:", output_directory)
+
+    return output_directory
+
+
+def get_report_tasks(instrument_id, run_id):
+
+    """
+    Loads the QC results of an instrument run and returns a rendering task for each plot in the report.
+
+    Each task only includes the columns of the tables that its plot needs, so that tasks are cheap to send to
+    worker processes.
+
+    Args:
+        instrument_id (str): Instrument ID
+        run_id (str): Instrument run ID (Job ID)
+
+    Returns:
+        tuple: List of tasks (dicts with "id", "section", "title", "plot", and the plot's arguments), and the run record
+    """
+
+    # Load parsed QC results (shared with the dashboard's run cache if the report is generated from the dashboard)
+    df_run = db.get_instrument_run(instrument_id, run_id)
+    if len(df_run) == 0:
+        raise ValueError("Instrument run " + str(run_id) + " does not exist on " + str(instrument_id) + ".")
+
+    status = df_run["status"].values[0]
+    load_from = plots.get_load_from(instrument_id, status)
+    database_version = db.get_database_version(instrument_id)
+    if load_from == "csv":
+        db.download_qc_results(instrument_id, run_id)
+    version, pinned = plots.get_results_version(instrument_id, run_id, status, load_from, database_version)
+
+    parsed = plots.load_parsed_run(instrument_id, run_id, load_from, version, pinned)
+    df_run = parsed["run"]
+    results = parsed["results"]
+
+    chromatography = df_run["chromatography"].values[0]
+    retention_times = db.get_internal_standards_dict(chromatography, "retention_time")
+
+    biological_standards = df_run["biological_standards"].values[0]
+    biological_standards = ast.literal_eval(biological_standards) if biological_standards is not None else []
+
+    # Biological standard samples aren't shown in internal standard plots
+    identifiers = [identifier for identifier, biological_standard in db.get_biological_standard_identifiers().items()
+        if biological_standard in biological_standards]
+
+    df_samples = results["samples"]
+    tasks = []
+
+    for polarity in ["Pos", "Neg"]:
+
+        samples = df_samples.loc[df_samples["polarity"] == polarity]["sample_id"].astype(str).tolist()
+        samples = [sample for sample in samples if not any(identifier in sample for identifier in identifiers)]
+
+        df_istd_rt = results["internal_standards"][polarity]["retention_time"]
+        if df_istd_rt is None or len(samples) == 0:
+            continue
+
+        internal_standards = [column for column in df_istd_rt.columns if column != "Specimen"]
+
+        for internal_standard in internal_standards:
+            for plot, (table, label) in internal_standard_plots.items():
+
+                if table in results["internal_standards"][polarity]:
+                    dataframe = results["internal_standards"][polarity][table]
+                else:
+                    dataframe = results["qc"][polarity][table]
+
+                if dataframe is None or internal_standard not in dataframe.columns:
+                    continue
+
+                tasks.append({
+                    "id": "-".join(["istd", plot, polarity, str(len(tasks))]),
+                    "section": "Internal standards (" + polarity + ")",
+                    "title": label + " – " + internal_standard,
+                    "plot": plot,
+                    "dataframe": dataframe[["Specimen", internal_standard]],
+                    "samples": samples,
+                    "internal_standard": internal_standard,
+                    "retention_times": {internal_standard: retention_times.get(internal_standard)},
+                })
+
+    for biological_standard in biological_standards:
+        for polarity in ["Pos", "Neg"]:
+
+            bio_tables = results["biological_standards"].get(biological_standard, {}).get(polarity, {})
+            df_bio_rt = bio_tables.get("retention_time")
+            df_bio_mz = bio_tables.get("precursor_mz")
+            df_bio_intensity = bio_tables.get("intensity")
+
+            if df_bio_rt is None or df_bio_mz is None or df_bio_intensity is None:
+                continue
+
+            # Compare against precomputed aggregates of previous runs (m/z-RT plot) and of all runs (benchmark plots)
+            try:
+                df_previous_aggregates = db.get_bio_standard_aggregates(instrument_id, biological_standard,
+                    chromatography, polarity, before_run=run_id)
+                df_aggregates = db.get_bio_standard_aggregates(instrument_id, biological_standard, chromatography, polarity)
+            except Exception as error:
+                print("Error loading biological standard aggregates:", error)
+                df_previous_aggregates = None
+                df_aggregates = None
+
+            section = "Biological standard: " + biological_standard + " (" + polarity + ")"
+
+            tasks.append({
+                "id": "-".join(["bio", "mz-rt", polarity, str(len(tasks))]),
+                "section": section,
+                "title": "m/z vs. retention time",
+                "plot": "bio_feature",
+                "run_id": run_id,
+                "df_rt": df_bio_rt,
+                "df_mz": df_bio_mz,
+                "df_intensity": df_bio_intensity,
+                "df_aggregates": df_previous_aggregates,
+            })
+
+            for feature in df_bio_intensity.columns[2:]:
+                tasks.append({
+                    "id": "-".join(["bio", "benchmark", polarity, str(len(tasks))]),
+                    "section": section,
+                    "title": "Benchmark – " + feature,
+                    "plot": "bio_benchmark",
+                    "dataframe": df_bio_intensity[["Name", feature]],
+                    "feature": feature,
+                    "df_aggregates": df_aggregates.loc[df_aggregates["feature"] == feature]
+                        if df_aggregates is not None else None,
+                })
+
+    return tasks, df_run
+
+
+def get_report_figure(task):
+
+    """
+    Builds the Plotly figure for a rendering task from get_report_tasks().
+
+    Args:
+        task (dict): Rendering task
+
+    Returns:
+        plotly.graph_objects.Figure object: Plotly figure
+    """
+
+    if task["plot"] == "rt":
+        return plots.load_istd_rt_plot(dataframe=task["dataframe"], samples=task["samples"],
+            internal_standard=task["internal_standard"], retention_times=task["retention_times"])
+
+    elif task["plot"] == "intensity":
+        return plots.load_istd_intensity_plot(dataframe=task["dataframe"], samples=task["samples"],
+            internal_standard=task["internal_standard"], treatments=pd.DataFrame())
+
+    elif task["plot"] == "delta_mz":
+        return plots.load_istd_delta_mz_plot(dataframe=task["dataframe"], samples=task["samples"],
+            internal_standard=task["internal_standard"])
+
+    elif task["plot"] == "bio_feature":
+        return plots.load_bio_feature_plot(run_id=task["run_id"], df_rt=task["df_rt"], df_mz=task["df_mz"],
+            df_intensity=task["df_intensity"], target_biostnd="All previous", source_biostnd=None,
+            df_aggregates=task["df_aggregates"])
+
+    elif task["plot"] == "bio_benchmark":
+        return plots.load_bio_benchmark_plot(dataframe=task["dataframe"], metabolite_name=task["feature"],
+            df_aggregates=task["df_aggregates"])
+
+
+def render_plot(task):
+
+    """
+    Renders the plot of a rendering task to an HTML div, and to a PNG image if requested. Runs in worker processes.
+
+    Args:
+        task (dict): Rendering task from get_report_tasks()
+
+    Returns:
+        tuple: HTML div of the plot (None if it could not be rendered), and the path of the PNG image (or None)
+    """
+
+    try:
+        figure = get_report_figure(task)
+        div = figure.to_html(full_html=False, include_plotlyjs=False, div_id=task["id"])
+    except Exception as error:
+        print("Could not render plot " + task["title"] + ":", error)
+        return None, None
+
+    png_file = None
+    if "png" in task["formats"]:
+        try:
+            png_file = os.path.join("png", task["id"] + ".png")
+            figure.write_image(os.path.join(task["output_directory"], png_file), width=1200, height=600)
+        except Exception as error:
+            print("Could not save PNG image of plot " + task["title"] + ":", error)
+            png_file = None
+
+    return div, png_file
+
+
+def write_report_html(report_file, instrument_id, run_id, df_run, tasks, rendered):
+
+    """
+    Writes the report HTML file, with Plotly embedded once, a table of contents, and the rendered plots by section.
+
+    Args:
+        report_file (str): Path of the HTML file
+        instrument_id (str): Instrument ID
+        run_id (str): Instrument run ID (Job ID)
+        df_run (DataFrame): Instrument run record
+        tasks (list): Rendering tasks from get_report_tasks()
+        rendered (list): Output of render_plot() for each task
+
+    Returns:
+        None
+    """
+
+    # Group plots by section, in order
+    sections = {}
+    for task, (div, png_file) in zip(tasks, rendered):
+        if div is not None:
+            sections.setdefault(task["section"], []).append((task, div, png_file))
+
+    title = html.escape(str(instrument_id) + " – " + str(run_id) + " QC report")
+    details = [
+        ("Chromatography", df_run["chromatography"].values[0]),
+        ("Status", df_run["status"].values[0]),
+        ("Samples", df_run["samples"].values[0]),
+        ("Samples processed", df_run["completed"].values[0]),
+        ("Passes", df_run["passes"].values[0]),
+        ("Fails", df_run["fails"].values[0]),
+        ("Generated", time.strftime("%Y-%m-%d %H:%M:%S")),
+    ]
+
+    with open(report_file, "w", encoding="utf-8") as file:
+        file.write("<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>" + title + "</title>\n")
+        file.write("<style>body { font-family: sans-serif; margin: 2em; } td { padding: 0 1em 0 0; }</style>\n")
+        file.write("<script type=\"text/javascript\">" + plotly.offline.get_plotlyjs() + "</script>\n")
+        file.write("</head>\n<body>\n<h1>" + title + "</h1>\n<table>\n")
+
+        for label, value in details:
+            file.write("<tr><td>" + label + "</td><td>" + html.escape(str(value)) + "</td></tr>\n")
+        file.write("</table>\n<h2>Contents</h2>\n<ul>\n")
+
+        for index, section in enumerate(sections):
+            file.write("<li><a href=\"#section-" + str(index) + "\">" + html.escape(section) + "</a> ("
+                + str(len(sections[section])) + " plots)</li>\n")
+        file.write("</ul>\n")
+
+        for index, (section, section_plots) in enumerate(sections.items()):
+            file.write("<h2 id=\"section-" + str(index) + "\">" + html.escape(section) + "</h2>\n")
+            for task, div, png_file in section_plots:
+                file.write("<h3>" + html.escape(task["title"]) + "</h3>\n")
+                if png_file is not None:
+                    file.write("<p><a href=\"" + png_file.replace(os.sep, "/") + "\">PNG</a></p>\n")
+                file.write(div + "\n")
+
+        file.write("</body>\n</html>\n")
+
+
+def zip_report(report_directory):
+
+    """
+    Compresses a report folder into a ZIP archive next to it (ex: to download the report from the dashboard).
+
+    Args:
+        report_directory (str): Path of the report folder, as returned by generate_report()
+
+    Returns:
+        str: Path of the ZIP archive
+    """
+
+    return shutil.make_archive(report_directory, "zip", root_dir=report_directory)
+
+
+def main():
+
+    """
+    Generates a QC report for an instrument run from the command line.
+    """
+
+    parser = argparse.ArgumentParser(description="Generates a static QC report for an instrument run.")
+    parser.add_argument("instrument_id", help="Instrument ID")
+    parser.add_argument("run_id", help="Instrument run ID (Job ID)")
+    parser.add_argument("--output", default=None, help="Folder to save the report to")
+    parser.add_argument("--png", action="store_true", help="Also save a PNG image of each plot (requires kaleido)")
+    parser.add_argument("--processes", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--zip", action="store_true", help="Also compress the report into a ZIP archive")
+    arguments = parser.parse_args()
+
+    formats = ("html", "png") if arguments.png else ("html",)
+
+    try:
+        report_directory = generate_report(arguments.instrument_id, arguments.run_id,
+            output_directory=arguments.output, formats=formats, processes=arguments.processes)
+        if arguments.zip:
+            print("Saved ZIP archive:", zip_report(report_directory))
+    except Exception as error:
+        print("Could not generate QC report:", error)
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import os, sys, threading
+from collections import OrderedDict
+import pandas as pd
+
+"""
+In-memory cache of parsed QC results for instrument runs, shared by all dashboard sessions and callbacks.
+
+Entries are keyed by tuples that start with (instrument ID, run ID, results version). The results version changes
+whenever new samples are processed, so a stale entry is never returned: it is simply replaced by the next version.
+Completed runs don't change anymore, so their entries are pinned, which means they are only evicted after all other
+entries when the memory budget is exceeded.
+
+Concurrent requests for the same entry share one load: the first request loads it while the others wait for it.
+
+Set the environment variable RAPIDQCMS_RUN_CACHE_MB to change the memory budget (512 MB by default).
+"""
+
+# Memory budget for cached entries (in bytes)
+memory_budget_environment_variable = "RAPIDQCMS_RUN_CACHE_MB"
+memory_budget = [int(float(os.environ.get(memory_budget_environment_variable, 512)) * 1024 * 1024)]
+
+# Cached entries in least recently used order, each as { "value": ..., "size": int, "pinned": bool }
+entries = OrderedDict()
+cache_lock = threading.Lock()
+
+# Locks for entries that are being loaded, so that concurrent requests don't load the same entry twice
+loading_locks = {}
+
+statistics = {"hits": 0, "misses": 0, "evictions": 0, "size": 0}
+
+
+def get(key):
+
+    """
+    Returns a cached entry and marks it as most recently used.
+
+    Args:
+        key (tuple): Cache key, starting with (instrument ID, run ID, results version)
+
+    Returns:
+        Cached value, or None if the key is not cached
+    """
+
+    with cache_lock:
+        if key not in entries:
+            return None
+
+        entries.move_to_end(key)
+        return entries[key]["value"]
+
+
+def put(key, value, pinned=False):
+
+    """
+    Caches a value, replaces entries of older versions of the same run, and evicts entries over the memory budget.
+
+    Args:
+        key (tuple): Cache key, starting with (instrument ID, run ID, results version)
+        value: Value to cache (DataFrames, strings, or dicts / lists / tuples of them)
+        pinned (bool, default False): Whether the value is immutable (for completed runs)
+
+    Returns:
+        None
+    """
+
+    size = estimate_size(value)
+
+    with cache_lock:
+
+        # Remove entries for other versions of the same run, which can't be requested anymore
+        for cached_key in [cached_key for cached_key in entries if cached_key[:2] == key[:2] and cached_key[2] != key[2]]:
+            remove_entry(cached_key)
+
+        if key in entries:
+            remove_entry(key)
+
+        entries[key] = {"value": value, "size": size, "pinned": pinned}
+        statistics["size"] += size
+
+        evict_entries(key)
+
+
+def resize(key, size_change):
+
+    """
+    Updates the size of a cached entry whose value grew or shrank (ex: after tables in it were serialized to JSON),
+    and evicts other entries over the memory budget.
+
+    Args:
+        key (tuple): Cache key, starting with (instrument ID, run ID, results version)
+        size_change (int): Change of the entry's size in bytes
+
+    Returns:
+        None
+    """
+
+    with cache_lock:
+        if key not in entries:
+            return
+
+        entries[key]["size"] += size_change
+        statistics["size"] += size_change
+
+        evict_entries(key)
+
+
+def get_or_load(key, loader, pinned=False):
+
+    """
+    Returns a cached entry, or loads and caches it if it isn't cached yet.
+
+    If another thread is already loading the same entry, waits for it instead of loading the entry again.
+
+    Args:
+        key (tuple): Cache key, starting with (instrument ID, run ID, results version)
+        loader (function): Function without arguments that returns the value to cache
+        pinned (bool, default False): Whether the value is immutable (for completed runs)
+
+    Returns:
+        Cached or newly loaded value
+    """
+
+    value = get(key)
+    if value is not None:
+        statistics["hits"] += 1
+        return value
+
+    with cache_lock:
+        lock = loading_locks.setdefault(key, threading.Lock())
+
+    with lock:
+        value = get(key)
+        if value is not None:
+            statistics["hits"] += 1
+        else:
+            statistics["misses"] += 1
+            value = loader()
+            put(key, value, pinned)
+
+    with cache_lock:
+        loading_locks.pop(key, None)
+
+    return value
+
+
+def get_latest(instrument_id, run_id):
+
+    """
+    Returns the most recently used entry for any version of an instrument run (ex: to update it with new samples).
+
+    Only entries with keys of the form (instrument ID, run ID, results version) are considered.
+
+    Args:
+        instrument_id (str): Instrument ID
+        run_id (str): Instrument run ID
+
+    Returns:
+        Cached value, or None if no version of the run is cached
+    """
+
+    with cache_lock:
+        for key in reversed(entries):
+            if len(key) == 3 and key[:2] == (instrument_id, run_id):
+                return entries[key]["value"]
+
+    return None
+
+
+def invalidate(instrument_id, run_id=None):
+
+    """
+    Removes all cached entries for an instrument run (ex: after it was deleted), or for all runs on an instrument.
+
+    Args:
+        instrument_id (str): Instrument ID
+        run_id (str, default None): Instrument run ID, or None for all runs on the instrument
+
+    Returns:
+        None
+    """
+
+    with cache_lock:
+        for key in [key for key in entries if key[0] == instrument_id and (run_id is None or key[1] == run_id)]:
+            remove_entry(key)
+
+
+def evict_entries(key):
+
+    """
+    Evicts least recently used entries (unpinned ones first) until the cache fits the memory budget. The given entry
+    is always kept. Must be called while holding cache_lock.
+    """
+
+    while statistics["size"] > memory_budget[0] and len(entries) > 1:
+        candidates = [cached_key for cached_key in entries if cached_key != key]
+        unpinned = [cached_key for cached_key in candidates if not entries[cached_key]["pinned"]]
+        remove_entry(unpinned[0] if unpinned else candidates[0])
+        statistics["evictions"] += 1
+
+
+def remove_entry(key):
+
+    """
+    Removes an entry and updates the cache size. Must be called while holding cache_lock.
+    """
+
+    statistics["size"] -= entries[key]["size"]
+    del entries[key]
+
+
+def estimate_size(value):
+
+    """
+    Estimates the memory used by a cached value in bytes.
+
+    Args:
+        value: DataFrame, string, or dict / list / tuple of them
+
+    Returns:
+        int: Estimated size in bytes
+    """
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    elif isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    elif isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    elif isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    else:
+        return sys.getsizeof(value)
+
+
+def get_statistics():
+
+    """
+    Returns cache hits, misses, evictions, and the number and total size of cached entries.
+
+    Returns:
+        dict: Cache statistics
+    """
+
+    with cache_lock:
+        return dict(statistics, entries=len(entries), pinned=sum(entry["pinned"] for entry in entries.values()),
+            memory_budget=memory_budget[0])
@@ -1,7 +1,5 @@
 import ssl
 import rapidqcms.DatabaseFunctions as db
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
 
 def send_message(message):
 
@@ -17,6 +15,10 @@ def send_message(message):
         Response object on success, or Error object on failure
     """
 
+    # The Slack SDK is only imported when a message is sent
+    from slack_sdk import WebClient
+    from slack_sdk.errors import SlackApiError
+
     # SSL
     ssl_context = ssl.create_default_context()
     ssl_context.check_hostname = False
@@ -0,0 +1,617 @@
+import os, time, shutil, tempfile, hashlib, threading
+import rapidqcms.SyncWorker as sync
+
+"""
+Storage backends for syncing workspaces between devices.
+
+Sync code in DatabaseFunctions reads and writes files by name through a StorageBackend, so it works the same
+regardless of where files are stored:
+
+- GoogleDriveBackend: The Rapid-QC-MS folder in Google Drive (default)
+- LocalDirectoryBackend: A local or shared network directory (ex: a NAS mounted on every device), which has much
+  lower latency than Google Drive. Set the environment variable RAPIDQCMS_SYNC_DIRECTORY to its path to use it.
+- InMemoryBackend: An in-memory store that counts requests and can simulate latency, for benchmarking sync offline
+
+Every backend describes files with the same dictionary (see StorageBackend.stat()):
+
+    { "name": str, "id": str, "modified": str, "size": int, "md5": str }
+
+The "id" can be passed back to get(), put(), and delete() to skip looking the file up by name. The "modified" value
+is only meant to be compared for equality, and "md5" is the MD5 hash of the file's content (None if unknown).
+"""
+
+class StorageBackend:
+
+    """
+    Interface for storing files by name in a flat namespace (ex: the Rapid-QC-MS folder in Google Drive).
+    """
+
+    def put(self, name, data, id=None, new=False):
+
+        """
+        Stores a file, replacing the existing file with the same name.
+
+        Args:
+            name (str): Name of the file
+            data (bytes): Content of the file
+            id (str, default None): ID of the existing file, if known
+            new (bool, default False): Whether the name is known not to exist yet (ex: content-hashed shards),
+                so that no lookup is needed
+
+        Returns:
+            dict: Metadata of the stored file
+        """
+
+        raise NotImplementedError
+
+
+    def get(self, name, id=None):
+
+        """
+        Returns the content of a file.
+
+        Args:
+            name (str): Name of the file
+            id (str, default None): ID of the file, if known
+
+        Returns:
+            bytes: Content of the file. Raises FileNotFoundError if the file does not exist.
+        """
+
+        raise NotImplementedError
+
+
+    def stat(self, name):
+
+        """
+        Returns metadata of a file.
+
+        Args:
+            name (str): Name of the file
+
+        Returns:
+            dict: Metadata of the file, or None if the file does not exist
+        """
+
+        raise NotImplementedError
+
+
+    def list(self, prefix=""):
+
+        """
+        Returns metadata of all files whose names start with a prefix.
+
+        Args:
+            prefix (str, default ""): Prefix of the file names
+
+        Returns:
+            list: List of file metadata dictionaries
+        """
+
+        raise NotImplementedError
+
+
+    def delete(self, name, id=None):
+
+        """
+        Deletes a file, if it exists.
+
+        Args:
+            name (str): Name of the file
+            id (str, default None): ID of the file, if known
+
+        Returns:
+            bool: True if the file was deleted, False if it did not exist
+        """
+
+        raise NotImplementedError
+
+
+    def put_file(self, name, path, id=None, new=False):
+
+        """
+        Stores a local file. See put().
+
+        Args:
+            name (str): Name of the file
+            path (str): Path of the local file to store
+            id (str, default None): ID of the existing file, if known
+            new (bool, default False): Whether the name is known not to exist yet
+
+        Returns:
+            dict: Metadata of the stored file
+        """
+
+        with open(path, "rb") as file:
+            return self.put(name, file.read(), id=id, new=new)
+
+
+    def get_file(self, name, path, id=None):
+
+        """
+        Downloads a file to a local path, replacing the local file atomically.
+
+        Args:
+            name (str): Name of the file
+            path (str): Local path to write the file to
+            id (str, default None): ID of the file, if known
+
+        Returns:
+            str: Local path of the file
+        """
+
+        temporary_file = path + ".tmp"
+        with open(temporary_file, "wb") as file:
+            file.write(self.get(name, id=id))
+        os.replace(temporary_file, path)
+
+        return path
+
+
+def get_md5(data):
+
+    """
+    Returns the MD5 hash of file content, as reported by Google Drive for uploaded files.
+    """
+
+    return hashlib.md5(data).hexdigest()
+
+
+class GoogleDriveBackend(StorageBackend):
+
+    """
+    Stores files in a Google Drive folder with pydrive2.
+
+    Names are resolved to Google Drive ID's through an in-memory cache, then an optional persistent cache
+    (see DatabaseFunctions.get_cached_drive_id()), and only then by querying the folder for the title.
+    """
+
+    def __init__(self, drive, folder_id, lookup_id=None, remember_id=None):
+
+        """
+        Args:
+            drive (GoogleDrive): Authenticated pydrive2 GoogleDrive instance
+            folder_id (str): Google Drive ID of the folder to store files in
+            lookup_id (function, default None): Function that returns a cached Google Drive ID for a name, or None
+            remember_id (function, default None): Function that caches a Google Drive ID (or None) for a name
+        """
+
+        self.drive = drive
+        self.folder_id = folder_id
+        self.lookup_id = lookup_id
+        self.remember_id = remember_id
+        self.ids = {}
+
+
+    def find_id(self, name):
+
+        """
+        Returns the cached Google Drive ID for a name, or None.
+        """
+
+        if name in self.ids:
+            return self.ids[name]
+        elif self.lookup_id is not None:
+            return self.lookup_id(name)
+        return None
+
+
+    def remember(self, name, file_id, persist=True):
+
+        """
+        Caches the Google Drive ID for a name in memory, and in the persistent cache if persist is True.
+        """
+
+        if file_id is None:
+            self.ids.pop(name, None)
+        else:
+            self.ids[name] = file_id
+
+        if persist and self.remember_id is not None:
+            self.remember_id(name, file_id)
+
+
+    def get_title_query(self, title, contains=False):
+
+        """
+        Returns a Google Drive query for files in the folder with a given title, so that filtering happens server-side.
+        """
+
+        title = title.replace("\\", "\\\\").replace("'", "\\'")
+        operator = " contains " if contains else " = "
+        return {"q": "'" + self.folder_id + "' in parents and title" + operator + "'" + title + "' and trashed=false"}
+
+
+    def to_stat(self, file):
+
+        """
+        Converts Google Drive file metadata to a metadata dictionary.
+        """
+
+        return {
+            "name": file["title"],
+            "id": file["id"],
+            "modified": file.get("modifiedDate"),
+            "size": int(file.get("fileSize") or 0),
+            "md5": file.get("md5Checksum")
+        }
+
+
+    def find_file(self, name):
+
+        """
+        Returns the GoogleDriveFile (with metadata) for a name, or None if it does not exist.
+
+        If the Drive ID is cached, metadata is requested by ID. Otherwise (or if the cached file no longer exists),
+        the folder is queried for the title, and the Drive ID is cached for next time.
+        """
+
+        file_id = self.find_id(name)
+
+        if file_id is not None:
+            try:
+                file = self.drive.CreateFile({"id": file_id})
+                file.FetchMetadata(fields="id,title,modifiedDate,fileSize,md5Checksum,labels")
+                if file["title"] == name and not file["labels"]["trashed"]:
+                    return file
+            except Exception as error:
+                print("GoogleDriveBackend – Cached Drive ID for " + name + " is no longer valid:", error)
+
+        files = self.drive.ListFile(self.get_title_query(name)).GetList()
+
+        if len(files) == 0:
+            self.remember(name, None)
+            return None
+
+        self.remember(name, files[0]["id"])
+        return files[0]
+
+
+    def put(self, name, data, id=None, new=False):
+
+        temporary_file = tempfile.NamedTemporaryFile(delete=False)
+        with temporary_file:
+            temporary_file.write(data)
+
+        try:
+            return self.put_file(name, temporary_file.name, id=id, new=new)
+        finally:
+            os.remove(temporary_file.name)
+
+
+    def put_file(self, name, path, id=None, new=False):
+
+        file_id = None if new else (id or self.find_id(name))
+        sync.throttle(os.path.getsize(path))
+
+        # Look up the title if the Drive ID isn't cached, so that the existing file is replaced instead of duplicated
+        if not new and file_id is None:
+            existing_file = self.find_file(name)
+            if existing_file is not None:
+                file_id = existing_file["id"]
+
+        # Replace existing file by Drive ID, which fails if the cached file was deleted
+        if file_id is not None:
+            try:
+                file = self.drive.CreateFile({"id": file_id, "title": name})
+                file.SetContentFile(path)
+                file.Upload()
+                self.remember(name, file["id"], persist=id is None)
+                return self.to_stat(file)
+            except Exception as error:
+                print("GoogleDriveBackend – Could not replace " + name + " by Drive ID:", error)
+                existing_file = self.find_file(name)
+                file_id = existing_file["id"] if existing_file is not None else None
+
+        if file_id is not None:
+            file = self.drive.CreateFile({"id": file_id, "title": name})
+        else:
+            file = self.drive.CreateFile({"title": name, "parents": [{"id": self.folder_id}]})
+
+        file.SetContentFile(path)
+        file.Upload()
+
+        # Content-hashed files are looked up from manifests, so they don't need to be cached persistently
+        self.remember(name, file["id"], persist=not new)
+        return self.to_stat(file)
+
+
+    def get(self, name, id=None):
+
+        file_id = id or self.find_id(name)
+
+        if file_id is not None:
+            try:
+                file = self.drive.CreateFile({"id": file_id})
+                file.FetchContent()
+                return file.content.getvalue()
+            except Exception as error:
+                if id is not None:
+                    raise FileNotFoundError(name) from error
+
+        file = self.find_file(name)
+        if file is None:
+            raise FileNotFoundError(name)
+
+        file.FetchContent()
+        return file.content.getvalue()
+
+
+    def get_file(self, name, path, id=None):
+
+        file_id = id or self.find_id(name)
+        temporary_file = path + ".tmp"
+
+        # Download by Drive ID, and look up the title if a cached Drive ID is no longer valid
+        if file_id is not None:
+            try:
+                self.drive.CreateFile({"id": file_id}).GetContentFile(temporary_file)
+                os.replace(temporary_file, path)
+                return path
+            except Exception as error:
+                if id is not None:
+                    raise FileNotFoundError(name) from error
+
+        file = self.find_file(name)
+        if file is None:
+            raise FileNotFoundError(name)
+
+        file.GetContentFile(temporary_file)
+        os.replace(temporary_file, path)
+
+        return path
+
+
+    def stat(self, name):
+
+        file = self.find_file(name)
+        return self.to_stat(file) if file is not None else None
+
+
+    def list(self, prefix=""):
+
+        files = self.drive.ListFile(self.get_title_query(prefix, contains=True)).GetList()
+
+        stats = []
+        for file in files:
+            if file["title"].startswith(prefix):
+                self.remember(file["title"], file["id"], persist=False)
+                stats.append(self.to_stat(file))
+
+        return stats
+
+
+    def delete(self, name, id=None):
+
+        file_id = id
+
+        if file_id is None:
+            file = self.find_file(name)
+            file_id = file["id"] if file is not None else None
+
+        if file_id is None:
+            return False
+
+        self.drive.CreateFile({"id": file_id}).Delete()
+        self.remember(name, None, persist=id is None)
+        return True
+
+
+class LocalDirectoryBackend(StorageBackend):
+
+    """
+    Stores files in a local or shared network directory.
+
+    Files are written to a temporary file first and then renamed, so other devices never read partially written files.
+    File ID's are the file names. MD5 hashes are cached for the current version of each file only.
+    """
+
+    def __init__(self, directory):
+
+        """
+        Args:
+            directory (str): Path of the directory to store files in (created if it does not exist)
+        """
+
+        self.directory = directory
+        self.hashes = {}
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+
+    def get_path(self, name):
+
+        """
+        Returns the local path of a file.
+        """
+
+        return os.path.join(self.directory, name)
+
+
+    def get_temporary_path(self, name):
+
+        """
+        Returns a temporary path to write a file to before renaming it, which is unique to this process and thread.
+        """
+
+        return os.path.join(self.directory, "." + name + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp")
+
+
+    def put(self, name, data, id=None, new=False):
+
+        sync.throttle(len(data))
+
+        temporary_file = self.get_temporary_path(name)
+        with open(temporary_file, "wb") as file:
+            file.write(data)
+        os.replace(temporary_file, self.get_path(name))
+
+        return self.stat(name)
+
+
+    def put_file(self, name, path, id=None, new=False):
+
+        sync.throttle(os.path.getsize(path))
+
+        temporary_file = self.get_temporary_path(name)
+        shutil.copyfile(path, temporary_file)
+        os.replace(temporary_file, self.get_path(name))
+
+        return self.stat(name)
+
+
+    def get(self, name, id=None):
+
+        with open(self.get_path(name), "rb") as file:
+            return file.read()
+
+
+    def get_file(self, name, path, id=None):
+
+        temporary_file = path + ".tmp"
+        shutil.copyfile(self.get_path(name), temporary_file)
+        os.replace(temporary_file, path)
+
+        return path
+
+
+    def stat(self, name):
+
+        try:
+            file_stat = os.stat(self.get_path(name))
+        except FileNotFoundError:
+            return None
+
+        # Hash the file only when it changes
+        version = (file_stat.st_mtime_ns, file_stat.st_size)
+        if name not in self.hashes or self.hashes[name][0] != version:
+            with open(self.get_path(name), "rb") as file:
+                self.hashes[name] = (version, get_md5(file.read()))
+
+        return {
+            "name": name,
+            "id": name,
+            "modified": str(file_stat.st_mtime_ns),
+            "size": file_stat.st_size,
+            "md5": self.hashes[name][1]
+        }
+
+
+    def list(self, prefix=""):
+
+        stats = []
+
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith(prefix) and not name.startswith("."):
+                file_stat = self.stat(name)
+                if file_stat is not None:
+                    stats.append(file_stat)
+
+        return stats
+
+
+    def delete(self, name, id=None):
+
+        self.hashes.pop(name, None)
+
+        try:
+            os.remove(self.get_path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class InMemoryBackend(StorageBackend):
+
+    """
+    Stores files in memory, for benchmarking and testing sync without network access.
+
+    Every request is counted in the "requests" dictionary, and can be delayed by a fixed latency to simulate
+    a remote service (ex: latency=0.3 for Google Drive).
+    """
+
+    def __init__(self, latency=0.0):
+
+        """
+        Args:
+            latency (float, default 0.0): Delay (in seconds) added to every request
+        """
+
+        self.latency = latency
+        self.files = {}
+        self.version = 0
+        self.lock = threading.Lock()
+        self.requests = {"put": 0, "get": 0, "stat": 0, "list": 0, "delete": 0}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+    def request(self, method):
+
+        """
+        Counts a request and waits for the simulated latency.
+        """
+
+        with self.lock:
+            self.requests[method] += 1
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+
+    def to_stat(self, name):
+
+        """
+        Returns the metadata dictionary of a stored file.
+        """
+
+        data, version = self.files[name]
+        return {"name": name, "id": name, "modified": str(version), "size": len(data), "md5": get_md5(data)}
+
+
+    def put(self, name, data, id=None, new=False):
+
+        self.request("put")
+        sync.throttle(len(data))
+
+        with self.lock:
+            self.version += 1
+            self.files[name] = (bytes(data), self.version)
+            self.bytes_sent += len(data)
+            return self.to_stat(name)
+
+
+    def get(self, name, id=None):
+
+        self.request("get")
+
+        with self.lock:
+            if name not in self.files:
+                raise FileNotFoundError(name)
+            self.bytes_received += len(self.files[name][0])
+            return self.files[name][0]
+
+
+    def stat(self, name):
+
+        self.request("stat")
+
+        with self.lock:
+            return self.to_stat(name) if name in self.files else None
+
+
+    def list(self, prefix=""):
+
+        self.request("list")
+
+        with self.lock:
+            return [self.to_stat(name) for name in sorted(self.files) if name.startswith(prefix)]
+
+
+    def delete(self, name, id=None):
+
+        self.request("delete")
+
+        with self.lock:
+            return self.files.pop(name, None) is not None
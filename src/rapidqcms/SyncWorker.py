@@ -0,0 +1,340 @@
+import os, time, json, threading, traceback
+import psutil
+import sqlalchemy as sa
+
+"""
+Background worker for Google Drive uploads.
+
+Uploads are queued as jobs in a SQLite database (/data/sync_queue.db), so queued work survives restarts of the
+acquisition listener or the dashboard, and are processed one at a time on a background thread.
+
+- Coalescing: each job has a key naming the object it uploads (ex: "qc_results:Thermo QE 1:BRDE001"). If a job
+  with the same key is still waiting, it is updated in place instead of queueing another upload.
+- Retries: failed jobs are retried with exponential backoff, up to a maximum number of attempts.
+- Dependencies: a job can wait for the job with another key to succeed (ex: deleting QC result files of a run only
+  after the database that holds the run was uploaded). While that job is waiting, running, or has failed, the
+  dependent job is not run.
+- Bandwidth limits: upload functions call throttle() with the number of bytes they are about to send.
+  Set the environment variable RAPIDQCMS_SYNC_BANDWIDTH_LIMIT (in KB/s) to limit the average upload bandwidth.
+  Each file is still sent at full speed once throttle() returns, so the limit spreads uploads out over time
+  rather than capping the speed of a single large upload.
+
+Job types are registered with register_job_type() by DatabaseFunctions, which owns the actual upload functions.
+"""
+
+# Path for establishing a SQLite connection to the queue database, set by initialize()
+queue_database = [None]
+
+# Functions that run each job type
+job_types = {}
+
+# Retry schedule for failed jobs (in seconds)
+retry_base_delay = 5
+retry_max_delay = 10 * 60
+max_attempts = 8
+
+# Upload bandwidth limit in bytes per second (None for unlimited)
+bandwidth_limit_environment_variable = "RAPIDQCMS_SYNC_BANDWIDTH_LIMIT"
+bandwidth_limit = [None]
+bandwidth_state = {"allowance": 0.0, "last_check": time.time()}
+bandwidth_lock = threading.Lock()
+
+# Background worker thread and lock for claiming jobs within this process
+worker_thread = [None]
+worker_lock = threading.Lock()
+
+
+def initialize(queue_database_file):
+
+    """
+    Creates the queue database if it does not exist yet, and reads the bandwidth limit from the environment.
+
+    Args:
+        queue_database_file (str): Path of the SQLite queue database file
+
+    Returns:
+        None
+    """
+
+    queue_database[0] = "sqlite:///" + queue_database_file.replace("\\", "/")
+    engine = sa.create_engine(queue_database[0])
+
+    db_metadata = sa.MetaData()
+    sa.Table(
+        "sync_jobs", db_metadata,
+        sa.Column("id", sa.INTEGER, primary_key=True),
+        sa.Column("key", sa.TEXT),
+        sa.Column("job_type", sa.TEXT),
+        sa.Column("arguments", sa.TEXT),
+        sa.Column("status", sa.TEXT),
+        sa.Column("attempts", sa.INTEGER),
+        sa.Column("next_attempt", sa.REAL),
+        sa.Column("owner", sa.INTEGER),
+        sa.Column("error", sa.TEXT),
+        sa.Column("depends_on", sa.TEXT)
+    )
+    db_metadata.create_all(engine)
+
+    # Add the dependency column to queue databases created by older versions
+    with engine.begin() as connection:
+        columns = [column["name"] for column in sa.inspect(connection).get_columns("sync_jobs")]
+        if "depends_on" not in columns:
+            connection.execute(sa.text("ALTER TABLE sync_jobs ADD COLUMN depends_on TEXT"))
+
+    limit = os.environ.get(bandwidth_limit_environment_variable)
+    if limit:
+        bandwidth_limit[0] = float(limit) * 1024
+
+
+def register_job_type(job_type, function):
+
+    """
+    Registers the function that runs a job type.
+
+    Args:
+        job_type (str): Name of the job type (ex: "qc_results")
+        function (function): Function to call with the job's arguments as keyword arguments
+
+    Returns:
+        None
+    """
+
+    job_types[job_type] = function
+
+
+def enqueue(job_type, key, depends_on=None, **arguments):
+
+    """
+    Queues a job for the background worker, and starts the worker if it isn't running.
+
+    If a job with the same key is still waiting (or has failed), it is replaced by this one instead of being queued twice.
+
+    Args:
+        job_type (str): Registered job type
+        key (str): Name of the object that the job uploads, used for coalescing
+        depends_on (str, default None): Key of a job that has to succeed before this job runs, if it is queued
+        **arguments: Keyword arguments for the job type's function
+
+    Returns:
+        None
+    """
+
+    engine = sa.create_engine(queue_database[0])
+
+    with engine.begin() as connection:
+        coalesced = connection.execute(sa.text(
+            "UPDATE sync_jobs SET arguments = :arguments, status = 'pending', attempts = 0, next_attempt = :now, "
+            "error = NULL, depends_on = :depends_on WHERE key = :key AND status IN ('pending', 'failed')"),
+            {"arguments": json.dumps(arguments), "now": time.time(), "depends_on": depends_on, "key": key}).rowcount
+
+        if coalesced == 0:
+            connection.execute(sa.text(
+                "INSERT INTO sync_jobs (key, job_type, arguments, status, attempts, next_attempt, depends_on) "
+                "VALUES (:key, :job_type, :arguments, 'pending', 0, :now, :depends_on)"),
+                {"key": key, "job_type": job_type, "arguments": json.dumps(arguments), "now": time.time(),
+                 "depends_on": depends_on})
+
+    start_worker()
+
+
+def start_worker():
+
+    """
+    Starts the background worker thread, if it isn't running in this process.
+
+    Returns:
+        threading.Thread: The worker thread
+    """
+
+    with worker_lock:
+        if worker_thread[0] is not None and worker_thread[0].is_alive():
+            return worker_thread[0]
+
+        worker_thread[0] = threading.Thread(target=run_worker, daemon=True)
+        worker_thread[0].start()
+        return worker_thread[0]
+
+
+def claim_next_job():
+
+    """
+    Claims the oldest job that is due, so that no other process runs it at the same time.
+
+    Jobs whose dependency is still in the queue (waiting, running, or failed) are skipped.
+
+    Returns:
+        tuple: Job ID, job type, and arguments (dict), or None if no job is due
+    """
+
+    engine = sa.create_engine(queue_database[0])
+
+    with engine.begin() as connection:
+
+        # Queue jobs again that were left running by processes that no longer exist (ex: a killed acquisition listener)
+        for job_id, owner in connection.execute(sa.text("SELECT id, owner FROM sync_jobs WHERE status = 'running'")).fetchall():
+            if owner is None or not psutil.pid_exists(owner):
+                connection.execute(sa.text("UPDATE sync_jobs SET status = 'pending', owner = NULL WHERE id = :id"),
+                    {"id": job_id})
+
+        job = connection.execute(sa.text(
+            "SELECT id, job_type, arguments FROM sync_jobs AS job WHERE status = 'pending' AND next_attempt <= :now "
+            "AND NOT EXISTS (SELECT 1 FROM sync_jobs AS dependency WHERE dependency.key = job.depends_on) "
+            "ORDER BY id LIMIT 1"), {"now": time.time()}).first()
+
+        if job is None:
+            return None
+
+        claimed = connection.execute(sa.text(
+            "UPDATE sync_jobs SET status = 'running', owner = :owner WHERE id = :id AND status = 'pending'"),
+            {"owner": os.getpid(), "id": job.id}).rowcount
+
+    if claimed == 0:
+        return None
+
+    return job.id, job.job_type, json.loads(job.arguments)
+
+
+def run_worker():
+
+    """
+    Runs queued jobs indefinitely, retrying failed jobs with exponential backoff.
+
+    Returns:
+        None
+    """
+
+    while True:
+        try:
+            job_ran = run_next_job()
+        except Exception as error:
+            print("SyncWorker – Error reading sync queue:", error)
+            job_ran = False
+
+        if not job_ran:
+            time.sleep(1)
+
+
+def run_next_job():
+
+    """
+    Claims and runs the next job that is due (see claim_next_job()).
+
+    A job that succeeds is removed from the queue. A job that fails is scheduled for another attempt with
+    exponential backoff, or marked as failed after max_attempts attempts.
+
+    Returns:
+        bool: True if a job was run (whether it succeeded or not), False if no job was due
+    """
+
+    job = claim_next_job()
+    if job is None:
+        return False
+
+    job_id, job_type, arguments = job
+    engine = sa.create_engine(queue_database[0])
+
+    try:
+        job_types[job_type](**arguments)
+
+        with engine.begin() as connection:
+            connection.execute(sa.text("DELETE FROM sync_jobs WHERE id = :id"), {"id": job_id})
+
+    except Exception as error:
+        print("SyncWorker – Error running " + job_type + " job:", error)
+        traceback.print_exc()
+
+        with engine.begin() as connection:
+            attempts = connection.execute(sa.text("SELECT attempts FROM sync_jobs WHERE id = :id"),
+                {"id": job_id}).scalar() + 1
+
+            delay = min(retry_base_delay * (2 ** (attempts - 1)), retry_max_delay)
+            status = "pending" if attempts < max_attempts else "failed"
+
+            connection.execute(sa.text(
+                "UPDATE sync_jobs SET status = :status, attempts = :attempts, next_attempt = :next_attempt, "
+                "owner = NULL, error = :error WHERE id = :id"),
+                {"status": status, "attempts": attempts, "next_attempt": time.time() + delay,
+                 "error": str(error), "id": job_id})
+
+    return True
+
+
+def wait_until_idle(timeout=None):
+
+    """
+    Blocks until no jobs are waiting or running, or until the timeout expires.
+
+    Failed jobs that exhausted their retries are not waited for, and neither are jobs that depend on them.
+
+    Args:
+        timeout (float, default None): Maximum number of seconds to wait, or None to wait indefinitely
+
+    Returns:
+        bool: True if the queue is idle, False if the timeout expired
+    """
+
+    if queue_database[0] is None:
+        return True
+
+    engine = sa.create_engine(queue_database[0])
+    started = time.time()
+
+    while True:
+        with engine.connect() as connection:
+            remaining = connection.execute(sa.text(
+                "SELECT COUNT(*) FROM sync_jobs AS job WHERE status IN ('pending', 'running') "
+                "AND NOT EXISTS (SELECT 1 FROM sync_jobs AS dependency WHERE dependency.key = job.depends_on "
+                "AND dependency.status = 'failed')")).scalar()
+
+        if remaining == 0:
+            return True
+        elif timeout is not None and time.time() - started > timeout:
+            return False
+
+        start_worker()
+        time.sleep(1)
+
+
+def get_jobs():
+
+    """
+    Returns all jobs in the sync queue, including failed ones.
+
+    Returns:
+        list: List of dictionaries with the key, job type, status, number of attempts, and last error of each job
+    """
+
+    engine = sa.create_engine(queue_database[0])
+
+    with engine.connect() as connection:
+        return [dict(row._mapping) for row in connection.execute(
+            sa.text("SELECT key, job_type, status, attempts, error FROM sync_jobs ORDER BY id"))]
+
+
+def throttle(size):
+
+    """
+    Waits as long as needed to keep uploads under the bandwidth limit, before sending the given number of bytes.
+
+    Uses a token bucket that allows bursts of up to one second's worth of bandwidth. This limits the average
+    upload rate: the wait happens before the upload, and the bytes are then sent as fast as the connection allows.
+
+    Args:
+        size (int): Number of bytes about to be uploaded
+
+    Returns:
+        None
+    """
+
+    if bandwidth_limit[0] is None:
+        return None
+
+    with bandwidth_lock:
+        now = time.time()
+        bandwidth_state["allowance"] = min(bandwidth_limit[0],
+            bandwidth_state["allowance"] + (now - bandwidth_state["last_check"]) * bandwidth_limit[0])
+        bandwidth_state["last_check"] = now
+        bandwidth_state["allowance"] -= size
+
+        if bandwidth_state["allowance"] < 0:
+            time.sleep(-bandwidth_state["allowance"] / bandwidth_limit[0])
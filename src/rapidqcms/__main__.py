@@ -1,21 +1,203 @@
-from rapidqcms.DashWebApp import *
+import os, sys, logging, webbrowser
+import importlib.util
+import rapidqcms.DatabaseFunctions as db
+
+"""
+Starts the Rapid-QC-MS dashboard.
+
+The dashboard is served by a multi-threaded WSGI server, so that a slow callback doesn't block other users. The server
+is configured with environment variables:
+
+- RAPIDQCMS_HOST: Address to listen on (127.0.0.1 by default, 0.0.0.0 to host the dashboard for other devices)
+- RAPIDQCMS_PORT: Port to listen on (8050 by default)
+- RAPIDQCMS_THREADS: Number of threads per worker process (32 by default; each browser that shows an active run keeps
+  one thread busy with its live update stream)
+- RAPIDQCMS_WORKERS: Number of worker processes (1 by default, more require gunicorn, which doesn't run on Windows)
+
+waitress (pip install waitress) is used for a single worker process, and Flask's threaded server if it isn't installed.
+The WSGI application can also be served by other WSGI servers as rapidqcms.DashWebApp:server.
+
+The Dash app is only imported by the processes that serve it (ex: not by the gunicorn master process).
+"""
+
+host_environment_variable = "RAPIDQCMS_HOST"
+port_environment_variable = "RAPIDQCMS_PORT"
+threads_environment_variable = "RAPIDQCMS_THREADS"
+workers_environment_variable = "RAPIDQCMS_WORKERS"
+
+# Lock file held by the gunicorn worker process that runs database maintenance (see start_worker_services())
+maintenance_lock_file = os.path.join(db.data_directory, "maintenance.lock")
+maintenance_lock = [None]
+
+
+def get_server_configuration():
+
+    """
+    Returns the server configuration from environment variables.
+
+    Returns:
+        dict: Host, port, threads, and workers
+    """
+
+    return {
+        "host": os.environ.get(host_environment_variable, "127.0.0.1"),
+        "port": int(os.environ.get(port_environment_variable, 8050)),
+        "threads": max(1, int(os.environ.get(threads_environment_variable, 32))),
+        "workers": max(1, int(os.environ.get(workers_environment_variable, 1)))
+    }
+
+
+def serve(host, port, threads=32, workers=1):
+
+    """
+    Serves the Dash app with a multi-threaded (and optionally multi-process) WSGI server.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port to listen on
+        threads (int, default 32): Number of threads per worker process
+        workers (int, default 1): Number of worker processes
+
+    Returns:
+        None
+    """
+
+    if workers > 1:
+        if sys.platform != "win32" and importlib.util.find_spec("gunicorn") is not None:
+            return serve_with_gunicorn(host, port, threads, workers)
+        print("Multiple worker processes require gunicorn (pip install gunicorn), which doesn't run on Windows. "
+            "Serving with a single worker process.")
+
+    # Background services run in the only worker process
+    db.start_maintenance_scheduler()
+    db.start_sync_worker()
+
+    from rapidqcms.DashWebApp import app, server
+
+    if importlib.util.find_spec("waitress") is not None:
+        import waitress
+        waitress.serve(server, host=host, port=port, threads=threads)
+    else:
+        print("waitress is not installed (pip install waitress). Serving with Flask's threaded server.")
+        app.run_server(host=host, port=port, threaded=True, debug=False)
+
+
+def serve_with_gunicorn(host, port, threads, workers):
+
+    """
+    Serves the Dash app with gunicorn, using multiple worker processes with multiple threads each.
+
+    Database maintenance runs in one worker process (see start_worker_services()). The Google Drive upload queue is
+    processed by each worker process, which is safe because queued jobs are claimed by one process at a time
+    (see SyncWorker). The gunicorn master process only manages the workers.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port to listen on
+        threads (int): Number of threads per worker process
+        workers (int): Number of worker processes
+
+    Returns:
+        None
+    """
+
+    from gunicorn.app.base import BaseApplication
+
+    options = {
+        "bind": host + ":" + str(port),
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "timeout": 300,
+        "post_fork": start_worker_services
+    }
+
+    class DashApplication(BaseApplication):
+
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from rapidqcms.DashWebApp import server
+            return server
+
+    DashApplication().run()
+
+
+def start_worker_services(arbiter, worker):
+
+    """
+    Starts background services in a gunicorn worker process, after it was forked (gunicorn's post_fork hook).
+
+    Every worker processes the upload queue. The database maintenance scheduler only runs in the worker that holds
+    the maintenance lock, so that databases are maintained by one process.
+
+    Args:
+        arbiter (gunicorn.arbiter.Arbiter): gunicorn master process
+        worker (gunicorn.workers.base.Worker): Worker that was forked
+
+    Returns:
+        None
+    """
+
+    db.start_sync_worker()
+
+    if acquire_maintenance_lock():
+        db.start_maintenance_scheduler()
+
+
+def acquire_maintenance_lock():
+
+    """
+    Locks the maintenance lock file for this process, if no other process holds it.
+
+    The lock is held until the process exits, and is released by the operating system even if the process crashed,
+    so that the worker that replaces it takes over database maintenance.
+
+    Returns:
+        bool: Whether this process holds the lock
+    """
+
+    import fcntl
+
+    if maintenance_lock[0] is not None:
+        return True
+
+    if not os.path.exists(db.data_directory):
+        os.makedirs(db.data_directory)
+
+    lock = open(maintenance_lock_file, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return False
+
+    maintenance_lock[0] = lock
+    return True
+
 
 def main():
 
     """
-    Opens web browser and starts Flask server for Dash app
+    Opens web browser and starts the WSGI server for Dash app
     """
-    logging.basicConfig(filename="rapid-qc-ms.log", level=logging.INFO)
-    # Opens localhost:8050 in Google Chrome
+    logging.basicConfig(filename=os.path.join(db.root_directory, "rapid-qc-ms.log"), level=logging.INFO)
+
+    configuration = get_server_configuration()
+    url = "http://127.0.0.1:" + str(configuration["port"]) + "/"
+
+    # Opens the dashboard in Google Chrome
     if sys.platform == "win32":
         chrome_path = "C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe"
         webbrowser.register("chrome", None, webbrowser.BackgroundBrowser(chrome_path))
-        webbrowser.get("chrome").open("http://127.0.0.1:8050/")
+        webbrowser.get("chrome").open(url)
     elif sys.platform == "darwin":
-        webbrowser.get("chrome").open("http://127.0.0.1:8050/", new=1)
+        webbrowser.get("chrome").open(url, new=1)
 
-    # Start Dash app on port 8050
-    app.run_server(threaded=False, debug=False, port=8050)
+    # Start Dash app
+    serve(**configuration)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,66 @@
+/*
+ * Live updates of the selected active instrument run (see LiveUpdates.py).
+ *
+ * The browser keeps a server-sent event stream open for the selected run, and the refresh interval checks the
+ * latest event in the browser only. The dashboard's callbacks are triggered (through the "live-update" store)
+ * only when the server reported new samples or a new status for the run.
+ */
+
+var liveUpdates = {source: null, key: null, event: null, counter: 0};
+
+function closeLiveUpdates() {
+    if (liveUpdates.source !== null) {
+        liveUpdates.source.close();
+    }
+    liveUpdates.source = null;
+    liveUpdates.key = null;
+    liveUpdates.event = null;
+}
+
+function openLiveUpdates(instrument, runId) {
+    closeLiveUpdates();
+    liveUpdates.key = instrument + "/" + runId;
+    liveUpdates.source = new EventSource("live-updates?instrument=" + encodeURIComponent(instrument)
+        + "&run=" + encodeURIComponent(runId));
+    liveUpdates.source.onmessage = function(message) {
+        liveUpdates.event = JSON.parse(message.data);
+    };
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    live_updates: {
+        check_for_updates: function(n_intervals, disabled, resources) {
+
+            // Only active runs are watched
+            if (disabled || !resources) {
+                closeLiveUpdates();
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            resources = JSON.parse(resources);
+            if (resources.status === "Complete") {
+                closeLiveUpdates();
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            if (liveUpdates.key !== resources.instrument + "/" + resources.run_id) {
+                openLiveUpdates(resources.instrument, resources.run_id);
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            // Trigger callbacks once per event, and only if the run changed since QC results were loaded
+            var event = liveUpdates.event;
+            if (event === null || event.delivered) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            event.delivered = true;
+            if (event.completed === resources.samples_completed && event.status === resources.status) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            liveUpdates.counter += 1;
+            return liveUpdates.counter;
+        }
+    }
+});
@@ -0,0 +1,78 @@
+import os, sys
+import pandas as pd
+import pytest
+
+# Import rapidqcms from the source tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+
+    """
+    Creates a workspace in a temporary directory, with instrument "Test QE", chromatography "HILIC",
+    and biological standard "Urine". Returns the DatabaseFunctions module, pointed at the temporary workspace.
+    """
+
+    import rapidqcms.DatabaseFunctions as db
+
+    data_directory = str(tmp_path / "data")
+    methods_directory = os.path.join(data_directory, "methods")
+    settings_db_file = os.path.join(methods_directory, "Settings.db")
+    os.makedirs(methods_directory)
+
+    monkeypatch.setattr(db, "data_directory", data_directory)
+    monkeypatch.setattr(db, "methods_directory", methods_directory)
+    monkeypatch.setattr(db, "settings_db_file", settings_db_file)
+    monkeypatch.setattr(db, "settings_database", "sqlite:///" + settings_db_file.replace("\\", "/"))
+    monkeypatch.setattr(db, "sync_queue_file", os.path.join(data_directory, "sync_queue.db"))
+    monkeypatch.setattr(db, "sync_state_file", os.path.join(data_directory, "sync_state.json"))
+
+    db.create_databases("Test QE")
+    db.insert_new_instrument("Test QE", "Thermo Fisher")
+    db.insert_chromatography_method("HILIC")
+    db.add_biological_standard("Urine", "Urine")
+    return db
+
+
+def add_run(db, run_id, samples=10):
+
+    """
+    Adds an instrument run with alternating positive and negative mode samples, and one positive and one negative mode
+    injection of the "Urine" biological standard (named "RUN_ID_Urine_Pos" and "RUN_ID_Urine_Neg").
+
+    Returns:
+        tuple: Sample ID's and biological standard sample ID's of the run
+    """
+
+    rows = []
+    for index in range(samples):
+        polarity = "Pos" if index % 2 == 0 else "Neg"
+        rows.append({"File Name": run_id + "_S" + str(index).zfill(3) + "_" + polarity, "Path": "",
+            "Instrument Method": "HILIC_" + polarity, "Position": "A" + str(index), "Inj Vol": 1, "Sample ID": ""})
+
+    for polarity in ["Pos", "Neg"]:
+        rows.append({"File Name": run_id + "_Urine_" + polarity, "Path": "", "Instrument Method": "HILIC_" + polarity,
+            "Position": "B1", "Inj Vol": 1, "Sample ID": ""})
+
+    sequence = pd.DataFrame(rows).to_json(orient="split")
+    db.insert_new_run(run_id, "Test QE", "HILIC", ["Urine"], "", sequence, None, "Default", "completed")
+
+    return [row["File Name"] for row in rows[:samples]], [row["File Name"] for row in rows[samples:]]
+
+
+def persist_sample(db, run_id, sample_id, seed, is_bio_standard=False, features=5):
+
+    """
+    Writes made-up QC results for a sample, in the format written by AutoQCProcessing.convert_to_dict().
+    """
+
+    def record(offset):
+        return str({"Name": sample_id, **{"iSTD " + str(index): round(seed * 1.1 + index + offset, 3)
+            for index in range(features)}})
+
+    qc_dataframe = str([{"Name": sample_id, **{"iSTD " + str(index): seed + index + result_type
+        for index in range(features)}} for result_type in range(6)])
+
+    db.persist_sample_results("Test QE", run_id, sample_id, record(0), record(1), record(2), qc_dataframe,
+        "Pass", is_bio_standard)
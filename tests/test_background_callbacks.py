@@ -0,0 +1,73 @@
+import os
+import time
+
+
+def wait_for_result(manager, key, job, timeout=10):
+
+    """
+    Polls a background job like the browser does, and returns its result.
+    """
+
+    started = time.time()
+    while time.time() - started < timeout:
+        result = manager.get_result(key, job)
+        if result is not manager.UNDEFINED:
+            return result
+        time.sleep(0.01)
+
+    raise TimeoutError("Background job did not finish")
+
+
+def test_cache_is_created_on_first_use(tmp_path, monkeypatch):
+
+    import rapidqcms.BackgroundCallbacks as background
+    import rapidqcms.DatabaseFunctions as db
+
+    monkeypatch.setattr(db, "data_directory", str(tmp_path))
+    cache_directory = os.path.join(str(tmp_path), "background_callbacks")
+
+    manager = background.ThreadedDiskcacheManager(threads=1)
+    assert not os.path.exists(cache_directory)
+
+    assert manager.get_progress("unknown") is None
+    assert os.path.exists(os.path.join(cache_directory, "cache.db"))
+
+
+def test_job_reports_progress_and_result(tmp_path):
+
+    import rapidqcms.BackgroundCallbacks as background
+
+    manager = background.ThreadedDiskcacheManager(str(tmp_path), threads=1)
+
+    def callback(set_progress, value):
+        set_progress("Halfway")
+        return value * 2
+
+    key = manager.build_cache_key(callback, [], [])
+    job = manager.call_job_fn(key, manager.make_job_fn(callback, True), [21], {})
+
+    assert wait_for_result(manager, key, job) == 42
+    assert manager.get_progress(key) is None
+    assert not manager.job_running(job)
+
+
+def test_cancelled_job_is_discarded(tmp_path):
+
+    import rapidqcms.BackgroundCallbacks as background
+
+    manager = background.ThreadedDiskcacheManager(str(tmp_path), threads=1)
+
+    # Keep the only background thread busy, so that the next job is still queued when it is cancelled
+    blocker_key = manager.build_cache_key(None, [], [])
+    blocker = manager.call_job_fn(blocker_key, manager.make_job_fn(lambda: time.sleep(0.2), False), [], {})
+
+    calls = []
+    key = manager.build_cache_key(None, [], [])
+    job = manager.call_job_fn(key, manager.make_job_fn(lambda: calls.append(1), False), [], {})
+    manager.terminate_job(job)
+
+    wait_for_result(manager, blocker_key, blocker)
+    manager.executor.shutdown(wait=True)
+
+    assert calls == []
+    assert not manager.result_ready(key)
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+import rapidqcms.PlotGeneration as plot
+
+
+def reference_lttb(x, y, threshold):
+
+    """
+    Straightforward LTTB, as described in Steinarsson (2013), "Downsampling Time Series for Visual Representation".
+    """
+
+    length = len(x)
+    every = (length - 2) / (threshold - 2)
+    kept = [0]
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        next_start = int(np.floor((bucket + 1) * every)) + 1
+        next_end = min(int(np.floor((bucket + 2) * every)) + 1, length)
+        next_x = np.mean(x[next_start:next_end])
+        next_y = np.mean(y[next_start:next_end])
+
+        start = int(np.floor(bucket * every)) + 1
+        end = int(np.floor((bucket + 1) * every)) + 1
+
+        largest_area, selected = -1, start
+        for index in range(start, end):
+            area = abs((x[previous] - next_x) * (y[index] - y[previous])
+                - (x[previous] - x[index]) * (next_y - y[previous]))
+            if area > largest_area:
+                largest_area, selected = area, index
+
+        kept.append(selected)
+        previous = selected
+
+    kept.append(length - 1)
+    return np.array(kept)
+
+
+@pytest.mark.parametrize("length,threshold", [(100, 10), (1000, 37), (5003, 2000), (10, 9)])
+def test_matches_reference_implementation(length, threshold):
+
+    random = np.random.default_rng(length)
+    x = np.sort(random.uniform(0, 100, length))
+    y = random.normal(0, 1, length)
+
+    kept = plot.downsample_lttb(x, y, threshold)
+
+    np.testing.assert_array_equal(kept, reference_lttb(x, y, threshold))
+    assert len(kept) == threshold
+    assert kept[0] == 0 and kept[-1] == length - 1
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_keeps_peaks():
+
+    y = np.zeros(10000)
+    peaks = [123, 4567, 9876]
+    y[peaks] = [50, -80, 100]
+
+    kept = plot.downsample_lttb(np.arange(len(y)), y, 100)
+    assert set(peaks) <= set(kept.tolist())
+
+
+def test_short_series_are_not_downsampled():
+
+    np.testing.assert_array_equal(plot.downsample_lttb(np.arange(50), np.zeros(50), 50), np.arange(50))
+    np.testing.assert_array_equal(plot.downsample_lttb(np.arange(50), np.zeros(50), 2), np.arange(50))
+
+
+def test_zoomed_range_is_shown_at_full_resolution(monkeypatch):
+
+    monkeypatch.setattr(plot, "downsample_point_threshold", 100)
+
+    samples = ["SAMPLE_" + str(index).zfill(4) for index in range(1000)]
+    values = np.sin(np.arange(1000) / 10)
+    values[500] = np.nan
+    dataframe = pd.DataFrame({"iSTD 1": values, "Specimen": samples})
+
+    positions, names, plotted = plot.get_istd_plot_points(dataframe, samples, "iSTD 1")
+    assert len(positions) == 100
+    assert not np.isnan(plotted).any()
+
+    positions, names, plotted = plot.get_istd_plot_points(dataframe, samples, "iSTD 1", x_range=[450.5, 550])
+    zoomed = [position for position in range(450, 551) if position != 500]
+    assert set(zoomed) <= set(positions.tolist())
+    assert names.tolist() == [samples[position] for position in positions]
+    np.testing.assert_array_equal(plotted, values[positions])
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+import rapidqcms.DatabaseFunctions as db
+
+
+@pytest.fixture
+def table():
+    return pd.DataFrame({
+        "iSTD 1": [1.23456789e-5, 123456.789, np.nan, 100.0, -0.5],
+        "iSTD 2": [1.2071234, 1.934, 3.953, np.inf, 8.132],
+        "Specimen": ["SAMPLE_001", "SAMPLE_002", None, "SAMPLE_004", "SAMPLE_005"],
+        "Count": [1, 2, 3, 4, 5]
+    })
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip_keeps_columns_types_and_significant_digits(table, compress):
+
+    df = db.decode_table(db.encode_table(table, compress=compress))
+
+    assert df.columns.tolist() == table.columns.tolist()
+    assert df.dtypes.tolist() == table.dtypes.tolist()
+    assert df["Specimen"].tolist() == table["Specimen"].tolist()
+    assert df["Count"].tolist() == table["Count"].tolist()
+
+    # Small values keep their significant digits, even next to large values in the same column
+    expected = table["iSTD 1"].to_numpy()
+    np.testing.assert_allclose(df["iSTD 1"].to_numpy(), expected, rtol=10 ** -(db.table_float_precision - 1))
+    assert df["iSTD 1"][0] != 0
+
+    # Missing and infinite values are decoded as missing
+    assert df["iSTD 1"].isna().tolist() == [False, False, True, False, False]
+    assert df["iSTD 2"].isna().tolist() == [False, False, False, True, False]
+
+
+def test_precision_sets_significant_digits_of_each_value():
+
+    payload = db.encode_table(pd.DataFrame({"value": [1.23456789e-5, 123456.789, 2.0]}), precision=3, compress=False)
+    assert payload == '{"columns":["value"],"values":[[1.23e-05,1.23e+05,2.0]]}'
+
+
+def test_large_payloads_are_compressed(table):
+
+    large_table = pd.concat([table] * 2000, ignore_index=True)
+    payload = db.encode_table(large_table)
+
+    assert payload.startswith("zlib:")
+    assert len(db.decode_table(payload)) == len(large_table)
+
+
+def test_tables_in_records_format_are_decoded(table):
+
+    df = db.decode_table(table.to_json(orient="records"))
+    assert df.columns.tolist() == table.columns.tolist()
+    assert len(df) == len(table)
@@ -0,0 +1,30 @@
+import os, sys, json, subprocess
+
+# Seconds that importing the acquisition listener may take (pandas, NumPy and SQLAlchemy take most of it)
+import_time_budget = 5
+
+# Packages that are only imported when they are used
+deferred_modules = ["pydrive2", "googleapiclient", "slack_sdk", "dash", "plotly"]
+
+import_script = """
+import sys, json, time
+started = time.perf_counter()
+import rapidqcms.AcquisitionListener
+elapsed = time.perf_counter() - started
+print(json.dumps({"elapsed": elapsed, "modules": sorted(name.split(".")[0] for name in sys.modules)}))
+"""
+
+
+def test_acquisition_listener_imports_quickly():
+
+    source_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    environment = dict(os.environ, PYTHONPATH=source_directory + os.pathsep + os.environ.get("PYTHONPATH", ""))
+
+    # A fresh interpreter, so that modules imported by other tests don't count
+    output = subprocess.run([sys.executable, "-c", import_script], env=environment, capture_output=True, text=True,
+        check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    imported = [name for name in deferred_modules if name in result["modules"]]
+    assert imported == []
+    assert result["elapsed"] < import_time_budget
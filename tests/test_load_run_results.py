@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+from conftest import add_run, persist_sample
+
+
+@pytest.fixture
+def runs(workspace):
+
+    """
+    Adds three runs with processed samples and biological standards, except for the last samples of each run.
+    """
+
+    db = workspace
+    samples = {}
+
+    for run_id in ["RUN1", "RUN2", "RUN3"]:
+        samples[run_id], bio_standards = add_run(db, run_id)
+        for index, sample_id in enumerate(samples[run_id][:-3]):
+            persist_sample(db, run_id, sample_id, index)
+        for index, sample_id in enumerate(bio_standards):
+            persist_sample(db, run_id, sample_id, index, is_bio_standard=True)
+
+    return db, samples
+
+
+def assert_same_results(db, results, run_id, load_from):
+
+    for polarity in ["Pos", "Neg"]:
+        for result_type in ["precursor_mz", "retention_time", "intensity"]:
+            pd.testing.assert_frame_equal(results["internal_standards"][polarity][result_type],
+                db.parse_internal_standard_data("Test QE", run_id, result_type, polarity, load_from, as_json=False))
+            pd.testing.assert_frame_equal(
+                results["biological_standards"]["Urine"][polarity][result_type].reset_index(drop=True),
+                db.parse_biological_standard_data("Test QE", run_id, result_type, polarity, "Urine", load_from,
+                    as_json=False).reset_index(drop=True))
+
+        for result_type in db.qc_result_types:
+            pd.testing.assert_frame_equal(results["qc"][polarity][result_type],
+                db.parse_internal_standard_qc_data("Test QE", run_id, polarity, result_type, load_from, as_json=False))
+
+
+def test_single_pass_matches_parsing_each_table(runs):
+
+    db, samples = runs
+    results = db.load_run_results("Test QE", "RUN2", "database", "HILIC", ["Urine"])
+
+    assert_same_results(db, results, "RUN2", "database")
+    assert results["samples"]["sample_id"].tolist() == \
+        db.get_samples_in_run("Test QE", "RUN2", "Both")["sample_id"].tolist()
+
+
+def test_single_pass_matches_parsing_each_table_from_csv(runs):
+
+    db, samples = runs
+
+    # Write the CSV files that download_qc_results() creates for active runs on remote devices
+    directory = db.os.path.join(db.data_directory, "Test_QE_RUN2", "csv")
+    db.os.makedirs(directory)
+    db.get_samples_in_run("Test QE", "RUN2", "Specimen").to_csv(db.os.path.join(directory, "samples.csv"), index=False)
+    db.get_table("Test QE", "bio_qc_results").to_csv(db.os.path.join(directory, "bio_standards.csv"), index=False)
+
+    results = db.load_run_results("Test QE", "RUN2", "csv", "HILIC", ["Urine"])
+    assert_same_results(db, results, "RUN2", "csv")
+
+
+def test_update_with_new_samples_matches_full_load(runs):
+
+    db, samples = runs
+    previous = db.load_run_results("Test QE", "RUN3", "database", "HILIC", ["Urine"])
+
+    # Process the remaining samples, and reprocess the first one with different results
+    for index, sample_id in enumerate(samples["RUN3"][-3:]):
+        persist_sample(db, "RUN3", sample_id, 10 + index)
+    persist_sample(db, "RUN3", samples["RUN3"][0], 20)
+
+    updated = db.load_run_results("Test QE", "RUN3", "database", "HILIC", ["Urine"], previous=previous)
+    reloaded = db.load_run_results("Test QE", "RUN3", "database", "HILIC", ["Urine"])
+
+    assert_same_results(db, updated, "RUN3", "database")
+
+    for polarity in ["Pos", "Neg"]:
+        for result_type in ["precursor_mz", "retention_time", "intensity"]:
+            pd.testing.assert_frame_equal(updated["internal_standards"][polarity][result_type],
+                reloaded["internal_standards"][polarity][result_type])
@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+from conftest import add_run, persist_sample
+
+
+@pytest.fixture
+def synced_run(workspace, monkeypatch):
+
+    """
+    Adds a run with biological standards in a previous run, and syncs QC results through an in-memory backend.
+    """
+
+    import rapidqcms.StorageBackends as storage
+
+    db = workspace
+    monkeypatch.setattr(db, "storage_backend", [storage.InMemoryBackend()])
+
+    previous_samples, previous_bio_standards = add_run(db, "RUN1")
+    for index, sample_id in enumerate(previous_bio_standards):
+        persist_sample(db, "RUN1", sample_id, index, is_bio_standard=True)
+
+    samples, bio_standards = add_run(db, "RUN2")
+    return db, samples, bio_standards
+
+
+def count_full_reads(monkeypatch):
+
+    """
+    Counts calls of pd.read_csv() that read every row of a CSV file.
+    """
+
+    calls = []
+    read_csv = pd.read_csv
+
+    def counting_read_csv(*args, **kwargs):
+        if kwargs.get("nrows") != 0 and kwargs.get("usecols") is None:
+            calls.append(args[0])
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_csv", counting_read_csv)
+    return calls
+
+
+def download(db):
+
+    # Progress manifests are cached for a few seconds, which is skipped here
+    db.progress_cache.clear()
+    return db.download_qc_results("Test QE", "RUN2")
+
+
+def test_new_samples_are_appended_without_reading_csv_files(synced_run, monkeypatch):
+
+    db, samples, bio_standards = synced_run
+    full_reads = count_full_reads(monkeypatch)
+
+    for index, sample_id in enumerate(samples[:4] + bio_standards[:1]):
+        persist_sample(db, "RUN2", sample_id, index, is_bio_standard=sample_id in bio_standards)
+        db.upload_qc_results("Test QE", "RUN2")
+        download(db)
+
+    assert full_reads == []
+
+    run_csv, samples_csv, bio_standards_csv = download(db)
+    assert pd.read_csv(samples_csv)["sample_id"].tolist() == samples[:4]
+
+    df_bio_standards = pd.read_csv(bio_standards_csv)
+    assert df_bio_standards.loc[df_bio_standards["run_id"] == "RUN1"]["sample_id"].tolist() == ["RUN1_Urine_Pos",
+        "RUN1_Urine_Neg"]
+    assert df_bio_standards.loc[df_bio_standards["run_id"] == "RUN2"]["sample_id"].tolist() == bio_standards[:1]
+
+
+def test_reprocessed_samples_replace_their_rows(synced_run, monkeypatch):
+
+    db, samples, bio_standards = synced_run
+
+    for index, sample_id in enumerate(samples[:3]):
+        persist_sample(db, "RUN2", sample_id, index)
+    db.upload_qc_results("Test QE", "RUN2")
+    download(db)
+
+    # Reprocess a sample and add a new one in the same download, which reads and rewrites samples.csv once
+    persist_sample(db, "RUN2", samples[1], 50)
+    db.upload_qc_results("Test QE", "RUN2")
+    persist_sample(db, "RUN2", samples[3], 3)
+    db.upload_qc_results("Test QE", "RUN2")
+
+    full_reads = count_full_reads(monkeypatch)
+    run_csv, samples_csv, bio_standards_csv = download(db)
+    assert len(full_reads) == 1
+
+    df_samples = pd.read_csv(samples_csv, index_col=False)
+    assert sorted(df_samples["sample_id"].tolist()) == sorted(samples[:4])
+
+    expected = db.get_samples_in_run("Test QE", "RUN2", "Specimen")
+    expected = expected.loc[expected["sample_id"].isin(samples[:4])]
+    for sample_id in samples[:4]:
+        assert df_samples.loc[df_samples["sample_id"] == sample_id]["intensity"].tolist() == \
+            expected.loc[expected["sample_id"] == sample_id]["intensity"].tolist()
@@ -0,0 +1,142 @@
+import threading, time
+import pandas as pd
+import pytest
+import rapidqcms.RunCache as cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+
+    """
+    Gives each test an empty cache with a budget of 100 KB.
+    """
+
+    monkeypatch.setattr(cache, "entries", cache.OrderedDict())
+    monkeypatch.setattr(cache, "loading_locks", {})
+    monkeypatch.setattr(cache, "statistics", {"hits": 0, "misses": 0, "evictions": 0, "size": 0})
+    monkeypatch.setattr(cache, "memory_budget", [100 * 1024])
+
+
+def table(kilobytes):
+    return pd.DataFrame({"value": [0.0] * (kilobytes * 128)})
+
+
+def test_least_recently_used_entries_are_evicted_first():
+
+    for run_id in ["RUN1", "RUN2", "RUN3"]:
+        cache.put(("Test QE", run_id, 1), table(30))
+
+    # Using RUN1 makes RUN2 the least recently used entry
+    assert cache.get(("Test QE", "RUN1", 1)) is not None
+    cache.put(("Test QE", "RUN4", 1), table(30))
+
+    assert list(cache.entries) == [("Test QE", "RUN3", 1), ("Test QE", "RUN1", 1), ("Test QE", "RUN4", 1)]
+    assert cache.get_statistics()["evictions"] == 1
+    assert cache.get_statistics()["size"] <= cache.memory_budget[0]
+
+
+def test_pinned_entries_are_evicted_after_unpinned_entries():
+
+    cache.put(("Test QE", "RUN1", 1), table(30), pinned=True)
+    cache.put(("Test QE", "RUN2", 1), table(30))
+    cache.put(("Test QE", "RUN3", 1), table(30))
+    cache.put(("Test QE", "RUN4", 1), table(30))
+
+    assert ("Test QE", "RUN1", 1) in cache.entries
+    assert ("Test QE", "RUN2", 1) not in cache.entries
+
+    # Pinned entries are evicted too if nothing else is left
+    cache.put(("Test QE", "RUN5", 1), table(90))
+    assert list(cache.entries) == [("Test QE", "RUN5", 1)]
+
+
+def test_new_versions_replace_older_versions_of_a_run():
+
+    cache.put(("Test QE", "RUN1", 1), table(10))
+    cache.put(("Test QE", "RUN1", 1, "plots"), "{}")
+    cache.put(("Test QE", "RUN1", 2), table(10))
+
+    assert list(cache.entries) == [("Test QE", "RUN1", 2)]
+    assert cache.get_latest("Test QE", "RUN1") is cache.get(("Test QE", "RUN1", 2))
+
+    cache.invalidate("Test QE", "RUN1")
+    assert cache.get_statistics()["entries"] == 0
+    assert cache.get_statistics()["size"] == 0
+
+
+def test_concurrent_requests_share_one_load():
+
+    loads = []
+    started = threading.Event()
+
+    def loader():
+        loads.append(1)
+        started.wait(1)
+        return table(1)
+
+    threads = [threading.Thread(target=cache.get_or_load, args=(("Test QE", "RUN1", 1), loader)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert cache.get_statistics()["misses"] == 1
+    assert cache.get_statistics()["hits"] == 4
+
+
+def test_resized_entries_count_towards_the_memory_budget():
+
+    cache.put(("Test QE", "RUN1", 1), table(30))
+    cache.put(("Test QE", "RUN2", 1), table(30))
+    cache.resize(("Test QE", "RUN2", 1), 50 * 1024)
+
+    assert list(cache.entries) == [("Test QE", "RUN2", 1)]
+    assert cache.get_statistics()["size"] == cache.entries[("Test QE", "RUN2", 1)]["size"]
+
+    # Entries that were evicted in the meantime are ignored
+    cache.resize(("Test QE", "RUN1", 1), 1024)
+    assert list(cache.entries) == [("Test QE", "RUN2", 1)]
+
+
+def test_serialized_tables_are_counted_and_encoded_once(workspace, monkeypatch):
+
+    from conftest import add_run, persist_sample
+    import rapidqcms.PlotGeneration as plots
+
+    db = workspace
+    monkeypatch.setattr(cache, "memory_budget", [512 * 1024 * 1024])
+
+    samples, bio_standards = add_run(db, "RUN1")
+    for index, sample_id in enumerate(samples + bio_standards):
+        persist_sample(db, "RUN1", sample_id, index, is_bio_standard=sample_id in bio_standards)
+
+    encoded = []
+    encode_table = db.encode_table
+
+    def counting_encode_table(df):
+        encoded.append(id(df))
+        time.sleep(0.01)
+        return encode_table(df)
+
+    monkeypatch.setattr(db, "encode_table", counting_encode_table)
+
+    # Different arguments share the parsed run, and its tables are serialized by one thread at a time
+    arguments = [{}, {"biological_standards_only": True}, {"for_benchmark_plot": True}] * 3
+    threads = [threading.Thread(target=plots.get_qc_results, args=("Test QE", "RUN1", "Complete"), kwargs=kwargs)
+        for kwargs in arguments]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(encoded) == len(set(encoded))
+
+    key = [key for key in cache.entries if len(key) == 3][0]
+    parsed = cache.entries[key]
+    encoded_size = sum(cache.estimate_size(value[1]) for value in parsed["value"]["json"].values())
+
+    assert set(parsed["value"]["json"]) <= set(encoded)
+    assert parsed["size"] == cache.estimate_size(dict(parsed["value"], json={})) + encoded_size
+    assert cache.get_statistics()["size"] == sum(entry["size"] for entry in cache.entries.values())
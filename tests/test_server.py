@@ -0,0 +1,53 @@
+import os, sys, subprocess
+import pytest
+
+pytest.importorskip("fcntl")
+
+lock_script = """
+import sys
+import rapidqcms.__main__ as server
+server.maintenance_lock_file = sys.argv[1]
+print(server.acquire_maintenance_lock())
+"""
+
+
+def acquire_in_other_process(lock_file):
+
+    source_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    environment = dict(os.environ, PYTHONPATH=source_directory + os.pathsep + os.environ.get("PYTHONPATH", ""))
+
+    output = subprocess.run([sys.executable, "-c", lock_script, lock_file], env=environment, capture_output=True,
+        text=True, check=True).stdout
+    return output.strip().splitlines()[-1] == "True"
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+
+    import rapidqcms.__main__ as server
+
+    monkeypatch.setattr(server, "maintenance_lock_file", str(tmp_path / "maintenance.lock"))
+    monkeypatch.setattr(server, "maintenance_lock", [None])
+    yield server
+
+    if server.maintenance_lock[0] is not None:
+        server.maintenance_lock[0].close()
+
+
+def test_maintenance_runs_in_one_worker(server, monkeypatch):
+
+    started = []
+    monkeypatch.setattr(server.db, "start_sync_worker", lambda: started.append("sync"))
+    monkeypatch.setattr(server.db, "start_maintenance_scheduler", lambda: started.append("maintenance"))
+
+    # The first worker gets the lock, and other workers only process the upload queue
+    server.start_worker_services(None, None)
+    assert started == ["sync", "maintenance"]
+    assert not acquire_in_other_process(server.maintenance_lock_file)
+
+
+def test_lock_is_released_when_the_worker_exits(server):
+
+    # A worker that exited doesn't keep the lock
+    assert acquire_in_other_process(server.maintenance_lock_file)
+    assert server.acquire_maintenance_lock()
@@ -0,0 +1,118 @@
+import time
+import pytest
+import rapidqcms.SyncWorker as sync
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+
+    """
+    Creates an empty sync queue in a temporary directory, with jobs only run by the tests (not a worker thread).
+    """
+
+    monkeypatch.setattr(sync, "queue_database", [None])
+    monkeypatch.setattr(sync, "job_types", {})
+    monkeypatch.setattr(sync, "start_worker", lambda: None)
+    sync.initialize(str(tmp_path / "sync_queue.db"))
+
+    calls = []
+    sync.register_job_type("upload", lambda **arguments: calls.append(("upload", arguments)))
+    return calls
+
+
+def test_jobs_with_the_same_key_are_coalesced(queue):
+
+    sync.enqueue("upload", "upload:A", version=1)
+    sync.enqueue("upload", "upload:A", version=2)
+    sync.enqueue("upload", "upload:B", version=1)
+
+    assert [job["key"] for job in sync.get_jobs()] == ["upload:A", "upload:B"]
+
+    while sync.run_next_job():
+        pass
+
+    assert queue == [("upload", {"version": 2}), ("upload", {"version": 1})]
+    assert sync.get_jobs() == []
+
+
+def test_failed_jobs_are_retried_with_backoff(queue, monkeypatch):
+
+    attempts = []
+
+    def flaky_upload():
+        attempts.append(time.time())
+        if len(attempts) < 3:
+            raise ConnectionError("offline")
+
+    sync.register_job_type("flaky", flaky_upload)
+    monkeypatch.setattr(sync, "retry_base_delay", 0)
+    sync.enqueue("flaky", "flaky")
+
+    assert sync.run_next_job()
+    job = sync.get_jobs()[0]
+    assert (job["status"], job["attempts"], job["error"]) == ("pending", 1, "offline")
+
+    while sync.run_next_job():
+        pass
+
+    assert len(attempts) == 3
+    assert sync.get_jobs() == []
+
+
+def test_retries_wait_for_backoff_and_stop_after_max_attempts(queue, monkeypatch):
+
+    def failing_upload():
+        raise ConnectionError("offline")
+
+    sync.register_job_type("failing", failing_upload)
+    sync.enqueue("failing", "failing")
+
+    # The second attempt is not due until the backoff delay has passed
+    assert sync.run_next_job()
+    assert not sync.run_next_job()
+
+    monkeypatch.setattr(sync, "retry_base_delay", 0)
+    monkeypatch.setattr(sync, "max_attempts", 3)
+    sync.enqueue("failing", "failing")
+
+    while sync.run_next_job():
+        pass
+
+    job = sync.get_jobs()[0]
+    assert (job["status"], job["attempts"]) == ("failed", 3)
+    assert sync.wait_until_idle(timeout=0)
+
+
+def test_dependent_jobs_wait_for_their_dependency_to_succeed(queue, monkeypatch):
+
+    succeed = [False]
+
+    def database_upload():
+        if not succeed[0]:
+            raise ConnectionError("offline")
+
+    sync.register_job_type("database", database_upload)
+    sync.register_job_type("cleanup", lambda: queue.append(("cleanup", {})))
+    monkeypatch.setattr(sync, "retry_base_delay", 0)
+    monkeypatch.setattr(sync, "max_attempts", 2)
+
+    sync.enqueue("database", "database:A")
+    sync.enqueue("cleanup", "cleanup:A", depends_on="database:A")
+
+    # The cleanup is not run while the upload fails, nor after the upload gave up
+    while sync.run_next_job():
+        pass
+
+    assert queue == []
+    assert [job["status"] for job in sync.get_jobs()] == ["failed", "pending"]
+    assert sync.wait_until_idle(timeout=0)
+
+    # The cleanup runs once a new upload succeeds
+    succeed[0] = True
+    sync.enqueue("database", "database:A")
+
+    while sync.run_next_job():
+        pass
+
+    assert queue == [("cleanup", {})]
+    assert sync.get_jobs() == []